@@ -16,6 +16,7 @@ from app.models.user import User
 from app.models.project import Project
 from app.models.agent_config import AgentConfig
 from app.models.execution import Execution
+from app.models.execution_log import ExecutionLog
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
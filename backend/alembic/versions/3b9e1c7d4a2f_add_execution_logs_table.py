@@ -0,0 +1,70 @@
+"""Add execution_logs table
+
+Revision ID: 3b9e1c7d4a2f
+Revises: 740553ed158c
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+import json
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9e1c7d4a2f'
+down_revision: Union[str, Sequence[str], None] = '740553ed158c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    execution_logs = op.create_table(
+        'execution_logs',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('execution_id', sa.String(), nullable=False),
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('agent', sa.String(length=100), nullable=False),
+        sa.Column('level', sa.String(length=20), nullable=False),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['execution_id'], ['executions.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'idx_execution_log_execution_seq', 'execution_logs', ['execution_id', 'seq'], unique=True
+    )
+
+    # Copy entries from the legacy executions.agent_logs JSON column
+    conn = op.get_bind()
+    rows = conn.execute(sa.text("SELECT id, agent_logs FROM executions")).fetchall()
+    for execution_id, agent_logs in rows:
+        try:
+            logs = json.loads(agent_logs or "[]")
+        except (TypeError, ValueError):
+            continue
+        logs = [log for log in logs if isinstance(log, dict)] if isinstance(logs, list) else []
+        entries = []
+        for seq, log in enumerate(logs, start=1):
+            try:
+                timestamp = datetime.fromisoformat(log["timestamp"])
+            except (KeyError, TypeError, ValueError):
+                timestamp = datetime.now(timezone.utc)
+            entries.append({
+                'execution_id': execution_id,
+                'seq': seq,
+                'agent': str(log.get('agent') or 'system')[:100],
+                'level': str(log.get('level') or 'info')[:20],
+                'message': str(log.get('message', '')),
+                'timestamp': timestamp,
+            })
+        if entries:
+            op.bulk_insert(execution_logs, entries)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_execution_log_execution_seq', table_name='execution_logs')
+    op.drop_table('execution_logs')
@@ -95,9 +95,10 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Check if token is revoked
+    # Check token and user-level revocation in one round trip
     from app.core.token_blacklist import token_blacklist
-    if await token_blacklist.is_token_revoked(token):
+    token_revoked, user_tokens_revoked = await token_blacklist.check_revocation(token, user_id)
+    if token_revoked:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token has been revoked",
@@ -105,7 +106,7 @@ async def get_current_user(
         )
     
     # Check if all user tokens are revoked
-    if await token_blacklist.is_user_tokens_revoked(user_id):
+    if user_tokens_revoked:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="All user tokens have been revoked",
@@ -5,9 +5,11 @@ This module defines FastAPI endpoints for project management including
 CRUD operations and project-related functionality.
 """
 
+import mimetypes
 import os
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
@@ -27,6 +29,8 @@ from app.schemas.project import (
     ProjectErrorResponse,
 )
 from app.services.project_service import ProjectService, get_project_service
+from app.metagpt_integration.file_handler import get_file_handler
+from app.websocket.file_transfer import iter_file_range, parse_range_header
 from app.api.deps import (
     get_current_user,
     get_pagination,
@@ -693,6 +697,100 @@ async def get_project_metadata(
         )
 
 
+# ============================================================================
+# Project Files Endpoint
+# ============================================================================
+
+@router.get(
+    "/{project_id}/files/{file_path:path}",
+    status_code=status.HTTP_200_OK,
+    summary="Download project file",
+    description="Download a file from the project workspace, optionally a byte range",
+    response_class=FileResponse,
+)
+async def download_project_file(
+    project_id: str,
+    file_path: str,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Download a workspace file.
+    
+    Whole files are served with FileResponse, which uses the server's
+    zero-copy sendfile path when available. A single-range Range header
+    returns 206 Partial Content streamed in chunks.
+    
+    Args:
+        project_id: Project ID
+        file_path: Relative file path within the workspace
+        request: Incoming request (for the Range header)
+        current_user: Current authenticated user
+        db: Database session
+        
+    Returns:
+        FileResponse or StreamingResponse with the file content
+        
+    Raises:
+        HTTPException: 404 Not Found if project or file not found
+        HTTPException: 400 Bad Request if the path is invalid
+        HTTPException: 416 Range Not Satisfiable for a bad Range header
+        
+    Example:
+        GET /api/v1/projects/550e8400-e29b-41d4-a716-446655440000/files/src/main.py
+        Range: bytes=0-1023
+    """
+    service = get_project_service(db)
+    project = await service.get_project_by_owner(project_id, str(current_user.id))
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found",
+        )
+    
+    try:
+        full_path = get_file_handler().resolve_file_path(project_id, file_path)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
+    except FileNotFoundError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"File not found: {file_path}",
+        ) from e
+    
+    media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+    range_header = request.headers.get("range")
+    if not range_header:
+        return FileResponse(
+            full_path,
+            media_type=media_type,
+            filename=os.path.basename(full_path),
+            headers={"Accept-Ranges": "bytes"},
+        )
+    
+    size = os.path.getsize(full_path)
+    try:
+        start, end = parse_range_header(range_header, size)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        ) from e
+    
+    return StreamingResponse(
+        iter_file_range(full_path, start, end, settings.websocket_file_chunk_size),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=media_type,
+        headers={
+            "Accept-Ranges": "bytes",
+            "Content-Range": f"bytes {start}-{end - 1}/{size}",
+            "Content-Length": str(end - start),
+        },
+    )
+
+
 # ============================================================================
 # Health Check Endpoint
 # ============================================================================
@@ -18,28 +18,17 @@ import json
 from typing import Optional
 from uuid import uuid4
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, Depends, HTTPException, status
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, status
+from fastapi.responses import PlainTextResponse
 
 from app.core.config import settings
-from app.core.database import get_db
-from app.core.security import verify_token
-from app.models.user import User
-from app.websocket.connection_manager import (
-    get_connection_manager,
-    ConnectionManager,
-)
-from app.websocket.message_handler import (
-    get_message_handler,
-    MessageHandler,
-    MessageType,
-)
-from app.metagpt_integration.streaming import (
-    get_streaming_handler,
-    StreamingHandler,
-    EventType,
-    EventFilter,
-)
+from app.core.metrics import get_metrics_registry
+from app.core.database import AsyncSessionLocal
+from app.websocket.auth import get_websocket_authenticator
+from app.websocket.connection_manager import get_connection_manager
+from app.websocket.subscriptions import ChannelSubscriptions
+from app.websocket.message_handler import get_message_handler, RequestDispatcher
+from app.metagpt_integration.streaming import get_streaming_handler
 
 
 logger = logging.getLogger(__name__)
@@ -47,37 +36,6 @@ logger = logging.getLogger(__name__)
 router = APIRouter(tags=["websocket"])
 
 
-# ============================================================================
-# WebSocket Authentication
-# ============================================================================
-
-async def get_user_from_token(token: str, db: AsyncSession) -> Optional[User]:
-    """
-    Authenticate user from WebSocket token.
-    
-    Args:
-        token: JWT token
-        db: Database session
-        
-    Returns:
-        User object or None if invalid
-    """
-    from sqlalchemy import select
-    
-    payload = verify_token(token)
-    if not payload:
-        return None
-    
-    user_id = payload.get("sub")
-    if not user_id:
-        return None
-    
-    result = await db.execute(
-        select(User).where(User.id == user_id)
-    )
-    return result.scalar_one_or_none()
-
-
 # ============================================================================
 # WebSocket Endpoints
 # ============================================================================
@@ -86,13 +44,18 @@ async def get_user_from_token(token: str, db: AsyncSession) -> Optional[User]:
 async def websocket_endpoint(
     websocket: WebSocket,
     token: str = Query(...),
-    db: AsyncSession = Depends(get_db),
+    batch_ms: Optional[int] = Query(None, ge=1),
+    batch_size: Optional[int] = Query(None, ge=1),
+    compress: Optional[str] = Query(None),
 ):
     """
     WebSocket endpoint for real-time communication.
     
     Query Parameters:
         token: JWT authentication token (required)
+        batch_ms: Opt-in event batching window in milliseconds (optional)
+        batch_size: Max events per batch frame (optional)
+        compress: Opt-in compression codec for large frames, e.g. "deflate" (optional)
         
     Connection Flow:
         1. Authenticate user with JWT token
@@ -106,8 +69,22 @@ async def websocket_endpoint(
     Message Format:
         {
             "type": "message_type",
-            "payload": {...}
+            "payload": {...},
+            "id": "client-correlation-id"  (optional)
         }
+
+    Requests are handled concurrently (up to websocket_max_inflight_requests
+    per connection), so responses may arrive out of order; match them to
+    requests by "request_id", which echoes the request's "id".
+
+    One connection can follow any number of projects and executions:
+    {"type": "subscribe", "payload": {"project_id": ...}} (or "execution_id")
+    adds a channel and "unsubscribe" removes it. Channel events arrive as
+    {"type": "event", "event": {...}} messages.
+
+    Binary frames start with a kind byte: 0x01 is a deflate-compressed JSON
+    frame, 0x02 is a file chunk of a chunked GET_FILE transfer (see
+    app.websocket.file_transfer for the layout).
         
     Response Format:
         {
@@ -115,23 +92,38 @@ async def websocket_endpoint(
             "message_type": "...",
             "data": {...},
             "error": "...",
-            "timestamp": "..."
+            "timestamp": "...",
+            "request_id": "client-correlation-id"  (if the request had an id)
         }
     """
-    # Authenticate user
-    user = await get_user_from_token(token, db)
-    if not user:
-        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid token")
-        logger.warning("WebSocket connection rejected: Invalid token")
+    # Authenticate; no DB session is held while the socket is open
+    auth = await get_websocket_authenticator().authenticate(token)
+    if not auth.ok:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=auth.error)
+        logger.warning(f"WebSocket connection rejected: {auth.error}")
         return
+    user = auth.user
 
     # Generate connection ID
     connection_id = f"ws_{uuid4().hex[:12]}"
 
     # Get managers
     conn_manager = get_connection_manager()
-    msg_handler = get_message_handler(db, settings)
+    msg_handler = get_message_handler(settings, AsyncSessionLocal)
     streaming_handler = await get_streaming_handler()
+    channels = ChannelSubscriptions(
+        connection_id,
+        conn_manager,
+        streaming_handler,
+        max_channels=settings.websocket_max_channels,
+    )
+    dispatcher = RequestDispatcher(
+        msg_handler,
+        user,
+        lambda response: conn_manager.send_to_connection(connection_id, response),
+        send_binary=lambda frame: conn_manager.send_binary(connection_id, frame),
+        channels=channels,
+    )
 
     try:
         # Accept connection
@@ -139,15 +131,20 @@ async def websocket_endpoint(
             connection_id=connection_id,
             websocket=websocket,
             user_id=str(user.id),
+            batch_interval_ms=batch_ms,
+            batch_max_size=batch_size,
+            compression=compress,
         )
 
         logger.info(f"WebSocket connected: {connection_id} (user: {user.id})")
 
         # Send connection acknowledgment
-        await websocket.send_json({
+        await conn_manager.send_to_connection(connection_id, {
             "type": "connection_ack",
             "connection_id": connection_id,
             "user_id": str(user.id),
+            "batching": conn_info.get_batching_info(),
+            "compression": conn_info.compression.value if conn_info.compression else None,
             "timestamp": conn_info.connected_at.isoformat(),
         })
 
@@ -156,50 +153,39 @@ async def websocket_endpoint(
             try:
                 # Receive message
                 data = await websocket.receive_json()
+                conn_manager.touch(connection_id)
 
-                # Extract message type and payload
-                message_type = data.get("type")
-                payload = data.get("payload", {})
-
-                if not message_type:
-                    await websocket.send_json({
-                        "success": False,
-                        "error": "Missing message type",
-                    })
-                    continue
-
-                logger.debug(f"Received message {message_type} from {connection_id}")
-
-                # Handle message
-                response = await msg_handler.handle(
-                    message_type=message_type,
-                    payload=payload,
-                    user=user,
-                )
+                logger.debug(f"Received message {data.get('type')} from {connection_id}")
 
-                # Send response
-                await websocket.send_json(response.to_dict())
+                # Dispatch; the response is sent when the request finishes
+                await dispatcher.submit(data)
 
+            except WebSocketDisconnect:
+                raise
             except json.JSONDecodeError:
                 logger.warning(f"Invalid JSON from {connection_id}")
-                await websocket.send_json({
+                await conn_manager.send_to_connection(connection_id, {
                     "success": False,
                     "error": "Invalid JSON format",
                 })
             except Exception as e:
                 logger.error(f"Error handling message from {connection_id}: {e}")
-                await websocket.send_json({
+                await conn_manager.send_to_connection(connection_id, {
                     "success": False,
                     "error": f"Internal error: {str(e)}",
                 })
 
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected: {connection_id}")
+        await dispatcher.close()
+        await channels.close()
         await conn_manager.disconnect(connection_id)
 
     except Exception as e:
         logger.error(f"WebSocket error for {connection_id}: {e}")
         try:
+            await dispatcher.close()
+            await channels.close()
             await conn_manager.disconnect(connection_id)
         except Exception as cleanup_error:
             logger.error(f"Error during cleanup: {cleanup_error}")
@@ -210,7 +196,9 @@ async def websocket_project_endpoint(
     websocket: WebSocket,
     project_id: str,
     token: str = Query(...),
-    db: AsyncSession = Depends(get_db),
+    batch_ms: Optional[int] = Query(None, ge=1),
+    batch_size: Optional[int] = Query(None, ge=1),
+    compress: Optional[str] = Query(None),
 ):
     """
     WebSocket endpoint for project-specific real-time communication.
@@ -220,35 +208,44 @@ async def websocket_project_endpoint(
         
     Query Parameters:
         token: JWT authentication token (required)
+        batch_ms: Opt-in event batching window in milliseconds (optional)
+        batch_size: Max events per batch frame (optional)
+        compress: Opt-in compression codec for large frames, e.g. "deflate" (optional)
         
     Features:
         - Project-scoped message routing
         - Automatic subscription to project events
         - Project-specific event filtering
     """
-    # Authenticate user
-    user = await get_user_from_token(token, db)
-    if not user:
-        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid token")
-        logger.warning("WebSocket connection rejected: Invalid token")
-        return
-
-    # Verify user has access to project
-    from app.services.project_service import get_project_service
-    project_service = get_project_service(db)
-    project = await project_service.get_project(project_id, str(user.id))
-    if not project:
-        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Project not found")
-        logger.warning(f"WebSocket connection rejected: Project {project_id} not found")
+    # Authenticate and verify project ownership in one lookup; no DB session
+    # is held while the socket is open
+    auth = await get_websocket_authenticator().authenticate(token, project_id=project_id)
+    if not auth.ok:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=auth.error)
+        logger.warning(f"WebSocket connection rejected for project {project_id}: {auth.error}")
         return
+    user = auth.user
 
     # Generate connection ID
     connection_id = f"ws_proj_{uuid4().hex[:12]}"
 
     # Get managers
     conn_manager = get_connection_manager()
-    msg_handler = get_message_handler(db, settings)
+    msg_handler = get_message_handler(settings, AsyncSessionLocal)
     streaming_handler = await get_streaming_handler()
+    channels = ChannelSubscriptions(
+        connection_id,
+        conn_manager,
+        streaming_handler,
+        max_channels=settings.websocket_max_channels,
+    )
+    dispatcher = RequestDispatcher(
+        msg_handler,
+        user,
+        lambda response: conn_manager.send_to_connection(connection_id, response),
+        send_binary=lambda frame: conn_manager.send_binary(connection_id, frame),
+        channels=channels,
+    )
 
     try:
         # Accept connection with project context
@@ -257,6 +254,9 @@ async def websocket_project_endpoint(
             websocket=websocket,
             user_id=str(user.id),
             project_id=project_id,
+            batch_interval_ms=batch_ms,
+            batch_max_size=batch_size,
+            compression=compress,
         )
 
         logger.info(
@@ -265,94 +265,60 @@ async def websocket_project_endpoint(
         )
 
         # Send connection acknowledgment
-        await websocket.send_json({
+        await conn_manager.send_to_connection(connection_id, {
             "type": "connection_ack",
             "connection_id": connection_id,
             "user_id": str(user.id),
             "project_id": project_id,
+            "batching": conn_info.get_batching_info(),
+            "compression": conn_info.compression.value if conn_info.compression else None,
             "timestamp": conn_info.connected_at.isoformat(),
         })
 
-        # Subscribe to project events
-        async def on_streaming_event(event):
-            """Handle streaming events for this connection."""
-            try:
-                await websocket.send_json({
-                    "type": "event",
-                    "event": event.to_dict(),
-                })
-            except Exception as e:
-                logger.error(f"Error sending event to {connection_id}: {e}")
-
-        # Create filter for project events
-        event_filter = EventFilter(
-            project_ids={project_id},
-        )
-
-        # Subscribe to streaming events
-        subscriber = await streaming_handler.subscribe(
-            subscriber_id=connection_id,
-            callback=on_streaming_event,
-            event_filter=event_filter,
-        )
+        # Subscribe to project events; more channels can be added with SUBSCRIBE
+        await channels.add(project_id=project_id)
 
         # Listen for messages
         while True:
             try:
                 # Receive message
                 data = await websocket.receive_json()
-
-                # Extract message type and payload
-                message_type = data.get("type")
-                payload = data.get("payload", {})
-
-                if not message_type:
-                    await websocket.send_json({
-                        "success": False,
-                        "error": "Missing message type",
-                    })
-                    continue
-
-                # Add project context to payload
-                payload["project_id"] = project_id
+                conn_manager.touch(connection_id)
 
                 logger.debug(
-                    f"Received message {message_type} from {connection_id} "
+                    f"Received message {data.get('type')} from {connection_id} "
                     f"(project: {project_id})"
                 )
 
-                # Handle message
-                response = await msg_handler.handle(
-                    message_type=message_type,
-                    payload=payload,
-                    user=user,
-                )
-
-                # Send response
-                await websocket.send_json(response.to_dict())
+                # Dispatch with project context; responses are sent when ready
+                await dispatcher.submit(data, context={"project_id": project_id})
 
+            except WebSocketDisconnect:
+                raise
             except json.JSONDecodeError:
                 logger.warning(f"Invalid JSON from {connection_id}")
-                await websocket.send_json({
+                await conn_manager.send_to_connection(connection_id, {
                     "success": False,
                     "error": "Invalid JSON format",
                 })
             except Exception as e:
                 logger.error(f"Error handling message from {connection_id}: {e}")
-                await websocket.send_json({
+                await conn_manager.send_to_connection(connection_id, {
                     "success": False,
                     "error": f"Internal error: {str(e)}",
                 })
 
     except WebSocketDisconnect:
         logger.info(f"WebSocket project disconnected: {connection_id}")
-        await streaming_handler.unsubscribe(connection_id)
+        await dispatcher.close()
+        await channels.close()
         await conn_manager.disconnect(connection_id)
 
     except Exception as e:
         logger.error(f"WebSocket project error for {connection_id}: {e}")
         try:
-            await streaming_handler.unsubscribe(connection_id)
+            await dispatcher.close()
+            await channels.close()
             await conn_manager.disconnect(connection_id)
         except Exception as cleanup_error:
             logger.error(f"Error during cleanup: {cleanup_error}")
@@ -363,7 +329,9 @@ async def websocket_execution_endpoint(
     websocket: WebSocket,
     execution_id: str,
     token: str = Query(...),
-    db: AsyncSession = Depends(get_db),
+    batch_ms: Optional[int] = Query(None, ge=1),
+    batch_size: Optional[int] = Query(None, ge=1),
+    compress: Optional[str] = Query(None),
 ):
     """
     WebSocket endpoint for execution-specific real-time communication.
@@ -373,6 +341,9 @@ async def websocket_execution_endpoint(
         
     Query Parameters:
         token: JWT authentication token (required)
+        batch_ms: Opt-in event batching window in milliseconds (optional)
+        batch_size: Max events per batch frame (optional)
+        compress: Opt-in compression codec for large frames, e.g. "deflate" (optional)
         
     Features:
         - Execution-scoped message routing
@@ -383,32 +354,47 @@ async def websocket_execution_endpoint(
     from uuid import UUID
     from app.models.execution import Execution
 
-    # Authenticate user
-    user = await get_user_from_token(token, db)
-    if not user:
-        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid token")
-        logger.warning("WebSocket connection rejected: Invalid token")
+    auth = await get_websocket_authenticator().authenticate(token)
+    if not auth.ok:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=auth.error)
+        logger.warning(f"WebSocket connection rejected: {auth.error}")
         return
+    user = auth.user
 
-    # Verify user has access to execution
-    try:
-        execution = await db.get(Execution, UUID(execution_id))
-        if not execution or execution.user_id != user.id:
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Execution not found")
-            logger.warning(f"WebSocket connection rejected: Execution {execution_id} not found")
+    # Verify access with a short-lived session; none is held while the socket is open
+    async with AsyncSessionLocal() as db:
+        # Verify user has access to execution
+        try:
+            execution = await db.get(Execution, UUID(execution_id))
+            if not execution or execution.user_id != user.id:
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Execution not found")
+                logger.warning(f"WebSocket connection rejected: Execution {execution_id} not found")
+                return
+        except Exception as e:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid execution ID")
+            logger.warning(f"WebSocket connection rejected: Invalid execution ID - {e}")
             return
-    except Exception as e:
-        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid execution ID")
-        logger.warning(f"WebSocket connection rejected: Invalid execution ID - {e}")
-        return
 
     # Generate connection ID
     connection_id = f"ws_exec_{uuid4().hex[:12]}"
 
     # Get managers
     conn_manager = get_connection_manager()
-    msg_handler = get_message_handler(db, settings)
+    msg_handler = get_message_handler(settings, AsyncSessionLocal)
     streaming_handler = await get_streaming_handler()
+    channels = ChannelSubscriptions(
+        connection_id,
+        conn_manager,
+        streaming_handler,
+        max_channels=settings.websocket_max_channels,
+    )
+    dispatcher = RequestDispatcher(
+        msg_handler,
+        user,
+        lambda response: conn_manager.send_to_connection(connection_id, response),
+        send_binary=lambda frame: conn_manager.send_binary(connection_id, frame),
+        channels=channels,
+    )
 
     try:
         # Accept connection with execution context
@@ -417,6 +403,9 @@ async def websocket_execution_endpoint(
             websocket=websocket,
             user_id=str(user.id),
             project_id=str(execution.project_id),
+            batch_interval_ms=batch_ms,
+            batch_max_size=batch_size,
+            compression=compress,
         )
 
         logger.info(
@@ -425,96 +414,64 @@ async def websocket_execution_endpoint(
         )
 
         # Send connection acknowledgment
-        await websocket.send_json({
+        await conn_manager.send_to_connection(connection_id, {
             "type": "connection_ack",
             "connection_id": connection_id,
             "user_id": str(user.id),
             "execution_id": execution_id,
             "project_id": str(execution.project_id),
+            "batching": conn_info.get_batching_info(),
+            "compression": conn_info.compression.value if conn_info.compression else None,
             "timestamp": conn_info.connected_at.isoformat(),
         })
 
-        # Subscribe to execution events
-        async def on_streaming_event(event):
-            """Handle streaming events for this connection."""
-            try:
-                await websocket.send_json({
-                    "type": "event",
-                    "event": event.to_dict(),
-                })
-            except Exception as e:
-                logger.error(f"Error sending event to {connection_id}: {e}")
-
-        # Create filter for execution events
-        event_filter = EventFilter(
-            execution_ids={execution_id},
-        )
-
-        # Subscribe to streaming events
-        subscriber = await streaming_handler.subscribe(
-            subscriber_id=connection_id,
-            callback=on_streaming_event,
-            event_filter=event_filter,
-        )
+        # Subscribe to execution events; more channels can be added with SUBSCRIBE
+        await channels.add(execution_id=execution_id)
 
         # Listen for messages
         while True:
             try:
                 # Receive message
                 data = await websocket.receive_json()
-
-                # Extract message type and payload
-                message_type = data.get("type")
-                payload = data.get("payload", {})
-
-                if not message_type:
-                    await websocket.send_json({
-                        "success": False,
-                        "error": "Missing message type",
-                    })
-                    continue
-
-                # Add execution context to payload
-                payload["execution_id"] = execution_id
-                payload["project_id"] = str(execution.project_id)
+                conn_manager.touch(connection_id)
 
                 logger.debug(
-                    f"Received message {message_type} from {connection_id} "
+                    f"Received message {data.get('type')} from {connection_id} "
                     f"(execution: {execution_id})"
                 )
 
-                # Handle message
-                response = await msg_handler.handle(
-                    message_type=message_type,
-                    payload=payload,
-                    user=user,
-                )
-
-                # Send response
-                await websocket.send_json(response.to_dict())
+                # Dispatch with execution context; responses are sent when ready
+                await dispatcher.submit(data, context={
+                    "execution_id": execution_id,
+                    "project_id": str(execution.project_id),
+                })
 
+            except WebSocketDisconnect:
+                raise
             except json.JSONDecodeError:
                 logger.warning(f"Invalid JSON from {connection_id}")
-                await websocket.send_json({
+                await conn_manager.send_to_connection(connection_id, {
                     "success": False,
                     "error": "Invalid JSON format",
                 })
             except Exception as e:
                 logger.error(f"Error handling message from {connection_id}: {e}")
-                await websocket.send_json({
+                await conn_manager.send_to_connection(connection_id, {
                     "success": False,
                     "error": f"Internal error: {str(e)}",
                 })
 
     except WebSocketDisconnect:
         logger.info(f"WebSocket execution disconnected: {connection_id}")
-        await streaming_handler.unsubscribe(connection_id)
+        await dispatcher.close()
+        await channels.close()
         await conn_manager.disconnect(connection_id)
 
     except Exception as e:
         logger.error(f"WebSocket execution error for {connection_id}: {e}")
         try:
-            await streaming_handler.unsubscribe(connection_id)
+            await dispatcher.close()
+            await channels.close()
             await conn_manager.disconnect(connection_id)
         except Exception as cleanup_error:
             logger.error(f"Error during cleanup: {cleanup_error}")
@@ -542,6 +499,38 @@ async def websocket_health():
     }
 
 
+@router.get("/metrics")
+async def websocket_metrics(format: str = Query("json", pattern="^(json|prometheus)$")):
+    """
+    Get WebSocket, broadcast, streaming and LLM client cache metrics.
+    
+    Query Parameters:
+        format: "json" (default) or "prometheus" for the text exposition format
+        
+    Returns:
+        Component counters and latency histograms
+    """
+    from app.metagpt_integration.llm_registry import get_llm_registry_stats
+    from app.websocket.broadcast import get_broadcast_manager
+
+    components = {
+        "websocket": get_connection_manager().get_metrics(),
+        "broadcast": get_broadcast_manager().get_metrics(),
+        "streaming": (await get_streaming_handler()).get_metrics(),
+        "websocket_auth": get_websocket_authenticator().get_metrics(),
+        "llm_clients": get_llm_registry_stats(),
+    }
+    registry = get_metrics_registry()
+
+    if format == "prometheus":
+        return PlainTextResponse(
+            registry.render_prometheus(components),
+            media_type="text/plain; version=0.0.4",
+        )
+
+    return {**components, "histograms": registry.snapshot()}
+
+
 @router.get("/connections")
 async def get_connections():
     """
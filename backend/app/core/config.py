@@ -113,6 +113,68 @@ class Settings(BaseSettings):
     ollama_base_url: str = Field(default="http://localhost:11434", description="Ollama base URL")
     ollama_model: str = Field(default="llama2", description="Ollama model name")
 
+    # Connection validation
+    llm_validation_cache_seconds: int = Field(
+        default=300, ge=0, description="How long a successful LLM connection validation is reused"
+    )
+    llm_validation_failure_cache_seconds: int = Field(
+        default=30, ge=0, description="How long a failed LLM connection validation is reused"
+    )
+
+    # Client cache
+    llm_client_cache_max_size: int = Field(
+        default=64, ge=1, description="Max cached LLM clients (least recently used are evicted)"
+    )
+    llm_client_cache_idle_seconds: float = Field(
+        default=1800.0, ge=0.0, description="Seconds an unused LLM client stays cached (0 = no limit)"
+    )
+
+    # HTTP connection pools (shared per provider)
+    llm_http_max_connections: int = Field(
+        default=100, ge=1, description="Max open connections per LLM provider"
+    )
+    llm_http_max_keepalive_connections: int = Field(
+        default=20, ge=0, description="Max idle keep-alive connections per LLM provider"
+    )
+    llm_http_keepalive_expiry: float = Field(
+        default=30.0, ge=0.0, description="Seconds an idle LLM connection is kept open"
+    )
+    llm_http_timeout: float = Field(
+        default=120.0, gt=0.0, description="LLM request read/write timeout in seconds"
+    )
+    llm_http_connect_timeout: float = Field(
+        default=10.0, gt=0.0, description="LLM connect timeout in seconds"
+    )
+    llm_http2_enabled: bool = Field(
+        default=True, description="Use HTTP/2 for HTTPS LLM providers (requires the h2 package)"
+    )
+
+    # Response cache
+    llm_response_cache_enabled: bool = Field(
+        default=False, description="Answer repeated deterministic LLM requests from a cache"
+    )
+    llm_response_cache_backend: str = Field(
+        default="sqlite", pattern="^(sqlite|redis)$", description="Response cache backend (sqlite or redis)"
+    )
+    llm_response_cache_path: str = Field(
+        default="./llm_cache.db", description="SQLite response cache file"
+    )
+    llm_response_cache_ttl_seconds: int = Field(
+        default=86400, ge=1, description="How long an LLM response stays cached"
+    )
+    llm_response_cache_max_entries: int = Field(
+        default=10000, ge=1, description="Max cached LLM responses (least recently used are evicted)"
+    )
+    llm_response_cache_max_temperature: float = Field(
+        default=0.0, ge=0.0, description="Highest temperature whose responses are cached"
+    )
+    llm_near_duplicate_cache_enabled: bool = Field(
+        default=False, description="Answer cache misses with responses of nearly identical cached requests"
+    )
+    llm_near_duplicate_threshold: float = Field(
+        default=0.9, gt=0.0, le=1.0, description="Min estimated similarity of a near-duplicate request"
+    )
+
     # ========================================================================
     # MetaGPT Configuration
     # ========================================================================
@@ -122,6 +184,21 @@ class Settings(BaseSettings):
     )
     metagpt_log_level: str = Field(default="INFO", description="MetaGPT log level")
     metagpt_enable_streaming: bool = Field(default=True, description="Enable MetaGPT streaming")
+    workflow_max_parallel_stages: int = Field(
+        default=4, ge=1, description="Max workflow stages running concurrently per execution"
+    )
+    workflow_codegen_max_parallel: int = Field(
+        default=4, ge=1, description="Max concurrent per-file LLM calls in a code generation stage"
+    )
+    workflow_codegen_max_files: int = Field(
+        default=40, ge=1, description="Max files generated by one code generation stage"
+    )
+    workflow_write_flush_interval: float = Field(
+        default=1.0, ge=0, description="Seconds between flushes of buffered workflow logs and progress (0 = only at stage boundaries)"
+    )
+    workflow_write_max_pending_logs: int = Field(
+        default=100, ge=1, description="Flush buffered workflow logs once this many are pending"
+    )
 
     # ========================================================================
     # File Storage Configuration
@@ -165,6 +242,92 @@ class Settings(BaseSettings):
     sentry_dsn: Optional[str] = Field(default=None, description="Sentry DSN")
     sentry_environment: str = Field(default="development", description="Sentry environment")
     sentry_traces_sample_rate: float = Field(default=1.0, description="Sentry traces sample rate")
+    metrics_top_k: int = Field(default=100, ge=1, description="Max keys tracked by per-project/per-source counters")
+
+    # ========================================================================
+    # WebSocket Configuration
+    # ========================================================================
+    websocket_send_queue_size: int = Field(default=1000, description="Max queued outbound messages per WebSocket connection")
+    websocket_send_overflow_policy: str = Field(
+        default="drop_oldest",
+        pattern="^(drop_oldest|drop_newest|close)$",
+        description="Policy when a connection's send queue is full (drop_oldest, drop_newest, close)"
+    )
+    websocket_batch_max_interval_ms: int = Field(default=1000, description="Upper bound for negotiated event batching window")
+    websocket_batch_default_size: int = Field(default=50, description="Default max events per batch frame")
+    websocket_batch_max_size: int = Field(default=500, description="Upper bound for negotiated events per batch frame")
+    websocket_registry_shards: int = Field(default=16, ge=1, description="Number of shards in the connection registry")
+    websocket_idle_timeout_seconds: int = Field(default=3600, ge=1, description="Disconnect WebSocket connections idle for this long")
+    websocket_reaper_interval_seconds: int = Field(default=30, ge=1, description="Interval between idle-connection reaper passes")
+    websocket_cluster_enabled: bool = Field(
+        default=False,
+        description="Relay targeted WebSocket messages to other API nodes through Redis"
+    )
+    websocket_node_id: Optional[str] = Field(default=None, description="Cluster node id (generated if unset)")
+    websocket_cluster_presence_refresh_seconds: int = Field(
+        default=30, ge=1, description="Interval for re-announcing cluster presence"
+    )
+    websocket_cluster_resubscribe_backoff_ms: int = Field(
+        default=500, ge=1, description="Initial delay before resubscribing after the cluster relay loses Redis"
+    )
+    websocket_cluster_resubscribe_max_backoff_ms: int = Field(
+        default=30000, ge=1, description="Upper bound for the cluster relay resubscribe delay"
+    )
+    broadcast_queue_size: int = Field(default=10000, ge=1, description="Max broadcast events waiting for the dispatcher")
+    broadcast_batch_window_ms: int = Field(default=20, ge=0, description="Window for grouping broadcast events per project")
+    broadcast_max_batch_size: int = Field(default=200, ge=1, description="Max broadcast events per dispatcher batch")
+    broadcast_max_retries: int = Field(default=3, ge=0, description="Retries for broadcast relays to other cluster nodes that fail")
+    broadcast_retry_backoff_ms: int = Field(default=100, ge=1, description="Initial broadcast relay retry backoff")
+    websocket_max_inflight_requests: int = Field(
+        default=16, ge=1, description="Max concurrently handled requests per WebSocket connection"
+    )
+    websocket_request_timeout_seconds: float = Field(
+        default=30.0, gt=0, description="Default timeout for handling one WebSocket request"
+    )
+    websocket_file_chunk_size: int = Field(
+        default=65536, ge=1024, description="Bytes per binary frame when streaming a file over WebSocket"
+    )
+    websocket_file_inline_max_bytes: int = Field(
+        default=262144,
+        ge=0,
+        description="Largest file (or range) returned inline in a GET_FILE response; larger ones are streamed in chunks"
+    )
+    websocket_max_channels: int = Field(
+        default=100, ge=1, description="Max project/execution channels subscribed on one WebSocket connection"
+    )
+    websocket_auth_cache_seconds: float = Field(
+        default=5.0,
+        ge=0,
+        description="How long a WebSocket handshake's auth result is reused for the same token (0 disables)"
+    )
+    websocket_auth_cache_size: int = Field(
+        default=10000, ge=1, description="Max cached WebSocket handshake auth results"
+    )
+    websocket_per_message_deflate: bool = Field(
+        default=True,
+        description="Enable permessage-deflate in the ASGI server (read by start.sh and python -m app.main)"
+    )
+    websocket_compression_threshold_bytes: int = Field(
+        default=16384,
+        description="Frames at or above this size are deflate-compressed for clients that negotiate compression"
+    )
+    websocket_compression_level: int = Field(default=6, ge=1, le=9, description="zlib level for compressed frames")
+    websocket_compression_offload_bytes: int = Field(
+        default=262144, ge=0, description="Frames at or above this size are compressed in a worker thread"
+    )
+    streaming_file_snapshot_max_entries: int = Field(
+        default=500, ge=1, description="Max files whose last streamed content is kept as a delta base"
+    )
+    streaming_file_snapshot_max_file_size: int = Field(
+        default=1024 * 1024, ge=0, description="Files larger than this (characters) get no delta base"
+    )
+    streaming_file_snapshot_max_total_size: int = Field(
+        default=32 * 1024 * 1024, ge=0, description="Max total characters of kept file snapshots"
+    )
+    streaming_file_patch_max_line_pairs: int = Field(
+        default=40000, ge=0,
+        description="Send full content when the changed lines of base and new file, multiplied, exceed this"
+    )
 
     # ========================================================================
     # Feature Flags
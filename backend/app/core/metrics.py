@@ -0,0 +1,266 @@
+"""
+Metrics Primitives
+
+Bounded-memory metric types used by the WebSocket and streaming layers, and
+a small registry that exposes them as JSON or in the Prometheus text format.
+
+- TopKCounter: per-key counts (e.g. per project) with a fixed number of
+  tracked keys, using the Space-Saving algorithm
+- Histogram: fixed-bucket histogram with quantile estimates, for latencies
+"""
+
+import bisect
+import logging
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+# Default latency buckets in seconds (upper bounds)
+DEFAULT_LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class TopKCounter:
+    """
+    Approximate per-key counter that tracks at most `capacity` keys.
+
+    Implements Space-Saving: when a new key arrives and the counter is full,
+    the key with the smallest count is evicted and the new key inherits that
+    count as its error bound. Any key whose true count exceeds total/capacity
+    is guaranteed to be tracked, and reported counts overestimate the true
+    count by at most the reported error.
+    """
+
+    def __init__(self, capacity: int = 100):
+        """
+        Initialize counter.
+
+        Args:
+            capacity: Maximum number of keys tracked
+        """
+        self.capacity = max(1, capacity)
+        self.total = 0
+        self._counts: Dict[str, List[int]] = {}
+
+    def add(self, key: str, amount: int = 1) -> None:
+        """
+        Count occurrences of a key.
+
+        Args:
+            key: Key to count
+            amount: Number of occurrences
+        """
+        self.total += amount
+        entry = self._counts.get(key)
+        if entry is not None:
+            entry[0] += amount
+            return
+
+        if len(self._counts) < self.capacity:
+            self._counts[key] = [amount, 0]
+            return
+
+        victim = min(self._counts, key=lambda k: self._counts[k][0])
+        floor = self._counts.pop(victim)[0]
+        self._counts[key] = [floor + amount, floor]
+
+    def top(self, n: Optional[int] = None) -> List[Tuple[str, int, int]]:
+        """
+        Get the heaviest keys.
+
+        Args:
+            n: Number of keys to return (all tracked keys if omitted)
+
+        Returns:
+            List of (key, count, error) sorted by count descending
+        """
+        items = sorted(self._counts.items(), key=lambda kv: kv[1][0], reverse=True)
+        return [(key, count, error) for key, (count, error) in items[:n]]
+
+    def as_dict(self, n: Optional[int] = None) -> Dict[str, int]:
+        """Get the heaviest keys as a {key: count} dict."""
+        return {key: count for key, count, _ in self.top(n)}
+
+    def reset(self) -> None:
+        """Forget all counts."""
+        self.total = 0
+        self._counts.clear()
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram.
+
+    Memory is constant regardless of the number of observations. Quantiles
+    are estimated by linear interpolation inside the containing bucket.
+    """
+
+    def __init__(self, name: str, description: str = "", buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        """
+        Initialize histogram.
+
+        Args:
+            name: Metric name
+            description: Help text
+            buckets: Sorted bucket upper bounds
+        """
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Record one observation."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate a quantile.
+
+        Args:
+            q: Quantile in [0, 1]
+
+        Returns:
+            Estimated value, or None if nothing was observed
+        """
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return lower
+                upper = self.buckets[i]
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get count, sum, cumulative buckets and common quantiles."""
+        cumulative = 0
+        buckets = {}
+        for bound, bucket_count in zip(list(self.buckets) + ["+Inf"], self.counts, strict=True):
+            cumulative += bucket_count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": buckets,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+    def reset(self) -> None:
+        """Forget all observations."""
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+
+class MetricsRegistry:
+    """
+    Process-wide registry of histograms, with JSON and Prometheus rendering.
+    """
+
+    def __init__(self, namespace: str = "xteam"):
+        """
+        Initialize registry.
+
+        Args:
+            namespace: Prefix for rendered metric names
+        """
+        self.namespace = namespace
+        self.histograms: Dict[str, Histogram] = {}
+
+    def histogram(self, name: str, description: str = "", buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        """Get or create a histogram."""
+        if name not in self.histograms:
+            self.histograms[name] = Histogram(name, description, buckets)
+        return self.histograms[name]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get all histograms as JSON-serializable dicts."""
+        return {name: hist.snapshot() for name, hist in self.histograms.items()}
+
+    def render_prometheus(self, components: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+        """
+        Render metrics in the Prometheus text exposition format.
+
+        Args:
+            components: Component metric dicts (e.g. get_metrics() results).
+                Numeric values become gauges; dicts and TopKCounter values
+                become one labelled series per key.
+
+        Returns:
+            Exposition text
+        """
+        lines: List[str] = []
+
+        for name, hist in self.histograms.items():
+            full = self._name(name)
+            lines.append(f"# HELP {full} {hist.description}")
+            lines.append(f"# TYPE {full} histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(list(hist.buckets) + ["+Inf"], hist.counts, strict=True):
+                cumulative += bucket_count
+                lines.append(f'{full}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f"{full}_sum {hist.sum}")
+            lines.append(f"{full}_count {hist.count}")
+
+        for component, values in (components or {}).items():
+            for key, value in values.items():
+                full = self._name(f"{component}_{key}")
+                if isinstance(value, bool) or value is None:
+                    continue
+                if isinstance(value, TopKCounter):
+                    value = value.as_dict()
+                if isinstance(value, (int, float)):
+                    lines.append(f"# TYPE {full} gauge")
+                    lines.append(f"{full} {value}")
+                elif isinstance(value, dict) and "buckets" not in value:
+                    series = [(k, v) for k, v in value.items() if isinstance(v, (int, float)) and not isinstance(v, bool)]
+                    if series:
+                        lines.append(f"# TYPE {full} gauge")
+                    for label, count in series:
+                        escaped = str(label).replace("\\", "\\\\").replace('"', '\\"')
+                        lines.append(f'{full}{{key="{escaped}"}} {count}')
+
+        return "\n".join(lines) + "\n"
+
+    def _name(self, name: str) -> str:
+        """Build a valid Prometheus metric name."""
+        return re.sub(r"[^a-zA-Z0-9_]", "_", f"{self.namespace}_{name}")
+
+
+# Global metrics registry instance
+_metrics_registry: Optional[MetricsRegistry] = None
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """
+    Get or create global metrics registry instance.
+
+    Returns:
+        MetricsRegistry instance
+    """
+    global _metrics_registry
+
+    if _metrics_registry is None:
+        _metrics_registry = MetricsRegistry()
+
+    return _metrics_registry
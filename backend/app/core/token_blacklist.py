@@ -5,7 +5,7 @@ Provides token revocation functionality using Redis for blacklisting.
 """
 
 import logging
-from typing import Optional
+from typing import Optional, Tuple
 from datetime import timedelta
 import redis.asyncio as aioredis
 
@@ -154,6 +154,34 @@ class TokenBlacklistService:
             logger.error(f"Failed to check user token revocation: {e}")
             return False
 
+    async def check_revocation(self, token: str, user_id: str) -> Tuple[bool, bool]:
+        """
+        Check token and user-level revocation in one Redis round trip.
+
+        Both EXISTS commands are sent in a single non-transactional pipeline.
+
+        Args:
+            token: JWT token to check
+            user_id: User ID from the token
+
+        Returns:
+            Tuple of (token_revoked, user_tokens_revoked)
+        """
+        if not self.redis_client:
+            logger.warning("Redis not connected, cannot check token revocation")
+            return False, False
+
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.exists(f"{self.prefix}{token}")
+                pipe.exists(f"{self.prefix}user:{user_id}")
+                token_count, user_count = await pipe.execute()
+            return token_count > 0, user_count > 0
+        except Exception as e:
+            logger.error(f"Failed to check token revocation: {e}")
+            # Fail-open, as the single checks do
+            return False, False
+
 
 # Global token blacklist service instance
 token_blacklist = TokenBlacklistService()
@@ -49,15 +49,40 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     await init_db()
 
     logger.info("Database tables created/verified")
+
+    # Startup: Reap idle WebSocket connections in the background
+    connection_manager.start_reaper()
+
+    # Startup: Relay WebSocket messages between API nodes
+    if settings.websocket_cluster_enabled:
+        from app.websocket.cluster import get_cluster_relay
+        await get_cluster_relay()
+
     logger.info("XTeam Backend started successfully")
 
     yield
 
     # Shutdown: Clean up resources
     logger.info("Shutting down XTeam Backend...")
+    from app.websocket.broadcast import close_broadcast_manager
+    await close_broadcast_manager()
+    if settings.websocket_cluster_enabled:
+        from app.websocket.cluster import close_cluster_relay
+        await close_cluster_relay()
+    await connection_manager.stop_reaper()
     await connection_manager.disconnect_all()
     logger.info("All WebSocket connections closed")
-    
+
+    # Shutdown: Close the LLM response cache
+    from app.metagpt_integration.llm_cache import close_llm_response_cache
+    await close_llm_response_cache()
+
+    # Shutdown: Drop cached LLM clients and close their connection pools
+    from app.metagpt_integration.http_pool import close_http_client_pool
+    from app.metagpt_integration.llm_registry import close_llm_clients
+    await close_llm_clients()
+    await close_http_client_pool()
+
     # Shutdown: Disconnect token blacklist
     await token_blacklist.disconnect()
 
@@ -163,14 +188,15 @@ async def websocket_endpoint(websocket: WebSocket) -> None:
         logger.warning("WebSocket connection rejected: Invalid token payload")
         return
     
-    # Check if token is revoked
-    if await token_blacklist.is_token_revoked(token):
+    # Check token and user-level revocation in one round trip
+    token_revoked, user_tokens_revoked = await token_blacklist.check_revocation(token, user_id)
+    if token_revoked:
         await websocket.close(code=1008, reason="Token has been revoked")
         logger.warning(f"WebSocket connection rejected: Revoked token for user {user_id}")
         return
     
     # Check if all user tokens are revoked
-    if await token_blacklist.is_user_tokens_revoked(user_id):
+    if user_tokens_revoked:
         await websocket.close(code=1008, reason="All user tokens revoked")
         logger.warning(f"WebSocket connection rejected: All tokens revoked for user {user_id}")
         return
@@ -337,4 +363,5 @@ if __name__ == "__main__":
         reload=settings.reload,
         log_level=settings.log_level.lower(),
         access_log=True,
+        ws_per_message_deflate=settings.websocket_per_message_deflate,
     )
@@ -5,8 +5,9 @@ This module provides the AgentManager class for orchestrating MetaGPT agents
 with custom LLM configurations per agent role.
 """
 
+import asyncio
 import logging
-from typing import Optional, Dict, Any, List, AsyncGenerator
+from typing import Optional, Dict, Any, List, AsyncGenerator, Awaitable, Callable, Tuple
 from uuid import UUID
 from datetime import datetime, timezone
 
@@ -17,7 +18,25 @@ from app.models.project import Project
 from app.models.execution import Execution, ExecutionStatus, ExecutionType
 from app.models.agent_config import AgentRole
 from app.services.agent_service import AgentService, get_agent_service
+from app.services.execution_log_service import get_execution_log_service
+from app.metagpt_integration.codegen import (
+    FileBlockParser,
+    FilePlanItem,
+    extract_code_block,
+    parse_file_plan,
+)
 from app.metagpt_integration.file_handler import get_file_handler
+from app.metagpt_integration.llm_registry import get_llm_client_from_config, validate_llm_connection
+from app.metagpt_integration.prompt_cache import PromptCacheStats, use_prompt_cache_stats
+from app.metagpt_integration.streaming import EventType, get_streaming_handler
+from app.metagpt_integration.workflow import (
+    DEFAULT_WORKFLOW,
+    StageNode,
+    WorkflowError,
+    WorkflowGraph,
+    WorkflowScheduler,
+)
+from app.metagpt_integration.write_buffer import ExecutionWriteBuffer
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +61,7 @@ class AgentManager:
         db: AsyncSession,
         project: Project,
         user_id: str,
+        workflow: Optional[WorkflowGraph] = None,
     ):
         """
         Initialize agent manager.
@@ -50,6 +70,7 @@ class AgentManager:
             db: Database session
             project: Project instance
             user_id: User ID
+            workflow: Stage graph to run (defaults to DEFAULT_WORKFLOW)
         """
         self.db = db
         self.project = project
@@ -59,6 +80,13 @@ class AgentManager:
         self.agents: Dict[str, Any] = {}
         self.streaming_handler = None
         self.file_handler = get_file_handler()
+        self.workflow = workflow or DEFAULT_WORKFLOW
+        # Concurrent stages share the session; serialize its use
+        self._db_lock = asyncio.Lock()
+        # Batches log, progress and status writes while a workflow runs
+        self.write_buffer: Optional[ExecutionWriteBuffer] = None
+        # Response and prompt cache statistics of the running execution
+        self.cache_stats = PromptCacheStats()
         
         logger.info(f"Initialized AgentManager for project: {project.id}")
 
@@ -73,19 +101,20 @@ class AgentManager:
         if self.streaming_handler is None:
             self.streaming_handler = await get_streaming_handler()
             logger.info("Initialized streaming handler")
+
+    async def initialize_agents(self) -> Dict[str, Any]:
         """
         Initialize all agents with custom LLM configurations.
         
+        All role configurations are loaded in one query, and each distinct
+        LLM connection is validated once, concurrently, with results cached
+        by the LLM registry.
+        
         Returns:
             Dict[str, Any]: Dictionary of initialized agents
-            
-        Raises:
-            ValueError: If agent configuration is invalid
         """
         logger.info("Initializing agents with custom LLM configurations")
         
-        agents = {}
-        
         # Define agent roles to initialize
         agent_roles = [
             AgentRole.PRODUCT_MANAGER,
@@ -94,49 +123,47 @@ class AgentManager:
             AgentRole.QA_ENGINEER,
         ]
         
+        configs = await self.agent_service.get_agent_configs_for_roles(self.user_id, agent_roles)
+        
+        # Create LLM clients
+        candidates = []
         for role in agent_roles:
+            config = configs.get(role)
+            if not config:
+                logger.warning(f"No configuration found for role: {role.value}")
+                continue
+            
             try:
-                # Get agent configuration for this role
-                config = await self.agent_service.get_agent_config_for_role(
-                    self.user_id,
-                    role,
-                    use_default=True,
-                )
-                
-                if not config:
-                    logger.warning(f"No configuration found for role: {role.value}")
-                    continue
-                
-                # Get LLM configuration
-                llm_config = await self.agent_service.get_llm_config_for_agent(
-                    self.user_id,
-                    role,
-                )
-                
-                # Create LLM client
-                llm_client = get_llm_client_from_config(llm_config)
-                
-                # Validate connection
-                is_valid = await llm_client.validate_connection()
-                if not is_valid:
-                    logger.error(f"Failed to validate LLM connection for role: {role.value}")
-                    continue
-                
-                # Create agent instance (placeholder for actual MetaGPT agent)
-                agent = {
-                    "role": role.value,
-                    "name": config.agent_name or role.value,
-                    "llm_client": llm_client,
-                    "config": config,
-                    "llm_config": llm_config,
-                }
-                
-                agents[role.value] = agent
-                logger.info(f"Initialized agent: {role.value}")
-                
+                llm_config = config.get_llm_config()
+                llm_client = get_llm_client_from_config(llm_config, tenant=str(self.user_id))
             except Exception as e:
                 logger.error(f"Failed to initialize agent {role.value}: {e}")
                 continue
+            
+            candidates.append((role, config, llm_config, llm_client))
+        
+        # Validate connections concurrently (the registry runs one check per
+        # distinct connection)
+        results = await asyncio.gather(*(
+            validate_llm_connection(llm_config, llm_client)
+            for _, _, llm_config, llm_client in candidates
+        ))
+        
+        agents = {}
+        for (role, config, llm_config, llm_client), is_valid in zip(candidates, results):
+            if not is_valid:
+                logger.error(f"Failed to validate LLM connection for role: {role.value}")
+                continue
+            
+            # Create agent instance (placeholder for actual MetaGPT agent)
+            agents[role.value] = {
+                "role": role.value,
+                "name": config.agent_name or role.value,
+                "llm_client": llm_client,
+                "config": config.get_agent_config(),
+                "llm_config": llm_config,
+            }
+            logger.info(f"Initialized agent: {role.value}")
         
         self.agents = agents
         return agents
@@ -174,6 +201,30 @@ class AgentManager:
         
         return execution
 
+    async def load_execution(self, execution_id: str) -> Execution:
+        """
+        Load an existing execution of the project, e.g. to resume it.
+        
+        Args:
+            execution_id: Execution ID
+            
+        Returns:
+            Execution: Loaded execution instance
+            
+        Raises:
+            ValueError: If the execution does not belong to the project or
+                is running or completed
+        """
+        execution = await self.db.get(Execution, str(UUID(str(execution_id))))
+        if execution is None or str(execution.project_id) != str(self.project.id):
+            raise ValueError(f"Execution not found: {execution_id}")
+        
+        if execution.status in (ExecutionStatus.RUNNING, ExecutionStatus.COMPLETED):
+            raise ValueError(f"Execution cannot be resumed from status: {execution.status.value}")
+        
+        self.execution = execution
+        return execution
+
     async def update_execution_status(
         self,
         status: ExecutionStatus,
@@ -187,9 +238,12 @@ class AgentManager:
         if not self.execution:
             raise ValueError("No active execution")
         
-        self.execution.status = status
-        self.db.add(self.execution)
-        await self.db.commit()
+        if self.write_buffer:
+            self.write_buffer.set_status(status)
+        else:
+            self.execution.status = status
+            self.db.add(self.execution)
+            await self.db.commit()
         
         logger.info(f"Updated execution status to: {status.value}")
 
@@ -210,9 +264,14 @@ class AgentManager:
         if not self.execution:
             raise ValueError("No active execution")
         
-        self.execution.add_log(agent, message, level)
-        self.db.add(self.execution)
-        await self.db.commit()
+        if self.write_buffer:
+            await self.write_buffer.add_log(agent, message, level)
+            return
+        
+        async with self._db_lock:
+            await get_execution_log_service(self.db).append(
+                str(self.execution.id), agent, message, level,
+            )
 
     async def set_execution_output(
         self,
@@ -221,15 +280,24 @@ class AgentManager:
         """
         Set execution output.
         
+        While a workflow runs, the output is written together with the
+        pending buffered writes (a stage boundary flush).
+        
         Args:
             output: Output dictionary
         """
         if not self.execution:
             raise ValueError("No active execution")
         
-        self.execution.output = output
-        self.db.add(self.execution)
-        await self.db.commit()
+        if self.write_buffer:
+            self.write_buffer.set_output(output)
+            await self.write_buffer.flush()
+            return
+        
+        async with self._db_lock:
+            self.execution.set_output(output)
+            self.db.add(self.execution)
+            await self.db.commit()
 
     # ========================================================================
     # Workflow Execution
@@ -239,16 +307,25 @@ class AgentManager:
         self,
         prompt: str,
         execution_type: ExecutionType = ExecutionType.FULL,
+        execution_id: Optional[str] = None,
     ) -> AsyncGenerator[Dict[str, Any], None]:
         """
         Run a complete workflow with all agents.
         
         This is the main orchestration method that coordinates all agents
-        to complete a project based on the provided prompt.
+        to complete a project based on the provided prompt. Stages of the
+        workflow graph run as soon as their inputs are ready, so independent
+        stages run concurrently; each stage's output is checkpointed to the
+        execution output under "stages" as soon as it finishes.
+        
+        Resuming an execution (by execution_id, or the current execution
+        after retry_execution()) skips the stages it already completed, so a
+        retry only pays for the failed work.
         
         Args:
             prompt: Project requirements/prompt
             execution_type: Type of execution
+            execution_id: Existing execution to resume (optional)
             
         Yields:
             Dict[str, Any]: Status updates and agent messages
@@ -264,8 +341,18 @@ class AgentManager:
             # Initialize streaming handler
             await self.initialize_streaming()
             
-            # Create execution record
-            execution = await self.create_execution(execution_type)
+            # Resume an existing execution, or create a new execution record
+            if execution_id is not None:
+                execution = await self.load_execution(execution_id)
+            elif self.execution is not None and self.execution.status == ExecutionStatus.PENDING:
+                execution = self.execution
+            else:
+                execution = await self.create_execution(execution_type)
+            
+            # Batch the workflow's database writes from here on
+            execution.error_message = None
+            self._open_write_buffer(execution)
+            self.cache_stats = PromptCacheStats()
             
             # Initialize agents
             await self.initialize_agents()
@@ -273,6 +360,16 @@ class AgentManager:
             if not self.agents:
                 raise ValueError("No agents initialized")
             
+            # Restore checkpointed stages of a resumed execution
+            scheduler = WorkflowScheduler(
+                self.workflow,
+                self._run_stage,
+                max_parallel=settings.workflow_max_parallel_stages,
+            )
+            resumed = scheduler.restore(execution.get_output(), prompt)
+            if resumed:
+                logger.info(f"Resuming execution {execution.id}, skipping stages: {', '.join(resumed)}")
+            
             # Update execution status
             await self.update_execution_status(ExecutionStatus.RUNNING)
             
@@ -281,6 +378,7 @@ class AgentManager:
                 "type": "execution_start",
                 "execution_id": str(execution.id),
                 "agents_count": len(self.agents),
+                "resumed_stages": resumed,
                 "timestamp": datetime.now(timezone.utc).isoformat(),
             }
             yield start_event
@@ -295,31 +393,35 @@ class AgentManager:
                     project_id=str(self.project.id),
                 )
             
-            # Run workflow stages
-            workflow_output = {}
-            
-            # Stage 1: Product Manager - Requirements Analysis
-            async for update in self._run_product_manager_stage(prompt):
-                yield update
-            
-            # Stage 2: Architect - System Design
-            async for update in self._run_architect_stage(prompt):
+            # Run workflow stages, each as soon as its inputs are ready
+            async for update in scheduler.run(prompt):
+                if update["type"] == "stage_complete":
+                    await self._emit_event(update, source=update["agent"])
+                    # Checkpoint, so a retry can skip this stage
+                    if not update["resumed"]:
+                        await self.set_execution_output(self._workflow_output(scheduler))
+                    await self._update_project_progress(
+                        90.0 * scheduler.finished_count / len(self.workflow)
+                    )
                 yield update
             
-            # Stage 3: Engineer - Code Generation
-            async for update in self._run_engineer_stage(prompt):
-                yield update
+            workflow_output = self._workflow_output(scheduler)
+            cache = workflow_output["cache"]
+            logger.info(
+                f"Execution {execution.id} cache hit rate {cache['hit_rate']:.0%}, "
+                f"saved ~{cache['saved_tokens']} tokens"
+            )
             
-            # Stage 4: QA Engineer - Testing
-            async for update in self._run_qa_engineer_stage(prompt):
-                yield update
+            failed = scheduler.failed_stages()
+            if failed:
+                raise WorkflowError(f"Workflow stages failed: {', '.join(failed)}")
             
             # Update project progress
             await self._update_project_progress(100.0)
             
-            # Complete execution
+            # Complete execution (and write everything before reporting it)
             await self.update_execution_status(ExecutionStatus.COMPLETED)
-            await self.set_execution_output(workflow_output)
+            await self._close_write_buffer()
             
             # Yield execution complete event
             complete_event = {
@@ -344,8 +446,15 @@ class AgentManager:
         except Exception as e:
             logger.error(f"Workflow execution failed: {e}")
             
-            # Update execution status to failed
-            if self.execution:
+            # Update execution status to failed, flushing buffered logs with it
+            if self.write_buffer:
+                self.write_buffer.set_failed(str(e))
+                try:
+                    await self._close_write_buffer()
+                except Exception as flush_error:
+                    logger.error(f"Failed to write execution failure: {flush_error}")
+                    await self._persist_failure(str(e))
+            elif self.execution:
                 await self.update_execution_status(ExecutionStatus.FAILED)
                 self.execution.fail(str(e))
                 self.db.add(self.execution)
@@ -369,420 +478,347 @@ class AgentManager:
                     execution_id=str(self.execution.id) if self.execution else None,
                     project_id=str(self.project.id),
                 )
+        
+        finally:
+            # Also flush if the consumer stopped iterating early
+            await self._close_write_buffer()
 
-    # ========================================================================
-    # Workflow Stages
-    # ========================================================================
-
-    async def _run_product_manager_stage(
-        self,
-        prompt: str,
-    ) -> AsyncGenerator[Dict[str, Any], None]:
+    def _workflow_output(self, scheduler: WorkflowScheduler) -> Dict[str, Any]:
         """
-        Run Product Manager stage - Requirements Analysis.
+        Build the execution output: stage results plus cache statistics.
         
         Args:
-            prompt: Project requirements
+            scheduler: Scheduler running the workflow
             
-        Yields:
-            Dict[str, Any]: Stage updates
+        Returns:
+            Dict[str, Any]: Execution output
         """
-        agent_role = AgentRole.PRODUCT_MANAGER.value
+        return {**scheduler.get_output(), "cache": self.cache_stats.to_dict()}
+
+    def _open_write_buffer(self, execution: Execution) -> None:
+        """
+        Start buffering the execution's log, progress and status writes.
         
-        if agent_role not in self.agents:
-            logger.warning(f"Agent not available: {agent_role}")
+        Args:
+            execution: Execution being run
+        """
+        self.write_buffer = ExecutionWriteBuffer(
+            self.db,
+            execution,
+            self.project,
+            lock=self._db_lock,
+            flush_interval=settings.workflow_write_flush_interval,
+            max_pending_logs=settings.workflow_write_max_pending_logs,
+        )
+        self.write_buffer.start()
+
+    async def _close_write_buffer(self) -> None:
+        """
+        Flush pending writes and stop buffering.
+
+        A failed final flush keeps its writes and is retried once.
+
+        Raises:
+            Exception: If the retry fails as well
+        """
+        write_buffer, self.write_buffer = self.write_buffer, None
+        if write_buffer is None:
             return
-        
-        agent = self.agents[agent_role]
-        
+
         try:
-            logger.info("Running Product Manager stage")
-            
-            # Yield stage start
-            start_event = {
-                "type": "stage_start",
-                "stage": "requirements_analysis",
-                "agent": agent_role,
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-            }
-            yield start_event
-            
-            # Emit to streaming handler
-            if self.streaming_handler:
-                await self.streaming_handler.emit(
-                    event_type="stage_start",
-                    data=start_event,
-                    source=agent_role,
-                    execution_id=str(self.execution.id) if self.execution else None,
-                    project_id=str(self.project.id),
-                )
-            
-            # Generate requirements analysis
-            analysis_prompt = f"""
-            Analyze the following project requirements and create a detailed specification:
-            
-            {prompt}
-            
-            Provide:
-            1. Project Overview
-            2. Key Features
-            3. User Stories
-            4. Acceptance Criteria
-            """
-            
-            # Get response from LLM
-            response = await agent["llm_client"].generate(
-                prompt=analysis_prompt,
-                temperature=agent["llm_config"].get("temperature", 0.7),
-                max_tokens=agent["llm_config"].get("max_tokens", 2000),
-            )
-            
-            # Log response
-            await self.add_execution_log(
-                agent=agent_role,
-                message=f"Generated requirements analysis",
-                level="info",
-            )
-            
-            # Yield agent message
-            message_event = {
-                "type": "agent_message",
-                "agent": agent_role,
-                "content": response,
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-            }
-            yield message_event
-            
-            # Emit to streaming handler
-            if self.streaming_handler:
-                await self.streaming_handler.emit(
-                    event_type="agent_message",
-                    data=message_event,
-                    source=agent_role,
-                    execution_id=str(self.execution.id) if self.execution else None,
-                    project_id=str(self.project.id),
-                )
-            
-            # Update progress
-            await self._update_project_progress(25.0)
-            
+            await write_buffer.close()
         except Exception as e:
-            logger.error(f"Product Manager stage failed: {e}")
-            await self.add_execution_log(
-                agent=agent_role,
-                message=f"Error: {str(e)}",
-                level="error",
-            )
+            logger.warning(f"Final execution flush failed, retrying: {e}")
+            await write_buffer.flush()
+
+    async def _persist_failure(self, error_message: str) -> None:
+        """
+        Mark the execution as failed in a fresh transaction.
+
+        Used when the buffered writes could not be flushed, so the execution
+        does not stay RUNNING; the buffered logs are lost.
+
+        Args:
+            error_message: Error message
+        """
+        if not self.execution:
+            return
+
+        async with self._db_lock:
+            try:
+                await self.db.rollback()
+                await self.db.refresh(self.execution)
+                self.execution.fail(error_message)
+                self.db.add(self.execution)
+                await self.db.commit()
+            except Exception as e:
+                logger.error(f"Failed to mark execution {self.execution.id} as failed: {e}")
+
+    # ========================================================================
+    # Workflow Stages
+    # ========================================================================
 
-    async def _run_architect_stage(
+    async def _run_stage(
         self,
+        node: StageNode,
         prompt: str,
-    ) -> AsyncGenerator[Dict[str, Any], None]:
+        inputs: Dict[str, str],
+        publish: Callable[[Dict[str, Any]], Awaitable[None]],
+    ) -> Optional[str]:
         """
-        Run Architect stage - System Design.
+        Run one workflow stage with the agent for its role.
         
         Args:
+            node: Workflow stage
             prompt: Project requirements
+            inputs: Outputs of the stage's upstream stages
+            publish: Forwards an update to the workflow's event stream
             
-        Yields:
-            Dict[str, Any]: Stage updates
+        Returns:
+            Optional[str]: Agent response, or None if the agent is not available
+            
+        Raises:
+            Exception: If the stage fails (recorded by the scheduler)
         """
-        agent_role = AgentRole.ARCHITECT.value
+        agent_role = node.role.value
         
         if agent_role not in self.agents:
             logger.warning(f"Agent not available: {agent_role}")
-            return
+            return None
         
         agent = self.agents[agent_role]
+        # Count this stage's cache hits and saved tokens for the execution
+        use_prompt_cache_stats(self.cache_stats)
         
         try:
-            logger.info("Running Architect stage")
+            logger.info(f"Running stage: {node.name} ({agent_role})")
             
-            # Yield stage start
+            # Publish stage start
             start_event = {
                 "type": "stage_start",
-                "stage": "system_design",
+                "stage": node.name,
                 "agent": agent_role,
                 "timestamp": datetime.now(timezone.utc).isoformat(),
             }
-            yield start_event
-            
-            # Emit to streaming handler
-            if self.streaming_handler:
-                await self.streaming_handler.emit(
-                    event_type="stage_start",
-                    data=start_event,
-                    source=agent_role,
-                    execution_id=str(self.execution.id) if self.execution else None,
-                    project_id=str(self.project.id),
-                )
-            
-            # Generate system design
-            design_prompt = f"""
-            Design the system architecture for the following project:
-            
-            {prompt}
-            
-            Provide:
-            1. System Architecture Diagram (ASCII)
-            2. Component Descriptions
-            3. Technology Stack
-            4. Database Schema
-            5. API Endpoints
-            """
-            
-            # Get response from LLM
-            response = await agent["llm_client"].generate(
-                prompt=design_prompt,
-                temperature=agent["llm_config"].get("temperature", 0.7),
-                max_tokens=agent["llm_config"].get("max_tokens", 3000),
-            )
+            await publish(start_event)
+            await self._emit_event(start_event, source=agent_role)
+            
+            # Split into one call per file if the design lists the files
+            if node.fan_out is not None:
+                plan = parse_file_plan(inputs[node.fan_out], max_files=settings.workflow_codegen_max_files)
+                if plan:
+                    return await self._run_fan_out_stage(node, agent, prompt, inputs, plan, publish)
+            
+            # Get response from LLM (streamed if it carries files, so each
+            # file is written as soon as its block closes)
+            generate_kwargs = {
+                "prompt": node.render(prompt, inputs),
+                "temperature": agent["llm_config"].get("temperature", node.temperature),
+                "max_tokens": agent["llm_config"].get("max_tokens", node.max_tokens),
+            }
+            if node.creates_files:
+                response = await self._stream_files(agent, agent_role, generate_kwargs)
+            else:
+                response = await agent["llm_client"].generate(**generate_kwargs)
             
             # Log response
             await self.add_execution_log(
                 agent=agent_role,
-                message=f"Generated system architecture design",
+                message=f"Generated {node.description or node.name}",
                 level="info",
             )
             
-            # Yield agent message
+            # Publish agent message
             message_event = {
                 "type": "agent_message",
                 "agent": agent_role,
+                "stage": node.name,
                 "content": response,
                 "timestamp": datetime.now(timezone.utc).isoformat(),
             }
-            yield message_event
-            
-            # Emit to streaming handler
-            if self.streaming_handler:
-                await self.streaming_handler.emit(
-                    event_type="agent_message",
-                    data=message_event,
-                    source=agent_role,
-                    execution_id=str(self.execution.id) if self.execution else None,
-                    project_id=str(self.project.id),
-                )
+            await publish(message_event)
+            await self._emit_event(message_event, source=agent_role)
             
-            # Update progress
-            await self._update_project_progress(50.0)
+            return response
             
         except Exception as e:
-            logger.error(f"Architect stage failed: {e}")
+            logger.error(f"Stage {node.name} failed: {e}")
             await self.add_execution_log(
                 agent=agent_role,
                 message=f"Error: {str(e)}",
                 level="error",
             )
+            raise
 
-    async def _run_engineer_stage(
+    async def _run_fan_out_stage(
         self,
+        node: StageNode,
+        agent: Dict[str, Any],
         prompt: str,
-    ) -> AsyncGenerator[Dict[str, Any], None]:
+        inputs: Dict[str, str],
+        plan: List[FilePlanItem],
+        publish: Callable[[Dict[str, Any]], Awaitable[None]],
+    ) -> str:
         """
-        Run Engineer stage - Code Generation.
+        Run a fan-out stage as concurrent per-file calls.
+        
+        Each file is written to the workspace as soon as it is generated, so
+        wall time follows the slowest file rather than the sum of all files.
         
         Args:
+            node: Workflow stage
+            agent: Agent running the stage
             prompt: Project requirements
+            inputs: Outputs of the stage's upstream stages
+            plan: Files to generate
+            publish: Forwards an update to the workflow's event stream
             
-        Yields:
-            Dict[str, Any]: Stage updates
-        """
-        agent_role = AgentRole.ENGINEER.value
-        
-        if agent_role not in self.agents:
-            logger.warning(f"Agent not available: {agent_role}")
-            return
-        
-        agent = self.agents[agent_role]
-        
-        try:
-            logger.info("Running Engineer stage")
-            
-            # Yield stage start
-            start_event = {
-                "type": "stage_start",
-                "stage": "code_generation",
-                "agent": agent_role,
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-            }
-            yield start_event
+        Returns:
+            str: All generated files, as the stage output
             
-            # Emit to streaming handler
-            if self.streaming_handler:
-                await self.streaming_handler.emit(
-                    event_type="stage_start",
-                    data=start_event,
-                    source=agent_role,
-                    execution_id=str(self.execution.id) if self.execution else None,
-                    project_id=str(self.project.id),
+        Raises:
+            RuntimeError: If any file failed to generate
+        """
+        agent_role = node.role.value
+        semaphore = asyncio.Semaphore(settings.workflow_codegen_max_parallel)
+        files = "\n".join(f"- {item.path}: {item.purpose}" for item in plan)
+        
+        async def generate(item: FilePlanItem) -> str:
+            async with semaphore:
+                response = await agent["llm_client"].generate(
+                    prompt=node.render_module(prompt, inputs, item.path, item.purpose, files),
+                    temperature=agent["llm_config"].get("temperature", node.temperature),
+                    max_tokens=agent["llm_config"].get("max_tokens", node.max_tokens),
                 )
             
-            # Generate code
-            code_prompt = f"""
-            Generate production-ready code for the following project:
-            
-            {prompt}
-            
-            Provide:
-            1. Main application file
-            2. API routes/endpoints
-            3. Database models
-            4. Configuration files
-            5. Requirements/dependencies
-            
-            Use best practices and include proper error handling.
-            """
-            
-            # Get response from LLM
-            response = await agent["llm_client"].generate(
-                prompt=code_prompt,
-                temperature=agent["llm_config"].get("temperature", 0.5),
-                max_tokens=agent["llm_config"].get("max_tokens", 4000),
-            )
-            
-            # Log response
-            await self.add_execution_log(
-                agent=agent_role,
-                message=f"Generated code implementation",
-                level="info",
-            )
+            content = extract_code_block(response)
+            if node.creates_files:
+                await self._write_file(item.path, content, agent_role)
             
-            # Yield agent message
             message_event = {
                 "type": "agent_message",
                 "agent": agent_role,
+                "stage": node.name,
+                "file": item.path,
                 "content": response,
                 "timestamp": datetime.now(timezone.utc).isoformat(),
             }
-            yield message_event
-            
-            # Emit to streaming handler
-            if self.streaming_handler:
-                await self.streaming_handler.emit(
-                    event_type="agent_message",
-                    data=message_event,
-                    source=agent_role,
-                    execution_id=str(self.execution.id) if self.execution else None,
-                    project_id=str(self.project.id),
-                )
-            
-            # Parse and create files from the response
-            await self._create_files_from_response(response, agent_role)
-            
-        except Exception as e:
-            logger.error(f"Engineer stage failed: {e}")
-            await self.add_execution_log(
-                agent=agent_role,
-                message=f"Error: {str(e)}",
-                level="error",
-            )
+            await publish(message_event)
+            await self._emit_event(message_event, source=agent_role)
+            return content
+        
+        logger.info(f"Generating {len(plan)} files for stage {node.name}")
+        results = await asyncio.gather(*(generate(item) for item in plan), return_exceptions=True)
+        
+        # The stage itself was cancelled while its files finished
+        current_task = asyncio.current_task()
+        if current_task is not None and current_task.cancelling():
+            raise asyncio.CancelledError()
+        
+        failed = []
+        for item, result in zip(plan, results):
+            # A cancelled file call is a BaseException, not an Exception
+            if isinstance(result, BaseException):
+                logger.error(f"Failed to generate {item.path}: {result!r}")
+                failed.append(item.path)
+        
+        await self.add_execution_log(
+            agent=agent_role,
+            message=f"Generated {node.description or node.name} ({len(plan) - len(failed)} of {len(plan)} files)",
+            level="error" if failed else "info",
+        )
+        
+        if failed:
+            raise RuntimeError(f"Failed to generate {len(failed)} of {len(plan)} files: {', '.join(failed)}")
+        
+        return "\n\n".join(
+            f"### {item.path}\n```\n{content}\n```" for item, content in zip(plan, results)
+        )
 
-    async def _run_qa_engineer_stage(
+    async def _stream_files(
         self,
-        prompt: str,
-    ) -> AsyncGenerator[Dict[str, Any], None]:
+        agent: Dict[str, Any],
+        agent_role: str,
+        generate_kwargs: Dict[str, Any],
+    ) -> str:
         """
-        Run QA Engineer stage - Testing.
+        Stream a response, writing each file block as soon as it closes.
         
         Args:
-            prompt: Project requirements
+            agent: Agent generating the response
+            agent_role: Role of the agent
+            generate_kwargs: Arguments for the LLM call
             
-        Yields:
-            Dict[str, Any]: Stage updates
+        Returns:
+            str: Complete response
         """
-        agent_role = AgentRole.QA_ENGINEER.value
-        
-        if agent_role not in self.agents:
-            logger.warning(f"Agent not available: {agent_role}")
-            return
+        parser = FileBlockParser()
+        chunks = []
         
-        agent = self.agents[agent_role]
+        async for chunk in agent["llm_client"].generate_with_streaming(**generate_kwargs):
+            chunks.append(chunk)
+            await self._write_files(parser.feed(chunk), agent_role)
         
-        try:
-            logger.info("Running QA Engineer stage")
-            
-            # Yield stage start
-            start_event = {
-                "type": "stage_start",
-                "stage": "testing",
-                "agent": agent_role,
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-            }
-            yield start_event
-            
-            # Emit to streaming handler
-            if self.streaming_handler:
-                await self.streaming_handler.emit(
-                    event_type="stage_start",
-                    data=start_event,
-                    source=agent_role,
-                    execution_id=str(self.execution.id) if self.execution else None,
-                    project_id=str(self.project.id),
-                )
-            
-            # Generate tests
-            test_prompt = f"""
-            Create comprehensive tests for the following project:
-            
-            {prompt}
-            
-            Provide:
-            1. Unit tests
-            2. Integration tests
-            3. API endpoint tests
-            4. Test coverage report
-            5. Edge cases and error scenarios
-            """
-            
-            # Get response from LLM
-            response = await agent["llm_client"].generate(
-                prompt=test_prompt,
-                temperature=agent["llm_config"].get("temperature", 0.5),
-                max_tokens=agent["llm_config"].get("max_tokens", 3000),
-            )
-            
-            # Log response
-            await self.add_execution_log(
-                agent=agent_role,
-                message=f"Generated test suite",
-                level="info",
-            )
-            
-            # Yield agent message
-            message_event = {
-                "type": "agent_message",
-                "agent": agent_role,
-                "content": response,
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-            }
-            yield message_event
-            
-            # Emit to streaming handler
-            if self.streaming_handler:
-                await self.streaming_handler.emit(
-                    event_type="agent_message",
-                    data=message_event,
-                    source=agent_role,
-                    execution_id=str(self.execution.id) if self.execution else None,
-                    project_id=str(self.project.id),
-                )
-            
-            # Update progress
-            await self._update_project_progress(90.0)
-            
-        except Exception as e:
-            logger.error(f"QA Engineer stage failed: {e}")
-            await self.add_execution_log(
-                agent=agent_role,
-                message=f"Error: {str(e)}",
-                level="error",
-            )
+        await self._write_files(parser.close(), agent_role)
+        return "".join(chunks)
 
     # ========================================================================
     # Helper Methods
     # ========================================================================
 
+    async def _write_file(
+        self,
+        file_path: str,
+        content: str,
+        agent_role: str,
+    ) -> None:
+        """
+        Write a generated file to the project workspace and stream the change.
+        
+        Args:
+            file_path: Relative file path within the workspace
+            content: File content
+            agent_role: Role of the agent that generated the file
+        """
+        existed = self.file_handler.file_exists(str(self.project.id), file_path)
+        
+        # Create file in workspace
+        full_path = self.file_handler.write_file(
+            str(self.project.id),
+            file_path,
+            content,
+        )
+        
+        # Emit file change event (a patch if the file was streamed before)
+        if self.streaming_handler:
+            await self.streaming_handler.emit_file_change(
+                event_type=EventType.FILE_MODIFIED if existed else EventType.FILE_CREATED,
+                file_path=file_path,
+                content=content,
+                source=agent_role,
+                execution_id=str(self.execution.id) if self.execution else None,
+                project_id=str(self.project.id),
+            )
+        
+        logger.info(f"Created file: {full_path}")
+
+    async def _emit_event(self, event: Dict[str, Any], source: str) -> None:
+        """
+        Emit a workflow event to the streaming handler.
+        
+        Args:
+            event: Event data (its "type" is the event type)
+            source: Source of event
+        """
+        if self.streaming_handler:
+            await self.streaming_handler.emit(
+                event_type=event["type"],
+                data=event,
+                source=source,
+                execution_id=str(self.execution.id) if self.execution else None,
+                project_id=str(self.project.id),
+            )
+
     async def _update_project_progress(self, progress: float) -> None:
         """
         Update project progress.
@@ -790,70 +826,46 @@ class AgentManager:
         Args:
             progress: Progress value (0-100)
         """
+        if self.write_buffer:
+            self.write_buffer.set_progress(progress)
+            return
+        
         try:
-            self.project.update_progress(progress)
-            self.db.add(self.project)
-            await self.db.commit()
+            async with self._db_lock:
+                self.project.update_progress(progress)
+                self.db.add(self.project)
+                await self.db.commit()
             
             logger.info(f"Updated project progress to: {progress}%")
             
         except Exception as e:
             logger.error(f"Failed to update project progress: {e}")
 
-    async def _create_files_from_response(
+    async def _write_files(
         self,
-        response: str,
+        files: List[Tuple[str, str]],
         agent_role: str,
     ) -> None:
         """
-        Parse response and create files in the project workspace.
+        Write parsed file blocks, logging (not raising) per-file failures.
         
         Args:
-            response: LLM response containing file content
-            agent_role: Role of the agent that generated the response
+            files: (path, content) pairs
+            agent_role: Role of the agent that generated the files
         """
-        try:
-            # Simple file extraction - look for code blocks with file paths
-            import re
-            
-            # Pattern to match file paths in markdown code blocks
-            file_pattern = r'```(?:\w+)?\s*(\S+)\n(.*?)\n```'
-            matches = re.findall(file_pattern, response, re.DOTALL)
-            
-            for file_path, content in matches:
-                try:
-                    # Create file in workspace
-                    full_path = self.file_handler.write_file(
-                        str(self.project.id),
-                        file_path,
-                        content.strip(),
-                    )
-                    
-                    # Emit file creation event
-                    if self.streaming_handler:
-                        await self.streaming_handler.emit(
-                            event_type="file_created",
-                            data={
-                                "file_path": file_path,
-                                "size": len(content),
-                            },
-                            source=agent_role,
-                            execution_id=str(self.execution.id) if self.execution else None,
-                            project_id=str(self.project.id),
-                        )
-                    
-                    logger.info(f"Created file: {full_path}")
-                    
-                except Exception as e:
-                    logger.error(f"Failed to create file {file_path}: {e}")
-                    
-        except Exception as e:
-            logger.error(f"Failed to parse files from response: {e}")
+        for file_path, content in files:
+            try:
+                await self._write_file(file_path, content, agent_role)
+            except Exception as e:
+                logger.error(f"Failed to create file {file_path}: {e}")
 
     async def retry_execution(self) -> bool:
         """
         Retry the current execution.
         
+        Running run_workflow() afterwards resumes the execution from its
+        checkpoint, so stages that already completed are not run again.
+        
         Returns:
             bool: True if retry is possible, False otherwise
         """
@@ -0,0 +1,221 @@
+"""
+Code Generation Fan-out Module
+
+This module splits a system design into per-file code generation tasks, so
+the engineer stage can generate files concurrently instead of asking one
+LLM call for the whole codebase (which hits max_tokens and serializes all
+generation).
+
+The architect is asked for a "File List" section with one item per file:
+
+    File List:
+    - app/main.py: Application entry point
+    - app/models.py: Database models
+
+parse_file_plan() reads that section; a design without one yields an empty
+plan and the engineer falls back to a single call.
+
+For single-call responses, FileBlockParser extracts fenced code blocks
+tagged with a path incrementally, as the response streams in, so each file
+can be written as soon as its block closes.
+"""
+
+import logging
+import re
+from typing import List, NamedTuple, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class FilePlanItem(NamedTuple):
+    """
+    A file to generate.
+
+    Attributes:
+        path: Relative file path within the workspace
+        purpose: What the file contains, as described by the design
+    """
+    path: str
+    purpose: str
+
+
+# Heading introducing the file list, e.g. "6. File List", "## File List:"
+_FILE_LIST_HEADING = re.compile(r"^[\s#*\d.)]*file\s+list\b", re.IGNORECASE)
+
+# List item naming a file, e.g. "- `app/main.py`: entry point", "1. app/db.py - models"
+_FILE_ITEM = re.compile(
+    r"^\s*(?:[-*+]|\d+[.)])\s+`?([A-Za-z0-9_.\-/]+\.[A-Za-z0-9]+)`?\s*(?:[:–—-]\s*(.*))?$"
+)
+
+# First fenced code block of a response
+_CODE_BLOCK = re.compile(r"```[^\n]*\n(.*?)\n?```", re.DOTALL)
+
+
+def parse_file_plan(design: str, max_files: Optional[int] = None) -> List[FilePlanItem]:
+    """
+    Parse the file list section of a system design.
+
+    Args:
+        design: System design text
+        max_files: Max files to return (None = all)
+
+    Returns:
+        List[FilePlanItem]: Files in the order listed (empty if the design
+            has no file list)
+    """
+    plan: List[FilePlanItem] = []
+    seen = set()
+    in_list = False
+
+    for line in design.splitlines():
+        if not in_list:
+            in_list = bool(_FILE_LIST_HEADING.match(line))
+            continue
+
+        if not line.strip():
+            continue
+
+        match = _FILE_ITEM.match(line)
+        if not match:
+            # The list ends at the first line that is not a file item
+            if plan:
+                break
+            continue
+
+        path, purpose = match.group(1), (match.group(2) or "").strip()
+        if path.startswith("/") or ".." in path or path in seen:
+            continue
+
+        seen.add(path)
+        plan.append(FilePlanItem(path, purpose))
+
+    if max_files is not None and len(plan) > max_files:
+        logger.warning(f"File plan has {len(plan)} files, generating the first {max_files}")
+        plan = plan[:max_files]
+
+    return plan
+
+
+def extract_code_block(response: str) -> str:
+    """
+    Extract file content from a single-file response.
+
+    Args:
+        response: LLM response
+
+    Returns:
+        str: Content of the first fenced code block, or the whole response
+            if it has none
+    """
+    match = _CODE_BLOCK.search(response)
+    content = match.group(1) if match else response
+    return content.strip()
+
+
+class FileBlockParser:
+    """
+    Incremental parser for fenced code blocks naming a file.
+
+    Feed response chunks as they arrive; each call returns the blocks that
+    closed within it. Only the current line and the lines of the open block
+    are kept, never the whole response. A block names its file in the info
+    string of the opening fence:
+
+        ```python app/main.py
+        ```app/main.py
+
+    Blocks whose info string is only a language (```python) are skipped.
+    """
+
+    def __init__(self):
+        """Initialize parser."""
+        self._partial = ""
+        self._in_block = False
+        self._path: Optional[str] = None
+        self._lines: List[str] = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        """
+        Consume a chunk of the response.
+
+        Args:
+            chunk: Next piece of the response
+
+        Returns:
+            List[Tuple[str, str]]: (path, content) of blocks closed by the chunk
+        """
+        text = self._partial + chunk
+        lines = text.split("\n")
+        self._partial = lines.pop()
+
+        files = []
+        for line in lines:
+            block = self._consume(line)
+            if block is not None:
+                files.append(block)
+        return files
+
+    def close(self) -> List[Tuple[str, str]]:
+        """
+        Finish parsing (the response ended).
+
+        Returns:
+            List[Tuple[str, str]]: Blocks closed by the final unterminated
+                line; a block left open is discarded
+        """
+        files = []
+        if self._partial:
+            block = self._consume(self._partial)
+            if block is not None:
+                files.append(block)
+        self._partial = ""
+        self._in_block = False
+        self._lines = []
+        return files
+
+    def _consume(self, line: str) -> Optional[Tuple[str, str]]:
+        """Process one complete line, returning a block if it closed."""
+        fence = line.strip()
+
+        if not self._in_block:
+            if fence.startswith("```"):
+                self._in_block = True
+                self._path = _block_path(fence[3:])
+                self._lines = []
+            return None
+
+        if fence != "```":
+            if self._path is not None:
+                self._lines.append(line)
+            return None
+
+        self._in_block = False
+        path, content = self._path, "\n".join(self._lines).strip()
+        self._lines = []
+        if path is None:
+            return None
+        return path, content
+
+
+def _block_path(info: str) -> Optional[str]:
+    """
+    Get the file path from a code fence info string.
+
+    Args:
+        info: Text after the opening backticks, e.g. "python app/main.py"
+
+    Returns:
+        Optional[str]: Path, or None if the info string names no file
+    """
+    tokens = info.split()
+    if not tokens:
+        return None
+
+    path = tokens[-1]
+    # A single token without a directory or extension is a language tag
+    if len(tokens) == 1 and "/" not in path and "." not in path:
+        return None
+    if path.startswith("/") or ".." in path:
+        return None
+    return path
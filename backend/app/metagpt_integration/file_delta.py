@@ -0,0 +1,266 @@
+"""
+File Delta Module
+
+This module computes compact line-based patches between file versions so that
+file change events can carry only what changed instead of the full content.
+
+A patch is a JSON-serializable list of operations applied in order to the
+lines (newlines included) of the base content:
+
+- ``["=", n]``: keep the next n lines of the base
+- ``["-", n]``: skip the next n lines of the base
+- ``["+", text]``: insert text
+
+Patches are always tied to the SHA-256 hash of the base content. A client
+applies a patch only when it holds content with that exact hash; otherwise it
+must fall back to the full content (e.g. via GET_FILE).
+"""
+
+import hashlib
+import logging
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(content: str) -> str:
+    """
+    Compute the hash identifying a file version.
+
+    Args:
+        content: File content
+
+    Returns:
+        Hex-encoded SHA-256 of the UTF-8 content
+    """
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def make_file_patch(
+    base: str,
+    target: str,
+    max_line_pairs: Optional[int] = None,
+) -> Optional[List[List[Any]]]:
+    """
+    Compute a line-based patch turning base into target.
+
+    Lines shared at the start and end are matched directly; only the lines
+    in between are diffed. Diffing costs up to cubic time in the number of
+    lines (e.g. with many repeated lines), so it is skipped when the changed
+    region is too large.
+
+    Args:
+        base: Content the client already holds
+        target: New content
+        max_line_pairs: Give up when the changed regions of base and target
+            have more than this many lines multiplied together (no limit if None)
+
+    Returns:
+        List of patch operations, or None if the diff would be too costly
+    """
+    base_lines = base.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+
+    prefix = 0
+    limit = min(len(base_lines), len(target_lines))
+    while prefix < limit and base_lines[prefix] == target_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    while (
+        suffix < limit - prefix
+        and base_lines[len(base_lines) - 1 - suffix] == target_lines[len(target_lines) - 1 - suffix]
+    ):
+        suffix += 1
+
+    base_middle = base_lines[prefix:len(base_lines) - suffix]
+    target_middle = target_lines[prefix:len(target_lines) - suffix]
+    if max_line_pairs is not None and len(base_middle) * len(target_middle) > max_line_pairs:
+        return None
+
+    patch: List[List[Any]] = [["=", prefix]] if prefix else []
+    matcher = SequenceMatcher(None, base_middle, target_middle, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            patch.append(["=", i2 - i1])
+            continue
+        if i2 > i1:
+            patch.append(["-", i2 - i1])
+        if j2 > j1:
+            patch.append(["+", "".join(target_middle[j1:j2])])
+    if suffix:
+        patch.append(["=", suffix])
+    return patch
+
+
+def apply_file_patch(base: str, patch: List[List[Any]]) -> str:
+    """
+    Apply a patch produced by make_file_patch.
+
+    Args:
+        base: Base content the patch was computed against
+        patch: List of patch operations
+
+    Returns:
+        Patched content
+
+    Raises:
+        ValueError: If the patch does not fit the base content
+    """
+    base_lines = base.splitlines(keepends=True)
+    pos = 0
+    out: List[str] = []
+
+    for op, arg in patch:
+        if op == "=":
+            if pos + arg > len(base_lines):
+                raise ValueError("Patch does not match base content")
+            out.extend(base_lines[pos:pos + arg])
+            pos += arg
+        elif op == "-":
+            if pos + arg > len(base_lines):
+                raise ValueError("Patch does not match base content")
+            pos += arg
+        elif op == "+":
+            out.append(arg)
+        else:
+            raise ValueError(f"Unknown patch operation: {op}")
+
+    if pos != len(base_lines):
+        raise ValueError("Patch does not match base content")
+    return "".join(out)
+
+
+def patch_size(patch: List[List[Any]]) -> int:
+    """Approximate encoded size of a patch in characters."""
+    return sum(len(arg) if op == "+" else 8 for op, arg in patch)
+
+
+class FileSnapshotCache:
+    """
+    Bounded LRU cache of the last content published for each file.
+
+    Keyed by (project_id, file_path). Used as the base for delta events and
+    to answer GET_FILE requests that carry a base hash. Bounded both by the
+    number of files and by their total size: least recently used snapshots
+    are evicted until both limits hold.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 500,
+        max_file_size: int = 1024 * 1024,
+        max_total_size: int = 32 * 1024 * 1024,
+    ):
+        """
+        Initialize snapshot cache.
+
+        Args:
+            max_entries: Maximum number of files tracked
+            max_file_size: Files larger than this (in characters) are not cached
+            max_total_size: Maximum total content size (in characters) of all
+                cached files
+        """
+        self.max_entries = max_entries
+        self.max_file_size = min(max_file_size, max_total_size)
+        self.max_total_size = max_total_size
+        self.total_size = 0
+        self._snapshots: "OrderedDict[Tuple[str, str], Tuple[str, str]]" = OrderedDict()
+
+    def get(self, project_id: Optional[str], file_path: str) -> Optional[Tuple[str, str]]:
+        """
+        Get the cached (hash, content) for a file.
+
+        Args:
+            project_id: Project ID
+            file_path: File path within the workspace
+
+        Returns:
+            Tuple of (content hash, content) or None if not cached
+        """
+        key = (project_id or "", file_path)
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None:
+            self._snapshots.move_to_end(key)
+        return snapshot
+
+    def put(self, project_id: Optional[str], file_path: str, content: str) -> str:
+        """
+        Record the latest content for a file.
+
+        Args:
+            project_id: Project ID
+            file_path: File path within the workspace
+            content: File content
+
+        Returns:
+            Content hash
+        """
+        key = (project_id or "", file_path)
+        digest = content_hash(content)
+        self._remove(key)
+        if len(content) > self.max_file_size:
+            return digest
+
+        self._snapshots[key] = (digest, content)
+        self.total_size += len(content)
+        while len(self._snapshots) > self.max_entries or self.total_size > self.max_total_size:
+            _, (_, evicted) = self._snapshots.popitem(last=False)
+            self.total_size -= len(evicted)
+        return digest
+
+    def discard(self, project_id: Optional[str], file_path: str) -> None:
+        """Forget a file (e.g. after deletion)."""
+        self._remove((project_id or "", file_path))
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        """Drop a snapshot, keeping the total size in step."""
+        snapshot = self._snapshots.pop(key, None)
+        if snapshot is not None:
+            self.total_size -= len(snapshot[1])
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+
+def build_file_payload(
+    file_path: str,
+    content: str,
+    base: Optional[Tuple[str, str]] = None,
+    max_line_pairs: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Build a file payload, as a patch against base when that is smaller.
+
+    Args:
+        file_path: File path within the workspace
+        content: Current file content
+        base: (hash, content) the receiver is expected to hold (optional)
+        max_line_pairs: Send full content instead of diffing larger changes
+            (see make_file_patch)
+
+    Returns:
+        Dict with ``encoding`` set to ``"patch"`` (with ``base_hash`` and
+        ``patch``) or ``"full"`` (with ``content``), plus ``content_hash``
+        and ``size`` in both cases
+    """
+    payload: Dict[str, Any] = {
+        "file_path": file_path,
+        "content_hash": content_hash(content),
+        "size": len(content),
+    }
+
+    if base is not None:
+        base_digest, base_content = base
+        if base_digest == payload["content_hash"]:
+            payload.update({"encoding": "patch", "base_hash": base_digest, "patch": []})
+            return payload
+        patch = make_file_patch(base_content, content, max_line_pairs)
+        if patch is not None and patch_size(patch) < len(content):
+            payload.update({"encoding": "patch", "base_hash": base_digest, "patch": patch})
+            return payload
+
+    payload.update({"encoding": "full", "content": content})
+    return payload
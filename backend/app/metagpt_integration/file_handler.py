@@ -227,6 +227,67 @@ class FileHandler:
             ValueError: If file path is invalid
             FileNotFoundError: If file not found
         """
+        full_path = self.resolve_file_path(project_id, file_path)
+        
+        try:
+            with open(full_path, "r", encoding="utf-8") as f:
+                content = f.read()
+            
+            logger.info(f"Read file: {full_path}")
+            return content
+            
+        except OSError as e:
+            logger.error(f"Failed to read file: {e}")
+            raise
+
+    def read_range(
+        self,
+        project_id: str,
+        file_path: str,
+        offset: int,
+        length: int,
+    ) -> bytes:
+        """
+        Read a byte range from a file in the workspace.
+        
+        Args:
+            project_id: Project ID
+            file_path: Relative file path within workspace
+            offset: First byte to read
+            length: Maximum number of bytes to read
+            
+        Returns:
+            bytes: File content in the range (shorter at end of file)
+            
+        Raises:
+            ValueError: If file path is invalid
+            FileNotFoundError: If file not found
+        """
+        full_path = self.resolve_file_path(project_id, file_path)
+        
+        with open(full_path, "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def resolve_file_path(
+        self,
+        project_id: str,
+        file_path: str,
+    ) -> str:
+        """
+        Resolve a workspace-relative path to an existing file's absolute path.
+        
+        Args:
+            project_id: Project ID
+            file_path: Relative file path within workspace
+            
+        Returns:
+            str: Absolute file path
+            
+        Raises:
+            ValueError: If file path is invalid or outside the workspace
+            FileNotFoundError: If file not found
+        """
         # Validate file path
         if file_path.startswith("/") or ".." in file_path:
             raise ValueError(f"Invalid file path: {file_path}")
@@ -241,19 +302,10 @@ class FileHandler:
         if not full_path.startswith(workspace_path):
             raise ValueError(f"File path outside workspace: {file_path}")
         
-        if not os.path.exists(full_path):
+        if not os.path.isfile(full_path):
             raise FileNotFoundError(f"File not found: {full_path}")
         
-        try:
-            with open(full_path, "r", encoding="utf-8") as f:
-                content = f.read()
-            
-            logger.info(f"Read file: {full_path}")
-            return content
-            
-        except OSError as e:
-            logger.error(f"Failed to read file: {e}")
-            raise
+        return full_path
 
     def append_file(
         self,
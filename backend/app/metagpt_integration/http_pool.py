@@ -0,0 +1,154 @@
+"""
+LLM HTTP Connection Pools
+
+This module provides one shared async HTTP client per LLM provider, so all
+LLM clients of a provider reuse the same keep-alive connections (and TLS
+sessions) instead of each opening its own.
+
+Pools carry no credentials or base URL: every LLM client passes its own API
+key and endpoint per request, so clients of different users can safely
+share a pool.
+
+Features:
+- Keep-alive connection pooling with configurable limits
+- HTTP/2 for HTTPS providers when the h2 package is installed
+- Clean shutdown from the application lifespan (close_http_client_pool)
+"""
+
+import importlib.util
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+# Providers reached over plain HTTP (httpx only speaks HTTP/2 over TLS)
+HTTP1_PROVIDERS = {"ollama"}
+
+
+class HTTPClientPool:
+    """
+    Shared async HTTP clients, one per LLM provider.
+
+    LLM clients borrow their provider's client and must not close it; the
+    pool closes all clients on close().
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 120.0,
+        connect_timeout: float = 10.0,
+        http2: bool = True,
+        **client_kwargs: Any,
+    ):
+        """
+        Initialize pool.
+
+        Args:
+            max_connections: Max open connections per provider
+            max_keepalive_connections: Max idle connections kept per provider
+            keepalive_expiry: Seconds an idle connection is kept
+            timeout: Read/write/pool timeout in seconds
+            connect_timeout: Connect timeout in seconds
+            http2: Use HTTP/2 where supported (needs the h2 package)
+            **client_kwargs: Extra httpx.AsyncClient arguments (e.g. transport)
+        """
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        if http2 and not self.http2:
+            logger.info("h2 package not installed, LLM HTTP clients use HTTP/1.1")
+        self.client_kwargs = client_kwargs
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def get(self, provider: str) -> httpx.AsyncClient:
+        """
+        Get the shared HTTP client of a provider.
+
+        Args:
+            provider: Provider name (openai, azure_openai, groq, ollama)
+
+        Returns:
+            httpx.AsyncClient: Shared client
+        """
+        client = self._clients.get(provider)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=self.http2 and provider not in HTTP1_PROVIDERS,
+                **self.client_kwargs,
+            )
+            self._clients[provider] = client
+            logger.debug(f"Created HTTP connection pool for {provider}")
+        return client
+
+    async def close(self) -> None:
+        """Close all clients (connections in use are closed as well)."""
+        clients, self._clients = self._clients, {}
+        for provider, client in clients.items():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"Failed to close HTTP connection pool for {provider}: {e}")
+        if clients:
+            logger.info(f"Closed {len(clients)} LLM HTTP connection pools")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pool statistics."""
+        return {
+            "providers": sorted(self._clients),
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+        }
+
+
+# ============================================================================
+# Global Pool Instance
+# ============================================================================
+
+_http_client_pool: Optional[HTTPClientPool] = None
+
+
+def get_http_client_pool() -> HTTPClientPool:
+    """
+    Get or create the global LLM HTTP client pool.
+
+    Returns:
+        HTTPClientPool: Pool using the configured limits
+    """
+    global _http_client_pool
+
+    if _http_client_pool is None:
+        _http_client_pool = HTTPClientPool(
+            max_connections=settings.llm_http_max_connections,
+            max_keepalive_connections=settings.llm_http_max_keepalive_connections,
+            keepalive_expiry=settings.llm_http_keepalive_expiry,
+            timeout=settings.llm_http_timeout,
+            connect_timeout=settings.llm_http_connect_timeout,
+            http2=settings.llm_http2_enabled,
+        )
+
+    return _http_client_pool
+
+
+async def close_http_client_pool() -> None:
+    """Close the global LLM HTTP client pool, if it was created."""
+    global _http_client_pool
+
+    if _http_client_pool is not None:
+        await _http_client_pool.close()
+        _http_client_pool = None
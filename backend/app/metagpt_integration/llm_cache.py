@@ -0,0 +1,614 @@
+"""
+LLM Response Cache
+
+This module provides an optional cache in front of LLMClient.generate, so
+re-running a workflow with identical inputs (retries, demos) does not call
+the provider again.
+
+Responses are keyed by a hash of the connection (provider, model, endpoint),
+the prompt and the generation parameters. Only deterministic requests are
+cached by default (temperature at or below llm_response_cache_max_temperature),
+and callers can bypass the cache per call with bypass_cache=True.
+
+Backends:
+- SQLite (aiosqlite): a local file, for single-node deployments
+- Redis: shared between workers
+
+Both expire entries after a TTL and evict the least recently used entries
+beyond max_entries. Backend errors never fail a generation; the cache is
+skipped instead.
+
+With llm_near_duplicate_cache_enabled, a miss can also be answered by a
+nearly identical cached request (see prompt_cache.py).
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Any, AsyncGenerator, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.metagpt_integration.llm_registry import LLMClient, connection_key
+from app.metagpt_integration.prompt_cache import NearDuplicateIndex, current_prompt_cache_stats
+
+
+logger = logging.getLogger(__name__)
+
+
+# Connection config keys that change what a prompt returns (credentials do not)
+RESPONSE_CONNECTION_KEYS = (
+    "provider",
+    "model",
+    "endpoint",
+    "deployment_name",
+    "api_version",
+    "base_url",
+)
+
+
+def response_cache_key(
+    connection: Dict[str, Any],
+    prompt: str,
+    temperature: float,
+    max_tokens: int,
+    system_prompt: Optional[str] = None,
+    **params,
+) -> str:
+    """
+    Build the cache key of an LLM request.
+
+    Args:
+        connection: LLM configuration (only RESPONSE_CONNECTION_KEYS are used)
+        prompt: Prompt
+        temperature: Temperature
+        max_tokens: Max tokens
+        system_prompt: System prompt (optional)
+        **params: Other generation parameters
+
+    Returns:
+        str: Hex SHA-256 of the request
+    """
+    request = {
+        "connection": {key: connection.get(key) for key in RESPONSE_CONNECTION_KEYS},
+        "prompt": prompt,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "system_prompt": system_prompt,
+        "params": params,
+    }
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# ============================================================================
+# Cache Backends
+# ============================================================================
+
+class ResponseCacheBackend(ABC):
+    """
+    Storage for cached responses with TTL and LRU eviction.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        """Get a live response and mark it as recently used."""
+        pass
+
+    @abstractmethod
+    async def set(self, key: str, response: str, ttl: int) -> None:
+        """Store a response, evicting least recently used entries beyond the size limit."""
+        pass
+
+    @abstractmethod
+    async def clear(self) -> None:
+        """Drop all cached responses."""
+        pass
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Release backend resources."""
+        pass
+
+
+class SQLiteResponseCacheBackend(ResponseCacheBackend):
+    """
+    Response cache stored in a local SQLite file.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        """
+        Initialize SQLite backend.
+
+        Args:
+            path: Database file path
+            max_entries: Max cached responses
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self._conn = None
+
+    async def _connection(self):
+        """Open the database and create the table on first use."""
+        if self._conn is None:
+            import aiosqlite
+
+            conn = await aiosqlite.connect(self.path)
+            await conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            await conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_llm_responses_last_used ON llm_responses (last_used)"
+            )
+            await conn.commit()
+            self._conn = conn
+        return self._conn
+
+    async def get(self, key: str) -> Optional[str]:
+        conn = await self._connection()
+        now = time.time()
+        async with conn.execute(
+            "SELECT response FROM llm_responses WHERE key = ? AND expires_at > ?", (key, now)
+        ) as cursor:
+            row = await cursor.fetchone()
+        if row is None:
+            return None
+
+        await conn.execute("UPDATE llm_responses SET last_used = ? WHERE key = ?", (now, key))
+        await conn.commit()
+        return row[0]
+
+    async def set(self, key: str, response: str, ttl: int) -> None:
+        conn = await self._connection()
+        now = time.time()
+        await conn.execute(
+            "INSERT OR REPLACE INTO llm_responses (key, response, expires_at, last_used) VALUES (?, ?, ?, ?)",
+            (key, response, now + ttl, now),
+        )
+        await conn.execute("DELETE FROM llm_responses WHERE expires_at <= ?", (now,))
+        await conn.execute(
+            "DELETE FROM llm_responses WHERE key IN ("
+            "SELECT key FROM llm_responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        await conn.commit()
+
+    async def clear(self) -> None:
+        conn = await self._connection()
+        await conn.execute("DELETE FROM llm_responses")
+        await conn.commit()
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+
+class RedisResponseCacheBackend(ResponseCacheBackend):
+    """
+    Response cache stored in Redis.
+
+    Responses are plain keys with a TTL; a sorted set of last-use times
+    tracks recency for LRU eviction.
+    """
+
+    def __init__(self, redis_url: str, max_entries: int = 10000, prefix: str = "llm_response:"):
+        """
+        Initialize Redis backend.
+
+        Args:
+            redis_url: Redis URL
+            max_entries: Max cached responses
+            prefix: Key prefix
+        """
+        self.redis_url = redis_url
+        self.max_entries = max_entries
+        self.prefix = prefix
+        self.lru_key = f"{prefix}lru"
+        self.redis_client = None
+
+    def _client(self):
+        """Create the Redis client on first use."""
+        if self.redis_client is None:
+            import redis.asyncio as aioredis
+
+            self.redis_client = aioredis.from_url(self.redis_url, decode_responses=True)
+        return self.redis_client
+
+    async def get(self, key: str) -> Optional[str]:
+        async with self._client().pipeline(transaction=False) as pipe:
+            pipe.get(self.prefix + key)
+            pipe.zadd(self.lru_key, {key: time.time()}, xx=True)
+            response, _ = await pipe.execute()
+        return response
+
+    async def set(self, key: str, response: str, ttl: int) -> None:
+        client = self._client()
+        now = time.time()
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.set(self.prefix + key, response, ex=ttl)
+            pipe.zadd(self.lru_key, {key: now})
+            # Entries unused for a whole TTL have expired
+            pipe.zremrangebyscore(self.lru_key, "-inf", now - ttl)
+            pipe.zcard(self.lru_key)
+            *_, size = await pipe.execute()
+
+        overflow = size - self.max_entries
+        if overflow > 0:
+            evicted = [member for member, _ in await client.zpopmin(self.lru_key, overflow)]
+            if evicted:
+                await client.delete(*(self.prefix + member for member in evicted))
+
+    async def clear(self) -> None:
+        client = self._client()
+        members = await client.zrange(self.lru_key, 0, -1)
+        if members:
+            await client.delete(*(self.prefix + member for member in members))
+        await client.delete(self.lru_key)
+
+    async def close(self) -> None:
+        if self.redis_client is not None:
+            await self.redis_client.close()
+            self.redis_client = None
+
+
+# ============================================================================
+# Response Cache
+# ============================================================================
+
+class LLMResponseCache:
+    """
+    Response cache with a pluggable backend and hit/miss metrics.
+
+    With a near-duplicate index, a request missing from the cache can be
+    answered with the response of a nearly identical cached request (see
+    prompt_cache.NearDuplicateIndex). The index lives in process memory.
+    """
+
+    def __init__(
+        self,
+        backend: ResponseCacheBackend,
+        ttl: int = 86400,
+        near_duplicates: Optional[NearDuplicateIndex] = None,
+    ):
+        """
+        Initialize response cache.
+
+        Args:
+            backend: Storage backend
+            ttl: Seconds a response stays cached
+            near_duplicates: Index for near-duplicate lookup (optional)
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.near_duplicates = near_duplicates
+        self.metrics = {
+            "hits": 0,
+            "near_duplicate_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stores": 0,
+            "errors": 0,
+        }
+
+    async def get(
+        self,
+        key: str,
+        scope: Optional[str] = None,
+        prompt: Optional[str] = None,
+    ) -> Tuple[Optional[str], bool]:
+        """
+        Get a cached response.
+
+        Args:
+            key: Request key from response_cache_key()
+            scope: Key of the request without its prompt (enables
+                near-duplicate lookup, together with prompt)
+            prompt: Prompt of the request
+
+        Returns:
+            Tuple[Optional[str], bool]: Cached response (None on a miss or
+                backend error) and whether it is a near-duplicate match
+        """
+        response = await self._read(key)
+        if response is not None:
+            self.metrics["hits"] += 1
+            return response, False
+
+        if self.near_duplicates is not None and scope is not None and prompt is not None:
+            fingerprint = await asyncio.to_thread(self.near_duplicates.fingerprint, scope, prompt)
+            match = self.near_duplicates.find_fingerprint(fingerprint)
+            if match is not None and match[0] != key:
+                response = await self._read(match[0])
+                if response is not None:
+                    self.metrics["near_duplicate_hits"] += 1
+                    logger.debug(f"Near-duplicate LLM request (similarity {match[1]:.2f})")
+                    return response, True
+                # The matched response expired or was evicted
+                self.near_duplicates.remove(match[0])
+
+        self.metrics["misses"] += 1
+        return None, False
+
+    async def _read(self, key: str) -> Optional[str]:
+        """Read a response from the backend (None on a backend error)."""
+        try:
+            return await self.backend.get(key)
+        except Exception as e:
+            self.metrics["errors"] += 1
+            logger.error(f"LLM response cache read failed: {e}")
+            return None
+
+    async def set(
+        self,
+        key: str,
+        response: str,
+        scope: Optional[str] = None,
+        prompt: Optional[str] = None,
+    ) -> None:
+        """
+        Cache a response (errors are logged, not raised).
+
+        Args:
+            key: Request key from response_cache_key()
+            response: Response to cache
+            scope: Key of the request without its prompt (indexes the
+                request for near-duplicate lookup, together with prompt)
+            prompt: Prompt of the request
+        """
+        try:
+            await self.backend.set(key, response, self.ttl)
+            self.metrics["stores"] += 1
+        except Exception as e:
+            self.metrics["errors"] += 1
+            logger.error(f"LLM response cache write failed: {e}")
+            return
+
+        if self.near_duplicates is not None and scope is not None and prompt is not None:
+            fingerprint = await asyncio.to_thread(self.near_duplicates.fingerprint, scope, prompt)
+            self.near_duplicates.add_fingerprint(key, fingerprint)
+
+    async def clear(self) -> None:
+        """Drop all cached responses."""
+        await self.backend.clear()
+        if self.near_duplicates is not None:
+            self.near_duplicates.clear()
+
+    async def close(self) -> None:
+        """Close the backend."""
+        await self.backend.close()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get cache metrics."""
+        hits = self.metrics["hits"] + self.metrics["near_duplicate_hits"]
+        lookups = hits + self.metrics["misses"]
+        return {
+            **self.metrics,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+
+class CachedLLMClient(LLMClient):
+    """
+    LLM client answering repeated deterministic requests from a response cache.
+
+    Requests with a temperature above max_temperature, or made with
+    bypass_cache=True, always go to the provider. Lookups and hits are
+    recorded into the current execution's PromptCacheStats.
+
+    Near-duplicate matches are scoped to the client's credentials and
+    tenant, so one tenant is never answered with a response generated for
+    another tenant's (different) prompt. Exact matches are not scoped: a
+    byte-identical request on the same connection settings gets the cached
+    response whichever tenant made it first.
+    """
+
+    def __init__(
+        self,
+        client: LLMClient,
+        connection: Dict[str, Any],
+        cache: LLMResponseCache,
+        max_temperature: float = 0.0,
+        tenant: Optional[str] = None,
+    ):
+        """
+        Initialize cached client.
+
+        Args:
+            client: Client calling the provider
+            connection: LLM configuration the client was created from
+            cache: Response cache
+            max_temperature: Highest temperature whose responses are cached
+            tenant: Owner of the requests (e.g. user ID)
+        """
+        self.client = client
+        self.connection = connection
+        self.cache = cache
+        self.max_temperature = max_temperature
+        self.tenant = tenant
+        # Credentials (hashed) and tenant bound near-duplicate matching
+        self._tenant_scope = f"{connection_key(connection)}\x00{tenant or ''}"
+
+    def _cache_keys(
+        self,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        bypass_cache: bool,
+        params: Dict[str, Any],
+    ) -> Optional[Tuple[str, str]]:
+        """Get the request's cache key and scope, or None if it must not be cached."""
+        if bypass_cache or temperature > self.max_temperature:
+            self.cache.metrics["bypassed"] += 1
+            return None
+        return (
+            response_cache_key(self.connection, prompt, temperature, max_tokens, **params),
+            response_cache_key(
+                self.connection, "", temperature, max_tokens, tenant_scope=self._tenant_scope, **params,
+            ),
+        )
+
+    async def _lookup(self, keys: Tuple[str, str], prompt: str) -> Optional[str]:
+        """Look a request up, recording the result in the execution's statistics."""
+        key, scope = keys
+        cached, near_duplicate = await self.cache.get(key, scope, prompt)
+
+        stats = current_prompt_cache_stats()
+        if stats is not None:
+            stats.record_lookup()
+            if cached is not None:
+                stats.record_hit(prompt, cached, near_duplicate=near_duplicate)
+        return cached
+
+    async def generate(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        bypass_cache: bool = False,
+        **kwargs,
+    ) -> str:
+        """
+        Generate text, answering from the cache when possible.
+
+        Args:
+            prompt: Input prompt
+            temperature: Temperature parameter
+            max_tokens: Maximum tokens to generate
+            bypass_cache: Skip the cache for this call
+            **kwargs: Additional provider-specific parameters
+
+        Returns:
+            str: Generated text
+        """
+        keys = self._cache_keys(prompt, temperature, max_tokens, bypass_cache, kwargs)
+        if keys is not None:
+            cached = await self._lookup(keys, prompt)
+            if cached is not None:
+                return cached
+
+        response = await self.client.generate(prompt, temperature=temperature, max_tokens=max_tokens, **kwargs)
+
+        if keys is not None and response is not None:
+            await self.cache.set(keys[0], response, keys[1], prompt)
+        return response
+
+    async def generate_with_streaming(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        bypass_cache: bool = False,
+        **kwargs,
+    ) -> AsyncGenerator[str, None]:
+        """
+        Generate text with streaming; a cached response is yielded as one chunk.
+
+        Args:
+            prompt: Input prompt
+            temperature: Temperature parameter
+            max_tokens: Maximum tokens to generate
+            bypass_cache: Skip the cache for this call
+            **kwargs: Additional provider-specific parameters
+
+        Yields:
+            str: Generated text chunks
+        """
+        keys = self._cache_keys(prompt, temperature, max_tokens, bypass_cache, kwargs)
+        if keys is not None:
+            cached = await self._lookup(keys, prompt)
+            if cached is not None:
+                yield cached
+                return
+
+        chunks = []
+        async for chunk in self.client.generate_with_streaming(
+            prompt, temperature=temperature, max_tokens=max_tokens, **kwargs
+        ):
+            chunks.append(chunk)
+            yield chunk
+
+        # Only complete streams are cached
+        if keys is not None:
+            await self.cache.set(keys[0], "".join(chunks), keys[1], prompt)
+
+    async def validate_connection(self) -> bool:
+        """Validate the underlying connection."""
+        return await self.client.validate_connection()
+
+
+# ============================================================================
+# Global Response Cache Instance
+# ============================================================================
+
+_response_cache: Optional[LLMResponseCache] = None
+
+
+def get_llm_response_cache() -> LLMResponseCache:
+    """
+    Get or create the global LLM response cache.
+
+    Returns:
+        LLMResponseCache: Cache using the configured backend
+    """
+    global _response_cache
+
+    if _response_cache is None:
+        if settings.llm_response_cache_backend == "redis":
+            backend: ResponseCacheBackend = RedisResponseCacheBackend(
+                settings.redis_cache_url,
+                max_entries=settings.llm_response_cache_max_entries,
+            )
+        else:
+            backend = SQLiteResponseCacheBackend(
+                settings.llm_response_cache_path,
+                max_entries=settings.llm_response_cache_max_entries,
+            )
+        near_duplicates = None
+        if settings.llm_near_duplicate_cache_enabled:
+            near_duplicates = NearDuplicateIndex(
+                threshold=settings.llm_near_duplicate_threshold,
+                max_entries=settings.llm_response_cache_max_entries,
+            )
+        _response_cache = LLMResponseCache(
+            backend,
+            ttl=settings.llm_response_cache_ttl_seconds,
+            near_duplicates=near_duplicates,
+        )
+
+    return _response_cache
+
+
+def with_response_cache(client: LLMClient, config: Dict[str, Any], tenant: Optional[str] = None) -> LLMClient:
+    """
+    Wrap a client with the global response cache if it is enabled.
+
+    Args:
+        client: LLM client
+        config: LLM configuration the client was created from
+        tenant: Owner of the requests (scopes near-duplicate matching)
+
+    Returns:
+        LLMClient: Cached client, or the client itself if caching is disabled
+    """
+    if not settings.llm_response_cache_enabled:
+        return client
+    return CachedLLMClient(
+        client,
+        config,
+        get_llm_response_cache(),
+        max_temperature=settings.llm_response_cache_max_temperature,
+        tenant=tenant,
+    )
+
+
+async def close_llm_response_cache() -> None:
+    """Close the global response cache, if it was created."""
+    global _response_cache
+
+    if _response_cache is not None:
+        await _response_cache.close()
+        _response_cache = None
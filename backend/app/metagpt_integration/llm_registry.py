@@ -5,15 +5,55 @@ This module provides a factory pattern for creating and managing LLM clients
 for different providers (OpenAI, Azure OpenAI, Groq, Ollama, etc.).
 """
 
-from typing import Optional, Dict, Any, Union
+from typing import Optional, Dict, Any, List, Set, Tuple, Union
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
 import logging
+import time
 
 from app.core.config import settings
+from app.metagpt_integration.http_pool import get_http_client_pool
+from app.metagpt_integration.prompt_cache import record_provider_usage
 
 logger = logging.getLogger(__name__)
 
 
+# Config keys that identify an LLM connection (generation parameters do not)
+CONNECTION_CONFIG_KEYS = (
+    "provider",
+    "model",
+    "api_key",
+    "organization",
+    "endpoint",
+    "deployment_name",
+    "api_version",
+    "base_url",
+)
+
+
+def connection_key(config: Dict[str, Any]) -> str:
+    """
+    Build a key identifying the connection an LLM configuration uses.
+    
+    Configurations that differ only in generation parameters (temperature,
+    max_tokens, ...) share a key. Credentials are hashed, never stored.
+    
+    Args:
+        config: LLM configuration dictionary
+        
+    Returns:
+        str: "provider:model:fingerprint"
+    """
+    identity = {key: config.get(key) for key in CONNECTION_CONFIG_KEYS}
+    fingerprint = hashlib.sha256(
+        json.dumps(identity, sort_keys=True, default=str).encode()
+    ).hexdigest()[:16]
+    return f"{config.get('provider')}:{config.get('model')}:{fingerprint}"
+
+
 # ============================================================================
 # LLM Client Interface
 # ============================================================================
@@ -79,6 +119,15 @@ class LLMClient(ABC):
         """
         pass
 
+    async def aclose(self) -> None:
+        """
+        Release resources the client owns.
+        
+        Built-in clients use the shared HTTP connection pools (closed at
+        shutdown), so they own nothing to release.
+        """
+        pass
+
 
 # ============================================================================
 # OpenAI Client Implementation
@@ -106,8 +155,7 @@ class OpenAIClient(LLMClient):
             organization: Optional organization ID
         """
         try:
-            import openai
-            self.openai = openai
+            from openai import AsyncOpenAI
         except ImportError:
             raise ImportError("openai package is required for OpenAI client")
         
@@ -115,10 +163,12 @@ class OpenAIClient(LLMClient):
         self.model = model
         self.organization = organization
         
-        # Configure OpenAI client
-        self.openai.api_key = api_key
-        if organization:
-            self.openai.organization = organization
+        # Own credentials, shared connection pool
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            organization=organization,
+            http_client=get_http_client_pool().get("openai"),
+        )
         
         logger.info(f"Initialized OpenAI client with model: {model}")
 
@@ -142,7 +192,7 @@ class OpenAIClient(LLMClient):
             str: Generated text
         """
         try:
-            response = await self.openai.ChatCompletion.acreate(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=temperature,
@@ -150,6 +200,7 @@ class OpenAIClient(LLMClient):
                 **kwargs,
             )
             
+            record_provider_usage(getattr(response, "usage", None))
             return response.choices[0].message.content
             
         except Exception as e:
@@ -176,7 +227,7 @@ class OpenAIClient(LLMClient):
             str: Generated text chunks
         """
         try:
-            response = await self.openai.ChatCompletion.acreate(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=temperature,
@@ -186,10 +237,8 @@ class OpenAIClient(LLMClient):
             )
             
             async for chunk in response:
-                if "choices" in chunk:
-                    delta = chunk["choices"][0].get("delta", {})
-                    if "content" in delta:
-                        yield delta["content"]
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
                         
         except Exception as e:
             logger.error(f"OpenAI streaming failed: {e}")
@@ -203,7 +252,7 @@ class OpenAIClient(LLMClient):
             bool: True if connection is valid
         """
         try:
-            response = await self.openai.ChatCompletion.acreate(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[{"role": "user", "content": "test"}],
                 max_tokens=10,
@@ -240,8 +289,7 @@ class AzureOpenAIClient(LLMClient):
             api_version: API version
         """
         try:
-            import openai
-            self.openai = openai
+            from openai import AsyncAzureOpenAI
         except ImportError:
             raise ImportError("openai package is required for Azure OpenAI client")
         
@@ -250,11 +298,13 @@ class AzureOpenAIClient(LLMClient):
         self.deployment_name = deployment_name
         self.api_version = api_version
         
-        # Configure Azure OpenAI client
-        self.openai.api_type = "azure"
-        self.openai.api_key = api_key
-        self.openai.api_base = endpoint
-        self.openai.api_version = api_version
+        # Own credentials, shared connection pool
+        self.client = AsyncAzureOpenAI(
+            api_key=api_key,
+            azure_endpoint=endpoint,
+            api_version=api_version,
+            http_client=get_http_client_pool().get("azure_openai"),
+        )
         
         logger.info(f"Initialized Azure OpenAI client with deployment: {deployment_name}")
 
@@ -278,14 +328,15 @@ class AzureOpenAIClient(LLMClient):
             str: Generated text
         """
         try:
-            response = await self.openai.ChatCompletion.acreate(
-                deployment_id=self.deployment_name,
+            response = await self.client.chat.completions.create(
+                model=self.deployment_name,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=temperature,
                 max_tokens=max_tokens,
                 **kwargs,
             )
             
+            record_provider_usage(getattr(response, "usage", None))
             return response.choices[0].message.content
             
         except Exception as e:
@@ -312,8 +363,8 @@ class AzureOpenAIClient(LLMClient):
             str: Generated text chunks
         """
         try:
-            response = await self.openai.ChatCompletion.acreate(
-                deployment_id=self.deployment_name,
+            response = await self.client.chat.completions.create(
+                model=self.deployment_name,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=temperature,
                 max_tokens=max_tokens,
@@ -322,10 +373,8 @@ class AzureOpenAIClient(LLMClient):
             )
             
             async for chunk in response:
-                if "choices" in chunk:
-                    delta = chunk["choices"][0].get("delta", {})
-                    if "content" in delta:
-                        yield delta["content"]
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
                         
         except Exception as e:
             logger.error(f"Azure OpenAI streaming failed: {e}")
@@ -339,8 +388,8 @@ class AzureOpenAIClient(LLMClient):
             bool: True if connection is valid
         """
         try:
-            response = await self.openai.ChatCompletion.acreate(
-                deployment_id=self.deployment_name,
+            response = await self.client.chat.completions.create(
+                model=self.deployment_name,
                 messages=[{"role": "user", "content": "test"}],
                 max_tokens=10,
             )
@@ -382,7 +431,8 @@ class GroqClient(LLMClient):
         
         self.api_key = api_key
         self.model = model
-        self.client = self.AsyncGroq(api_key=api_key)
+        # Own credentials, shared connection pool
+        self.client = self.AsyncGroq(api_key=api_key, http_client=get_http_client_pool().get("groq"))
         
         logger.info(f"Initialized Groq client with model: {model}")
 
@@ -414,6 +464,7 @@ class GroqClient(LLMClient):
                 **kwargs,
             )
             
+            record_provider_usage(getattr(response, "usage", None))
             return response.choices[0].message.content
             
         except Exception as e:
@@ -450,7 +501,7 @@ class GroqClient(LLMClient):
             )
             
             async for chunk in response:
-                if chunk.choices[0].delta.content:
+                if chunk.choices and chunk.choices[0].delta.content:
                     yield chunk.choices[0].delta.content
                     
         except Exception as e:
@@ -499,15 +550,10 @@ class OllamaClient(LLMClient):
             base_url: Ollama base URL (default: http://localhost:11434)
             model: Model name (default: llama2)
         """
-        try:
-            import httpx
-            self.httpx = httpx
-        except ImportError:
-            raise ImportError("httpx package is required for Ollama client")
-        
         self.base_url = base_url.rstrip("/")
         self.model = model
-        self.client = self.httpx.AsyncClient(base_url=self.base_url)
+        # Shared connection pool; requests use absolute URLs of base_url
+        self.client = get_http_client_pool().get("ollama")
         
         logger.info(f"Initialized Ollama client with model: {model}")
 
@@ -532,7 +578,7 @@ class OllamaClient(LLMClient):
         """
         try:
             response = await self.client.post(
-                "/api/generate",
+                f"{self.base_url}/api/generate",
                 json={
                     "model": self.model,
                     "prompt": prompt,
@@ -572,7 +618,7 @@ class OllamaClient(LLMClient):
         try:
             async with self.client.stream(
                 "POST",
-                "/api/generate",
+                f"{self.base_url}/api/generate",
                 json={
                     "model": self.model,
                     "prompt": prompt,
@@ -584,7 +630,6 @@ class OllamaClient(LLMClient):
             ) as response:
                 async for line in response.aiter_lines():
                     if line:
-                        import json
                         data = json.loads(line)
                         if "response" in data:
                             yield data["response"]
@@ -601,7 +646,7 @@ class OllamaClient(LLMClient):
             bool: True if connection is valid
         """
         try:
-            response = await self.client.get("/api/tags")
+            response = await self.client.get(f"{self.base_url}/api/tags")
             return response.status_code == 200
         except Exception as e:
             logger.error(f"Ollama connection validation failed: {e}")
@@ -617,11 +662,35 @@ class LLMRegistry:
     Registry for LLM clients.
     
     Manages creation and caching of LLM clients for different providers.
+    Cached clients are keyed by connection_key() (provider, model, endpoint
+    and a hash of the credentials), so users never share each other's
+    credentials. At most max_clients are kept: the least recently used
+    client is evicted, as is any client unused for idle_seconds. Evicted
+    clients are closed with aclose().
     """
 
-    def __init__(self):
-        """Initialize LLM registry."""
-        self._clients: Dict[str, LLMClient] = {}
+    def __init__(self, max_clients: Optional[int] = None, idle_seconds: Optional[float] = None):
+        """
+        Initialize LLM registry.
+        
+        Args:
+            max_clients: Max cached clients (default: llm_client_cache_max_size)
+            idle_seconds: Seconds an unused client stays cached
+                (default: llm_client_cache_idle_seconds, 0 = no limit)
+        """
+        self.max_clients = max_clients if max_clients is not None else settings.llm_client_cache_max_size
+        self.idle_seconds = idle_seconds if idle_seconds is not None else settings.llm_client_cache_idle_seconds
+        # connection key -> (client, last used); least recently used first
+        self._clients: "OrderedDict[str, Tuple[LLMClient, float]]" = OrderedDict()
+        self._closing: Set[asyncio.Task] = set()
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+        self._validations: Dict[str, Tuple[float, bool]] = {}
+        self._pending_validations: Dict[str, asyncio.Task] = {}
         self._providers = {
             "openai": self._create_openai_client,
             "azure_openai": self._create_azure_openai_client,
@@ -713,13 +782,20 @@ class LLMRegistry:
         Raises:
             ValueError: If provider is not supported
         """
-        # Generate cache key
-        cache_key = f"{provider}:{model}"
+        # Key on the whole connection, credentials included (hashed)
+        cache_key = connection_key({"provider": provider, "model": model, "api_key": api_key, **kwargs})
         
         # Return cached client if available
-        if cache and cache_key in self._clients:
-            logger.debug(f"Using cached client for {cache_key}")
-            return self._clients[cache_key]
+        if cache:
+            self._expire_idle()
+            cached = self._clients.get(cache_key)
+            if cached is not None:
+                self._clients[cache_key] = (cached[0], time.monotonic())
+                self._clients.move_to_end(cache_key)
+                self.metrics["hits"] += 1
+                logger.debug(f"Using cached client for {provider}:{model}")
+                return cached[0]
+            self.metrics["misses"] += 1
         
         # Get provider factory
         if provider not in self._providers:
@@ -733,15 +809,125 @@ class LLMRegistry:
         
         # Cache client if requested
         if cache:
-            self._clients[cache_key] = client
+            self._clients[cache_key] = (client, time.monotonic())
+            evicted = []
+            while len(self._clients) > self.max_clients:
+                _, (old_client, _) = self._clients.popitem(last=False)
+                evicted.append(old_client)
+            if evicted:
+                self.metrics["evictions"] += len(evicted)
+                self._release(evicted)
         
         return client
 
+    def _expire_idle(self) -> None:
+        """Evict clients unused for idle_seconds."""
+        if self.idle_seconds <= 0 or not self._clients:
+            return
+        
+        deadline = time.monotonic() - self.idle_seconds
+        expired = []
+        # Least recently used first, so stop at the first live client
+        while self._clients:
+            key, (client, last_used) = next(iter(self._clients.items()))
+            if last_used > deadline:
+                break
+            del self._clients[key]
+            expired.append(client)
+        
+        if expired:
+            self.metrics["expirations"] += len(expired)
+            self._release(expired)
+
+    def _release(self, clients: List[LLMClient]) -> None:
+        """Close evicted clients in the background (if an event loop is running)."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        
+        for client in clients:
+            task = loop.create_task(self._close_client(client))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close_client(client: LLMClient) -> None:
+        """Close a client, logging failures."""
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.error(f"Failed to close LLM client: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get client cache statistics."""
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            **self.metrics,
+            "cached_clients": len(self._clients),
+            "max_clients": self.max_clients,
+            "hit_rate": self.metrics["hits"] / lookups if lookups else 0.0,
+        }
+
+    async def validate(self, config: Dict[str, Any], client: LLMClient) -> bool:
+        """
+        Validate an LLM connection, reusing recent results.
+        
+        Results are cached per connection_key for llm_validation_cache_seconds
+        (llm_validation_failure_cache_seconds for failures), and concurrent
+        validations of the same connection share one network call.
+        
+        Args:
+            config: LLM configuration the client was created from
+            client: Client to validate
+            
+        Returns:
+            bool: True if the connection is valid
+        """
+        key = connection_key(config)
+
+        cached = self._validations.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        task = self._pending_validations.get(key)
+        if task is None:
+            task = asyncio.create_task(self._validate(key, client))
+            self._pending_validations[key] = task
+            task.add_done_callback(lambda _: self._pending_validations.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _validate(self, key: str, client: LLMClient) -> bool:
+        """Run one validation and cache its result."""
+        try:
+            is_valid = bool(await client.validate_connection())
+        except Exception as e:
+            logger.error(f"LLM connection validation failed for {key.rsplit(':', 1)[0]}: {e}")
+            is_valid = False
+
+        ttl = settings.llm_validation_cache_seconds if is_valid else settings.llm_validation_failure_cache_seconds
+        if ttl > 0:
+            self._validations[key] = (time.monotonic() + ttl, is_valid)
+        return is_valid
+
     def clear_cache(self) -> None:
-        """Clear all cached clients."""
+        """Clear all cached clients and validation results."""
+        clients = [client for client, _ in self._clients.values()]
         self._clients.clear()
+        self._validations.clear()
+        self._release(clients)
         logger.info("Cleared LLM client cache")
 
+    async def close(self) -> None:
+        """Close all cached clients and wait for pending closes."""
+        clients = [client for client, _ in self._clients.values()]
+        self._clients.clear()
+        self._validations.clear()
+        for client in clients:
+            await self._close_client(client)
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
 
 # ============================================================================
 # Global Registry Instance
@@ -827,6 +1013,7 @@ def get_llm_client(
 def get_llm_client_from_config(
     config: Dict[str, Any],
     cache: bool = True,
+    tenant: Optional[str] = None,
 ) -> LLMClient:
     """
     Get an LLM client from a configuration dictionary.
@@ -838,6 +1025,8 @@ def get_llm_client_from_config(
             - api_key: API key
             - Additional provider-specific parameters
         cache: Whether to cache the client
+        tenant: Owner of the requests (e.g. user ID); near-duplicate cache
+            matches stay within a tenant, exact matches are shared
         
     Returns:
         LLMClient: LLM client instance
@@ -850,20 +1039,47 @@ def get_llm_client_from_config(
         }
         client = get_llm_client_from_config(config)
     """
+    from app.metagpt_integration.llm_cache import with_response_cache
+
     config_copy = config.copy()
     provider = config_copy.pop("provider")
     model = config_copy.pop("model")
     api_key = config_copy.pop("api_key")
-    
-    return get_llm_client(
+
+    client = get_llm_client(
         provider=provider,
         model=model,
         api_key=api_key,
         cache=cache,
         **config_copy,
     )
+    return with_response_cache(client, config, tenant=tenant)
+
+
+async def validate_llm_connection(config: Dict[str, Any], client: LLMClient) -> bool:
+    """
+    Validate an LLM connection with the registry's validation cache.
+    
+    Args:
+        config: LLM configuration the client was created from
+        client: Client to validate
+        
+    Returns:
+        bool: True if the connection is valid
+    """
+    return await _registry.validate(config, client)
 
 
 def clear_llm_cache() -> None:
     """Clear all cached LLM clients."""
     _registry.clear_cache()
+
+
+async def close_llm_clients() -> None:
+    """Close all cached LLM clients (application shutdown)."""
+    await _registry.close()
+
+
+def get_llm_registry_stats() -> Dict[str, Any]:
+    """Get LLM client cache statistics."""
+    return _registry.get_stats()
@@ -0,0 +1,422 @@
+"""
+Prompt Reuse Module
+
+This module helps repeated prompt scaffolds cost less:
+
+- Provider-native prompt caching: providers such as OpenAI and Groq reuse
+  the computation of a prompt prefix they have recently seen. The workflow
+  templates put the shared project context first and the stage-specific
+  instruction last, so parallel stages and per-file calls share a prefix;
+  record_provider_usage() reports the cached prompt tokens a response
+  carries.
+- Near-duplicate lookup: NearDuplicateIndex finds a cached request whose
+  prompt is nearly identical (same normalized text, or a MinHash estimate
+  of word-shingle Jaccard similarity above a threshold), without
+  embeddings. Only the context may differ: the final instruction paragraph
+  must match, so e.g. per-file prompts of one design never answer each
+  other. Signatures cost time linear in the prompt length, so the response
+  cache computes them with fingerprint() in a worker thread.
+- Per-execution statistics: PromptCacheStats counts hits and saved tokens.
+  The agent manager installs one per execution with use_prompt_cache_stats()
+  in the task running a stage; caches and clients record into it.
+"""
+
+import hashlib
+import random
+import re
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+
+# Mersenne prime modulus of the MinHash permutations
+_PRIME = (1 << 61) - 1
+
+_WHITESPACE = re.compile(r"\s+")
+_WORD = re.compile(r"\w+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Normalize a prompt for near-duplicate matching (case and whitespace).
+
+    Args:
+        prompt: Prompt
+
+    Returns:
+        str: Lowercased prompt with whitespace runs collapsed
+    """
+    return _WHITESPACE.sub(" ", prompt).strip().lower()
+
+
+def split_instruction(prompt: str) -> Tuple[str, str]:
+    """
+    Split a prompt into its context and its final instruction paragraph.
+
+    Args:
+        prompt: Prompt
+
+    Returns:
+        Tuple[str, str]: (context, instruction); the context is empty for a
+            single-paragraph prompt
+    """
+    paragraphs = [p for p in re.split(r"\n\s*\n", prompt.strip()) if p.strip()]
+    if len(paragraphs) < 2:
+        return "", prompt
+    return "\n\n".join(paragraphs[:-1]), paragraphs[-1]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the token count of a text (about four characters per token).
+
+    Args:
+        text: Text
+
+    Returns:
+        int: Estimated tokens
+    """
+    return (len(text) + 3) // 4
+
+
+# ============================================================================
+# MinHash
+# ============================================================================
+
+class MinHasher:
+    """
+    MinHash signatures of word shingles.
+
+    The fraction of equal positions in two signatures estimates the Jaccard
+    similarity of the texts' shingle sets.
+    """
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 3, seed: int = 1):
+        """
+        Initialize MinHasher.
+
+        Args:
+            num_perm: Signature length
+            shingle_size: Words per shingle
+            seed: Seed of the permutations (signatures are only comparable
+                between hashers with the same seed and num_perm)
+        """
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self._perms = [
+            (rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)
+        ]
+
+    def _shingles(self, text: str) -> Set[int]:
+        """Hash the text's word shingles to 64-bit integers."""
+        words = _WORD.findall(text.lower())
+        size = min(self.shingle_size, len(words)) or 1
+        return {
+            int.from_bytes(
+                hashlib.blake2b(" ".join(words[i:i + size]).encode(), digest_size=8).digest(), "big"
+            )
+            for i in range(max(len(words) - size + 1, 1))
+        }
+
+    def signature(self, text: str) -> Tuple[int, ...]:
+        """
+        Compute the MinHash signature of a text.
+
+        Args:
+            text: Text
+
+        Returns:
+            Tuple[int, ...]: num_perm minimum hash values
+        """
+        shingles = self._shingles(text)
+        return tuple(min((a * x + b) % _PRIME for x in shingles) for a, b in self._perms)
+
+    @staticmethod
+    def similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+        """Estimate the Jaccard similarity of two signatures."""
+        return sum(a == b for a, b in zip(first, second, strict=True)) / len(first)
+
+
+class PromptFingerprint(NamedTuple):
+    """
+    What a near-duplicate index needs to know about a request.
+
+    Attributes:
+        scope: Hash of the request's scope and final instruction
+        normalized: Hash of the normalized prompt
+        signature: MinHash signature of the prompt's context
+    """
+    scope: str
+    normalized: str
+    signature: Tuple[int, ...]
+
+
+class NearDuplicateIndex:
+    """
+    In-memory index of cached requests for near-duplicate lookup.
+
+    Requests only match within the same scope (connection, generation
+    parameters and final instruction). Within a scope, a request matches an
+    indexed one with the same normalized prompt, or, through locality
+    sensitive hashing of MinHash bands, one whose estimated similarity is at
+    least threshold. The index maps requests to cache keys; responses stay
+    in the response cache. The least recently used entries beyond
+    max_entries are dropped.
+    """
+
+    def __init__(self, threshold: float = 0.9, max_entries: int = 10000, num_perm: int = 64, bands: int = 16):
+        """
+        Initialize index.
+
+        Args:
+            threshold: Min estimated Jaccard similarity of a near duplicate
+            max_entries: Max indexed requests
+            num_perm: MinHash signature length
+            bands: LSH bands (num_perm must be a multiple)
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm=num_perm)
+
+        # key -> (scope, normalized hash, signature)
+        self._entries: "OrderedDict[str, Tuple[str, str, Tuple[int, ...]]]" = OrderedDict()
+        self._normalized: Dict[Tuple[str, str], str] = {}
+        self._buckets: Dict[Tuple[str, int, Tuple[int, ...]], Set[str]] = {}
+
+    def _bands(self, signature: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+        """Split a signature into LSH bands."""
+        return [(i, signature[i * self.rows:(i + 1) * self.rows]) for i in range(self.bands)]
+
+    def fingerprint(self, scope: str, prompt: str) -> PromptFingerprint:
+        """
+        Describe a request for add_fingerprint() and find_fingerprint().
+
+        Only reads the index's immutable hasher, so it is safe to call from
+        a worker thread.
+
+        Args:
+            scope: Hash of everything but the prompt that must match
+            prompt: Prompt
+
+        Returns:
+            PromptFingerprint: Fingerprint of the request
+        """
+        context, instruction = split_instruction(prompt)
+        return PromptFingerprint(
+            scope=hashlib.sha256(f"{scope}\x00{normalize_prompt(instruction)}".encode()).hexdigest(),
+            normalized=hashlib.sha256(normalize_prompt(prompt).encode()).hexdigest(),
+            signature=self.hasher.signature(context),
+        )
+
+    def add(self, key: str, scope: str, prompt: str) -> None:
+        """
+        Index a cached request.
+
+        Args:
+            key: Cache key of the request's response
+            scope: Hash of everything but the prompt that must match
+            prompt: Prompt
+        """
+        self.add_fingerprint(key, self.fingerprint(scope, prompt))
+
+    def add_fingerprint(self, key: str, fingerprint: PromptFingerprint) -> None:
+        """
+        Index a cached request by its fingerprint.
+
+        Args:
+            key: Cache key of the request's response
+            fingerprint: Fingerprint of the request
+        """
+        self.remove(key)
+
+        scope, normalized, signature = fingerprint
+        self._entries[key] = (scope, normalized, signature)
+        self._normalized[(scope, normalized)] = key
+        for band in self._bands(signature):
+            self._buckets.setdefault((scope, *band), set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            self.remove(next(iter(self._entries)))
+
+    def find(self, scope: str, prompt: str) -> Optional[Tuple[str, float]]:
+        """
+        Find a near-duplicate request.
+
+        Args:
+            scope: Hash of everything but the prompt that must match
+            prompt: Prompt
+
+        Returns:
+            Optional[Tuple[str, float]]: (cache key, estimated similarity)
+                of the most similar match, or None
+        """
+        return self.find_fingerprint(self.fingerprint(scope, prompt))
+
+    def find_fingerprint(self, fingerprint: PromptFingerprint) -> Optional[Tuple[str, float]]:
+        """
+        Find a near-duplicate request by fingerprint.
+
+        Args:
+            fingerprint: Fingerprint of the request
+
+        Returns:
+            Optional[Tuple[str, float]]: (cache key, estimated similarity)
+                of the most similar match, or None
+        """
+        scope, normalized, signature = fingerprint
+
+        key = self._normalized.get((scope, normalized))
+        if key is not None:
+            self._entries.move_to_end(key)
+            return key, 1.0
+
+        candidates: Set[str] = set()
+        for band in self._bands(signature):
+            candidates |= self._buckets.get((scope, *band), set())
+
+        best: Optional[Tuple[str, float]] = None
+        for candidate in candidates:
+            similarity = MinHasher.similarity(signature, self._entries[candidate][2])
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (candidate, similarity)
+
+        if best is not None:
+            self._entries.move_to_end(best[0])
+        return best
+
+    def remove(self, key: str) -> None:
+        """Drop a request from the index (e.g. its response expired)."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        scope, normalized, signature = entry
+        if self._normalized.get((scope, normalized)) == key:
+            del self._normalized[(scope, normalized)]
+        for band in self._bands(signature):
+            bucket = self._buckets.get((scope, *band))
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[(scope, *band)]
+
+    def clear(self) -> None:
+        """Drop all indexed requests."""
+        self._entries.clear()
+        self._normalized.clear()
+        self._buckets.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# ============================================================================
+# Per-Execution Statistics
+# ============================================================================
+
+class PromptCacheStats:
+    """
+    Cache statistics of one execution.
+    """
+
+    def __init__(self):
+        """Initialize statistics."""
+        self.metrics = {
+            "lookups": 0,
+            "exact_hits": 0,
+            "near_duplicate_hits": 0,
+            "saved_tokens": 0,
+            "provider_requests": 0,
+            "provider_prompt_tokens": 0,
+            "provider_cached_tokens": 0,
+        }
+
+    def record_lookup(self) -> None:
+        """Count a response cache lookup."""
+        self.metrics["lookups"] += 1
+
+    def record_hit(self, prompt: str, response: str, near_duplicate: bool = False) -> None:
+        """
+        Count a response served from the cache.
+
+        Args:
+            prompt: Prompt of the request
+            response: Cached response
+            near_duplicate: Whether it was a near-duplicate (not exact) match
+        """
+        self.metrics["near_duplicate_hits" if near_duplicate else "exact_hits"] += 1
+        self.metrics["saved_tokens"] += estimate_tokens(prompt) + estimate_tokens(response)
+
+    def record_provider_usage(self, prompt_tokens: int, cached_tokens: int) -> None:
+        """
+        Count a provider call and the prompt tokens the provider had cached.
+
+        Args:
+            prompt_tokens: Prompt tokens of the call
+            cached_tokens: Prompt tokens served from the provider's prefix cache
+        """
+        self.metrics["provider_requests"] += 1
+        self.metrics["provider_prompt_tokens"] += prompt_tokens
+        self.metrics["provider_cached_tokens"] += cached_tokens
+        self.metrics["saved_tokens"] += cached_tokens
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get statistics with hit rates."""
+        hits = self.metrics["exact_hits"] + self.metrics["near_duplicate_hits"]
+        lookups = self.metrics["lookups"]
+        prompt_tokens = self.metrics["provider_prompt_tokens"]
+        return {
+            **self.metrics,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "provider_cache_rate": self.metrics["provider_cached_tokens"] / prompt_tokens if prompt_tokens else 0.0,
+        }
+
+
+_current_stats: ContextVar[Optional[PromptCacheStats]] = ContextVar("prompt_cache_stats", default=None)
+
+
+def use_prompt_cache_stats(stats: Optional[PromptCacheStats]) -> None:
+    """
+    Record cache statistics of LLM calls in the current task into stats.
+
+    Tasks created afterwards from the current task inherit it.
+
+    Args:
+        stats: Statistics of the execution the task works for
+    """
+    _current_stats.set(stats)
+
+
+def current_prompt_cache_stats() -> Optional[PromptCacheStats]:
+    """Get the statistics LLM calls in the current task record into."""
+    return _current_stats.get()
+
+
+def record_provider_usage(usage: Any) -> None:
+    """
+    Record the usage block of a chat completion response.
+
+    Reads prompt_tokens and prompt_tokens_details.cached_tokens from either
+    an object or a dict (SDK versions differ); missing fields count as 0.
+
+    Args:
+        usage: Response usage (or None)
+    """
+    stats = _current_stats.get()
+    if stats is None or usage is None:
+        return
+
+    def field(value: Any, name: str) -> Any:
+        if isinstance(value, dict):
+            return value.get(name)
+        return getattr(value, name, None)
+
+    prompt_tokens = field(usage, "prompt_tokens") or 0
+    details = field(usage, "prompt_tokens_details")
+    cached_tokens = (field(details, "cached_tokens") if details is not None else None) or 0
+    stats.record_provider_usage(int(prompt_tokens), int(cached_tokens))
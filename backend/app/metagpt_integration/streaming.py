@@ -9,6 +9,7 @@ Features:
 - Async event emission with buffering
 - Subscriber management for targeted delivery
 - Event filtering and transformation
+- Patch-based file change events against the last published version
 - Metrics and monitoring
 - Graceful shutdown handling
 """
@@ -22,6 +23,10 @@ from enum import Enum
 from dataclasses import dataclass, asdict
 from uuid import UUID
 
+from app.core.config import settings
+from app.core.metrics import TopKCounter, get_metrics_registry
+from app.metagpt_integration.file_delta import FileSnapshotCache, build_file_payload, patch_size
+
 
 logger = logging.getLogger(__name__)
 
@@ -255,8 +260,21 @@ class StreamingHandler:
             "total_events": 0,
             "total_subscribers": 0,
             "events_by_type": {},
-            "events_by_source": {},
+            "file_events_full": 0,
+            "file_events_patch": 0,
+            "file_bytes_saved": 0,
         }
+        self.file_snapshots = FileSnapshotCache(
+            max_entries=settings.streaming_file_snapshot_max_entries,
+            max_file_size=settings.streaming_file_snapshot_max_file_size,
+            max_total_size=settings.streaming_file_snapshot_max_total_size,
+        )
+        # Per-source counts, bounded to the busiest sources
+        self.source_counts = TopKCounter(settings.metrics_top_k)
+        self.delivery_latency = get_metrics_registry().histogram(
+            "stream_event_delivery_latency_seconds",
+            "Time from streaming event emit to delivery to subscribers",
+        )
         self._lock = asyncio.Lock()
         self._running = False
         self._processor_task: Optional[asyncio.Task] = None
@@ -372,6 +390,24 @@ class StreamingHandler:
                 return True
             return False
 
+    async def update_filter(self, subscriber_id: str, event_filter: EventFilter) -> bool:
+        """
+        Replace a subscriber's event filter.
+        
+        Args:
+            subscriber_id: Subscriber identifier
+            event_filter: New event filter
+            
+        Returns:
+            True if updated, False if not found
+        """
+        async with self._lock:
+            subscriber = self.subscribers.get(subscriber_id)
+            if subscriber is None:
+                return False
+            subscriber.filter = event_filter
+            return True
+
     async def _process_events(self) -> None:
         """Process events from queue and deliver to subscribers."""
         try:
@@ -392,8 +428,7 @@ class StreamingHandler:
                         event_type_key = event.event_type.value
                         self.metrics["events_by_type"][event_type_key] = \
                             self.metrics["events_by_type"].get(event_type_key, 0) + 1
-                        self.metrics["events_by_source"][event.source] = \
-                            self.metrics["events_by_source"].get(event.source, 0) + 1
+                        self.source_counts.add(event.source)
 
                         # Flush if buffer is full
                         if len(self.event_buffer) >= self.buffer_size:
@@ -440,6 +475,8 @@ class StreamingHandler:
             if tasks:
                 await asyncio.gather(*tasks, return_exceptions=True)
 
+            self.delivery_latency.observe((datetime.utcnow() - event.timestamp).total_seconds())
+
         self.event_buffer.clear()
 
     async def emit_log(
@@ -479,10 +516,17 @@ class StreamingHandler:
         source: str = "file_handler",
         execution_id: Optional[str] = None,
         project_id: Optional[str] = None,
+        allow_patch: bool = True,
     ) -> None:
         """
         Emit a file change event.
         
+        When the handler has already published a version of the file, the
+        event carries a patch against that version (``encoding: "patch"``,
+        ``base_hash``, ``patch``) instead of the full content, if smaller.
+        Clients whose copy does not hash to ``base_hash`` must re-fetch the
+        file with GET_FILE. See app.metagpt_integration.file_delta.
+        
         Args:
             event_type: Type of file event (CREATED, MODIFIED, DELETED)
             file_path: Path to file
@@ -490,13 +534,26 @@ class StreamingHandler:
             source: Source of event
             execution_id: Associated execution ID
             project_id: Associated project ID
-        """
+            allow_patch: Send a patch when a base version is known
+        """
+        if event_type == EventType.FILE_DELETED or content is None:
+            self.file_snapshots.discard(project_id, file_path)
+            data = {"file_path": file_path, "content": content}
+        else:
+            base = self.file_snapshots.get(project_id, file_path) if allow_patch else None
+            data = build_file_payload(
+                file_path, content, base, max_line_pairs=settings.streaming_file_patch_max_line_pairs,
+            )
+            self.file_snapshots.put(project_id, file_path, content)
+            if data["encoding"] == "patch":
+                self.metrics["file_events_patch"] += 1
+                self.metrics["file_bytes_saved"] += len(content) - patch_size(data["patch"])
+            else:
+                self.metrics["file_events_full"] += 1
+
         await self.emit(
             event_type=event_type,
-            data={
-                "file_path": file_path,
-                "content": content,
-            },
+            data=data,
             source=source,
             execution_id=execution_id,
             project_id=project_id,
@@ -613,6 +670,8 @@ class StreamingHandler:
         """
         return {
             **self.metrics,
+            "events_by_source": self.source_counts.as_dict(),
+            "delivery_latency_seconds": self.delivery_latency.snapshot(),
             "active_subscribers": len(self.subscribers),
             "buffered_events": len(self.event_buffer),
             "queue_size": self.event_queue.qsize(),
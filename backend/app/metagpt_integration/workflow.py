@@ -0,0 +1,602 @@
+"""
+Workflow Graph Module
+
+This module describes agent workflows as a declarative graph of stages and
+runs them with an async scheduler.
+
+Each stage names the agent role that runs it, a prompt template, and the
+upstream stages whose outputs it consumes. Stages whose inputs are all
+available run concurrently (bounded by a semaphore), so wall-clock time
+drops whenever the graph has width, e.g. QA test planning runs alongside
+code generation since both only need the requirements and the design.
+
+Features:
+- Graph validation (unknown inputs, template fields, cycles)
+- Concurrent scheduling of independent stages
+- Per-stage results (output, status, error, duration)
+- Downstream stages are skipped when an input did not complete
+- Per-file fan-out of code generation stages (see codegen.py)
+- Checkpoint/resume: completed stages restored from a previous run's
+  output are not run again
+"""
+
+import asyncio
+import hashlib
+import logging
+import string
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.models.agent_config import AgentRole
+
+
+logger = logging.getLogger(__name__)
+
+
+class WorkflowError(Exception):
+    """Raised for invalid workflow graphs and failed workflow runs."""
+    pass
+
+
+class StageStatus(str, Enum):
+    """Stage status enumeration."""
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    SKIPPED = "skipped"
+
+
+@dataclass(frozen=True)
+class StageNode:
+    """
+    A stage of a workflow graph.
+
+    Attributes:
+        name: Unique stage name (also used in events and the execution output)
+        role: Agent role running the stage
+        prompt_template: str.format template; may reference {prompt} and
+            {<input>} for each upstream stage in inputs
+        inputs: Names of upstream stages whose outputs the stage consumes
+        temperature: Default temperature if the agent config has none
+        max_tokens: Default max tokens if the agent config has none
+        creates_files: Whether files in the response are written to the workspace
+        description: Short summary used in execution logs
+        fan_out: Input whose file list splits the stage into one call per
+            file (see codegen.parse_file_plan); without a file list the
+            stage runs as a single call
+        module_template: str.format template of a per-file call; may
+            reference the prompt_template fields plus {path}, {purpose}
+            and {files} (the whole file list)
+    """
+    name: str
+    role: AgentRole
+    prompt_template: str
+    inputs: Tuple[str, ...] = ()
+    temperature: float = 0.7
+    max_tokens: int = 2000
+    creates_files: bool = False
+    description: str = ""
+    fan_out: Optional[str] = None
+    module_template: str = ""
+
+    def render(self, prompt: str, inputs: Dict[str, str]) -> str:
+        """
+        Render the prompt template.
+
+        Args:
+            prompt: Original project prompt
+            inputs: Outputs of the upstream stages
+
+        Returns:
+            str: Rendered prompt
+        """
+        return self.prompt_template.format(prompt=prompt, **inputs)
+
+    def render_module(self, prompt: str, inputs: Dict[str, str], path: str, purpose: str, files: str) -> str:
+        """
+        Render the per-file template of a fan-out stage.
+
+        Args:
+            prompt: Original project prompt
+            inputs: Outputs of the upstream stages
+            path: File to generate
+            purpose: What the file contains
+            files: The whole file list, one file per line
+
+        Returns:
+            str: Rendered prompt
+        """
+        return self.module_template.format(prompt=prompt, path=path, purpose=purpose, files=files, **inputs)
+
+    @property
+    def fingerprint(self) -> str:
+        """Hash of the stage definition, so checkpoints of a changed stage are not reused."""
+        definition = "\x00".join([
+            self.name, self.role.value, self.prompt_template, *self.inputs,
+            self.fan_out or "", self.module_template,
+        ])
+        return hashlib.sha256(definition.encode()).hexdigest()[:16]
+
+
+@dataclass
+class StageResult:
+    """
+    Result of running a stage.
+
+    Attributes:
+        name: Stage name
+        role: Agent role that ran the stage
+        status: Final stage status
+        output: Agent response (if completed)
+        error: Error message (if failed or skipped)
+        duration: Wall-clock seconds spent running the stage
+        fingerprint: Fingerprint of the stage definition that produced it
+        resumed: Whether the result was restored from a checkpoint
+    """
+    name: str
+    role: str
+    status: StageStatus
+    output: Optional[str] = None
+    error: Optional[str] = None
+    duration: float = 0.0
+    fingerprint: Optional[str] = None
+    resumed: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary for the execution output."""
+        return {
+            "agent": self.role,
+            "status": self.status.value,
+            "output": self.output,
+            "error": self.error,
+            "duration_seconds": round(self.duration, 3),
+            "fingerprint": self.fingerprint,
+        }
+
+
+def prompt_fingerprint(prompt: str) -> str:
+    """Hash of the project prompt a checkpoint was made for."""
+    return hashlib.sha256(prompt.encode()).hexdigest()
+
+
+class WorkflowGraph:
+    """
+    Validated, topologically ordered set of stages.
+    """
+
+    def __init__(self, nodes: Iterable[StageNode]):
+        """
+        Initialize and validate a workflow graph.
+
+        Args:
+            nodes: Stages of the workflow
+
+        Raises:
+            WorkflowError: If names repeat, an input or template field is
+                unknown, or the graph has a cycle
+        """
+        self.nodes: Dict[str, StageNode] = {}
+        for node in nodes:
+            if node.name in self.nodes:
+                raise WorkflowError(f"Duplicate stage: {node.name}")
+            if node.name == "prompt":
+                raise WorkflowError("Stage name 'prompt' is reserved for the project prompt")
+            self.nodes[node.name] = node
+
+        for node in self.nodes.values():
+            for name in node.inputs:
+                if name not in self.nodes:
+                    raise WorkflowError(f"Stage {node.name} has unknown input: {name}")
+            allowed = {"prompt", *node.inputs}
+            self._check_fields(node, node.prompt_template, allowed)
+
+            if node.fan_out is not None:
+                if node.fan_out not in node.inputs:
+                    raise WorkflowError(f"Stage {node.name} fans out over {node.fan_out}, which is not an input")
+                if not node.module_template:
+                    raise WorkflowError(f"Stage {node.name} fans out without a module_template")
+                self._check_fields(node, node.module_template, allowed | {"path", "purpose", "files"})
+
+        self.order: List[StageNode] = self._topological_order()
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __iter__(self):
+        return iter(self.order)
+
+    @staticmethod
+    def _check_fields(node: StageNode, template: str, allowed: set) -> None:
+        """Reject template fields other than the allowed ones."""
+        for _, field_name, _, _ in string.Formatter().parse(template):
+            if field_name is not None and field_name not in allowed:
+                raise WorkflowError(f"Stage {node.name} template references unknown field: {field_name}")
+
+    def _topological_order(self) -> List[StageNode]:
+        """Order stages so every stage follows its inputs (Kahn's algorithm, stable by definition order)."""
+        remaining = {name: set(node.inputs) for name, node in self.nodes.items()}
+        order = []
+
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise WorkflowError(f"Workflow has a cycle between: {', '.join(sorted(remaining))}")
+            for name in ready:
+                order.append(self.nodes[name])
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+
+        return order
+
+
+# Runs one stage: (node, prompt, upstream outputs, publish) -> output, or None
+# if the stage's agent is not available. publish forwards a progress event to
+# the workflow's event stream.
+StageRunner = Callable[
+    [StageNode, str, Dict[str, str], Callable[[Dict[str, Any]], Awaitable[None]]],
+    Awaitable[Optional[str]],
+]
+
+
+class _StageDone:
+    """Queue marker for a finished stage task."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class WorkflowScheduler:
+    """
+    Runs a workflow graph, starting each stage as soon as its inputs complete.
+
+    Progress events published by stages are yielded in arrival order,
+    followed by a stage_complete event per stage. Stages restored from a
+    checkpoint with restore() are reported first, with "resumed" set, and
+    are not run.
+    """
+
+    def __init__(
+        self,
+        graph: WorkflowGraph,
+        run_stage: StageRunner,
+        max_parallel: int = 4,
+    ):
+        """
+        Initialize scheduler.
+
+        Args:
+            graph: Workflow graph
+            run_stage: Coroutine running one stage
+            max_parallel: Max stages running at once
+        """
+        self.graph = graph
+        self.run_stage = run_stage
+        self.max_parallel = max(1, max_parallel)
+        self.results: Dict[str, StageResult] = {}
+        self.prompt_hash: Optional[str] = None
+
+    def restore(self, output: Dict[str, Any], prompt: str) -> List[str]:
+        """
+        Restore completed stages from a checkpointed execution output.
+
+        A stage is restored only if the checkpoint was made for the same
+        prompt, the stage completed, its definition is unchanged and all of
+        its inputs were restored too; everything else runs again.
+
+        Args:
+            output: Execution output written by get_output()
+            prompt: Project prompt of the run being resumed
+
+        Returns:
+            List[str]: Names of restored stages, in graph order
+        """
+        if output.get("prompt_sha256") != prompt_fingerprint(prompt):
+            return []
+
+        saved_stages = output.get("stages") or {}
+        restored = []
+        for node in self.graph.order:
+            saved = saved_stages.get(node.name)
+            if (
+                not saved
+                or saved.get("status") != StageStatus.COMPLETED.value
+                or saved.get("fingerprint") != node.fingerprint
+                or saved.get("output") is None
+                or any(name not in restored for name in node.inputs)
+            ):
+                continue
+
+            self.results[node.name] = StageResult(
+                node.name,
+                saved.get("agent") or node.role.value,
+                StageStatus.COMPLETED,
+                output=saved["output"],
+                duration=saved.get("duration_seconds") or 0.0,
+                fingerprint=node.fingerprint,
+                resumed=True,
+            )
+            restored.append(node.name)
+
+        return restored
+
+    async def run(self, prompt: str) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Run all stages.
+
+        Args:
+            prompt: Original project prompt
+
+        Yields:
+            Dict[str, Any]: Stage progress events
+        """
+        self.prompt_hash = prompt_fingerprint(prompt)
+        queue: asyncio.Queue = asyncio.Queue()
+        semaphore = asyncio.Semaphore(self.max_parallel)
+        tasks: Dict[str, asyncio.Task] = {}
+        waiting = [node for node in self.graph.order if node.name not in self.results]
+
+        def start_ready() -> List[Dict[str, Any]]:
+            """Start stages whose inputs are done; skip those with unusable inputs."""
+            skipped = []
+            # Topological order lets a skip cascade within one pass
+            for node in list(waiting):
+                upstream = [self.results.get(name) for name in node.inputs]
+                if any(result is None for result in upstream):
+                    continue
+                waiting.remove(node)
+
+                unusable = [r.name for r in upstream if r.status != StageStatus.COMPLETED]
+                if unusable:
+                    self.results[node.name] = StageResult(
+                        node.name, node.role.value, StageStatus.SKIPPED,
+                        error=f"Upstream stages did not complete: {', '.join(unusable)}",
+                        fingerprint=node.fingerprint,
+                    )
+                    skipped.append(self._complete_event(node.name))
+                    continue
+
+                inputs = {r.name: r.output for r in upstream}
+                tasks[node.name] = asyncio.create_task(
+                    self._run_node(node, prompt, inputs, semaphore, queue)
+                )
+            return skipped
+
+        try:
+            for node in self.graph.order:
+                if node.name in self.results:
+                    yield self._complete_event(node.name)
+
+            for event in start_ready():
+                yield event
+
+            while tasks:
+                item = await queue.get()
+                if isinstance(item, _StageDone):
+                    tasks.pop(item.name, None)
+                    yield self._complete_event(item.name)
+                    for event in start_ready():
+                        yield event
+                else:
+                    yield item
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+    async def _run_node(
+        self,
+        node: StageNode,
+        prompt: str,
+        inputs: Dict[str, str],
+        semaphore: asyncio.Semaphore,
+        queue: asyncio.Queue,
+    ) -> None:
+        """Run one stage, record its result and signal completion."""
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                output = await self.run_stage(node, prompt, inputs, queue.put)
+                if output is None:
+                    result = StageResult(node.name, node.role.value, StageStatus.SKIPPED, error="Agent not available")
+                else:
+                    result = StageResult(node.name, node.role.value, StageStatus.COMPLETED, output=output)
+            except Exception as e:
+                logger.error(f"Stage {node.name} failed: {e}")
+                result = StageResult(node.name, node.role.value, StageStatus.FAILED, error=str(e))
+            result.duration = time.monotonic() - started
+            result.fingerprint = node.fingerprint
+
+        self.results[node.name] = result
+        await queue.put(_StageDone(node.name))
+
+    def _complete_event(self, name: str) -> Dict[str, Any]:
+        """Build the stage_complete event for a finished stage."""
+        result = self.results[name]
+        return {
+            "type": "stage_complete",
+            "stage": name,
+            "agent": result.role,
+            "status": result.status.value,
+            "error": result.error,
+            "duration_seconds": round(result.duration, 3),
+            "resumed": result.resumed,
+        }
+
+    # ========================================================================
+    # Results
+    # ========================================================================
+
+    @property
+    def finished_count(self) -> int:
+        """Number of stages with a final result."""
+        return len(self.results)
+
+    def failed_stages(self) -> List[str]:
+        """Names of failed stages, in graph order."""
+        return [
+            node.name for node in self.graph.order
+            if node.name in self.results and self.results[node.name].status == StageStatus.FAILED
+        ]
+
+    def get_output(self) -> Dict[str, Any]:
+        """Per-stage results, in graph order, for the execution output (and checkpoints)."""
+        return {
+            "prompt_sha256": self.prompt_hash,
+            "stages": {
+                node.name: self.results[node.name].to_dict()
+                for node in self.graph.order
+                if node.name in self.results
+            },
+        }
+
+
+# ============================================================================
+# Default Workflow
+# ============================================================================
+
+# Every template starts with the shared project context, in the same order,
+# and ends with its stage instruction: the stages (and the per-file calls of
+# code generation) then share a prompt prefix that providers with prompt
+# caching compute once (see prompt_cache.py).
+
+DEFAULT_WORKFLOW = WorkflowGraph([
+    StageNode(
+        name="requirements_analysis",
+        role=AgentRole.PRODUCT_MANAGER,
+        description="requirements analysis",
+        temperature=0.7,
+        max_tokens=2000,
+        prompt_template="""
+Project requirements:
+
+{prompt}
+
+Analyze the project requirements above and create a detailed specification.
+Provide:
+1. Project Overview
+2. Key Features
+3. User Stories
+4. Acceptance Criteria
+""",
+    ),
+    StageNode(
+        name="system_design",
+        role=AgentRole.ARCHITECT,
+        inputs=("requirements_analysis",),
+        description="system architecture design",
+        temperature=0.7,
+        max_tokens=3000,
+        prompt_template="""
+Project requirements:
+
+{prompt}
+
+Product specification:
+
+{requirements_analysis}
+
+Design the system architecture for the project above.
+Provide:
+1. System Architecture Diagram (ASCII)
+2. Component Descriptions
+3. Technology Stack
+4. Database Schema
+5. API Endpoints
+6. File List: every file of the codebase, one per line as
+   "- path/to/file.ext: purpose"
+""",
+    ),
+    StageNode(
+        name="code_generation",
+        role=AgentRole.ENGINEER,
+        inputs=("requirements_analysis", "system_design"),
+        description="code implementation",
+        temperature=0.5,
+        max_tokens=4000,
+        creates_files=True,
+        fan_out="system_design",
+        prompt_template="""
+Project requirements:
+
+{prompt}
+
+Product specification:
+
+{requirements_analysis}
+
+System design:
+
+{system_design}
+
+Generate production-ready code for the project above.
+Provide:
+1. Main application file
+2. API routes/endpoints
+3. Database models
+4. Configuration files
+5. Requirements/dependencies
+Use best practices and include proper error handling.
+Put every file in its own fenced code block whose opening fence names the
+language and the file's path relative to the project root, for example:
+```python app/main.py
+""",
+        module_template="""
+Project requirements:
+
+{prompt}
+
+Product specification:
+
+{requirements_analysis}
+
+System design:
+
+{system_design}
+
+The codebase consists of these files:
+
+{files}
+
+Generate production-ready code for one file of the project above.
+Write only the file {path} ({purpose}), complete, in a single code block.
+Use best practices and include proper error handling.
+""",
+    ),
+    # Test planning only needs the specification and the design, so it runs
+    # alongside code generation
+    StageNode(
+        name="testing",
+        role=AgentRole.QA_ENGINEER,
+        inputs=("requirements_analysis", "system_design"),
+        description="test suite",
+        temperature=0.5,
+        max_tokens=3000,
+        prompt_template="""
+Project requirements:
+
+{prompt}
+
+Product specification:
+
+{requirements_analysis}
+
+System design:
+
+{system_design}
+
+Create comprehensive tests for the project above, covering the API
+endpoints of the system design.
+Provide:
+1. Unit tests
+2. Integration tests
+3. API endpoint tests
+4. Test coverage report
+5. Edge cases and error scenarios
+""",
+    ),
+])
@@ -0,0 +1,229 @@
+"""
+Execution Write Buffer Module
+
+This module provides a write-behind buffer for the database writes an agent
+manager makes while a workflow runs. Log entries, project progress and
+execution status/output changes are accumulated in memory and written in one
+transaction, instead of committing every small change on the hot path.
+
+The buffer flushes:
+- On a timer (so status and logs stay reasonably fresh)
+- When enough log entries are pending
+- Explicitly, at stage boundaries and on completion or failure (close())
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.execution import Execution, ExecutionStatus
+from app.models.project import Project
+from app.services.execution_log_service import get_execution_log_service
+
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutionWriteBuffer:
+    """
+    Write-behind buffer for one execution.
+
+    All session writes happen inside flush(), under the lock shared with
+    the agent manager, so buffered changes never race other users of the
+    session. Status, output and progress are coalesced: only the latest
+    value is written.
+    """
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        execution: Execution,
+        project: Project,
+        lock: Optional[asyncio.Lock] = None,
+        flush_interval: float = 1.0,
+        max_pending_logs: int = 100,
+    ):
+        """
+        Initialize write buffer.
+
+        Args:
+            db: Database session
+            execution: Execution being written
+            project: Project of the execution
+            lock: Lock serializing use of the session
+            flush_interval: Seconds between timed flushes (0 disables the timer)
+            max_pending_logs: Flush as soon as this many log entries are pending
+        """
+        self.db = db
+        self.execution = execution
+        self.project = project
+        # Kept as plain values: a rollback expires the ORM objects
+        self.execution_id = str(execution.id)
+        self.lock = lock or asyncio.Lock()
+        self.flush_interval = flush_interval
+        self.max_pending_logs = max_pending_logs
+
+        self._logs: List[Dict[str, Any]] = []
+        self._status: Optional[ExecutionStatus] = None
+        self._error_message: Optional[str] = None
+        self._output: Optional[Dict[str, Any]] = None
+        self._progress: Optional[float] = None
+        self._timer: Optional[asyncio.Task] = None
+
+        self.metrics = {
+            "total_flushes": 0,
+            "total_logs": 0,
+            "coalesced_writes": 0,
+            "failed_flushes": 0,
+        }
+
+    # ========================================================================
+    # Buffered Writes
+    # ========================================================================
+
+    async def add_log(self, agent: str, message: str, level: str = "info") -> None:
+        """
+        Buffer a log entry.
+
+        Args:
+            agent: Agent name
+            message: Log message
+            level: Log level (info, warning, error, debug)
+        """
+        self._logs.append({
+            "agent": agent,
+            "message": message,
+            "level": level,
+            "timestamp": datetime.now(timezone.utc),
+        })
+        if len(self._logs) >= self.max_pending_logs:
+            await self.flush()
+
+    def set_status(self, status: ExecutionStatus) -> None:
+        """Buffer an execution status change."""
+        self._coalesce(self._status)
+        self._status = status
+
+    def set_failed(self, error_message: str) -> None:
+        """Buffer marking the execution as failed."""
+        self.set_status(ExecutionStatus.FAILED)
+        self._error_message = error_message
+
+    def set_output(self, output: Dict[str, Any]) -> None:
+        """Buffer an execution output change."""
+        self._coalesce(self._output)
+        self._output = output
+
+    def set_progress(self, progress: float) -> None:
+        """Buffer a project progress change."""
+        self._coalesce(self._progress)
+        self._progress = progress
+
+    @property
+    def pending(self) -> bool:
+        """Whether anything is waiting to be written."""
+        return bool(self._logs) or any(
+            value is not None for value in (self._status, self._output, self._progress)
+        )
+
+    # ========================================================================
+    # Flushing
+    # ========================================================================
+
+    async def flush(self) -> None:
+        """
+        Write everything pending in one transaction.
+
+        Raises:
+            Exception: If the transaction fails (pending writes are kept
+                and retried by the next flush)
+        """
+        async with self.lock:
+            if not self.pending:
+                return
+
+            logs, self._logs = self._logs, []
+            status, self._status = self._status, None
+            error_message, self._error_message = self._error_message, None
+            output, self._output = self._output, None
+            progress, self._progress = self._progress, None
+
+            try:
+                if logs:
+                    await get_execution_log_service(self.db).append_many(
+                        self.execution_id, logs, commit=False,
+                    )
+                if output is not None:
+                    self.execution.set_output(output)
+                if status == ExecutionStatus.FAILED and error_message is not None:
+                    self.execution.fail(error_message)
+                elif status is not None:
+                    self.execution.status = status
+                if status is not None or output is not None:
+                    self.db.add(self.execution)
+                if progress is not None:
+                    self.project.update_progress(progress)
+                    self.db.add(self.project)
+                await self.db.commit()
+            except Exception:
+                self.metrics["failed_flushes"] += 1
+                await self.db.rollback()
+                await self._reload()
+                # Keep the writes for the next flush; newer values win
+                self._logs = logs + self._logs
+                if self._status is None:
+                    self._status, self._error_message = status, error_message
+                if self._output is None:
+                    self._output = output
+                if self._progress is None:
+                    self._progress = progress
+                raise
+
+            self.metrics["total_flushes"] += 1
+            self.metrics["total_logs"] += len(logs)
+
+    async def _reload(self) -> None:
+        """Reload the execution and project expired by a rollback."""
+        try:
+            await self.db.refresh(self.execution)
+            await self.db.refresh(self.project)
+        except Exception as e:
+            logger.warning(f"Failed to reload execution {self.execution_id} after rollback: {e}")
+
+    def start(self) -> None:
+        """Start the flush timer."""
+        if self._timer is None and self.flush_interval > 0:
+            self._timer = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        """Stop the timer and flush what is pending (safe to call more than once)."""
+        if self._timer is not None:
+            self._timer.cancel()
+            try:
+                await self._timer
+            except asyncio.CancelledError:
+                pass
+            self._timer = None
+
+        await self.flush()
+
+    async def _flush_loop(self) -> None:
+        """Flush pending writes every flush_interval seconds."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush execution writes: {e}")
+
+    def _coalesce(self, previous: Any) -> None:
+        """Count a pending value being overwritten before it was written."""
+        if previous is not None:
+            self.metrics["coalesced_writes"] += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get buffer metrics."""
+        return {**self.metrics, "pending_logs": len(self._logs)}
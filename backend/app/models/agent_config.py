@@ -8,6 +8,7 @@ from datetime import datetime, timezone
 from typing import Optional, Dict, Any
 from sqlalchemy import Column, String, Text, DateTime, Index, ForeignKey, Enum, Boolean, Float
 from sqlalchemy.orm import relationship
+import json
 import uuid
 import enum
 
@@ -309,9 +310,12 @@ class AgentConfig(Base):
             "presence_penalty": self.presence_penalty,
         }
         
-        # Add custom parameters
-        if self.parameters:
-            config.update(self.parameters)
+        # Add custom parameters (stored as JSON text)
+        parameters = self.parameters
+        if isinstance(parameters, str):
+            parameters = json.loads(parameters or "{}")
+        if parameters:
+            config.update(parameters)
         
         return config
 
@@ -6,6 +6,7 @@ This module defines the Execution ORM model for tracking project executions.
 
 from datetime import datetime, timezone
 from typing import Optional, List, Dict, Any
+import json
 from sqlalchemy import Column, String, Text, DateTime, Index, ForeignKey, Enum, Float, Integer
 from sqlalchemy.dialects.postgresql import JSON
 from sqlalchemy.orm import relationship
@@ -267,10 +268,31 @@ class Execution(Base):
             data["agent_logs"] = self.agent_logs
         
         if include_output:
-            data["output"] = self.output
+            data["output"] = self.get_output()
         
         return data
 
+    def get_output(self) -> Dict[str, Any]:
+        """
+        Get the execution output.
+        
+        Returns:
+            dict: Output decoded from its JSON text
+        """
+        output = self.output
+        if isinstance(output, str):
+            output = json.loads(output or "{}")
+        return output or {}
+
+    def set_output(self, output: Dict[str, Any]) -> None:
+        """
+        Set the execution output (stored as JSON text).
+        
+        Args:
+            output: Execution output
+        """
+        self.output = json.dumps(output)
+
     def start(self) -> None:
         """Mark execution as started."""
         if self.status == ExecutionStatus.PENDING:
@@ -289,7 +311,7 @@ class Execution(Base):
         self._calculate_duration()
         
         if output:
-            self.output = output
+            self.set_output(output)
 
     def fail(self, error_message: str, output: Optional[Dict[str, Any]] = None) -> None:
         """
@@ -305,7 +327,7 @@ class Execution(Base):
         self._calculate_duration()
         
         if output:
-            self.output = output
+            self.set_output(output)
 
     def pause(self) -> None:
         """Pause execution."""
@@ -455,7 +477,12 @@ class Execution(Base):
     def _calculate_duration(self) -> None:
         """Calculate and update execution duration."""
         if self.started_at and self.completed_at:
-            delta = self.completed_at - self.started_at
+            # Backends without timezone support (SQLite) return naive UTC datetimes
+            started_at, completed_at = (
+                value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+                for value in (self.started_at, self.completed_at)
+            )
+            delta = completed_at - started_at
             self.duration_seconds = delta.total_seconds()
 
     @classmethod
@@ -0,0 +1,121 @@
+"""
+Execution Log Model
+
+This module defines the ExecutionLog ORM model, an append-only store of
+agent log lines for executions.
+"""
+
+from datetime import datetime, timezone
+from sqlalchemy import Column, String, Text, DateTime, Index, ForeignKey, Integer
+
+from app.core.database import Base
+
+
+class ExecutionLog(Base):
+    """
+    Execution log entry.
+
+    Each execution's entries are numbered by a per-execution sequence, so
+    reads are index range scans on (execution_id, seq) regardless of how
+    many lines the execution has produced.
+
+    Attributes:
+        id: Row identifier
+        execution_id: Execution ID (FK to Execution)
+        seq: Per-execution sequence number, starting at 1
+        agent: Agent name
+        level: Log level (info, warning, error, debug)
+        message: Log message
+        timestamp: When the entry was logged
+    """
+
+    __tablename__ = "execution_logs"
+
+    # ========================================================================
+    # Primary Key
+    # ========================================================================
+
+    id = Column(
+        Integer,
+        primary_key=True,
+        autoincrement=True,
+        doc="Row identifier"
+    )
+
+    # ========================================================================
+    # Foreign Keys
+    # ========================================================================
+
+    execution_id = Column(
+        String,
+        ForeignKey("executions.id", ondelete="CASCADE"),
+        nullable=False,
+        doc="Execution ID"
+    )
+
+    # ========================================================================
+    # Log Fields
+    # ========================================================================
+
+    seq = Column(
+        Integer,
+        nullable=False,
+        doc="Per-execution sequence number"
+    )
+
+    agent = Column(
+        String(100),
+        nullable=False,
+        doc="Agent name"
+    )
+
+    level = Column(
+        String(20),
+        default="info",
+        nullable=False,
+        doc="Log level"
+    )
+
+    message = Column(
+        Text,
+        nullable=False,
+        doc="Log message"
+    )
+
+    timestamp = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+        doc="When the entry was logged"
+    )
+
+    # ========================================================================
+    # Indexes
+    # ========================================================================
+
+    __table_args__ = (
+        Index("idx_execution_log_execution_seq", "execution_id", "seq", unique=True),
+    )
+
+    # ========================================================================
+    # Methods
+    # ========================================================================
+
+    def __repr__(self) -> str:
+        """String representation of ExecutionLog."""
+        return f"<ExecutionLog(execution_id={self.execution_id}, seq={self.seq}, level={self.level})>"
+
+    def to_dict(self) -> dict:
+        """
+        Convert log entry to dictionary.
+
+        Returns:
+            dict: Log entry in the same shape as legacy agent_logs entries, plus seq
+        """
+        return {
+            "seq": self.seq,
+            "agent": self.agent,
+            "level": self.level,
+            "message": self.message,
+            "timestamp": self.timestamp.isoformat() if self.timestamp else None,
+        }
@@ -250,6 +250,42 @@ class AgentService:
         
         return AgentConfigResponse.from_attributes(config) if config else None
 
+    async def get_agent_configs_for_roles(
+        self,
+        user_id: str,
+        agent_roles: List[AgentRole],
+    ) -> Dict[AgentRole, AgentConfig]:
+        """
+        Get the configuration to use for each of several roles in one query.
+        
+        For each role the default configuration is preferred, otherwise the
+        first active one, as in get_agent_config_for_role.
+        
+        Args:
+            user_id: User ID
+            agent_roles: Agent roles
+            
+        Returns:
+            Dict[AgentRole, AgentConfig]: Configuration per role (roles without
+            an active configuration are omitted)
+        """
+        result = await self.db.execute(
+            select(AgentConfig)
+            .where(
+                and_(
+                    AgentConfig.user_id == user_id,
+                    AgentConfig.agent_role.in_(agent_roles),
+                    AgentConfig.is_active == True,
+                )
+            )
+            .order_by(AgentConfig.is_default.desc(), AgentConfig.created_at)
+        )
+        
+        configs: Dict[AgentRole, AgentConfig] = {}
+        for config in result.scalars():
+            configs.setdefault(config.agent_role, config)
+        return configs
+
     async def get_user_agent_configs(
         self,
         user_id: str,
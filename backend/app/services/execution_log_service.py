@@ -0,0 +1,244 @@
+"""
+Execution Log Service
+
+This module provides the append-only execution log store: writing log lines
+with per-execution sequence numbers and reading them back with cursor
+pagination, SQL-side filters and tailing.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.execution_log import ExecutionLog
+
+
+# Maximum entries returned by one read
+MAX_LOG_PAGE_SIZE = 1000
+
+
+@dataclass
+class LogPage:
+    """
+    One page of execution log entries.
+
+    Attributes:
+        entries: Entries in ascending sequence order
+        before: Cursor for the previous (older) page, or None at the start
+        after: Cursor for tailing newer entries (last seq seen)
+        has_more: Whether more entries exist in the direction read
+    """
+    entries: List[ExecutionLog]
+    before: Optional[int]
+    after: Optional[int]
+    has_more: bool
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert page to dictionary."""
+        return {
+            "logs": [entry.to_dict() for entry in self.entries],
+            "cursor": {"before": self.before, "after": self.after},
+            "has_more": self.has_more,
+        }
+
+
+# ============================================================================
+# Execution Log Service Class
+# ============================================================================
+
+class ExecutionLogService:
+    """
+    Service class for execution logs.
+
+    Sequence numbers are allocated from the current maximum for the
+    execution, which is a single index lookup. Each execution has one
+    writer (its agent manager), so allocation does not race in practice;
+    the unique (execution_id, seq) index rejects any collision.
+    """
+
+    def __init__(self, db: AsyncSession):
+        """
+        Initialize execution log service.
+
+        Args:
+            db: Database session
+        """
+        self.db = db
+
+    # ========================================================================
+    # Write Operations
+    # ========================================================================
+
+    async def append(
+        self,
+        execution_id: str,
+        agent: str,
+        message: str,
+        level: str = "info",
+        timestamp: Optional[datetime] = None,
+        commit: bool = True,
+    ) -> ExecutionLog:
+        """
+        Append one log entry.
+
+        Args:
+            execution_id: Execution ID
+            agent: Agent name
+            message: Log message
+            level: Log level (info, warning, error, debug)
+            timestamp: Optional timestamp (defaults to now)
+            commit: Whether to commit the session
+
+        Returns:
+            ExecutionLog: Created entry
+        """
+        entries = await self.append_many(
+            execution_id,
+            [{"agent": agent, "message": message, "level": level, "timestamp": timestamp}],
+            commit=commit,
+        )
+        return entries[0]
+
+    async def append_many(
+        self,
+        execution_id: str,
+        logs: List[Dict[str, Any]],
+        commit: bool = True,
+    ) -> List[ExecutionLog]:
+        """
+        Append several log entries with consecutive sequence numbers.
+
+        Args:
+            execution_id: Execution ID
+            logs: Entries with agent, message and optional level/timestamp
+            commit: Whether to commit the session
+
+        Returns:
+            List[ExecutionLog]: Created entries
+        """
+        seq = await self.last_seq(execution_id)
+        entries = []
+        for log in logs:
+            seq += 1
+            entry = ExecutionLog(
+                execution_id=execution_id,
+                seq=seq,
+                agent=log.get("agent") or "system",
+                level=log.get("level") or "info",
+                message=log.get("message", ""),
+            )
+            timestamp = log.get("timestamp")
+            if isinstance(timestamp, str):
+                timestamp = datetime.fromisoformat(timestamp)
+            if timestamp:
+                entry.timestamp = timestamp
+            entries.append(entry)
+
+        self.db.add_all(entries)
+        if commit:
+            await self.db.commit()
+        else:
+            await self.db.flush()
+        return entries
+
+    # ========================================================================
+    # Read Operations
+    # ========================================================================
+
+    async def last_seq(self, execution_id: str) -> int:
+        """
+        Get the highest sequence number of an execution.
+
+        Args:
+            execution_id: Execution ID
+
+        Returns:
+            int: Last sequence number (0 if the execution has no logs)
+        """
+        result = await self.db.execute(
+            select(func.max(ExecutionLog.seq)).where(ExecutionLog.execution_id == execution_id)
+        )
+        return result.scalar() or 0
+
+    async def get_logs(
+        self,
+        execution_id: str,
+        limit: int = 100,
+        before: Optional[int] = None,
+        after: Optional[int] = None,
+        agent: Optional[str] = None,
+        level: Optional[str] = None,
+    ) -> LogPage:
+        """
+        Read a page of log entries.
+
+        Without a cursor the newest `limit` entries are returned. `before`
+        pages backwards through older entries; `after` tails entries newer
+        than a sequence number, oldest first.
+
+        Args:
+            execution_id: Execution ID
+            limit: Max entries to return
+            before: Return entries with seq below this cursor
+            after: Return entries with seq above this cursor
+            agent: Only entries from this agent
+            level: Only entries with this level
+
+        Returns:
+            LogPage: Entries in ascending seq order with cursors
+        """
+        limit = max(1, min(limit, MAX_LOG_PAGE_SIZE))
+        query = select(ExecutionLog).where(ExecutionLog.execution_id == execution_id)
+
+        if agent:
+            query = query.where(ExecutionLog.agent == agent)
+        if level:
+            query = query.where(ExecutionLog.level == level)
+
+        tailing = after is not None
+        if tailing:
+            query = query.where(ExecutionLog.seq > after).order_by(ExecutionLog.seq.asc())
+        else:
+            if before is not None:
+                query = query.where(ExecutionLog.seq < before)
+            query = query.order_by(ExecutionLog.seq.desc())
+
+        # Fetch one extra row to learn whether another page exists
+        result = await self.db.execute(query.limit(limit + 1))
+        entries = list(result.scalars().all())
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+        if not tailing:
+            entries.reverse()
+
+        if entries:
+            first_seq, last_seq = entries[0].seq, entries[-1].seq
+        else:
+            first_seq, last_seq = None, after if tailing else None
+
+        return LogPage(
+            entries=entries,
+            before=first_seq if has_more and not tailing else None,
+            after=last_seq,
+            has_more=has_more,
+        )
+
+
+# ============================================================================
+# Service Factory Function
+# ============================================================================
+
+def get_execution_log_service(db: AsyncSession) -> ExecutionLogService:
+    """
+    Factory function to create an ExecutionLogService instance.
+
+    Args:
+        db: Database session
+
+    Returns:
+        ExecutionLogService: Service instance
+    """
+    return ExecutionLogService(db)
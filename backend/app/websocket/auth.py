@@ -0,0 +1,251 @@
+"""
+WebSocket Handshake Authentication
+
+This module authenticates WebSocket handshakes with as few round trips as
+possible, since reconnect storms (e.g. after a deploy) repeat the handshake
+for every client at once:
+
+- Token and user-level revocation are checked in one pipelined Redis call
+- The user and, for project sockets, project ownership are fetched in one
+  joined query, concurrently with the revocation check
+- Results are cached briefly per token, and concurrent handshakes for the
+  same token share one lookup
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, select
+
+from app.core.config import Settings, settings as default_settings
+from app.core.security import verify_token
+from app.core.token_blacklist import TokenBlacklistService, token_blacklist
+from app.models.project import Project
+from app.models.user import User
+
+
+logger = logging.getLogger(__name__)
+
+
+class HandshakeResult(NamedTuple):
+    """
+    Outcome of a handshake authentication.
+
+    Attributes:
+        user: Authenticated user, or None if rejected
+        error: Close reason when rejected
+    """
+    user: Optional[User]
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        """Whether the handshake was accepted."""
+        return self.user is not None
+
+
+class WebSocketAuthenticator:
+    """
+    Authenticates WebSocket handshakes with a short per-token result cache.
+
+    Cached users are detached ORM instances and are only read (id, flags).
+    A revocation takes effect for cached tokens once the entry expires, so
+    the cache TTL should stay at a few seconds.
+    """
+
+    def __init__(
+        self,
+        settings: Settings = default_settings,
+        session_factory: Optional[Any] = None,
+        blacklist: Optional[TokenBlacklistService] = None,
+    ):
+        """
+        Initialize authenticator.
+
+        Args:
+            settings: Application settings
+            session_factory: Async session factory (defaults to AsyncSessionLocal)
+            blacklist: Token blacklist (defaults to the global instance)
+        """
+        if session_factory is None:
+            from app.core.database import AsyncSessionLocal
+            session_factory = AsyncSessionLocal
+
+        self.session_factory = session_factory
+        self.blacklist = blacklist or token_blacklist
+        self.ttl = settings.websocket_auth_cache_seconds
+        self.max_entries = settings.websocket_auth_cache_size
+
+        self._cache: "OrderedDict[Tuple[str, Optional[str]], Tuple[float, HandshakeResult]]" = OrderedDict()
+        self._pending: Dict[Tuple[str, Optional[str]], asyncio.Task] = {}
+
+        self.metrics = {
+            "total_handshakes": 0,
+            "cache_hits": 0,
+            "coalesced": 0,
+            "total_lookups": 0,
+            "total_rejected": 0,
+        }
+
+    async def authenticate(self, token: str, project_id: Optional[str] = None) -> HandshakeResult:
+        """
+        Authenticate a handshake token, optionally checking project ownership.
+
+        Args:
+            token: JWT token from the handshake
+            project_id: Project the socket is scoped to (optional)
+
+        Returns:
+            HandshakeResult with the user, or the close reason
+        """
+        self.metrics["total_handshakes"] += 1
+
+        payload = verify_token(token)
+        user_id = payload.get("sub") if payload else None
+        if not user_id:
+            return self._reject("Invalid token")
+
+        key = (hashlib.sha256(token.encode()).hexdigest(), project_id)
+
+        cached = self._cache.get(key)
+        if cached is not None:
+            expires_at, result = cached
+            if expires_at > time.monotonic():
+                self._cache.move_to_end(key)
+                self.metrics["cache_hits"] += 1
+                return self._count(result)
+            del self._cache[key]
+
+        # Share one lookup between concurrent handshakes with the same token
+        task = self._pending.get(key)
+        if task is not None:
+            self.metrics["coalesced"] += 1
+        else:
+            task = asyncio.create_task(self._lookup(key, token, user_id, project_id))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+
+        # Shielded so a client that goes away does not cancel the shared lookup
+        result = await asyncio.shield(task)
+        return self._count(result)
+
+    def invalidate(self, token: Optional[str] = None) -> None:
+        """
+        Drop cached results.
+
+        Args:
+            token: Only drop results for this token (all results if omitted)
+        """
+        if token is None:
+            self._cache.clear()
+            return
+
+        token_hash = hashlib.sha256(token.encode()).hexdigest()
+        for key in [k for k in self._cache if k[0] == token_hash]:
+            del self._cache[key]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get authenticator metrics."""
+        return {**self.metrics, "cached_entries": len(self._cache)}
+
+    # ========================================================================
+    # Internals
+    # ========================================================================
+
+    async def _lookup(
+        self,
+        key: Tuple[str, Optional[str]],
+        token: str,
+        user_id: str,
+        project_id: Optional[str],
+    ) -> HandshakeResult:
+        """Run the revocation check and the user/project query concurrently, and cache the result."""
+        self.metrics["total_lookups"] += 1
+
+        (token_revoked, user_revoked), (user, owned_project_id) = await asyncio.gather(
+            self.blacklist.check_revocation(token, user_id),
+            self._fetch_user(user_id, project_id),
+        )
+
+        if token_revoked:
+            result = HandshakeResult(None, "Token has been revoked")
+        elif user_revoked:
+            result = HandshakeResult(None, "All user tokens revoked")
+        elif user is None or not user.is_active:
+            result = HandshakeResult(None, "Invalid token")
+        elif project_id is not None and owned_project_id is None:
+            result = HandshakeResult(None, "Project not found")
+        else:
+            result = HandshakeResult(user)
+
+        self._store(key, result)
+        return result
+
+    async def _fetch_user(self, user_id: str, project_id: Optional[str]) -> Tuple[Optional[User], Optional[str]]:
+        """
+        Fetch a user and, if requested, the id of a project they own.
+
+        Args:
+            user_id: User ID
+            project_id: Project ID to check ownership of (optional)
+
+        Returns:
+            Tuple of (user or None, project id if owned by the user else None)
+        """
+        if project_id is None:
+            query = select(User)
+        else:
+            query = select(User, Project.id).outerjoin(
+                Project,
+                and_(Project.id == project_id, Project.owner_id == User.id),
+            )
+
+        async with self.session_factory() as db:
+            result = await db.execute(query.where(User.id == user_id))
+            row = result.first()
+
+        if row is None:
+            return None, None
+        return row[0], row[1] if project_id is not None else None
+
+    def _store(self, key: Tuple[str, Optional[str]], result: HandshakeResult) -> None:
+        """Cache a result, evicting the least recently used entries."""
+        if self.ttl <= 0:
+            return
+        self._cache[key] = (time.monotonic() + self.ttl, result)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def _reject(self, error: str) -> HandshakeResult:
+        """Build and count a rejection."""
+        return self._count(HandshakeResult(None, error))
+
+    def _count(self, result: HandshakeResult) -> HandshakeResult:
+        """Count rejections."""
+        if not result.ok:
+            self.metrics["total_rejected"] += 1
+        return result
+
+
+# Global authenticator instance
+_authenticator: Optional[WebSocketAuthenticator] = None
+
+
+def get_websocket_authenticator() -> WebSocketAuthenticator:
+    """
+    Get or create global WebSocket authenticator instance.
+
+    Returns:
+        WebSocketAuthenticator instance
+    """
+    global _authenticator
+
+    if _authenticator is None:
+        _authenticator = WebSocketAuthenticator()
+
+    return _authenticator
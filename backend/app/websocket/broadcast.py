@@ -8,16 +8,22 @@ Features:
 - Broadcast agent updates to project participants
 - Event-based notification system
 - Targeted delivery to users and projects
-- Retry logic for failed deliveries
-- Event queuing and batching
+- Retry logic for relays to other cluster nodes that fail
+- Event queuing and batching: broadcast_* calls only enqueue; a background
+  dispatcher delivers queued events grouped per project
 - Metrics and monitoring
 """
 
+import asyncio
 import logging
-from typing import Any, Dict, List, Optional
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
 from datetime import datetime
 from enum import Enum
 
+from app.core.config import settings
+from app.core.metrics import TopKCounter, get_metrics_registry
 from app.websocket.connection_manager import get_connection_manager
 from app.metagpt_integration.streaming import (
     get_streaming_handler,
@@ -107,23 +113,240 @@ class BroadcastEvent:
         }
 
 
+# Queued broadcast: (event, exclude_user_id, monotonic enqueue time)
+QueuedBroadcast = Tuple[BroadcastEvent, Optional[str], float]
+
+
 class BroadcastManager:
     """
     Manages broadcasting of events to connected WebSocket clients.
     
     Handles event routing, delivery, and retry logic.
+
+    Broadcasting never waits on delivery: events are put on a bounded queue
+    and a dispatcher task delivers them. The dispatcher collects events for
+    up to batch_window_ms, groups them by project and hands each group to
+    the connection manager in one call. Local delivery only queues frames
+    and cannot fail; when a cluster relay is attached, a group whose publish
+    to other nodes fails is re-published with exponential backoff, up to
+    max_retries times, and may reach those nodes after newer events for the
+    same project.
     """
 
-    def __init__(self):
-        """Initialize broadcast manager."""
+    def __init__(
+        self,
+        queue_size: int = settings.broadcast_queue_size,
+        batch_window_ms: int = settings.broadcast_batch_window_ms,
+        max_batch_size: int = settings.broadcast_max_batch_size,
+        max_retries: int = settings.broadcast_max_retries,
+        retry_backoff_ms: int = settings.broadcast_retry_backoff_ms,
+    ):
+        """
+        Initialize broadcast manager.
+
+        Args:
+            queue_size: Max events waiting for the dispatcher
+            batch_window_ms: How long the dispatcher collects events per batch
+            max_batch_size: Max events per dispatcher batch
+            max_retries: Relay attempts after the first before a group is dropped
+            retry_backoff_ms: Delay before the first relay retry (doubled per attempt)
+        """
+        self.batch_window_ms = batch_window_ms
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        self.retry_backoff_ms = retry_backoff_ms
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._dispatcher_task: Optional[asyncio.Task] = None
+        self._retry_tasks: Set[asyncio.Task] = set()
         self.metrics = {
             "total_broadcasts": 0,
             "successful_broadcasts": 0,
             "failed_broadcasts": 0,
+            "dropped_broadcasts": 0,
+            "retried_broadcasts": 0,
+            "total_batches": 0,
             "total_messages_sent": 0,
             "broadcasts_by_type": {},
-            "broadcasts_by_project": {},
         }
+        # Per-project counts, bounded to the busiest projects
+        self.project_counts = TopKCounter(settings.metrics_top_k)
+        self.dispatch_latency = get_metrics_registry().histogram(
+            "broadcast_dispatch_latency_seconds",
+            "Time from broadcast enqueue to hand-off to the connection manager",
+        )
+
+    def start(self) -> None:
+        """Start the dispatcher task if it is not running."""
+        if self._dispatcher_task is None or self._dispatcher_task.done():
+            self._dispatcher_task = asyncio.create_task(self._dispatch_loop())
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """
+        Deliver queued events and stop the dispatcher.
+
+        Args:
+            timeout: Max seconds to wait for the queue to drain
+        """
+        for task in list(self._retry_tasks):
+            task.cancel()
+
+        if self._dispatcher_task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self._queue.qsize()} undelivered broadcast(s) on shutdown")
+        self._dispatcher_task.cancel()
+        try:
+            await self._dispatcher_task
+        except asyncio.CancelledError:
+            pass
+        self._dispatcher_task = None
+
+    def enqueue(
+        self,
+        event: BroadcastEvent,
+        exclude_user_id: Optional[str] = None,
+    ) -> bool:
+        """
+        Queue an event for delivery without waiting.
+
+        Args:
+            event: Event to broadcast
+            exclude_user_id: User to exclude from broadcast (optional)
+
+        Returns:
+            True if queued, False if the queue is full and the event was dropped
+        """
+        self.start()
+        try:
+            self._queue.put_nowait((event, exclude_user_id, time.monotonic()))
+            return True
+        except asyncio.QueueFull:
+            self.metrics["dropped_broadcasts"] += 1
+            logger.warning(
+                f"Broadcast queue full, dropping {event.event_type.value} "
+                f"for project {event.project_id}"
+            )
+            return False
+
+    async def _dispatch_loop(self) -> None:
+        """Collect queued events into batches and deliver them."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[QueuedBroadcast] = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window_ms / 1000
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._deliver_batch(batch)
+            except Exception as e:
+                logger.error(f"Error dispatching broadcasts: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _deliver_batch(self, batch: List[QueuedBroadcast]) -> None:
+        """
+        Deliver a batch of events, one connection manager call per project.
+
+        Args:
+            batch: Queued events in enqueue order
+        """
+        groups: "OrderedDict[Tuple[str, Optional[str]], List[QueuedBroadcast]]" = OrderedDict()
+        for item in batch:
+            event, exclude_user_id, _ = item
+            groups.setdefault((event.project_id, exclude_user_id), []).append(item)
+
+        conn_manager = get_connection_manager()
+        self.metrics["total_batches"] += 1
+
+        for (project_id, exclude_user_id), items in groups.items():
+            messages = [event.to_dict() for event, _, _ in items]
+            sent_count = conn_manager.send_many_to_project_local(
+                project_id, messages, exclude_user_id=exclude_user_id,
+            )
+
+            now = time.monotonic()
+            for _, _, enqueued_at in items:
+                self.dispatch_latency.observe(now - enqueued_at)
+
+            self.metrics["total_messages_sent"] += sent_count
+            if sent_count > 0:
+                self.metrics["successful_broadcasts"] += len(items)
+                logger.debug(
+                    f"Broadcast {len(items)} event(s) as {sent_count} message(s) "
+                    f"for project {project_id}"
+                )
+            else:
+                self.metrics["failed_broadcasts"] += len(items)
+                logger.debug(f"No clients received {len(items)} broadcast(s) for project {project_id}")
+
+            if conn_manager.cluster is not None:
+                await self._relay(project_id, messages, exclude_user_id)
+
+    async def _relay(
+        self,
+        project_id: str,
+        messages: List[Dict[str, Any]],
+        exclude_user_id: Optional[str],
+        attempt: int = 0,
+    ) -> None:
+        """Publish a group to other cluster nodes, scheduling a retry if that fails."""
+        cluster = get_connection_manager().cluster
+        if cluster is None:
+            return
+
+        try:
+            await cluster.publish_to_project(
+                project_id, messages, exclude_user_id, many=True, raise_errors=True,
+            )
+        except Exception as e:
+            logger.warning(f"Broadcast relay for project {project_id} failed: {e}")
+            self._schedule_retry(project_id, messages, exclude_user_id, attempt)
+
+    def _schedule_retry(
+        self,
+        project_id: str,
+        messages: List[Dict[str, Any]],
+        exclude_user_id: Optional[str],
+        attempt: int,
+    ) -> None:
+        """Re-publish a failed relay after a backoff, or drop it once retries are exhausted."""
+        if attempt >= self.max_retries:
+            self.metrics["failed_broadcasts"] += len(messages)
+            logger.error(
+                f"Giving up relaying {len(messages)} broadcast(s) for project {project_id} "
+                f"after {attempt + 1} attempt(s)"
+            )
+            return
+
+        self.metrics["retried_broadcasts"] += len(messages)
+        delay = self.retry_backoff_ms * (2 ** attempt) / 1000
+        task = asyncio.create_task(
+            self._retry_after(delay, project_id, messages, exclude_user_id, attempt + 1)
+        )
+        self._retry_tasks.add(task)
+        task.add_done_callback(self._retry_tasks.discard)
+
+    async def _retry_after(
+        self,
+        delay: float,
+        project_id: str,
+        messages: List[Dict[str, Any]],
+        exclude_user_id: Optional[str],
+        attempt: int,
+    ) -> None:
+        """Re-publish a relay once its retry backoff has elapsed."""
+        await asyncio.sleep(delay)
+        await self._relay(project_id, messages, exclude_user_id, attempt)
 
     async def broadcast_agent_update(
         self,
@@ -137,6 +360,9 @@ class BroadcastManager:
         """
         Broadcast an agent update to all connected clients of a project.
         
+        Returns as soon as the event is queued; delivery happens in the
+        background dispatcher.
+        
         Args:
             project_id: Project ID
             event_type: Type of event
@@ -146,7 +372,7 @@ class BroadcastManager:
             exclude_user_id: User to exclude from broadcast (optional)
             
         Returns:
-            Number of messages sent successfully
+            1 if the event was queued, 0 if it was dropped
         """
         try:
             # Create broadcast event
@@ -158,40 +384,18 @@ class BroadcastManager:
                 user_id=user_id,
             )
 
-            # Get connection manager
-            conn_manager = get_connection_manager()
-
-            # Send to project
-            message = event.to_dict()
-            sent_count = await conn_manager.send_to_project(
-                project_id,
-                message,
-                exclude_user_id=exclude_user_id,
-            )
+            # Queue for the dispatcher
+            if not self.enqueue(event, exclude_user_id):
+                return 0
 
             # Update metrics
             self.metrics["total_broadcasts"] += 1
             event_type_key = event_type.value
             self.metrics["broadcasts_by_type"][event_type_key] = \
                 self.metrics["broadcasts_by_type"].get(event_type_key, 0) + 1
-            self.metrics["broadcasts_by_project"][project_id] = \
-                self.metrics["broadcasts_by_project"].get(project_id, 0) + 1
-            self.metrics["total_messages_sent"] += sent_count
+            self.project_counts.add(project_id)
 
-            if sent_count > 0:
-                self.metrics["successful_broadcasts"] += 1
-                logger.debug(
-                    f"Broadcast {event_type.value} to {sent_count} client(s) "
-                    f"for project {project_id}"
-                )
-            else:
-                self.metrics["failed_broadcasts"] += 1
-                logger.warning(
-                    f"No clients received broadcast {event_type.value} "
-                    f"for project {project_id}"
-                )
-
-            return sent_count
+            return 1
 
         except Exception as e:
             logger.error(f"Error broadcasting agent update: {e}")
@@ -215,7 +419,7 @@ class BroadcastManager:
             user_id: User who started execution (optional)
             
         Returns:
-            Number of messages sent
+            1 if the event was queued, 0 if it was dropped
         """
         return await self.broadcast_agent_update(
             project_id=project_id,
@@ -248,7 +452,7 @@ class BroadcastManager:
             message: Optional progress message
             
         Returns:
-            Number of messages sent
+            1 if the event was queued, 0 if it was dropped
         """
         return await self.broadcast_agent_update(
             project_id=project_id,
@@ -277,7 +481,7 @@ class BroadcastManager:
             result: Execution result (optional)
             
         Returns:
-            Number of messages sent
+            1 if the event was queued, 0 if it was dropped
         """
         return await self.broadcast_agent_update(
             project_id=project_id,
@@ -307,7 +511,7 @@ class BroadcastManager:
             error_type: Type of error
             
         Returns:
-            Number of messages sent
+            1 if the event was queued, 0 if it was dropped
         """
         return await self.broadcast_agent_update(
             project_id=project_id,
@@ -334,7 +538,7 @@ class BroadcastManager:
             execution_id: Execution ID
             
         Returns:
-            Number of messages sent
+            1 if the event was queued, 0 if it was dropped
         """
         return await self.broadcast_agent_update(
             project_id=project_id,
@@ -365,7 +569,7 @@ class BroadcastManager:
             source: Source of log
             
         Returns:
-            Number of messages sent
+            1 if the event was queued, 0 if it was dropped
         """
         return await self.broadcast_agent_update(
             project_id=project_id,
@@ -394,7 +598,7 @@ class BroadcastManager:
             logs: List of log entries
             
         Returns:
-            Number of messages sent
+            1 if the event was queued, 0 if it was dropped
         """
         return await self.broadcast_agent_update(
             project_id=project_id,
@@ -424,7 +628,7 @@ class BroadcastManager:
             content: File content (optional)
             
         Returns:
-            Number of messages sent
+            1 if the event was queued, 0 if it was dropped
         """
         return await self.broadcast_agent_update(
             project_id=project_id,
@@ -454,7 +658,7 @@ class BroadcastManager:
             content: File content (optional)
             
         Returns:
-            Number of messages sent
+            1 if the event was queued, 0 if it was dropped
         """
         return await self.broadcast_agent_update(
             project_id=project_id,
@@ -482,7 +686,7 @@ class BroadcastManager:
             file_path: Path to deleted file
             
         Returns:
-            Number of messages sent
+            1 if the event was queued, 0 if it was dropped
         """
         return await self.broadcast_agent_update(
             project_id=project_id,
@@ -511,7 +715,7 @@ class BroadcastManager:
             details: Optional status details
             
         Returns:
-            Number of messages sent
+            1 if the event was queued, 0 if it was dropped
         """
         return await self.broadcast_agent_update(
             project_id=project_id,
@@ -541,7 +745,7 @@ class BroadcastManager:
             error_type: Type of error
             
         Returns:
-            Number of messages sent
+            1 if the event was queued, 0 if it was dropped
         """
         return await self.broadcast_agent_update(
             project_id=project_id,
@@ -569,7 +773,7 @@ class BroadcastManager:
             warning_message: Warning message
             
         Returns:
-            Number of messages sent
+            1 if the event was queued, 0 if it was dropped
         """
         return await self.broadcast_agent_update(
             project_id=project_id,
@@ -590,6 +794,9 @@ class BroadcastManager:
         """
         return {
             **self.metrics,
+            "queued_broadcasts": self._queue.qsize(),
+            "broadcasts_by_project": self.project_counts.as_dict(),
+            "dispatch_latency_seconds": self.dispatch_latency.snapshot(),
             "success_rate": (
                 self.metrics["successful_broadcasts"] / max(1, self.metrics["total_broadcasts"])
                 * 100
@@ -602,10 +809,13 @@ class BroadcastManager:
             "total_broadcasts": 0,
             "successful_broadcasts": 0,
             "failed_broadcasts": 0,
+            "dropped_broadcasts": 0,
+            "retried_broadcasts": 0,
+            "total_batches": 0,
             "total_messages_sent": 0,
             "broadcasts_by_type": {},
-            "broadcasts_by_project": {},
         }
+        self.project_counts.reset()
         logger.info("Broadcast metrics reset")
 
 
@@ -629,6 +839,16 @@ def get_broadcast_manager() -> BroadcastManager:
     return _broadcast_manager
 
 
+async def close_broadcast_manager() -> None:
+    """Flush and close global broadcast manager instance."""
+    global _broadcast_manager
+
+    if _broadcast_manager:
+        await _broadcast_manager.stop()
+        _broadcast_manager = None
+        logger.info("Broadcast manager closed")
+
+
 # Convenience functions for common broadcast operations
 
 async def broadcast_agent_update(
@@ -651,7 +871,7 @@ async def broadcast_agent_update(
         exclude_user_id: User to exclude from broadcast (optional)
         
     Returns:
-        Number of messages sent successfully
+        1 if the event was queued, 0 if it was dropped
     """
     manager = get_broadcast_manager()
     return await manager.broadcast_agent_update(
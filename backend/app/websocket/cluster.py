@@ -0,0 +1,472 @@
+"""
+WebSocket Cluster Relay Module
+
+This module lets several API processes behind a load balancer deliver
+targeted WebSocket messages to connections held by other processes.
+
+Each process (node) registers in Redis which users and projects it currently
+holds connections for, and listens on its own inbox channel. A targeted send
+looks up the nodes holding the target and publishes the message only to
+those nodes' inboxes, so traffic is not fanned out to the whole cluster.
+
+Redis layout:
+- ``ws:presence:user:{user_id}``: set of node ids with connections for the user
+- ``ws:presence:project:{project_id}``: set of node ids with connections for the project
+- ``ws:inbox:{node_id}``: pub/sub channel for messages routed to a node
+- ``ws:broadcast``: pub/sub channel for cluster-wide broadcasts
+
+Presence entries are added when a node gets its first local connection for a
+user or project and removed when the last one closes. Entries left behind by
+a crashed node are pruned the first time a publish to its inbox reaches no
+subscriber. A periodic refresh re-announces all local presence.
+
+If the subscription connection drops, the node resubscribes with exponential
+backoff and re-announces its presence once the inbox is listening again.
+"""
+
+import asyncio
+import json
+import logging
+import socket
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional
+from uuid import uuid4
+
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    from app.websocket.connection_manager import ConnectionInfo, ConnectionManager
+
+
+logger = logging.getLogger(__name__)
+
+
+class ClusterRelay:
+    """
+    Routes targeted WebSocket messages between nodes through Redis.
+
+    Attached to a ConnectionManager, which calls connection_added and
+    connection_removed to maintain presence, and publish_* after local
+    delivery to reach connections on other nodes.
+    """
+
+    def __init__(
+        self,
+        manager: "ConnectionManager",
+        redis_url: str = settings.redis_url,
+        node_id: Optional[str] = None,
+        refresh_interval: float = settings.websocket_cluster_presence_refresh_seconds,
+        prefix: str = "ws:",
+        redis_client: Optional[aioredis.Redis] = None,
+        resubscribe_backoff_ms: int = settings.websocket_cluster_resubscribe_backoff_ms,
+        max_resubscribe_backoff_ms: int = settings.websocket_cluster_resubscribe_max_backoff_ms,
+    ):
+        """
+        Initialize cluster relay.
+
+        Args:
+            manager: Local connection manager
+            redis_url: Redis URL for presence and pub/sub
+            node_id: Unique id of this node (generated if omitted)
+            refresh_interval: Seconds between presence refreshes
+            prefix: Redis key prefix
+            redis_client: Existing Redis client to use instead of redis_url
+            resubscribe_backoff_ms: Delay before the first resubscribe attempt (doubled per attempt)
+            max_resubscribe_backoff_ms: Upper bound for the resubscribe delay
+        """
+        self.manager = manager
+        self.redis_url = redis_url
+        self.node_id = node_id or f"{socket.gethostname()}-{uuid4().hex[:8]}"
+        self.refresh_interval = refresh_interval
+        self.prefix = prefix
+        self.resubscribe_backoff_ms = resubscribe_backoff_ms
+        self.max_resubscribe_backoff_ms = max_resubscribe_backoff_ms
+        self.redis: Optional[aioredis.Redis] = redis_client
+        self.inbox_channel = f"{prefix}inbox:{self.node_id}"
+        self.broadcast_channel = f"{prefix}broadcast"
+        self._pubsub = None
+        self._listener_task: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.metrics = {
+            "total_published": 0,
+            "total_received": 0,
+            "total_stale_nodes_pruned": 0,
+            "total_resubscribes": 0,
+            "total_errors": 0,
+        }
+
+    def _user_key(self, user_id: str) -> str:
+        return f"{self.prefix}presence:user:{user_id}"
+
+    def _project_key(self, project_id: str) -> str:
+        return f"{self.prefix}presence:project:{project_id}"
+
+    def _inbox(self, node_id: str) -> str:
+        return f"{self.prefix}inbox:{node_id}"
+
+    async def start(self) -> None:
+        """Connect to Redis, subscribe to this node's inbox and announce presence."""
+        if self.redis is None:
+            self.redis = aioredis.from_url(self.redis_url, decode_responses=True)
+        await self.redis.ping()
+
+        await self._subscribe()
+        self._listener_task = asyncio.create_task(self._listen())
+
+        await self.refresh_presence()
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
+        logger.info(f"Cluster relay started for node {self.node_id}")
+
+    async def stop(self) -> None:
+        """Withdraw this node's presence and stop listening."""
+        for task in (self._refresh_task, self._listener_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._refresh_task = self._listener_task = None
+
+        registry = self.manager.registry
+        await self._update_presence(list(registry.by_user), list(registry.by_project), add=False)
+
+        await self._close_pubsub()
+        if self.redis is not None:
+            await self.redis.close()
+            self.redis = None
+        logger.info(f"Cluster relay stopped for node {self.node_id}")
+
+    # ========================================================================
+    # Presence
+    # ========================================================================
+
+    async def connection_added(self, conn_info: "ConnectionInfo", new_user: bool, new_project: bool) -> None:
+        """
+        Announce presence for a connection's user/project if it is the node's first.
+
+        Args:
+            conn_info: Newly registered connection
+            new_user: Whether this is the node's first connection for the user
+            new_project: Whether this is the node's first connection for the project
+        """
+        await self._update_presence(
+            [conn_info.user_id] if new_user else [],
+            [conn_info.project_id] if new_project and conn_info.project_id else [],
+            add=True,
+        )
+
+    async def connection_removed(self, conn_info: "ConnectionInfo", last_user: bool, last_project: bool) -> None:
+        """
+        Withdraw presence for a connection's user/project if it was the node's last.
+
+        Args:
+            conn_info: Removed connection
+            last_user: Whether the node has no more connections for the user
+            last_project: Whether the node has no more connections for the project
+        """
+        await self._update_presence(
+            [conn_info.user_id] if last_user else [],
+            [conn_info.project_id] if last_project and conn_info.project_id else [],
+            add=False,
+        )
+
+    async def projects_changed(
+        self,
+        added: Iterable[str] = (),
+        removed: Iterable[str] = (),
+    ) -> None:
+        """
+        Update presence for projects a connection joined or left after connecting.
+
+        Args:
+            added: Projects the node now holds a connection for
+            removed: Projects the node no longer holds any connection for
+        """
+        added, removed = list(added), list(removed)
+        if added:
+            await self._update_presence([], added, add=True)
+        if removed:
+            await self._update_presence([], removed, add=False)
+
+    async def refresh_presence(self) -> None:
+        """Re-announce presence for every user and project held by this node."""
+        registry = self.manager.registry
+        await self._update_presence(list(registry.by_user), list(registry.by_project), add=True)
+
+    async def _update_presence(self, user_ids: Iterable[str], project_ids: Iterable[str], add: bool) -> None:
+        """Add or remove this node from the presence sets of users and projects."""
+        keys = [self._user_key(u) for u in user_ids] + [self._project_key(p) for p in project_ids]
+        if not keys or self.redis is None:
+            return
+
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    if add:
+                        pipe.sadd(key, self.node_id)
+                    else:
+                        pipe.srem(key, self.node_id)
+                await pipe.execute()
+        except Exception as e:
+            self.metrics["total_errors"] += 1
+            logger.error(f"Failed to update cluster presence: {e}")
+
+    async def _refresh_loop(self) -> None:
+        """Periodically re-announce presence."""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self.refresh_presence()
+
+    # ========================================================================
+    # Routing
+    # ========================================================================
+
+    async def publish_to_user(
+        self,
+        user_id: str,
+        data: Dict,
+        exclude_connection_id: Optional[str] = None,
+    ) -> int:
+        """
+        Relay a message to other nodes holding connections for a user.
+
+        Returns:
+            Number of nodes the message was delivered to
+        """
+        return await self._publish_targeted(self._user_key(user_id), {
+            "scope": "user",
+            "target": user_id,
+            "data": data,
+            "exclude_connection_id": exclude_connection_id,
+        })
+
+    async def publish_to_project(
+        self,
+        project_id: str,
+        data: Any,
+        exclude_user_id: Optional[str] = None,
+        many: bool = False,
+        raise_errors: bool = False,
+    ) -> int:
+        """
+        Relay a message to other nodes holding connections for a project.
+
+        Args:
+            project_id: Project identifier
+            data: Message, or list of messages when many is set
+            exclude_user_id: User to exclude (optional)
+            many: Relay a list of messages in one publish
+            raise_errors: Re-raise Redis errors (after logging them) so the
+                caller can retry, instead of returning 0
+
+        Returns:
+            Number of nodes the message was delivered to
+        """
+        return await self._publish_targeted(self._project_key(project_id), {
+            "scope": "project",
+            "target": project_id,
+            "data": data,
+            "many": many,
+            "exclude_user_id": exclude_user_id,
+        }, raise_errors=raise_errors)
+
+    async def publish_broadcast(
+        self,
+        data: Dict,
+        exclude_user_id: Optional[str] = None,
+        exclude_connection_id: Optional[str] = None,
+    ) -> int:
+        """
+        Relay a broadcast to all other nodes.
+
+        Returns:
+            Number of nodes subscribed to the broadcast channel (including this one)
+        """
+        if self.redis is None:
+            return 0
+        envelope = {
+            "origin": self.node_id,
+            "scope": "broadcast",
+            "data": data,
+            "exclude_user_id": exclude_user_id,
+            "exclude_connection_id": exclude_connection_id,
+        }
+        try:
+            receivers = await self.redis.publish(self.broadcast_channel, json.dumps(envelope))
+            self.metrics["total_published"] += 1
+            return receivers
+        except Exception as e:
+            self.metrics["total_errors"] += 1
+            logger.error(f"Failed to relay broadcast: {e}")
+            return 0
+
+    async def _publish_targeted(
+        self,
+        presence_key: str,
+        envelope: Dict[str, Any],
+        raise_errors: bool = False,
+    ) -> int:
+        """Publish an envelope to the inbox of every other node in a presence set."""
+        if self.redis is None:
+            return 0
+
+        try:
+            nodes: List[str] = [n for n in await self.redis.smembers(presence_key) if n != self.node_id]
+            if not nodes:
+                return 0
+
+            envelope["origin"] = self.node_id
+            payload = json.dumps(envelope)
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for node in nodes:
+                    pipe.publish(self._inbox(node), payload)
+                receivers = await pipe.execute()
+
+            # A node with no inbox subscriber is gone; prune it from the set
+            stale = [node for node, count in zip(nodes, receivers) if not count]
+            if stale:
+                await self.redis.srem(presence_key, *stale)
+                self.metrics["total_stale_nodes_pruned"] += len(stale)
+                logger.info(f"Pruned stale nodes {stale} from {presence_key}")
+
+            delivered = len(nodes) - len(stale)
+            self.metrics["total_published"] += delivered
+            return delivered
+        except Exception as e:
+            self.metrics["total_errors"] += 1
+            logger.error(f"Failed to relay message for {presence_key}: {e}")
+            if raise_errors:
+                raise
+            return 0
+
+    async def _subscribe(self) -> None:
+        """Open a subscription to this node's inbox and the broadcast channel."""
+        self._pubsub = self.redis.pubsub()
+        await self._pubsub.subscribe(self.inbox_channel, self.broadcast_channel)
+
+    async def _close_pubsub(self) -> None:
+        """Close the current subscription, if any."""
+        if self._pubsub is None:
+            return
+        try:
+            await self._pubsub.unsubscribe()
+            await self._pubsub.close()
+        except Exception as e:
+            logger.warning(f"Error closing cluster relay subscription: {e}")
+        self._pubsub = None
+
+    async def _listen(self) -> None:
+        """
+        Deliver messages from this node's inbox and the broadcast channel locally.
+
+        When the subscription fails (e.g. Redis restarted), resubscribe with
+        exponential backoff and re-announce presence, which other nodes may
+        have pruned while the inbox had no subscriber.
+        """
+        attempt = 0
+        while True:
+            try:
+                if self._pubsub is None:
+                    await self._subscribe()
+                    await self.refresh_presence()
+                    self.metrics["total_resubscribes"] += 1
+                    logger.info(f"Cluster relay resubscribed for node {self.node_id}")
+                    attempt = 0
+
+                async for message in self._pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    try:
+                        self.handle_envelope(json.loads(message["data"]))
+                    except Exception as e:
+                        self.metrics["total_errors"] += 1
+                        logger.error(f"Failed to handle relayed message: {e}")
+                return
+            except asyncio.CancelledError:
+                return
+            except Exception as e:
+                self.metrics["total_errors"] += 1
+                delay = min(self.resubscribe_backoff_ms * (2 ** attempt), self.max_resubscribe_backoff_ms) / 1000
+                attempt += 1
+                logger.warning(f"Cluster relay subscription lost, resubscribing in {delay:.1f}s: {e}")
+                await self._close_pubsub()
+                try:
+                    await asyncio.sleep(delay)
+                except asyncio.CancelledError:
+                    return
+
+    def handle_envelope(self, envelope: Dict[str, Any]) -> int:
+        """
+        Deliver a relayed message to local connections.
+
+        Args:
+            envelope: Message envelope published by another node
+
+        Returns:
+            Number of local connections the message was queued for
+        """
+        if envelope.get("origin") == self.node_id:
+            return 0
+
+        self.metrics["total_received"] += 1
+        scope = envelope.get("scope")
+        data = envelope.get("data", {})
+
+        if scope == "user":
+            return self.manager.send_to_user_local(
+                envelope["target"], data, envelope.get("exclude_connection_id")
+            )
+        if scope == "project":
+            messages = data if envelope.get("many") else [data]
+            return sum(
+                self.manager.send_to_project_local(envelope["target"], message, envelope.get("exclude_user_id"))
+                for message in messages
+            )
+        if scope == "broadcast":
+            return self.manager.broadcast_local(
+                data, envelope.get("exclude_user_id"), envelope.get("exclude_connection_id")
+            )
+
+        logger.warning(f"Unknown relay scope: {scope}")
+        return 0
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get cluster relay metrics."""
+        return {**self.metrics, "node_id": self.node_id}
+
+
+# Global cluster relay instance
+_cluster_relay: Optional[ClusterRelay] = None
+
+
+async def get_cluster_relay() -> ClusterRelay:
+    """
+    Get or create the global cluster relay and attach it to the connection manager.
+
+    Returns:
+        ClusterRelay instance
+    """
+    global _cluster_relay
+
+    if _cluster_relay is None:
+        from app.websocket.connection_manager import get_connection_manager
+
+        manager = get_connection_manager()
+        relay = ClusterRelay(manager, node_id=settings.websocket_node_id)
+        await relay.start()
+        manager.cluster = relay
+        _cluster_relay = relay
+
+    return _cluster_relay
+
+
+async def close_cluster_relay() -> None:
+    """Detach and close the global cluster relay."""
+    global _cluster_relay
+
+    if _cluster_relay:
+        _cluster_relay.manager.cluster = None
+        await _cluster_relay.stop()
+        _cluster_relay = None
@@ -6,24 +6,58 @@ and project. It provides methods for connecting, disconnecting, and sending
 messages to specific users, projects, or broadcast to all connections.
 
 Features:
-- Connection tracking by user and project
-- Targeted message delivery (user, project, broadcast)
+- Connection tracking by user and project, with connections held in sharded dicts
+- Targeted message delivery (user, project, broadcast), across nodes
+  when a cluster relay is attached
 - Connection pooling and lifecycle management
 - Automatic cleanup on disconnect
+- Background reaper for idle connections, driven by an expiry heap
+- Per-connection outbound queues drained by a single writer task
+- Opt-in batching of events into array frames
+- Opt-in deflate compression of large frames
 - Connection statistics and monitoring
 - Graceful error handling
 """
 
+import asyncio
+import heapq
+import itertools
+import json
 import logging
-from typing import Dict, List, Optional, Set
+import time
+import zlib
+from typing import TYPE_CHECKING, Any, Coroutine, Dict, Iterator, List, Optional, Set, Tuple, Union
 from datetime import datetime
+from enum import Enum
 from fastapi import WebSocket
-from collections import defaultdict
+
+from app.core.config import settings
+from app.core.metrics import get_metrics_registry
+from app.metagpt_integration.streaming import EventPriority
+
+if TYPE_CHECKING:
+    from app.websocket.cluster import ClusterRelay
 
 
 logger = logging.getLogger(__name__)
 
 
+class SendOverflowPolicy(str, Enum):
+    """Policy applied when a connection's outbound queue is full."""
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    CLOSE = "close"
+
+
+class CompressionCodec(str, Enum):
+    """Frame compression codecs a client can negotiate."""
+    DEFLATE = "deflate"
+
+
+# Leading byte of binary frames, identifying how the rest of the frame is encoded
+FRAME_DEFLATE_JSON = 0x01
+
+
 class ConnectionInfo:
     """
     Information about a WebSocket connection.
@@ -33,9 +67,19 @@ class ConnectionInfo:
         websocket: WebSocket connection object
         user_id: Associated user ID
         project_id: Associated project ID
+        project_ids: Projects whose messages the connection receives (its
+            project plus projects subscribed to over the connection)
         connected_at: Connection timestamp
         last_activity: Last activity timestamp
+        last_seen: Monotonic time of last activity, used for idle expiry
         message_count: Number of messages sent
+        send_queue: Bounded queue of (monotonic enqueue time, message) items
+        writer_task: Task draining send_queue onto the socket
+        dropped_count: Number of messages dropped due to a full queue
+        queued_binary: Number of binary frames waiting in send_queue
+        batch_interval_ms: Event batching window (None = batching disabled)
+        batch_max_size: Max events per batch frame
+        compression: Negotiated frame compression codec (None = plain JSON text)
     """
 
     def __init__(
@@ -44,19 +88,34 @@ class ConnectionInfo:
         websocket: WebSocket,
         user_id: str,
         project_id: Optional[str] = None,
+        send_queue_size: int = 1000,
+        batch_interval_ms: Optional[int] = None,
+        batch_max_size: int = 50,
+        compression: Optional[CompressionCodec] = None,
     ):
         """Initialize connection info."""
         self.connection_id = connection_id
         self.websocket = websocket
         self.user_id = user_id
         self.project_id = project_id
+        self.project_ids: Set[str] = {project_id} if project_id else set()
         self.connected_at = datetime.utcnow()
         self.last_activity = datetime.utcnow()
+        self.last_seen = time.monotonic()
         self.message_count = 0
+        self.send_queue: asyncio.Queue = asyncio.Queue(maxsize=send_queue_size)
+        self.writer_task: Optional[asyncio.Task] = None
+        self.dropped_count = 0
+        self.queued_binary = 0
+        self.closing = False
+        self.batch_interval_ms = batch_interval_ms
+        self.batch_max_size = batch_max_size
+        self.compression = compression
 
     def update_activity(self) -> None:
         """Update last activity timestamp."""
         self.last_activity = datetime.utcnow()
+        self.last_seen = time.monotonic()
 
     def increment_message_count(self) -> None:
         """Increment message count."""
@@ -68,12 +127,165 @@ class ConnectionInfo:
             "connection_id": self.connection_id,
             "user_id": self.user_id,
             "project_id": self.project_id,
+            "project_ids": sorted(self.project_ids),
             "connected_at": self.connected_at.isoformat(),
             "last_activity": self.last_activity.isoformat(),
             "message_count": self.message_count,
+            "queued_messages": self.send_queue.qsize(),
+            "dropped_messages": self.dropped_count,
+            "batching": self.get_batching_info(),
+            "compression": self.compression.value if self.compression else None,
             "duration_seconds": (datetime.utcnow() - self.connected_at).total_seconds(),
         }
 
+    def get_batching_info(self) -> Optional[Dict]:
+        """Get negotiated batching parameters, or None if batching is disabled."""
+        if not self.batch_interval_ms:
+            return None
+        return {
+            "interval_ms": self.batch_interval_ms,
+            "max_size": self.batch_max_size,
+        }
+
+
+class ConnectionRegistry:
+    """
+    Index of active connections.
+    
+    Connections are spread over a fixed number of dicts by hash of their
+    connection_id, with secondary indexes by user and project that hold the
+    ConnectionInfo objects themselves, so fan-out needs no per-connection
+    lookup. Every method is synchronous, so each update (primary shard plus
+    both indexes) is atomic with respect to other coroutines on the event
+    loop: a connection is either fully registered or not visible at all.
+    No lock is involved, so sharding is not about contention.
+    
+    Only the primary id -> connection map is sharded: it keeps each of
+    those dicts small, bounding rehash pauses as the registry grows, and
+    lets bulk operations walk one shard at a time and yield to the loop in
+    between. The user and project indexes are single dicts, keyed by far
+    fewer users and projects than there are connections.
+    """
+
+    def __init__(self, num_shards: int = 16):
+        """
+        Initialize registry.
+        
+        Args:
+            num_shards: Number of connection shards
+        """
+        self.num_shards = max(1, num_shards)
+        self.shards: List[Dict[str, ConnectionInfo]] = [{} for _ in range(self.num_shards)]
+        self.by_user: Dict[str, Dict[str, ConnectionInfo]] = {}
+        self.by_project: Dict[str, Dict[str, ConnectionInfo]] = {}
+        self._count = 0
+
+    def _shard(self, connection_id: str) -> Dict[str, ConnectionInfo]:
+        """Get the shard owning a connection_id."""
+        return self.shards[hash(connection_id) % self.num_shards]
+
+    def add(self, conn_info: ConnectionInfo) -> None:
+        """
+        Register a connection and index it by user and project.
+        
+        Raises:
+            ValueError: If the connection_id is already registered
+        """
+        shard = self._shard(conn_info.connection_id)
+        if conn_info.connection_id in shard:
+            raise ValueError(f"Connection {conn_info.connection_id} already exists")
+
+        shard[conn_info.connection_id] = conn_info
+        self.by_user.setdefault(conn_info.user_id, {})[conn_info.connection_id] = conn_info
+        for project_id in conn_info.project_ids:
+            self.by_project.setdefault(project_id, {})[conn_info.connection_id] = conn_info
+        self._count += 1
+
+    def remove(self, connection_id: str) -> Optional[ConnectionInfo]:
+        """
+        Unregister a connection from all indexes.
+        
+        Returns:
+            The removed ConnectionInfo, or None if it was not registered
+        """
+        conn_info = self._shard(connection_id).pop(connection_id, None)
+        if conn_info is None:
+            return None
+
+        self._discard(self.by_user, conn_info.user_id, connection_id)
+        for project_id in conn_info.project_ids:
+            self._discard(self.by_project, project_id, connection_id)
+        self._count -= 1
+        return conn_info
+
+    def add_project(self, conn_info: ConnectionInfo, project_id: str) -> bool:
+        """
+        Index a registered connection under an additional project.
+
+        Returns:
+            True if this is the first connection indexed for the project
+        """
+        conn_info.project_ids.add(project_id)
+        connections = self.by_project.setdefault(project_id, {})
+        connections[conn_info.connection_id] = conn_info
+        return len(connections) == 1
+
+    def remove_project(self, conn_info: ConnectionInfo, project_id: str) -> bool:
+        """
+        Stop indexing a connection under a project.
+
+        Returns:
+            True if no connection is indexed for the project any more
+        """
+        conn_info.project_ids.discard(project_id)
+        self._discard(self.by_project, project_id, conn_info.connection_id)
+        return project_id not in self.by_project
+
+    @staticmethod
+    def _discard(index: Dict[str, Dict[str, ConnectionInfo]], key: str, connection_id: str) -> None:
+        """Remove a connection from a secondary index, dropping empty keys."""
+        connections = index.get(key)
+        if connections is None:
+            return
+        connections.pop(connection_id, None)
+        if not connections:
+            del index[key]
+
+    def get(self, connection_id: str) -> Optional[ConnectionInfo]:
+        """Look up a connection by id."""
+        return self._shard(connection_id).get(connection_id)
+
+    def __contains__(self, connection_id: str) -> bool:
+        return connection_id in self._shard(connection_id)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def values(self) -> Iterator[ConnectionInfo]:
+        """Iterate over a snapshot of all connections, shard by shard."""
+        for shard in self.shards:
+            yield from list(shard.values())
+
+    def ids(self) -> List[str]:
+        """Get a snapshot of all connection ids."""
+        return [cid for shard in self.shards for cid in shard]
+
+    def user_connection_ids(self, user_id: str) -> List[str]:
+        """Get a snapshot of a user's connection ids."""
+        return list(self.by_user.get(user_id, ()))
+
+    def project_connection_ids(self, project_id: str) -> List[str]:
+        """Get a snapshot of a project's connection ids."""
+        return list(self.by_project.get(project_id, ()))
+
+    def user_connections(self, user_id: str) -> List[ConnectionInfo]:
+        """Get a snapshot of a user's connections."""
+        return list(self.by_user.get(user_id, {}).values())
+
+    def project_connections(self, project_id: str) -> List[ConnectionInfo]:
+        """Get a snapshot of a project's connections."""
+        return list(self.by_project.get(project_id, {}).values())
+
 
 class ConnectionManager:
     """
@@ -81,24 +293,81 @@ class ConnectionManager:
     
     Organizes connections by user and project, providing methods for
     targeted message delivery and connection lifecycle management.
+
+    Outbound messages are never written to the socket by the caller. Each
+    connection owns a bounded queue drained by one writer task, so producers
+    enqueue in O(1) and frames are never interleaved on the same socket.
     """
 
-    def __init__(self):
-        """Initialize connection manager."""
-        # Connections indexed by connection_id
-        self.connections: Dict[str, ConnectionInfo] = {}
-        
-        # Connections indexed by user_id
-        self.user_connections: Dict[str, Set[str]] = defaultdict(set)
-        
-        # Connections indexed by project_id
-        self.project_connections: Dict[str, Set[str]] = defaultdict(set)
+    def __init__(
+        self,
+        send_queue_size: int = settings.websocket_send_queue_size,
+        overflow_policy: str = settings.websocket_send_overflow_policy,
+        compression_threshold: int = settings.websocket_compression_threshold_bytes,
+        compression_level: int = settings.websocket_compression_level,
+        compression_offload_threshold: int = settings.websocket_compression_offload_bytes,
+        num_shards: int = settings.websocket_registry_shards,
+        idle_timeout: float = settings.websocket_idle_timeout_seconds,
+        reaper_interval: float = settings.websocket_reaper_interval_seconds,
+    ):
+        """
+        Initialize connection manager.
+
+        Args:
+            send_queue_size: Max queued outbound messages per connection
+            overflow_policy: Policy applied when a send queue is full
+            compression_threshold: Min frame size in bytes before compressing
+            compression_level: zlib compression level (1-9)
+            compression_offload_threshold: Min frame size in bytes before
+                compressing in a worker thread instead of on the event loop
+            num_shards: Number of connection registry shards
+            idle_timeout: Seconds without activity before a connection is reaped
+            reaper_interval: Seconds between reaper passes
+        """
+        self.send_queue_size = send_queue_size
+        self.overflow_policy = SendOverflowPolicy(overflow_policy)
+        self.compression_threshold = compression_threshold
+        self.compression_level = compression_level
+        self.compression_offload_threshold = compression_offload_threshold
+
+        # Background tasks (e.g. slow-consumer disconnects) kept alive until done
+        self._background_tasks: Set[asyncio.Task] = set()
+
+        # Connections indexed by connection_id, user_id and project_id
+        self.registry = ConnectionRegistry(num_shards)
+
+        # Idle expiry: min-heap of (deadline, seq, connection). Activity only
+        # updates conn_info.last_seen; stale entries are re-armed when popped.
+        self.idle_timeout = idle_timeout
+        self.reaper_interval = reaper_interval
+        self._expiry_heap: List[Tuple[float, int, ConnectionInfo]] = []
+        self._expiry_seq = itertools.count()
+        self._reaper_task: Optional[asyncio.Task] = None
+
+        self.send_latency = get_metrics_registry().histogram(
+            "websocket_send_latency_seconds",
+            "Time from enqueue on a connection's send queue to the socket write",
+        )
+
+        # Cross-node relay, attached when clustering is enabled (see app.websocket.cluster)
+        self.cluster: Optional["ClusterRelay"] = None
         
         # Metrics
         self.metrics = {
             "total_connections": 0,
             "total_disconnections": 0,
             "total_messages_sent": 0,
+            "total_frames_sent": 0,
+            "total_batches_sent": 0,
+            "total_messages_dropped": 0,
+            "total_slow_consumer_closes": 0,
+            "total_idle_reaped": 0,
+            "total_compressed_frames": 0,
+            "total_offloaded_compressions": 0,
+            "total_bytes_uncompressed": 0,
+            "total_bytes_compressed": 0,
+            "total_binary_frames": 0,
+            "total_binary_bytes": 0,
             "total_errors": 0,
         }
 
@@ -108,6 +377,9 @@ class ConnectionManager:
         websocket: WebSocket,
         user_id: str,
         project_id: Optional[str] = None,
+        batch_interval_ms: Optional[int] = None,
+        batch_max_size: Optional[int] = None,
+        compression: Optional[str] = None,
     ) -> ConnectionInfo:
         """
         Register a new WebSocket connection.
@@ -117,6 +389,10 @@ class ConnectionManager:
             websocket: WebSocket connection object
             user_id: Associated user ID
             project_id: Associated project ID (optional)
+            batch_interval_ms: Requested event batching window (optional, opt-in)
+            batch_max_size: Requested max events per batch frame (optional)
+            compression: Requested frame compression codec (optional, opt-in;
+                unsupported codecs are ignored)
             
         Returns:
             ConnectionInfo object
@@ -124,20 +400,50 @@ class ConnectionManager:
         Raises:
             ValueError: If connection_id already exists
         """
-        if connection_id in self.connections:
+        if connection_id in self.registry:
             raise ValueError(f"Connection {connection_id} already exists")
 
-        # Accept the connection
-        await websocket.accept()
+        # Clamp requested batching parameters to the configured limits
+        if batch_interval_ms:
+            batch_interval_ms = min(batch_interval_ms, settings.websocket_batch_max_interval_ms)
+        batch_max_size = min(
+            batch_max_size or settings.websocket_batch_default_size,
+            settings.websocket_batch_max_size,
+        )
 
-        # Create connection info
-        conn_info = ConnectionInfo(connection_id, websocket, user_id, project_id)
+        try:
+            codec = CompressionCodec(compression) if compression else None
+        except ValueError:
+            logger.debug(f"Unsupported compression '{compression}' requested by {connection_id}")
+            codec = None
+
+        # Create connection info and start its writer
+        conn_info = ConnectionInfo(
+            connection_id,
+            websocket,
+            user_id,
+            project_id,
+            send_queue_size=self.send_queue_size,
+            batch_interval_ms=batch_interval_ms,
+            batch_max_size=batch_max_size,
+            compression=codec,
+        )
+
+        # Register before the first await so a concurrent connect with the
+        # same id fails here instead of overwriting this one
+        self.registry.add(conn_info)
+        new_user = len(self.registry.by_user[user_id]) == 1
+        new_project = bool(project_id) and len(self.registry.by_project[project_id]) == 1
+        try:
+            await websocket.accept()
+        except Exception:
+            self.registry.remove(connection_id)
+            raise
+        conn_info.writer_task = asyncio.create_task(self._writer_loop(conn_info))
+        self._schedule_expiry(conn_info)
 
-        # Store connection
-        self.connections[connection_id] = conn_info
-        self.user_connections[user_id].add(connection_id)
-        if project_id:
-            self.project_connections[project_id].add(connection_id)
+        if self.cluster:
+            await self.cluster.connection_added(conn_info, new_user, new_project)
 
         # Update metrics
         self.metrics["total_connections"] += 1
@@ -159,9 +465,33 @@ class ConnectionManager:
         Returns:
             True if disconnected, False if not found
         """
-        conn_info = self.connections.get(connection_id)
+        # Remove from all indexes first, so nothing new is routed to the
+        # connection while it is being closed
+        conn_info = self.registry.remove(connection_id)
         if not conn_info:
             return False
+        conn_info.closing = True
+        self.metrics["total_disconnections"] += 1
+
+        if self.cluster:
+            await self.cluster.connection_removed(
+                conn_info,
+                last_user=conn_info.user_id not in self.registry.by_user,
+                last_project=bool(conn_info.project_id) and conn_info.project_id not in self.registry.by_project,
+            )
+            await self.cluster.projects_changed(removed=[
+                project_id for project_id in conn_info.project_ids
+                if project_id != conn_info.project_id and project_id not in self.registry.by_project
+            ])
+
+        # Stop the writer so nothing is written after close
+        writer_task = conn_info.writer_task
+        if writer_task and not writer_task.done() and writer_task is not asyncio.current_task():
+            writer_task.cancel()
+            try:
+                await writer_task
+            except asyncio.CancelledError:
+                pass
 
         try:
             # Close the connection
@@ -169,21 +499,6 @@ class ConnectionManager:
         except Exception as e:
             logger.warning(f"Error closing connection {connection_id}: {e}")
 
-        # Remove from all indexes
-        del self.connections[connection_id]
-        self.user_connections[conn_info.user_id].discard(connection_id)
-        if conn_info.project_id:
-            self.project_connections[conn_info.project_id].discard(connection_id)
-
-        # Clean up empty sets
-        if not self.user_connections[conn_info.user_id]:
-            del self.user_connections[conn_info.user_id]
-        if conn_info.project_id and not self.project_connections[conn_info.project_id]:
-            del self.project_connections[conn_info.project_id]
-
-        # Update metrics
-        self.metrics["total_disconnections"] += 1
-
         logger.info(
             f"Connection {connection_id} closed for user {conn_info.user_id} "
             f"(project: {conn_info.project_id or 'none'})"
@@ -191,38 +506,297 @@ class ConnectionManager:
 
         return True
 
+    async def join_project(self, connection_id: str, project_id: str) -> bool:
+        """
+        Deliver a project's messages to a connection as well.
+        
+        Used when a connection subscribes to a project channel after
+        connecting, so send_to_project reaches it like a project socket.
+        
+        Args:
+            connection_id: Connection identifier
+            project_id: Project identifier
+            
+        Returns:
+            True if joined, False if the connection is not registered
+        """
+        conn_info = self.registry.get(connection_id)
+        if conn_info is None:
+            return False
+        if project_id in conn_info.project_ids:
+            return True
+
+        if self.registry.add_project(conn_info, project_id) and self.cluster:
+            await self.cluster.projects_changed(added=[project_id])
+        return True
+
+    async def leave_project(self, connection_id: str, project_id: str) -> bool:
+        """
+        Stop delivering a project's messages to a connection.
+        
+        Args:
+            connection_id: Connection identifier
+            project_id: Project identifier
+            
+        Returns:
+            True if left, False if the connection was not in the project
+        """
+        conn_info = self.registry.get(connection_id)
+        if conn_info is None or project_id not in conn_info.project_ids:
+            return False
+
+        if self.registry.remove_project(conn_info, project_id) and self.cluster:
+            await self.cluster.projects_changed(removed=[project_id])
+        return True
+
     async def send_to_connection(
         self,
         connection_id: str,
         data: Dict,
     ) -> bool:
         """
-        Send message to a specific connection.
+        Queue a message for a specific connection.
+        
+        The message is written to the socket by the connection's writer
+        task; this call never waits on network I/O.
         
         Args:
             connection_id: Connection identifier
             data: Message data to send
             
         Returns:
-            True if sent successfully, False otherwise
+            True if queued successfully, False otherwise
         """
-        conn_info = self.connections.get(connection_id)
+        conn_info = self.registry.get(connection_id)
         if not conn_info:
             logger.warning(f"Connection {connection_id} not found")
             return False
 
+        return self._enqueue(conn_info, data)
+
+    async def send_binary(
+        self,
+        connection_id: str,
+        frame: bytes,
+    ) -> bool:
+        """
+        Queue a binary frame (e.g. a file chunk) for a specific connection.
+        
+        Unlike JSON messages, binary frames are part of a larger transfer and
+        must not be dropped, so instead of applying the overflow policy this
+        waits for room in the send queue. Frames keep their order relative to
+        other messages on the connection.
+        
+        Args:
+            connection_id: Connection identifier
+            frame: Frame bytes, starting with a frame kind byte
+            
+        Returns:
+            True if queued, False if the connection is gone or closing
+        """
+        conn_info = self.registry.get(connection_id)
+        if not conn_info or conn_info.closing:
+            return False
+
+        conn_info.queued_binary += 1
         try:
-            await conn_info.websocket.send_json(data)
-            conn_info.increment_message_count()
-            conn_info.update_activity()
-            self.metrics["total_messages_sent"] += 1
+            await conn_info.send_queue.put((time.monotonic(), frame))
+        except asyncio.CancelledError:
+            conn_info.queued_binary -= 1
+            raise
+        return True
+
+    def _enqueue(self, conn_info: ConnectionInfo, data: Dict) -> bool:
+        """
+        Put a message on a connection's send queue, applying the overflow policy.
+        
+        Args:
+            conn_info: Target connection
+            data: Message data to send
+            
+        Returns:
+            True if the message was queued, False if it was dropped
+        """
+        queue = conn_info.send_queue
+        try:
+            queue.put_nowait((time.monotonic(), data))
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        policy = self.overflow_policy
+        if policy == SendOverflowPolicy.DROP_OLDEST and conn_info.queued_binary:
+            # The oldest item may be part of a file transfer; drop the new message instead
+            policy = SendOverflowPolicy.DROP_NEWEST
+
+        if policy == SendOverflowPolicy.DROP_OLDEST:
+            try:
+                queue.get_nowait()
+                queue.task_done()
+            except asyncio.QueueEmpty:
+                pass
+            queue.put_nowait((time.monotonic(), data))
+            conn_info.dropped_count += 1
+            self.metrics["total_messages_dropped"] += 1
             return True
+
+        if policy == SendOverflowPolicy.DROP_NEWEST:
+            conn_info.dropped_count += 1
+            self.metrics["total_messages_dropped"] += 1
+            return False
+
+        # SendOverflowPolicy.CLOSE: the client cannot keep up, drop it
+        conn_info.dropped_count += 1
+        self.metrics["total_messages_dropped"] += 1
+        if not conn_info.closing:
+            conn_info.closing = True
+            logger.warning(
+                f"Send queue full for {conn_info.connection_id}, closing slow consumer"
+            )
+            self.metrics["total_slow_consumer_closes"] += 1
+            self._spawn(self.disconnect(conn_info.connection_id))
+        return False
+
+    async def _writer_loop(self, conn_info: ConnectionInfo) -> None:
+        """
+        Drain a connection's send queue onto its socket.
+        
+        Runs for the lifetime of the connection. A send error schedules a
+        disconnect and ends the loop.
+        
+        When batching was negotiated, consecutive events are collected for up
+        to batch_interval_ms (or batch_max_size events) and written as one
+        ``{"type": "batch", "messages": [...]}`` frame. Non-event messages and
+        critical events close the current batch immediately, so order is
+        preserved and nothing urgent waits for the window to expire.
+        
+        Frames are encoded by _send_frame, which compresses large frames for
+        connections that negotiated compression.
+        
+        Args:
+            conn_info: Connection to write for
+        """
+        queue = conn_info.send_queue
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                batch = [await queue.get()]
+
+                if conn_info.batch_interval_ms and not self._closes_batch(batch[0][1]):
+                    deadline = loop.time() + conn_info.batch_interval_ms / 1000
+                    while len(batch) < conn_info.batch_max_size and not self._closes_batch(batch[-1][1]):
+                        remaining = deadline - loop.time()
+                        if remaining <= 0:
+                            break
+                        try:
+                            batch.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+                        except asyncio.TimeoutError:
+                            break
+
+                try:
+                    messages = [data for _, data in batch]
+                    # A binary frame closes a batch but is never embedded in it
+                    binary = messages.pop() if isinstance(messages[-1], bytes) else None
+                    if binary is not None:
+                        conn_info.queued_binary -= 1
+                    if len(messages) == 1:
+                        await self._send_frame(conn_info, messages[0])
+                    elif messages:
+                        await self._send_frame(conn_info, {
+                            "type": "batch",
+                            "count": len(messages),
+                            "messages": messages,
+                        })
+                        self.metrics["total_batches_sent"] += 1
+                    if binary is not None:
+                        await self._send_frame(conn_info, binary)
+                finally:
+                    for _ in batch:
+                        queue.task_done()
+
+                sent_at = time.monotonic()
+                for enqueued_at, _ in batch:
+                    self.send_latency.observe(sent_at - enqueued_at)
+
+                conn_info.message_count += len(batch)
+                conn_info.update_activity()
+                self.metrics["total_messages_sent"] += len(batch)
+                self.metrics["total_frames_sent"] += 1
+        except asyncio.CancelledError:
+            pass
         except Exception as e:
-            logger.error(f"Error sending message to {connection_id}: {e}")
+            logger.error(f"Error sending message to {conn_info.connection_id}: {e}")
             self.metrics["total_errors"] += 1
-            # Attempt to disconnect on error
-            await self.disconnect(connection_id)
-            return False
+            if not conn_info.closing:
+                conn_info.closing = True
+                self._spawn(self.disconnect(conn_info.connection_id))
+
+    async def _send_frame(self, conn_info: ConnectionInfo, frame: Union[Dict, bytes]) -> None:
+        """
+        Write one frame to a connection's socket.
+        
+        Binary frames are written as-is. Connections without compression
+        get a JSON text frame. For connections
+        that negotiated deflate, frames of at least compression_threshold bytes
+        are sent as a binary frame: one FRAME_DEFLATE_JSON byte followed by the
+        zlib-compressed UTF-8 JSON. Smaller frames stay plain text, as does any
+        frame that does not shrink when compressed. Frames of at least
+        compression_offload_threshold bytes are compressed in a worker thread
+        (zlib releases the GIL), so large frames do not stall the event loop.
+        
+        Args:
+            conn_info: Target connection
+            frame: Frame payload
+        """
+        websocket = conn_info.websocket
+        if isinstance(frame, bytes):
+            self.metrics["total_binary_frames"] += 1
+            self.metrics["total_binary_bytes"] += len(frame)
+            await websocket.send_bytes(frame)
+            return
+
+        if not conn_info.compression:
+            await websocket.send_json(frame)
+            return
+
+        text = json.dumps(frame, separators=(",", ":"), ensure_ascii=False)
+        raw = text.encode("utf-8")
+        if len(raw) >= self.compression_threshold:
+            if len(raw) >= self.compression_offload_threshold:
+                self.metrics["total_offloaded_compressions"] += 1
+                compressed = await asyncio.to_thread(zlib.compress, raw, self.compression_level)
+            else:
+                compressed = zlib.compress(raw, self.compression_level)
+            if len(compressed) < len(raw):
+                self.metrics["total_compressed_frames"] += 1
+                self.metrics["total_bytes_uncompressed"] += len(raw)
+                self.metrics["total_bytes_compressed"] += len(compressed)
+                await websocket.send_bytes(bytes([FRAME_DEFLATE_JSON]) + compressed)
+                return
+
+        await websocket.send_text(text)
+
+    @staticmethod
+    def _closes_batch(data: Union[Dict, bytes]) -> bool:
+        """
+        Check whether a message must be flushed without waiting for more events.
+        
+        Only streaming and broadcast events are batched; responses, acks and
+        critical-priority events are delivered as soon as they are dequeued.
+        """
+        if isinstance(data, bytes):
+            return True
+        if data.get("type") == "event":
+            priority = data.get("event", {}).get("priority", EventPriority.NORMAL.value)
+            return priority >= EventPriority.CRITICAL.value
+        return "event_type" not in data
+
+    def _spawn(self, coro: Coroutine[Any, Any, Any]) -> asyncio.Task:
+        """Run a coroutine in the background, keeping a reference until it finishes."""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
 
     async def send_to_user(
         self,
@@ -233,6 +807,31 @@ class ConnectionManager:
         """
         Send message to all connections of a user.
         
+        When a cluster relay is attached, the message is also relayed to
+        other nodes holding connections for the user.
+        
+        Args:
+            user_id: User identifier
+            data: Message data to send
+            exclude_connection_id: Connection to exclude (optional)
+            
+        Returns:
+            Number of local connections the message was sent to
+        """
+        sent_count = self.send_to_user_local(user_id, data, exclude_connection_id)
+        if self.cluster:
+            await self.cluster.publish_to_user(user_id, data, exclude_connection_id)
+        return sent_count
+
+    def send_to_user_local(
+        self,
+        user_id: str,
+        data: Dict,
+        exclude_connection_id: Optional[str] = None,
+    ) -> int:
+        """
+        Send message to a user's connections on this node only.
+        
         Args:
             user_id: User identifier
             data: Message data to send
@@ -241,14 +840,13 @@ class ConnectionManager:
         Returns:
             Number of messages sent successfully
         """
-        connection_ids = self.user_connections.get(user_id, set()).copy()
         sent_count = 0
 
-        for connection_id in connection_ids:
-            if exclude_connection_id and connection_id == exclude_connection_id:
+        for conn_info in self.registry.user_connections(user_id):
+            if exclude_connection_id and conn_info.connection_id == exclude_connection_id:
                 continue
 
-            if await self.send_to_connection(connection_id, data):
+            if self._enqueue(conn_info, data):
                 sent_count += 1
 
         if sent_count > 0:
@@ -265,6 +863,31 @@ class ConnectionManager:
         """
         Send message to all connections of a project.
         
+        When a cluster relay is attached, the message is also relayed to
+        other nodes holding connections for the project.
+        
+        Args:
+            project_id: Project identifier
+            data: Message data to send
+            exclude_user_id: User to exclude (optional)
+            
+        Returns:
+            Number of local connections the message was sent to
+        """
+        sent_count = self.send_to_project_local(project_id, data, exclude_user_id)
+        if self.cluster:
+            await self.cluster.publish_to_project(project_id, data, exclude_user_id)
+        return sent_count
+
+    def send_to_project_local(
+        self,
+        project_id: str,
+        data: Dict,
+        exclude_user_id: Optional[str] = None,
+    ) -> int:
+        """
+        Send message to a project's connections on this node only.
+        
         Args:
             project_id: Project identifier
             data: Message data to send
@@ -273,18 +896,13 @@ class ConnectionManager:
         Returns:
             Number of messages sent successfully
         """
-        connection_ids = self.project_connections.get(project_id, set()).copy()
         sent_count = 0
 
-        for connection_id in connection_ids:
-            conn_info = self.connections.get(connection_id)
-            if not conn_info:
-                continue
-
+        for conn_info in self.registry.project_connections(project_id):
             if exclude_user_id and conn_info.user_id == exclude_user_id:
                 continue
 
-            if await self.send_to_connection(connection_id, data):
+            if self._enqueue(conn_info, data):
                 sent_count += 1
 
         if sent_count > 0:
@@ -292,6 +910,60 @@ class ConnectionManager:
 
         return sent_count
 
+    async def send_many_to_project(
+        self,
+        project_id: str,
+        messages: List[Dict],
+        exclude_user_id: Optional[str] = None,
+    ) -> int:
+        """
+        Send several messages, in order, to all connections of a project.
+        
+        The project's connections are looked up once for the whole group and,
+        with a cluster relay attached, the group is relayed as one publish.
+        
+        Args:
+            project_id: Project identifier
+            messages: Messages to send
+            exclude_user_id: User to exclude (optional)
+            
+        Returns:
+            Number of messages queued across local connections
+        """
+        sent_count = self.send_many_to_project_local(project_id, messages, exclude_user_id)
+        if self.cluster and messages:
+            await self.cluster.publish_to_project(project_id, messages, exclude_user_id, many=True)
+        return sent_count
+
+    def send_many_to_project_local(
+        self,
+        project_id: str,
+        messages: List[Dict],
+        exclude_user_id: Optional[str] = None,
+    ) -> int:
+        """
+        Send several messages, in order, to a project's connections on this node only.
+        
+        Args:
+            project_id: Project identifier
+            messages: Messages to send
+            exclude_user_id: User to exclude (optional)
+            
+        Returns:
+            Number of messages queued across local connections
+        """
+        sent_count = 0
+
+        for conn_info in self.registry.project_connections(project_id):
+            if exclude_user_id and conn_info.user_id == exclude_user_id:
+                continue
+
+            for data in messages:
+                if self._enqueue(conn_info, data):
+                    sent_count += 1
+
+        return sent_count
+
     async def broadcast(
         self,
         data: Dict,
@@ -301,6 +973,31 @@ class ConnectionManager:
         """
         Broadcast message to all connections.
         
+        When a cluster relay is attached, the broadcast is also relayed to
+        every other node.
+        
+        Args:
+            data: Message data to send
+            exclude_user_id: User to exclude (optional)
+            exclude_connection_id: Connection to exclude (optional)
+            
+        Returns:
+            Number of local connections the message was sent to
+        """
+        sent_count = self.broadcast_local(data, exclude_user_id, exclude_connection_id)
+        if self.cluster:
+            await self.cluster.publish_broadcast(data, exclude_user_id, exclude_connection_id)
+        return sent_count
+
+    def broadcast_local(
+        self,
+        data: Dict,
+        exclude_user_id: Optional[str] = None,
+        exclude_connection_id: Optional[str] = None,
+    ) -> int:
+        """
+        Broadcast message to all connections on this node only.
+        
         Args:
             data: Message data to send
             exclude_user_id: User to exclude (optional)
@@ -309,21 +1006,16 @@ class ConnectionManager:
         Returns:
             Number of messages sent successfully
         """
-        connection_ids = list(self.connections.keys())
         sent_count = 0
 
-        for connection_id in connection_ids:
-            if exclude_connection_id and connection_id == exclude_connection_id:
-                continue
-
-            conn_info = self.connections.get(connection_id)
-            if not conn_info:
+        for conn_info in self.registry.values():
+            if exclude_connection_id and conn_info.connection_id == exclude_connection_id:
                 continue
 
             if exclude_user_id and conn_info.user_id == exclude_user_id:
                 continue
 
-            if await self.send_to_connection(connection_id, data):
+            if self._enqueue(conn_info, data):
                 sent_count += 1
 
         if sent_count > 0:
@@ -381,7 +1073,7 @@ class ConnectionManager:
         Returns:
             Connection info dictionary or None if not found
         """
-        conn_info = self.connections.get(connection_id)
+        conn_info = self.registry.get(connection_id)
         return conn_info.get_info() if conn_info else None
 
     def get_user_connections(self, user_id: str) -> List[Dict]:
@@ -394,12 +1086,7 @@ class ConnectionManager:
         Returns:
             List of connection info dictionaries
         """
-        connection_ids = self.user_connections.get(user_id, set())
-        return [
-            self.connections[cid].get_info()
-            for cid in connection_ids
-            if cid in self.connections
-        ]
+        return [conn_info.get_info() for conn_info in self.registry.user_connections(user_id)]
 
     def get_project_connections(self, project_id: str) -> List[Dict]:
         """
@@ -411,12 +1098,7 @@ class ConnectionManager:
         Returns:
             List of connection info dictionaries
         """
-        connection_ids = self.project_connections.get(project_id, set())
-        return [
-            self.connections[cid].get_info()
-            for cid in connection_ids
-            if cid in self.connections
-        ]
+        return [conn_info.get_info() for conn_info in self.registry.project_connections(project_id)]
 
     def get_all_connections(self) -> List[Dict]:
         """
@@ -425,19 +1107,19 @@ class ConnectionManager:
         Returns:
             List of connection info dictionaries
         """
-        return [conn_info.get_info() for conn_info in self.connections.values()]
+        return [conn_info.get_info() for conn_info in self.registry.values()]
 
     def get_user_count(self) -> int:
         """Get number of connected users."""
-        return len(self.user_connections)
+        return len(self.registry.by_user)
 
     def get_project_count(self) -> int:
         """Get number of projects with active connections."""
-        return len(self.project_connections)
+        return len(self.registry.by_project)
 
     def get_connection_count(self) -> int:
         """Get total number of active connections."""
-        return len(self.connections)
+        return len(self.registry)
 
     def get_user_connection_count(self, user_id: str) -> int:
         """
@@ -449,7 +1131,7 @@ class ConnectionManager:
         Returns:
             Number of connections
         """
-        return len(self.user_connections.get(user_id, set()))
+        return len(self.registry.by_user.get(user_id, ()))
 
     def get_project_connection_count(self, project_id: str) -> int:
         """
@@ -461,7 +1143,7 @@ class ConnectionManager:
         Returns:
             Number of connections
         """
-        return len(self.project_connections.get(project_id, set()))
+        return len(self.registry.by_project.get(project_id, ()))
 
     def get_metrics(self) -> Dict:
         """
@@ -475,22 +1157,122 @@ class ConnectionManager:
             "active_connections": self.get_connection_count(),
             "active_users": self.get_user_count(),
             "active_projects": self.get_project_count(),
+            "queued_messages": sum(c.send_queue.qsize() for c in self.registry.values()),
+            "overflow_policy": self.overflow_policy.value,
+            "registry_shards": self.registry.num_shards,
+            "cluster": self.cluster.get_metrics() if self.cluster else None,
+            "send_latency_seconds": self.send_latency.snapshot(),
+            "compression_ratio": (
+                round(self.metrics["total_bytes_uncompressed"] / self.metrics["total_bytes_compressed"], 2)
+                if self.metrics["total_bytes_compressed"] else None
+            ),
         }
 
-    async def cleanup_inactive_connections(self, timeout_seconds: int = 3600) -> int:
+    def touch(self, connection_id: str) -> None:
+        """
+        Record inbound activity (a message, ping or heartbeat) on a connection.
+        
+        O(1): only the connection's timestamp changes; its expiry entry is
+        re-armed lazily by the reaper.
+        
+        Args:
+            connection_id: Connection identifier
+        """
+        conn_info = self.registry.get(connection_id)
+        if conn_info:
+            conn_info.update_activity()
+
+    def _schedule_expiry(self, conn_info: ConnectionInfo) -> None:
+        """Arm a connection's idle deadline from its last activity."""
+        heapq.heappush(
+            self._expiry_heap,
+            (conn_info.last_seen + self.idle_timeout, next(self._expiry_seq), conn_info),
+        )
+
+    async def reap_expired(self) -> int:
+        """
+        Disconnect connections idle for longer than idle_timeout.
+        
+        Only heap entries whose deadline has passed are examined. Entries for
+        connections that saw activity since they were armed are re-armed at
+        their new deadline, and entries for connections that are already gone
+        are dropped, so a pass costs O((expired + refreshed) log n) rather
+        than a scan of every connection.
+        
+        Returns:
+            Number of connections reaped
+        """
+        now = time.monotonic()
+        expired: List[ConnectionInfo] = []
+
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            _, _, conn_info = heapq.heappop(self._expiry_heap)
+            if conn_info.closing or self.registry.get(conn_info.connection_id) is not conn_info:
+                continue
+            if conn_info.last_seen + self.idle_timeout > now:
+                self._schedule_expiry(conn_info)
+                continue
+            expired.append(conn_info)
+
+        reaped_count = 0
+        for conn_info in expired:
+            if await self.disconnect(conn_info.connection_id):
+                reaped_count += 1
+                logger.info(f"Reaped idle connection {conn_info.connection_id}")
+
+        self.metrics["total_idle_reaped"] += reaped_count
+        return reaped_count
+
+    async def _reaper_loop(self) -> None:
+        """Run reap_expired every reaper_interval seconds."""
+        while True:
+            await asyncio.sleep(self.reaper_interval)
+            try:
+                await self.reap_expired()
+            except Exception as e:
+                logger.error(f"Error reaping idle connections: {e}")
+
+    def start_reaper(self) -> None:
+        """Start the background idle-connection reaper."""
+        if self._reaper_task is None or self._reaper_task.done():
+            self._reaper_task = asyncio.create_task(self._reaper_loop())
+            logger.info(
+                f"Idle connection reaper started (timeout {self.idle_timeout}s, "
+                f"interval {self.reaper_interval}s)"
+            )
+
+    async def stop_reaper(self) -> None:
+        """Stop the background idle-connection reaper."""
+        if self._reaper_task:
+            self._reaper_task.cancel()
+            try:
+                await self._reaper_task
+            except asyncio.CancelledError:
+                pass
+            self._reaper_task = None
+
+    async def cleanup_inactive_connections(self, timeout_seconds: Optional[int] = None) -> int:
         """
         Clean up inactive connections.
         
+        Without a timeout this is a single reaper pass (see reap_expired).
+        An explicit timeout that differs from idle_timeout falls back to a
+        full scan of all connections.
+        
         Args:
-            timeout_seconds: Inactivity timeout in seconds
+            timeout_seconds: Inactivity timeout in seconds (optional)
             
         Returns:
             Number of connections cleaned up
         """
+        if timeout_seconds is None or timeout_seconds == self.idle_timeout:
+            return await self.reap_expired()
+
         now = datetime.utcnow()
         inactive_connections = []
 
-        for connection_id, conn_info in self.connections.items():
+        for conn_info in self.registry.values():
+            connection_id = conn_info.connection_id
             inactivity_duration = (now - conn_info.last_activity).total_seconds()
             if inactivity_duration > timeout_seconds:
                 inactive_connections.append(connection_id)
@@ -513,7 +1295,7 @@ class ConnectionManager:
         Returns:
             Number of connections disconnected
         """
-        connection_ids = self.user_connections.get(user_id, set()).copy()
+        connection_ids = self.registry.user_connection_ids(user_id)
         disconnected_count = 0
 
         for connection_id in connection_ids:
@@ -533,7 +1315,7 @@ class ConnectionManager:
         Returns:
             Number of connections disconnected
         """
-        connection_ids = self.project_connections.get(project_id, set()).copy()
+        connection_ids = self.registry.project_connection_ids(project_id)
         disconnected_count = 0
 
         for connection_id in connection_ids:
@@ -550,7 +1332,7 @@ class ConnectionManager:
         Returns:
             Number of connections disconnected
         """
-        connection_ids = list(self.connections.keys())
+        connection_ids = self.registry.ids()
         disconnected_count = 0
 
         for connection_id in connection_ids:
@@ -590,6 +1372,7 @@ async def close_connection_manager() -> None:
     global _connection_manager
 
     if _connection_manager:
+        await _connection_manager.stop_reaper()
         await _connection_manager.disconnect_all()
         _connection_manager = None
         logger.info("Connection manager closed")
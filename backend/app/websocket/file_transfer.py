@@ -0,0 +1,215 @@
+"""
+WebSocket File Transfer Module
+
+This module streams files (or byte ranges of files) to WebSocket clients as a
+sequence of binary frames, so large artifacts are never held in memory or
+embedded in a single JSON message.
+
+A chunked GET_FILE response carries a ``transfer_id`` and the range being
+sent. The file bytes follow as binary frames, each laid out as:
+
+    byte 0      FRAME_FILE_CHUNK (0x02)
+    bytes 1-8   transfer id (8 raw bytes; the hex form is in the JSON response)
+    bytes 9-16  absolute file offset of this chunk (unsigned 64-bit, big-endian)
+    byte 17     flags (FLAG_LAST on the final chunk)
+    bytes 18-   chunk data
+
+Frames are queued with backpressure, so at most one send queue's worth of
+chunks is buffered per connection.
+
+The range helpers are shared with the HTTP download endpoint.
+"""
+
+import asyncio
+import logging
+import struct
+from typing import AsyncIterator, Optional, Tuple
+from uuid import uuid4
+
+
+logger = logging.getLogger(__name__)
+
+
+# Leading byte of binary file chunk frames (see FRAME_DEFLATE_JSON for 0x01)
+FRAME_FILE_CHUNK = 0x02
+
+# Flag set on the last chunk of a transfer
+FLAG_LAST = 0x01
+
+CHUNK_HEADER = struct.Struct("!B8sQB")
+
+
+def new_transfer_id() -> str:
+    """Generate a transfer id (16 hex characters)."""
+    return uuid4().hex[:16]
+
+
+def encode_file_chunk(transfer_id: str, offset: int, data: bytes, last: bool) -> bytes:
+    """
+    Build one binary file chunk frame.
+
+    Args:
+        transfer_id: Transfer id from new_transfer_id
+        offset: Absolute file offset of the chunk
+        data: Chunk bytes
+        last: Whether this is the final chunk
+
+    Returns:
+        Frame bytes
+    """
+    header = CHUNK_HEADER.pack(
+        FRAME_FILE_CHUNK, bytes.fromhex(transfer_id), offset, FLAG_LAST if last else 0
+    )
+    return header + data
+
+
+def decode_file_chunk(frame: bytes) -> Tuple[str, int, bytes, bool]:
+    """
+    Parse a binary file chunk frame.
+
+    Args:
+        frame: Frame bytes
+
+    Returns:
+        Tuple of (transfer_id, offset, data, last)
+
+    Raises:
+        ValueError: If the frame is not a file chunk
+    """
+    if len(frame) < CHUNK_HEADER.size or frame[0] != FRAME_FILE_CHUNK:
+        raise ValueError("Not a file chunk frame")
+    _, transfer_id, offset, flags = CHUNK_HEADER.unpack_from(frame)
+    return transfer_id.hex(), offset, frame[CHUNK_HEADER.size:], bool(flags & FLAG_LAST)
+
+
+def resolve_range(offset: Optional[int], length: Optional[int], size: int) -> Tuple[int, int]:
+    """
+    Clamp a requested byte range to a file.
+
+    Args:
+        offset: First byte (default 0)
+        length: Number of bytes (default: to end of file)
+        size: File size
+
+    Returns:
+        Tuple of (start, end) with end exclusive
+
+    Raises:
+        ValueError: If the range is invalid
+    """
+    start = int(offset or 0)
+    if start < 0 or (length is not None and int(length) < 0):
+        raise ValueError("Range offset and length must not be negative")
+    if start > size:
+        raise ValueError(f"Range offset {start} is beyond end of file ({size} bytes)")
+    end = size if length is None else min(size, start + int(length))
+    return start, end
+
+
+def parse_range_header(header: str, size: int) -> Tuple[int, int]:
+    """
+    Parse a single-range HTTP Range header.
+
+    Supports "bytes=start-end", "bytes=start-" and suffix "bytes=-n".
+
+    Args:
+        header: Range header value
+        size: File size
+
+    Returns:
+        Tuple of (start, end) with end exclusive
+
+    Raises:
+        ValueError: If the header is malformed, has several ranges, or is unsatisfiable
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        raise ValueError(f"Unsupported range: {header}")
+
+    first, sep, last = spec.strip().partition("-")
+    if not sep or not (first or last):
+        raise ValueError(f"Malformed range: {header}")
+
+    if not first:
+        start = max(0, size - int(last))
+        end = size
+    else:
+        start = int(first)
+        end = min(size, int(last) + 1) if last else size
+
+    if start >= size or start >= end:
+        raise ValueError(f"Unsatisfiable range: {header}")
+    return start, end
+
+
+def chunk_count(start: int, end: int, chunk_size: int) -> int:
+    """Number of frames used to send a range (at least one)."""
+    return max(1, -(-(end - start) // chunk_size))
+
+
+async def iter_file_range(path: str, start: int, end: int, chunk_size: int) -> AsyncIterator[bytes]:
+    """
+    Read a byte range of a file in chunks.
+
+    Reads happen in a worker thread, one chunk at a time, so only the chunk
+    being sent is in memory.
+
+    Args:
+        path: Absolute file path
+        start: First byte
+        end: End of range (exclusive)
+        chunk_size: Max bytes per chunk
+
+    Yields:
+        Chunk bytes (stops early if the file is shorter than expected)
+    """
+    f = await asyncio.to_thread(open, path, "rb")
+    try:
+        await asyncio.to_thread(f.seek, start)
+        position = start
+        while position < end:
+            data = await asyncio.to_thread(f.read, min(chunk_size, end - position))
+            if not data:
+                break
+            position += len(data)
+            yield data
+    finally:
+        f.close()
+
+
+async def iter_file_chunks(
+    path: str,
+    transfer_id: str,
+    start: int,
+    end: int,
+    chunk_size: int,
+) -> AsyncIterator[bytes]:
+    """
+    Read a byte range of a file as chunk frames.
+
+    The last frame carries FLAG_LAST. An empty range yields a single empty
+    last frame, so the client always sees the end of the transfer.
+
+    Args:
+        path: Absolute file path
+        transfer_id: Transfer id announced in the response
+        start: First byte
+        end: End of range (exclusive)
+        chunk_size: Max bytes per frame
+
+    Yields:
+        Frame bytes
+    """
+    offset = start
+    pending: Optional[bytes] = None
+    chunks = iter_file_range(path, start, end, chunk_size)
+    try:
+        # Hold one chunk back so the final one can be flagged
+        async for data in chunks:
+            if pending is not None:
+                yield encode_file_chunk(transfer_id, offset, pending, last=False)
+                offset += len(pending)
+            pending = data
+        yield encode_file_chunk(transfer_id, offset, pending or b"", last=True)
+    finally:
+        await chunks.aclose()
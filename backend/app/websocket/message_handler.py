@@ -7,6 +7,10 @@ and managing project operations.
 
 Features:
 - Message type routing and validation
+- Per-message-type timeouts and concurrency limits
+- Short-lived database session per message
+- Concurrent request dispatch with correlation ids
+- Project and execution channel subscriptions per connection
 - Payload validation and transformation
 - Integration with agent manager and task queue
 - Error handling and response generation
@@ -14,31 +18,37 @@ Features:
 - Rate limiting support
 """
 
+import asyncio
+import base64
+import contextlib
 import logging
-from typing import Any, Callable, Dict, Optional
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, NamedTuple, Optional, Set
 from enum import Enum
 from datetime import datetime
 from uuid import UUID
 
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import Settings
+from app.core.database import AsyncSessionLocal
 from app.models.user import User
 from app.models.project import Project
 from app.models.execution import Execution, ExecutionStatus, ExecutionType
 from app.services.project_service import ProjectService, get_project_service
 from app.services.agent_service import AgentService, get_agent_service
-from app.metagpt_integration.agent_manager import AgentManager
-from app.metagpt_integration.task_queue import (
-    TaskQueue,
-    JobPriority,
-    get_task_queue,
-)
-from app.metagpt_integration.streaming import (
-    StreamingHandler,
-    EventType,
-    get_streaming_handler,
+from app.services.execution_log_service import get_execution_log_service
+from app.metagpt_integration.task_queue import JobPriority, get_task_queue
+from app.metagpt_integration.streaming import get_streaming_handler
+from app.metagpt_integration.file_delta import build_file_payload, content_hash
+from app.websocket.file_transfer import (
+    chunk_count,
+    iter_file_chunks,
+    new_transfer_id,
+    resolve_range,
 )
+from app.websocket.subscriptions import ChannelSubscriptions
 
 
 logger = logging.getLogger(__name__)
@@ -78,6 +88,61 @@ class MessageType(str, Enum):
     HEARTBEAT = "heartbeat"
 
 
+class MessagePolicy(NamedTuple):
+    """
+    Dispatch policy for one message type.
+
+    Attributes:
+        timeout: Seconds allowed for the request (settings default if None)
+        max_concurrency: Max requests of this type running at once on a
+            connection; further ones wait (unlimited if None)
+        uses_db: Whether the handler needs a database session
+        scoped: Whether the endpoint's context (its project or execution id)
+            is added to the payload
+    """
+    timeout: Optional[float] = None
+    max_concurrency: Optional[int] = None
+    uses_db: bool = True
+    scoped: bool = True
+
+
+# Dispatch table: per-message-type timeouts and concurrency limits
+MESSAGE_POLICIES: Dict[MessageType, MessagePolicy] = {
+    MessageType.START_AGENT: MessagePolicy(timeout=60.0, max_concurrency=1),
+    MessageType.CANCEL_EXECUTION: MessagePolicy(timeout=15.0),
+    MessageType.PAUSE_EXECUTION: MessagePolicy(timeout=15.0),
+    MessageType.RESUME_EXECUTION: MessagePolicy(timeout=15.0),
+    MessageType.GET_PROJECT: MessagePolicy(timeout=15.0),
+    MessageType.UPDATE_PROJECT: MessagePolicy(timeout=15.0, max_concurrency=1),
+    MessageType.GET_PROJECT_STATUS: MessagePolicy(timeout=15.0),
+    MessageType.GET_EXECUTION: MessagePolicy(timeout=15.0),
+    MessageType.GET_EXECUTION_LOGS: MessagePolicy(timeout=60.0, max_concurrency=2),
+    MessageType.GET_FILE: MessagePolicy(timeout=30.0, max_concurrency=4),
+    MessageType.LIST_FILES: MessagePolicy(timeout=60.0, max_concurrency=2),
+    MessageType.GET_AGENT_CONFIG: MessagePolicy(timeout=15.0),
+    MessageType.UPDATE_AGENT_CONFIG: MessagePolicy(timeout=15.0, max_concurrency=1),
+    MessageType.SUBSCRIBE: MessagePolicy(timeout=10.0, scoped=False),
+    MessageType.UNSUBSCRIBE: MessagePolicy(timeout=5.0, uses_db=False, scoped=False),
+    MessageType.PING: MessagePolicy(timeout=5.0, uses_db=False),
+    MessageType.HEARTBEAT: MessagePolicy(timeout=5.0, uses_db=False),
+}
+
+
+class _RequestScope(NamedTuple):
+    """Database session and services for the request being handled."""
+    db: AsyncSession
+    project_service: ProjectService
+    agent_service: AgentService
+
+
+# Scope of the request handled by the current task. Each dispatched request
+# runs in its own task, so concurrent requests never see each other's session.
+_request_scope: ContextVar[Optional[_RequestScope]] = ContextVar("ws_request_scope", default=None)
+
+# Channel subscriptions of the connection the current request came from
+_request_channels: ContextVar[Optional[ChannelSubscriptions]] = ContextVar("ws_request_channels", default=None)
+
+
 class MessageResponse:
     """
     Represents a WebSocket message response.
@@ -87,6 +152,8 @@ class MessageResponse:
         message_type: Type of response
         data: Response data
         error: Error message if failed
+        request_id: Correlation id echoed from the request
+        attachment: Binary frames to send after the response (e.g. file chunks)
         timestamp: Response timestamp
     """
 
@@ -96,23 +163,30 @@ class MessageResponse:
         message_type: str,
         data: Optional[Dict[str, Any]] = None,
         error: Optional[str] = None,
+        request_id: Optional[Any] = None,
+        attachment: Optional[AsyncIterator[bytes]] = None,
     ):
         """Initialize message response."""
         self.success = success
         self.message_type = message_type
         self.data = data or {}
         self.error = error
+        self.request_id = request_id
+        self.attachment = attachment
         self.timestamp = datetime.utcnow().isoformat()
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert response to dictionary."""
-        return {
+        result = {
             "success": self.success,
             "message_type": self.message_type,
             "data": self.data,
             "error": self.error,
             "timestamp": self.timestamp,
         }
+        if self.request_id is not None:
+            result["request_id"] = self.request_id
+        return result
 
 
 class MessageHandler:
@@ -120,24 +194,26 @@ class MessageHandler:
     Handles incoming WebSocket messages and routes them to appropriate handlers.
     
     Manages message validation, routing, and response generation.
+    
+    The handler does not hold a database session. Each message that needs
+    one opens a session when its handler starts and closes it when the
+    handler returns, so an idle WebSocket holds no pooled connection.
     """
 
     def __init__(
         self,
-        db: AsyncSession,
         settings: Settings,
+        session_factory: Optional[Callable[[], AsyncSession]] = None,
     ):
         """
         Initialize message handler.
         
         Args:
-            db: Database session
             settings: Application settings
+            session_factory: Factory for per-message sessions (AsyncSessionLocal by default)
         """
-        self.db = db
         self.settings = settings
-        self.project_service = get_project_service(db)
-        self.agent_service = get_agent_service(db)
+        self.session_factory = session_factory or AsyncSessionLocal
         
         # Message handlers registry
         self.handlers: Dict[MessageType, Callable] = {
@@ -160,11 +236,69 @@ class MessageHandler:
             MessageType.HEARTBEAT: self._handle_heartbeat,
         }
 
+        # Per-type dispatch policies and concurrency limits
+        self.policies: Dict[MessageType, MessagePolicy] = dict(MESSAGE_POLICIES)
+        self._semaphores: Dict[MessageType, asyncio.Semaphore] = {
+            msg_type: asyncio.Semaphore(policy.max_concurrency)
+            for msg_type, policy in self.policies.items()
+            if policy.max_concurrency
+        }
+
+        self.metrics = {
+            "total_handled": 0,
+            "total_timeouts": 0,
+            "total_sessions": 0,
+        }
+
+    @property
+    def db(self) -> AsyncSession:
+        """Database session of the request being handled."""
+        return self._scope().db
+
+    @property
+    def project_service(self) -> ProjectService:
+        """Project service bound to the request's session."""
+        return self._scope().project_service
+
+    @property
+    def agent_service(self) -> AgentService:
+        """Agent service bound to the request's session."""
+        return self._scope().agent_service
+
+    @property
+    def channels(self) -> Optional[ChannelSubscriptions]:
+        """Channel subscriptions of the request's connection (None if it has none)."""
+        return _request_channels.get()
+
+    def policy(self, message_type: str) -> MessagePolicy:
+        """
+        Get the dispatch policy of a message type.
+        
+        Args:
+            message_type: Message type value
+            
+        Returns:
+            MessagePolicy (defaults for unknown types)
+        """
+        try:
+            return self.policies.get(MessageType(message_type), MessagePolicy())
+        except ValueError:
+            return MessagePolicy()
+
+    def _scope(self) -> _RequestScope:
+        """Get the current request scope."""
+        scope = _request_scope.get()
+        if scope is None:
+            raise RuntimeError("Database session is only available while handling a message")
+        return scope
+
     async def handle(
         self,
         message_type: str,
         payload: Dict[str, Any],
         user: User,
+        request_id: Optional[Any] = None,
+        channels: Optional[ChannelSubscriptions] = None,
     ) -> MessageResponse:
         """
         Handle incoming WebSocket message.
@@ -173,10 +307,28 @@ class MessageHandler:
             message_type: Type of message
             payload: Message payload
             user: User sending the message
+            request_id: Correlation id to echo in the response (optional)
+            channels: Channel subscriptions of the connection (optional)
             
         Returns:
             MessageResponse object
         """
+        token = _request_channels.set(channels)
+        try:
+            response = await self._dispatch(message_type, payload, user)
+        finally:
+            _request_channels.reset(token)
+        response.request_id = request_id
+        self.metrics["total_handled"] += 1
+        return response
+
+    async def _dispatch(
+        self,
+        message_type: str,
+        payload: Dict[str, Any],
+        user: User,
+    ) -> MessageResponse:
+        """Route a message to its handler under the type's policy."""
         try:
             # Validate message type
             try:
@@ -199,8 +351,21 @@ class MessageHandler:
 
             # Call handler
             logger.debug(f"Handling message {message_type} for user {user.id}")
-            response = await handler(payload, user)
-            return response
+            policy = self.policies.get(msg_type, MessagePolicy())
+            timeout = policy.timeout or self.settings.websocket_request_timeout_seconds
+            try:
+                return await asyncio.wait_for(
+                    self._call_handler(handler, msg_type, policy, payload, user),
+                    timeout=timeout,
+                )
+            except asyncio.TimeoutError:
+                self.metrics["total_timeouts"] += 1
+                logger.warning(f"Message {message_type} for user {user.id} timed out after {timeout}s")
+                return MessageResponse(
+                    success=False,
+                    message_type=message_type,
+                    error=f"Request timed out after {timeout}s",
+                )
 
         except Exception as e:
             logger.error(f"Error handling message {message_type}: {e}")
@@ -210,6 +375,81 @@ class MessageHandler:
                 error=f"Internal error: {str(e)}",
             )
 
+    async def _call_handler(
+        self,
+        handler: Callable,
+        msg_type: MessageType,
+        policy: MessagePolicy,
+        payload: Dict[str, Any],
+        user: User,
+    ) -> MessageResponse:
+        """
+        Run a handler inside its type's concurrency limit.
+        
+        The session is opened only once the handler may run, and closed
+        (rolling back anything uncommitted) when it returns, raises or is
+        cancelled by a timeout.
+        """
+        async with contextlib.AsyncExitStack() as stack:
+            semaphore = self._semaphores.get(msg_type)
+            if semaphore is not None:
+                await stack.enter_async_context(semaphore)
+            if policy.uses_db:
+                session = await stack.enter_async_context(self.session_factory())
+                self.metrics["total_sessions"] += 1
+                token = _request_scope.set(_RequestScope(
+                    db=session,
+                    project_service=get_project_service(session),
+                    agent_service=get_agent_service(session),
+                ))
+                stack.callback(_request_scope.reset, token)
+            return await handler(payload, user)
+
+    async def stream_attachment(
+        self,
+        message_type: str,
+        attachment: AsyncIterator[bytes],
+        send_binary: Callable[[bytes], Awaitable[Any]],
+    ) -> bool:
+        """
+        Send a response's binary frames under its message type's policy.
+        
+        The transfer takes a slot of the type's concurrency limit (the
+        handler released its own when it returned) and gets the type's
+        timeout, so large transfers are bounded like the requests that
+        start them.
+        
+        Args:
+            message_type: Message type of the request
+            attachment: Frames to send
+            send_binary: Coroutine function sending one frame (False stops)
+            
+        Returns:
+            False if the transfer timed out, True otherwise
+        """
+        policy = self.policy(message_type)
+        timeout = policy.timeout or self.settings.websocket_request_timeout_seconds
+
+        async def send_frames() -> None:
+            async with contextlib.AsyncExitStack() as stack:
+                try:
+                    semaphore = self._semaphores.get(MessageType(message_type))
+                except ValueError:
+                    semaphore = None
+                if semaphore is not None:
+                    await stack.enter_async_context(semaphore)
+                async for frame in attachment:
+                    if await send_binary(frame) is False:
+                        break
+
+        try:
+            await asyncio.wait_for(send_frames(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.metrics["total_timeouts"] += 1
+            logger.warning(f"Transfer for {message_type} timed out after {timeout}s")
+            return False
+
     # ========================================================================
     # Agent Control Handlers
     # ========================================================================
@@ -730,9 +970,17 @@ class MessageHandler:
         """
         Handle get execution logs message.
         
+        Without a cursor the newest entries are returned. Use the returned
+        cursor.before to page back through older entries, or cursor.after
+        to tail entries logged since the last read.
+        
         Payload:
             - execution_id: Execution ID
-            - limit: Optional limit on number of logs
+            - limit: Optional limit on number of logs (default 100)
+            - before: Optional cursor; return entries older than this seq
+            - after: Optional cursor; return entries newer than this seq
+            - agent: Optional agent name filter
+            - level: Optional log level filter
         """
         try:
             execution_id = payload.get("execution_id")
@@ -743,7 +991,7 @@ class MessageHandler:
                     error="Missing execution_id",
                 )
 
-            execution = await self.db.get(Execution, UUID(execution_id))
+            execution = await self.db.get(Execution, str(UUID(execution_id)))
             if not execution or execution.user_id != user.id:
                 return MessageResponse(
                     success=False,
@@ -751,14 +999,21 @@ class MessageHandler:
                     error="Execution not found",
                 )
 
-            logs = execution.agent_logs or []
-            limit = payload.get("limit", 100)
-            logs = logs[-limit:]
+            before = payload.get("before")
+            after = payload.get("after")
+            page = await get_execution_log_service(self.db).get_logs(
+                execution_id=str(execution.id),
+                limit=int(payload.get("limit", 100)),
+                before=int(before) if before is not None else None,
+                after=int(after) if after is not None else None,
+                agent=payload.get("agent"),
+                level=payload.get("level"),
+            )
 
             return MessageResponse(
                 success=True,
                 message_type=MessageType.GET_EXECUTION_LOGS.value,
-                data={"execution_id": str(execution.id), "logs": logs},
+                data={"execution_id": str(execution.id), **page.to_dict()},
             )
 
         except Exception as e:
@@ -784,10 +1039,26 @@ class MessageHandler:
         Payload:
             - project_id: Project ID
             - file_path: Relative file path within workspace
+            - base_hash: Hash of the copy the client holds (optional). When it
+              matches a known version, a patch is returned instead of the
+              full content.
+            - offset: First byte of a range to read (optional)
+            - length: Number of bytes in the range (optional)
+            - chunked: Stream the file as binary frames (optional)
+        
+        Small whole-file reads return the content inline (encoding "full"
+        or "patch"). Small ranges return base64 content (encoding "range").
+        Files or ranges above websocket_file_inline_max_bytes, and any
+        request with chunked set, return encoding "chunked" with a
+        transfer_id; the bytes follow as FRAME_FILE_CHUNK binary frames.
         """
         try:
             project_id = payload.get("project_id")
             file_path = payload.get("file_path")
+            base_hash = payload.get("base_hash")
+            offset = payload.get("offset")
+            length = payload.get("length")
+            chunked = bool(payload.get("chunked"))
             
             if not project_id or not file_path:
                 return MessageResponse(
@@ -810,18 +1081,41 @@ class MessageHandler:
             file_handler = get_file_handler()
             
             try:
-                content = file_handler.read_file(project_id, file_path)
+                full_path = file_handler.resolve_file_path(project_id, file_path)
                 file_info = file_handler.get_file_info(project_id, file_path)
+                size = file_info["size"]
+                inline_max = self.settings.websocket_file_inline_max_bytes
+                
+                if offset is not None or length is not None or chunked or size > inline_max:
+                    start, end = resolve_range(offset, length, size)
+                    return await self._file_range_response(
+                        project_id, file_path, full_path, file_info, start, end,
+                        chunked=chunked or end - start > inline_max,
+                    )
+                
+                content = file_handler.read_file(project_id, file_path)
+                
+                # Patch against the client's copy if we know that version
+                base = None
+                if base_hash:
+                    if content_hash(content) == base_hash:
+                        base = (base_hash, content)
+                    else:
+                        streaming_handler = await get_streaming_handler()
+                        snapshot = streaming_handler.file_snapshots.get(project_id, file_path)
+                        if snapshot and snapshot[0] == base_hash:
+                            base = snapshot
+                
+                data = build_file_payload(
+                    file_path, content, base, max_line_pairs=self.settings.streaming_file_patch_max_line_pairs,
+                )
+                data["size"] = file_info.get("size")
+                data["modified_at"] = file_info.get("modified_at")
                 
                 return MessageResponse(
                     success=True,
                     message_type=MessageType.GET_FILE.value,
-                    data={
-                        "file_path": file_path,
-                        "content": content,
-                        "size": file_info.get("size"),
-                        "modified_at": file_info.get("modified_at"),
-                    },
+                    data=data,
                 )
             except FileNotFoundError:
                 return MessageResponse(
@@ -844,6 +1138,52 @@ class MessageHandler:
                 error=str(e),
             )
 
+    async def _file_range_response(
+        self,
+        project_id: str,
+        file_path: str,
+        full_path: str,
+        file_info: Dict[str, Any],
+        start: int,
+        end: int,
+        chunked: bool,
+    ) -> MessageResponse:
+        """Build a GET_FILE response for a byte range, inline or as chunks."""
+        data = {
+            "file_path": file_path,
+            "offset": start,
+            "length": end - start,
+            "size": file_info["size"],
+            "modified_at": file_info.get("modified_at"),
+        }
+
+        if not chunked:
+            from app.metagpt_integration.file_handler import get_file_handler
+            raw = await asyncio.to_thread(
+                get_file_handler().read_range, project_id, file_path, start, end - start
+            )
+            data.update(encoding="range", content=base64.b64encode(raw).decode("ascii"))
+            return MessageResponse(
+                success=True,
+                message_type=MessageType.GET_FILE.value,
+                data=data,
+            )
+
+        chunk_size = self.settings.websocket_file_chunk_size
+        transfer_id = new_transfer_id()
+        data.update(
+            encoding="chunked",
+            transfer_id=transfer_id,
+            chunk_size=chunk_size,
+            chunks=chunk_count(start, end, chunk_size),
+        )
+        return MessageResponse(
+            success=True,
+            message_type=MessageType.GET_FILE.value,
+            data=data,
+            attachment=iter_file_chunks(full_path, transfer_id, start, end, chunk_size),
+        )
+
     async def _handle_list_files(
         self,
         payload: Dict[str, Any],
@@ -1073,13 +1413,55 @@ class MessageHandler:
         """
         Handle subscribe message.
         
+        Adds project and/or execution channels to the connection; their
+        streaming events are delivered as {"type": "event"} messages.
+        
         Payload:
-            - execution_id: Optional execution ID to subscribe to
             - project_id: Optional project ID to subscribe to
+            - execution_id: Optional execution ID to subscribe to
         """
         try:
-            execution_id = payload.get("execution_id")
+            channels = self.channels
+            if channels is None:
+                return MessageResponse(
+                    success=False,
+                    message_type=MessageType.SUBSCRIBE.value,
+                    error="Subscriptions are not supported on this connection",
+                )
+
             project_id = payload.get("project_id")
+            execution_id = payload.get("execution_id")
+            if not project_id and not execution_id:
+                return MessageResponse(
+                    success=False,
+                    message_type=MessageType.SUBSCRIBE.value,
+                    error="Missing project_id or execution_id",
+                )
+
+            if project_id:
+                owned = await self.db.scalar(
+                    select(Project.id).where(Project.id == project_id, Project.owner_id == str(user.id))
+                )
+                if owned is None:
+                    return MessageResponse(
+                        success=False,
+                        message_type=MessageType.SUBSCRIBE.value,
+                        error="Project not found",
+                    )
+
+            if execution_id:
+                execution_id = str(UUID(execution_id))
+                owned = await self.db.scalar(
+                    select(Execution.id).where(Execution.id == execution_id, Execution.user_id == str(user.id))
+                )
+                if owned is None:
+                    return MessageResponse(
+                        success=False,
+                        message_type=MessageType.SUBSCRIBE.value,
+                        error="Execution not found",
+                    )
+
+            await channels.add(project_id=project_id, execution_id=execution_id)
 
             return MessageResponse(
                 success=True,
@@ -1087,6 +1469,7 @@ class MessageHandler:
                 data={
                     "execution_id": execution_id,
                     "project_id": project_id,
+                    "channels": channels.list(),
                 },
             )
 
@@ -1103,10 +1486,28 @@ class MessageHandler:
         payload: Dict[str, Any],
         user: User,
     ) -> MessageResponse:
-        """Handle unsubscribe message."""
+        """
+        Handle unsubscribe message.
+        
+        Payload:
+            - project_id: Optional project ID to unsubscribe from
+            - execution_id: Optional execution ID to unsubscribe from
+        """
         try:
-            execution_id = payload.get("execution_id")
+            channels = self.channels
+            if channels is None:
+                return MessageResponse(
+                    success=False,
+                    message_type=MessageType.UNSUBSCRIBE.value,
+                    error="Subscriptions are not supported on this connection",
+                )
+
             project_id = payload.get("project_id")
+            execution_id = payload.get("execution_id")
+            if execution_id:
+                execution_id = str(UUID(execution_id))
+
+            await channels.remove(project_id=project_id, execution_id=execution_id)
 
             return MessageResponse(
                 success=True,
@@ -1114,6 +1515,7 @@ class MessageHandler:
                 data={
                     "execution_id": execution_id,
                     "project_id": project_id,
+                    "channels": channels.list(),
                 },
             )
 
@@ -1154,15 +1556,171 @@ class MessageHandler:
         )
 
 
-def get_message_handler(db: AsyncSession, settings: Settings) -> MessageHandler:
+class RequestDispatcher:
+    """
+    Runs a connection's requests as concurrent tasks.
+
+    The receive loop submits each message and goes straight back to reading,
+    so a slow request never holds up pings or other commands on the same
+    socket. Each response carries the request's correlation id and is sent
+    as soon as its request finishes, so responses may arrive out of order.
+    """
+
+    def __init__(
+        self,
+        handler: MessageHandler,
+        user: User,
+        send: Callable[[Dict[str, Any]], Awaitable[Any]],
+        max_in_flight: Optional[int] = None,
+        send_binary: Optional[Callable[[bytes], Awaitable[Any]]] = None,
+        channels: Optional[ChannelSubscriptions] = None,
+    ):
+        """
+        Initialize request dispatcher.
+
+        Args:
+            handler: Message handler for the connection
+            user: User owning the connection
+            send: Coroutine function that sends a response to the client
+            max_in_flight: Max requests handled at once (settings default if None)
+            send_binary: Coroutine function that sends a binary frame (needed
+                for responses with attachments, such as chunked files)
+            channels: Channel subscriptions of the connection, for
+                SUBSCRIBE/UNSUBSCRIBE (optional)
+        """
+        self.handler = handler
+        self.user = user
+        self.send = send
+        self.send_binary = send_binary
+        self.channels = channels
+        self.max_in_flight = max_in_flight or handler.settings.websocket_max_inflight_requests
+        self._tasks: Set[asyncio.Task] = set()
+        self.metrics = {
+            "total_submitted": 0,
+            "total_rejected": 0,
+        }
+
+    @property
+    def in_flight(self) -> int:
+        """Number of requests currently being handled."""
+        return len(self._tasks)
+
+    async def submit(
+        self,
+        data: Dict[str, Any],
+        context: Optional[Dict[str, Any]] = None,
+    ) -> Optional[asyncio.Task]:
+        """
+        Start handling a client message without waiting for it to finish.
+
+        Message format: {"type": "...", "payload": {...}, "id": ...}. The
+        optional "id" (or "request_id") is echoed as "request_id" in the
+        response.
+
+        Args:
+            data: Decoded client message
+            context: Values added to the payload (e.g. the endpoint's project_id);
+                not added for message types whose policy is not scoped
+
+        Returns:
+            Task handling the request, or None if it was rejected
+        """
+        request_id = data.get("id", data.get("request_id"))
+        message_type = data.get("type")
+        payload = data.get("payload") or {}
+
+        if not message_type:
+            await self._reject(request_id, message_type, "Missing message type")
+            return None
+        if not isinstance(payload, dict):
+            await self._reject(request_id, message_type, "Payload must be an object")
+            return None
+        if len(self._tasks) >= self.max_in_flight:
+            self.metrics["total_rejected"] += 1
+            await self._reject(
+                request_id, message_type,
+                f"Too many in-flight requests (limit {self.max_in_flight})",
+            )
+            return None
+
+        if context and self.handler.policy(message_type).scoped:
+            payload = {**payload, **context}
+
+        self.metrics["total_submitted"] += 1
+        task = asyncio.create_task(self._run(message_type, payload, request_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _run(self, message_type: str, payload: Dict[str, Any], request_id: Optional[Any]) -> None:
+        """Handle one request and send its response."""
+        response = await self.handler.handle(
+            message_type=message_type,
+            payload=payload,
+            user=self.user,
+            request_id=request_id,
+            channels=self.channels,
+        )
+        if response.attachment is not None and self.send_binary is None:
+            await response.attachment.aclose()
+            response = MessageResponse(
+                success=False,
+                message_type=message_type,
+                error="Binary responses are not supported on this connection",
+                request_id=request_id,
+            )
+
+        try:
+            await self.send(response.to_dict())
+            if response.attachment is not None:
+                # The request stays in flight until its last frame is queued
+                completed = await self.handler.stream_attachment(
+                    message_type, response.attachment, self.send_binary,
+                )
+                if not completed:
+                    await self.send(MessageResponse(
+                        success=False,
+                        message_type=message_type,
+                        error="Transfer timed out",
+                        request_id=request_id,
+                    ).to_dict())
+        except Exception as e:
+            logger.warning(f"Failed to send response for {message_type}: {e}")
+        finally:
+            if response.attachment is not None:
+                await response.attachment.aclose()
+
+    async def _reject(self, request_id: Optional[Any], message_type: Optional[str], error: str) -> None:
+        """Send an error response for a request that was not started."""
+        await self.send(MessageResponse(
+            success=False,
+            message_type=message_type or "",
+            error=error,
+            request_id=request_id,
+        ).to_dict())
+
+    async def close(self) -> None:
+        """Cancel all in-flight requests."""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+
+def get_message_handler(
+    settings: Settings,
+    session_factory: Optional[Callable[[], AsyncSession]] = None,
+) -> MessageHandler:
     """
     Get message handler instance.
     
     Args:
-        db: Database session
         settings: Application settings
+        session_factory: Factory for per-message sessions (optional)
         
     Returns:
         MessageHandler instance
     """
-    return MessageHandler(db, settings)
+    return MessageHandler(settings, session_factory)
@@ -0,0 +1,184 @@
+"""
+WebSocket Channel Subscriptions
+
+This module lets one WebSocket connection follow any number of project and
+execution channels, added and removed at runtime with SUBSCRIBE and
+UNSUBSCRIBE messages, instead of opening a socket per project or execution.
+
+Each connection has at most one streaming subscriber, whose filter is
+replaced whenever the channel set changes. A connection with no channels
+has no subscriber at all, so it costs nothing per streaming event. Project
+channels also index the connection under the project in the connection
+manager, so project messages (send_to_project) reach it too.
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set
+
+from app.metagpt_integration.streaming import (
+    EventFilter,
+    EventPriority,
+    EventType,
+    StreamEvent,
+    StreamingHandler,
+)
+from app.websocket.connection_manager import ConnectionManager
+
+
+logger = logging.getLogger(__name__)
+
+
+class ChannelFilter(EventFilter):
+    """
+    Event filter matching events of any subscribed project or execution.
+
+    Unlike EventFilter, where project and execution criteria must all hold,
+    channels are alternatives: an event matches if its project or its
+    execution is subscribed.
+    """
+
+    def __init__(
+        self,
+        project_ids: Set[str],
+        execution_ids: Set[str],
+        event_types: Optional[Set[EventType]] = None,
+        min_priority: EventPriority = EventPriority.LOW,
+    ):
+        """
+        Initialize channel filter.
+
+        Args:
+            project_ids: Subscribed project IDs
+            execution_ids: Subscribed execution IDs
+            event_types: Set of event types to include (None = all)
+            min_priority: Minimum event priority to include
+        """
+        super().__init__(event_types=event_types, min_priority=min_priority)
+        self.channel_project_ids = frozenset(project_ids)
+        self.channel_execution_ids = frozenset(execution_ids)
+
+    def matches(self, event: StreamEvent) -> bool:
+        """Check if the event belongs to a subscribed channel and passes the base criteria."""
+        if (
+            event.project_id not in self.channel_project_ids
+            and event.execution_id not in self.channel_execution_ids
+        ):
+            return False
+        return super().matches(event)
+
+
+class ChannelSubscriptions:
+    """
+    Project and execution channels of one WebSocket connection.
+    """
+
+    def __init__(
+        self,
+        connection_id: str,
+        connection_manager: ConnectionManager,
+        streaming_handler: StreamingHandler,
+        max_channels: int = 100,
+    ):
+        """
+        Initialize channel subscriptions.
+
+        Args:
+            connection_id: Connection identifier (also the streaming subscriber id)
+            connection_manager: Connection manager holding the connection
+            streaming_handler: Streaming handler delivering events
+            max_channels: Max project plus execution channels on the connection
+        """
+        self.connection_id = connection_id
+        self.connection_manager = connection_manager
+        self.streaming_handler = streaming_handler
+        self.max_channels = max_channels
+        self.project_ids: Set[str] = set()
+        self.execution_ids: Set[str] = set()
+        self._subscribed = False
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self.project_ids) + len(self.execution_ids)
+
+    def list(self) -> Dict[str, List[str]]:
+        """Get the subscribed channels."""
+        return {
+            "project_ids": sorted(self.project_ids),
+            "execution_ids": sorted(self.execution_ids),
+        }
+
+    async def add(self, project_id: Optional[str] = None, execution_id: Optional[str] = None) -> None:
+        """
+        Subscribe to a project and/or execution channel.
+
+        Callers are responsible for checking that the user may access them.
+
+        Args:
+            project_id: Project ID (optional)
+            execution_id: Execution ID (optional)
+
+        Raises:
+            ValueError: If the connection would exceed max_channels
+        """
+        async with self._lock:
+            new = int(bool(project_id) and project_id not in self.project_ids)
+            new += int(bool(execution_id) and execution_id not in self.execution_ids)
+            if len(self) + new > self.max_channels:
+                raise ValueError(f"Too many subscriptions (limit {self.max_channels})")
+
+            if project_id and project_id not in self.project_ids:
+                self.project_ids.add(project_id)
+                await self.connection_manager.join_project(self.connection_id, project_id)
+            if execution_id:
+                self.execution_ids.add(execution_id)
+            await self._sync()
+
+    async def remove(self, project_id: Optional[str] = None, execution_id: Optional[str] = None) -> None:
+        """
+        Unsubscribe from a project and/or execution channel.
+
+        Args:
+            project_id: Project ID (optional)
+            execution_id: Execution ID (optional)
+        """
+        async with self._lock:
+            if project_id and project_id in self.project_ids:
+                self.project_ids.discard(project_id)
+                await self.connection_manager.leave_project(self.connection_id, project_id)
+            if execution_id:
+                self.execution_ids.discard(execution_id)
+            await self._sync()
+
+    async def close(self) -> None:
+        """Drop the streaming subscriber (the connection manager cleans up on disconnect)."""
+        async with self._lock:
+            self.project_ids.clear()
+            self.execution_ids.clear()
+            await self._sync()
+
+    async def _sync(self) -> None:
+        """Register, update or drop the streaming subscriber to match the channels."""
+        if not len(self):
+            if self._subscribed:
+                await self.streaming_handler.unsubscribe(self.connection_id)
+                self._subscribed = False
+            return
+
+        event_filter = ChannelFilter(self.project_ids, self.execution_ids)
+        if self._subscribed:
+            await self.streaming_handler.update_filter(self.connection_id, event_filter)
+        else:
+            await self.streaming_handler.subscribe(
+                subscriber_id=self.connection_id,
+                callback=self._on_event,
+                event_filter=event_filter,
+            )
+            self._subscribed = True
+
+    async def _on_event(self, event: StreamEvent) -> Any:
+        """Forward a streaming event to the connection."""
+        return await self.connection_manager.send_to_connection(self.connection_id, {
+            "type": "event",
+            "event": event.to_dict(),
+        })
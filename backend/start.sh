@@ -11,4 +11,6 @@ echo "Running database migrations..."
 alembic upgrade head
 
 echo "Starting application..."
-exec uvicorn app.main:app --host 0.0.0.0 --port 8000
+# permessage-deflate is a server option, so read it from settings here
+WS_PER_MESSAGE_DEFLATE=$(python -c "from app.core.config import settings; print(str(settings.websocket_per_message_deflate).lower())")
+exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --ws-per-message-deflate "$WS_PER_MESSAGE_DEFLATE"
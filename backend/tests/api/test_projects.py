@@ -119,3 +119,60 @@ class TestProjectEndpoints:
         )
         # This might be 200 (allowed) or 403 (forbidden) depending on implementation
         assert response.status_code in [200, 403]
+
+
+class TestProjectFileDownload:
+    """Test the project file download endpoint."""
+
+    @pytest.fixture
+    async def project_file(self, test_db, test_user: User, tmp_path, monkeypatch):
+        """Project owned by the test user with one workspace file."""
+        from app.metagpt_integration.file_handler import FileHandler
+        from app.models.project import Project
+
+        project = Project(name="Files", owner_id=test_user.id, workspace_path=str(tmp_path / "ws"))
+        test_db.add(project)
+        await test_db.commit()
+
+        handler = FileHandler(workspace_root=str(tmp_path))
+        (tmp_path / project.id / "src").mkdir(parents=True)
+        (tmp_path / project.id / "src" / "main.py").write_bytes(b"0123456789" * 10)
+        monkeypatch.setattr("app.api.v1.projects.get_file_handler", lambda: handler)
+        return project
+
+    @pytest.mark.asyncio
+    async def test_download_whole_file(self, client: AsyncClient, test_user_token: str, project_file):
+        """Test downloading a whole file."""
+        response = await client.get(
+            f"/api/v1/projects/{project_file.id}/files/src/main.py",
+            headers={"Authorization": f"Bearer {test_user_token}"},
+        )
+        assert response.status_code == 200
+        assert response.content == b"0123456789" * 10
+        assert response.headers["accept-ranges"] == "bytes"
+
+    @pytest.mark.asyncio
+    async def test_download_range(self, client: AsyncClient, test_user_token: str, project_file):
+        """Test downloading a byte range."""
+        response = await client.get(
+            f"/api/v1/projects/{project_file.id}/files/src/main.py",
+            headers={"Authorization": f"Bearer {test_user_token}", "Range": "bytes=5-14"},
+        )
+        assert response.status_code == 206
+        assert response.content == b"5678901234"
+        assert response.headers["content-range"] == "bytes 5-14/100"
+
+        response = await client.get(
+            f"/api/v1/projects/{project_file.id}/files/src/main.py",
+            headers={"Authorization": f"Bearer {test_user_token}", "Range": "bytes=500-"},
+        )
+        assert response.status_code == 416
+
+    @pytest.mark.asyncio
+    async def test_download_missing_file(self, client: AsyncClient, test_user_token: str, project_file):
+        """Test that a missing file returns 404."""
+        response = await client.get(
+            f"/api/v1/projects/{project_file.id}/files/nope.txt",
+            headers={"Authorization": f"Bearer {test_user_token}"},
+        )
+        assert response.status_code == 404
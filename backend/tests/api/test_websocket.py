@@ -2,8 +2,10 @@
 Test WebSocket functionality.
 """
 
-import pytest
+import asyncio
 import json
+
+import pytest
 from httpx import AsyncClient
 
 
@@ -36,6 +38,60 @@ class TestWebSocketConnection:
         pass
 
 
+class TestWebSocketDisconnect:
+    """Test that receive loops end when the client goes away."""
+
+    @pytest.mark.asyncio
+    async def test_disconnect_mid_loop_exits(self, monkeypatch):
+        """Test that a disconnect ends the receive loop instead of spinning on it."""
+        from types import SimpleNamespace
+
+        from fastapi import WebSocketDisconnect
+
+        from app.api.v1 import websocket as websocket_api
+        from app.metagpt_integration.streaming import StreamingHandler
+        from app.websocket.auth import HandshakeResult
+        from app.websocket.connection_manager import ConnectionManager
+        from tests.websocket.test_connection_manager import FakeWebSocket
+
+        class ClosingWebSocket(FakeWebSocket):
+            """Socket that sends one message, then disconnects like Starlette does."""
+
+            def __init__(self):
+                super().__init__()
+                self.receives = 0
+
+            async def receive_json(self):
+                self.receives += 1
+                await asyncio.sleep(0)
+                if self.receives == 1:
+                    return {"type": "ping"}
+                if self.receives == 2:
+                    raise WebSocketDisconnect(code=1001)
+                if self.receives > 50:
+                    raise asyncio.CancelledError()
+                raise RuntimeError('Cannot call "receive" once a disconnect message has been received.')
+
+        class Authenticator:
+            async def authenticate(self, token):
+                return HandshakeResult(SimpleNamespace(id="u1"))
+
+        async def get_streaming_handler():
+            return StreamingHandler()
+
+        manager = ConnectionManager()
+        monkeypatch.setattr(websocket_api, "get_websocket_authenticator", lambda: Authenticator())
+        monkeypatch.setattr(websocket_api, "get_streaming_handler", get_streaming_handler)
+        monkeypatch.setattr(websocket_api, "get_connection_manager", lambda: manager)
+        ws = ClosingWebSocket()
+
+        endpoint = websocket_api.websocket_endpoint(ws, token="t", batch_ms=None, batch_size=None, compress=None)
+        await asyncio.wait_for(endpoint, timeout=5)
+
+        assert ws.receives == 2
+        assert manager.get_connection_count() == 0
+
+
 class TestWebSocketMessages:
     """Test WebSocket message types and formats."""
     
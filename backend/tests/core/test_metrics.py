@@ -0,0 +1,76 @@
+"""
+Tests for bounded-cardinality metrics and latency histograms.
+"""
+
+import pytest
+from httpx import AsyncClient
+
+from app.core.metrics import Histogram, MetricsRegistry, TopKCounter
+
+
+class TestTopKCounter:
+    """Test the Space-Saving top-K counter."""
+
+    def test_memory_is_bounded(self):
+        """Test that unbounded key streams do not grow the counter."""
+        counter = TopKCounter(capacity=10)
+        for i in range(10_000):
+            counter.add(f"project-{i}")
+        assert len(counter) == 10
+        assert counter.total == 10_000
+
+    def test_heavy_hitters_are_kept(self):
+        """Test that frequent keys survive a long tail of rare keys."""
+        counter = TopKCounter(capacity=20)
+        for i in range(5000):
+            counter.add("hot" if i % 4 == 0 else f"cold-{i}")
+
+        key, count, error = counter.top(1)[0]
+        assert key == "hot"
+        assert count - error <= 1250 <= count
+
+
+class TestHistogram:
+    """Test fixed-bucket histograms."""
+
+    def test_quantiles(self):
+        """Test quantile estimates fall in the right bucket."""
+        hist = Histogram("latency", buckets=(0.01, 0.1, 1.0))
+        for _ in range(90):
+            hist.observe(0.005)
+        for _ in range(10):
+            hist.observe(0.5)
+
+        snapshot = hist.snapshot()
+        assert snapshot["count"] == 100
+        assert snapshot["buckets"] == {"0.01": 90, "0.1": 90, "1.0": 100, "+Inf": 100}
+        assert 0 < snapshot["p50"] <= 0.01
+        assert 0.1 < snapshot["p99"] <= 1.0
+
+    def test_prometheus_rendering(self):
+        """Test the text exposition output for histograms and components."""
+        registry = MetricsRegistry()
+        registry.histogram("send_latency_seconds", "Send latency", buckets=(0.1,)).observe(0.05)
+        counter = TopKCounter(5)
+        counter.add('p"1')
+
+        text = registry.render_prometheus({"broadcast": {"total": 3, "by_project": counter, "policy": "x"}})
+
+        assert 'xteam_send_latency_seconds_bucket{le="0.1"} 1' in text
+        assert "xteam_send_latency_seconds_count 1" in text
+        assert "xteam_broadcast_total 3" in text
+        assert 'xteam_broadcast_by_project{key="p\\"1"} 1' in text
+        assert "policy" not in text
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(client: AsyncClient):
+    """Test the WebSocket metrics endpoint in both formats."""
+    response = await client.get("/api/v1/websocket/metrics")
+    assert response.status_code == 200
+    body = response.json()
+    assert {"websocket", "broadcast", "streaming", "histograms"} <= body.keys()
+
+    response = await client.get("/api/v1/websocket/metrics", params={"format": "prometheus"})
+    assert response.status_code == 200
+    assert "xteam_websocket_send_latency_seconds_count" in response.text
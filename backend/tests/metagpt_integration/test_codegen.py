@@ -0,0 +1,119 @@
+"""
+Tests for splitting a system design into per-file code generation tasks.
+"""
+
+from app.metagpt_integration.codegen import FileBlockParser, FilePlanItem, extract_code_block, parse_file_plan
+
+
+DESIGN = """
+1. System Architecture Diagram (ASCII)
+   [client] -> [api] -> [db]
+3. Technology Stack
+- Python 3.11: runtime
+- FastAPI: web framework
+
+6. File List:
+- app/main.py: Application entry point
+* `app/models.py` - Database models
+1. app/api/routes.py: API routes
+- app/main.py: duplicate
+- ../secrets.env: escapes the workspace
+- requirements.txt
+
+Notes: keep modules small.
+- README.md: not part of the list
+"""
+
+
+class TestParseFilePlan:
+    """Test file list parsing."""
+
+    def test_file_list_section(self):
+        """Test that only the file list section is read, without duplicates or unsafe paths."""
+        assert parse_file_plan(DESIGN) == [
+            FilePlanItem("app/main.py", "Application entry point"),
+            FilePlanItem("app/models.py", "Database models"),
+            FilePlanItem("app/api/routes.py", "API routes"),
+            FilePlanItem("requirements.txt", ""),
+        ]
+
+    def test_no_file_list(self):
+        """Test that a design without a file list gives an empty plan."""
+        assert parse_file_plan("- Python 3.11: runtime\n- app/main.py: entry") == []
+
+    def test_max_files(self):
+        """Test that the plan is truncated to max_files."""
+        assert [item.path for item in parse_file_plan(DESIGN, max_files=2)] == ["app/main.py", "app/models.py"]
+
+
+class TestExtractCodeBlock:
+    """Test single-file response parsing."""
+
+    def test_first_code_block(self):
+        """Test that the first fenced block is the file content."""
+        response = "Here it is:\n```python\nprint('hi')\n```\nand\n```\nother\n```"
+
+        assert extract_code_block(response) == "print('hi')"
+
+    def test_no_code_block(self):
+        """Test that a response without a fence is used as is."""
+        assert extract_code_block("  print('hi')\n") == "print('hi')"
+
+
+RESPONSE = """Here is the code:
+
+```python app/main.py
+print("hi")
+```
+
+```python
+# no path, skipped
+```
+
+```app/config.yaml
+debug: true
+```
+```python ../escape.py
+nope
+```
+"""
+
+
+class TestFileBlockParser:
+    """Test incremental file block parsing."""
+
+    def test_whole_response(self):
+        """Test that blocks naming a file are returned and others skipped."""
+        parser = FileBlockParser()
+
+        assert parser.feed(RESPONSE) + parser.close() == [
+            ("app/main.py", 'print("hi")'),
+            ("app/config.yaml", "debug: true"),
+        ]
+
+    def test_any_chunking(self):
+        """Test that chunk boundaries do not change the result, and blocks come out as they close."""
+        expected = [("app/main.py", 'print("hi")'), ("app/config.yaml", "debug: true")]
+
+        for size in (1, 2, 3, 5, 8, 13):
+            parser = FileBlockParser()
+            files = []
+            for i in range(0, len(RESPONSE), size):
+                files.extend(parser.feed(RESPONSE[i:i + size]))
+            assert files + parser.close() == expected
+
+    def test_block_returned_when_closed(self):
+        """Test that a block is returned by the chunk that closes it."""
+        parser = FileBlockParser()
+
+        assert parser.feed("```a.py\nx = 1\n") == []
+        assert parser.feed("```\n```b.py\n") == [("a.py", "x = 1")]
+        assert parser.feed("y = 2\n```") == []
+        assert parser.close() == [("b.py", "y = 2")]
+
+    def test_unterminated_block_dropped(self):
+        """Test that a block still open when the response ends is discarded."""
+        parser = FileBlockParser()
+        parser.feed("```a.py\nx = 1\n")
+
+        assert parser.close() == []
@@ -0,0 +1,110 @@
+"""
+Tests for patch-based file change events.
+"""
+
+import asyncio
+
+import pytest
+
+from app.metagpt_integration.file_delta import (
+    FileSnapshotCache,
+    apply_file_patch,
+    build_file_payload,
+    content_hash,
+    make_file_patch,
+)
+from app.metagpt_integration.streaming import EventType, StreamingHandler
+
+
+BASE = "".join(f"line {i}\n" for i in range(200))
+
+
+class TestFilePatch:
+    """Test patch computation and application."""
+
+    @pytest.mark.parametrize("target", [
+        BASE.replace("line 50\n", "line fifty\n"),
+        BASE + "tail without newline",
+        "header\n" + BASE[:-1],
+        BASE[:700] + BASE,
+        "",
+    ])
+    def test_patch_round_trip(self, target):
+        """Test that applying a patch reproduces the target exactly."""
+        patch = make_file_patch(BASE, target)
+        assert apply_file_patch(BASE, patch) == target
+
+    def test_patch_rejects_wrong_base(self):
+        """Test that a patch does not silently apply to other content."""
+        patch = make_file_patch(BASE, BASE + "more\n")
+        with pytest.raises(ValueError):
+            apply_file_patch("short\n", patch)
+
+    def test_large_changes_not_diffed(self):
+        """Test that a change too costly to diff gets no patch, while a local edit still does."""
+        repetitive = "".join("pass\n" if i % 2 else f"x = {i % 7}\n" for i in range(1500))
+        reordered = "".join("pass\n" if i % 3 else f"x = {i % 5}\n" for i in range(1500))
+        edited = repetitive.replace("x = 3\n", "x = three\n", 1)
+
+        assert make_file_patch(repetitive, reordered, max_line_pairs=40000) is None
+        payload = build_file_payload("a.py", reordered, (content_hash(repetitive), repetitive), max_line_pairs=40000)
+        assert payload["encoding"] == "full"
+
+        patch = make_file_patch(repetitive, edited, max_line_pairs=40000)
+        assert apply_file_patch(repetitive, patch) == edited
+        assert len(patch) == 4
+
+    def test_payload_falls_back_to_full_content(self):
+        """Test that unrelated content is sent in full."""
+        payload = build_file_payload("a.py", "x = 1\n", (content_hash(BASE), BASE))
+        assert payload["encoding"] == "full"
+        assert payload["content"] == "x = 1\n"
+
+
+class TestFileSnapshotCache:
+    """Test snapshot cache bounds."""
+
+    def test_evicts_by_total_size(self):
+        """Test that least recently used snapshots are evicted to fit the size budget."""
+        cache = FileSnapshotCache(max_entries=10, max_file_size=100, max_total_size=300)
+        for name in ("a", "b", "c"):
+            cache.put("p", name, name * 100)
+        cache.get("p", "a")
+        cache.put("p", "d", "d" * 100)
+
+        assert cache.get("p", "b") is None
+        assert all(cache.get("p", name) is not None for name in ("a", "c", "d"))
+        assert cache.total_size == 300
+
+        cache.put("p", "a", "x" * 101)
+        cache.discard("p", "d")
+        assert len(cache) == 1 and cache.total_size == 100
+
+
+class TestFileChangeEvents:
+    """Test StreamingHandler.emit_file_change delta mode."""
+
+    @pytest.mark.asyncio
+    async def test_second_change_is_sent_as_patch(self):
+        """Test that re-generating a file only streams the changed lines."""
+        handler = StreamingHandler(batch_timeout_ms=10)
+        events = []
+
+        async def callback(event):
+            events.append(event)
+
+        await handler.subscribe("s1", callback)
+        await handler.start()
+
+        target = BASE.replace("line 7\n", "line seven\n")
+        await handler.emit_file_change(EventType.FILE_CREATED, "main.py", BASE, project_id="p1")
+        await handler.emit_file_change(EventType.FILE_MODIFIED, "main.py", target, project_id="p1")
+        await asyncio.sleep(0.1)
+        await handler.stop()
+
+        first, second = (e.data for e in events)
+        assert first["encoding"] == "full"
+        assert second["encoding"] == "patch"
+        assert second["base_hash"] == first["content_hash"]
+        assert apply_file_patch(first["content"], second["patch"]) == target
+        assert second["content_hash"] == content_hash(target)
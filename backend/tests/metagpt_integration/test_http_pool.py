@@ -0,0 +1,92 @@
+"""
+Tests for shared LLM HTTP connection pools.
+"""
+
+import json
+
+import httpx
+import openai
+import pytest
+
+from app.metagpt_integration import http_pool
+from app.metagpt_integration.http_pool import HTTPClientPool
+from app.metagpt_integration.llm_registry import AzureOpenAIClient, OllamaClient, OpenAIClient
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """Global pool answering every request from a mock transport."""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.url.path == "/api/tags":
+            return httpx.Response(200, json={"models": []})
+        body = json.loads(request.content)
+        return httpx.Response(200, json={"response": f"{body['model']}: {body['prompt']}"})
+
+    pool = HTTPClientPool(transport=httpx.MockTransport(handler))
+    pool.requests = requests
+    monkeypatch.setattr(http_pool, "_http_client_pool", pool)
+    return pool
+
+
+class TestHTTPClientPool:
+    """Test pool sharing and shutdown."""
+
+    @pytest.mark.asyncio
+    async def test_one_client_per_provider(self):
+        """Test that a provider's client is shared and providers are separate."""
+        pool = HTTPClientPool(max_connections=5, max_keepalive_connections=2)
+
+        assert pool.get("openai") is pool.get("openai")
+        assert pool.get("openai") is not pool.get("groq")
+        assert pool.get_stats()["providers"] == ["groq", "openai"]
+        assert pool.limits.max_connections == 5
+
+        clients = [pool.get("openai"), pool.get("groq")]
+        await pool.close()
+
+        assert all(client.is_closed for client in clients)
+        assert not pool.get("openai").is_closed
+        await pool.close()
+
+
+class TestProviderClients:
+    """Test that provider clients share pools but not credentials."""
+
+    @pytest.mark.asyncio
+    async def test_openai_clients_keep_own_credentials(self, pool):
+        """Test that OpenAI clients with different keys share a pool without touching the global module."""
+        global_key = openai.api_key
+        first = OpenAIClient(api_key="sk-first", model="gpt-4")
+        second = OpenAIClient(api_key="sk-second", model="gpt-4", organization="org-2")
+        azure = AzureOpenAIClient(
+            api_key="azure-key", endpoint="https://example.openai.azure.com", deployment_name="gpt-4",
+        )
+
+        assert first.client.api_key == "sk-first"
+        assert second.client.api_key == "sk-second"
+        assert second.client.organization == "org-2"
+        assert first.client._client is second.client._client is pool.get("openai")
+        assert azure.client._client is pool.get("azure_openai")
+        assert openai.api_key == global_key
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_ollama_clients_share_pool(self, pool):
+        """Test that Ollama clients with different hosts share one pool."""
+        local = OllamaClient(base_url="http://localhost:11434/", model="llama2")
+        remote = OllamaClient(base_url="http://gpu-box:11434", model="mistral")
+
+        assert await local.generate("hi") == "llama2: hi"
+        assert await remote.generate("hi") == "mistral: hi"
+        assert await remote.validate_connection()
+
+        assert local.client is remote.client
+        assert [str(r.url) for r in pool.requests] == [
+            "http://localhost:11434/api/generate",
+            "http://gpu-box:11434/api/generate",
+            "http://gpu-box:11434/api/tags",
+        ]
+        await pool.close()
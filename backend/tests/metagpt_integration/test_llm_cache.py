@@ -0,0 +1,154 @@
+"""
+Tests for the LLM response cache.
+"""
+
+import time
+
+import pytest
+
+from app.metagpt_integration.llm_cache import (
+    CachedLLMClient,
+    LLMResponseCache,
+    SQLiteResponseCacheBackend,
+    response_cache_key,
+)
+from app.metagpt_integration.llm_registry import LLMClient
+
+
+CONNECTION = {"provider": "openai", "model": "gpt-4", "api_key": "sk-test"}
+
+
+class CountingClient(LLMClient):
+    """LLM client numbering its responses."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def generate(self, prompt, temperature=0.7, max_tokens=2000, **kwargs):
+        self.calls += 1
+        return f"{prompt} #{self.calls}"
+
+    async def generate_with_streaming(self, prompt, temperature=0.7, max_tokens=2000, **kwargs):
+        self.calls += 1
+        for chunk in (prompt, f" #{self.calls}"):
+            yield chunk
+
+    async def validate_connection(self):
+        return True
+
+
+@pytest.fixture
+async def backend(tmp_path):
+    backend = SQLiteResponseCacheBackend(str(tmp_path / "llm_cache.db"), max_entries=3)
+    yield backend
+    await backend.close()
+
+
+class TestResponseCacheKey:
+    """Test request hashing."""
+
+    def test_key_depends_on_request_not_credentials(self):
+        """Test that generation parameters change the key and the API key does not."""
+        key = response_cache_key(CONNECTION, "hi", 0.0, 100)
+
+        assert key == response_cache_key({**CONNECTION, "api_key": "sk-other"}, "hi", 0.0, 100)
+        assert key != response_cache_key({**CONNECTION, "model": "gpt-4o"}, "hi", 0.0, 100)
+        assert key != response_cache_key(CONNECTION, "hi", 0.0, 200)
+        assert key != response_cache_key(CONNECTION, "hi", 0.0, 100, system_prompt="Be brief")
+
+
+class TestSQLiteResponseCacheBackend:
+    """Test the SQLite backend."""
+
+    @pytest.mark.asyncio
+    async def test_set_and_get(self, backend):
+        """Test that a stored response is returned."""
+        await backend.set("a", "response", ttl=60)
+
+        assert await backend.get("a") == "response"
+        assert await backend.get("missing") is None
+
+    @pytest.mark.asyncio
+    async def test_expired_entry_missing(self, backend, monkeypatch):
+        """Test that an entry is not returned after its TTL."""
+        await backend.set("a", "response", ttl=60)
+        now = time.time()
+        monkeypatch.setattr(time, "time", lambda: now + 61)
+
+        assert await backend.get("a") is None
+
+    @pytest.mark.asyncio
+    async def test_least_recently_used_evicted(self, backend, monkeypatch):
+        """Test that the least recently used entry is evicted beyond max_entries."""
+        clock = [1000.0]
+        monkeypatch.setattr(time, "time", lambda: clock[0])
+
+        for key in ("a", "b", "c"):
+            await backend.set(key, key, ttl=600)
+            clock[0] += 1
+        await backend.get("a")
+        clock[0] += 1
+        await backend.set("d", "d", ttl=600)
+
+        assert await backend.get("b") is None
+        assert [await backend.get(key) for key in ("a", "c", "d")] == ["a", "c", "d"]
+
+
+class TestCachedLLMClient:
+    """Test answering requests from the cache."""
+
+    @pytest.mark.asyncio
+    async def test_deterministic_requests_cached(self, backend):
+        """Test that temperature 0 requests are cached and others are not."""
+        inner = CountingClient()
+        cache = LLMResponseCache(backend, ttl=60)
+        client = CachedLLMClient(inner, CONNECTION, cache)
+
+        assert await client.generate("hi", temperature=0) == "hi #1"
+        assert await client.generate("hi", temperature=0) == "hi #1"
+        assert await client.generate("hi", temperature=0.7) == "hi #2"
+        assert await client.generate("hi", temperature=0.7) == "hi #3"
+
+        assert inner.calls == 3
+        assert cache.get_metrics()["hits"] == 1
+        assert cache.metrics["bypassed"] == 2
+
+    @pytest.mark.asyncio
+    async def test_bypass(self, backend):
+        """Test that bypass_cache always calls the provider."""
+        inner = CountingClient()
+        client = CachedLLMClient(inner, CONNECTION, LLMResponseCache(backend, ttl=60))
+
+        await client.generate("hi", temperature=0)
+        assert await client.generate("hi", temperature=0, bypass_cache=True) == "hi #2"
+
+    @pytest.mark.asyncio
+    async def test_streaming(self, backend):
+        """Test that a complete stream is cached and replayed."""
+        inner = CountingClient()
+        client = CachedLLMClient(inner, CONNECTION, LLMResponseCache(backend, ttl=60))
+
+        first = [chunk async for chunk in client.generate_with_streaming("hi", temperature=0)]
+        second = [chunk async for chunk in client.generate_with_streaming("hi", temperature=0)]
+
+        assert first == ["hi", " #1"]
+        assert second == ["hi #1"]
+        assert await client.generate("hi", temperature=0) == "hi #1"
+        assert inner.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_backend_errors_skip_cache(self):
+        """Test that a failing backend does not fail generation."""
+
+        class BrokenBackend(SQLiteResponseCacheBackend):
+            async def get(self, key):
+                raise OSError("disk gone")
+
+            async def set(self, key, response, ttl):
+                raise OSError("disk gone")
+
+        cache = LLMResponseCache(BrokenBackend(":memory:"), ttl=60)
+        client = CachedLLMClient(CountingClient(), CONNECTION, cache)
+
+        assert await client.generate("hi", temperature=0) == "hi #1"
+        assert cache.metrics["errors"] == 2
@@ -0,0 +1,213 @@
+"""
+Tests for LLM connection validation caching and agent initialization.
+"""
+
+import asyncio
+import time as time_module
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.core.database import Base
+from app.metagpt_integration import agent_manager as agent_manager_module
+from app.metagpt_integration.agent_manager import AgentManager
+from app.metagpt_integration.llm_registry import LLMClient, LLMRegistry, connection_key
+from app.models.agent_config import AgentConfig, AgentRole, LLMProvider
+from app.models.user import User
+
+
+class FakeClient(LLMClient):
+    """LLM client whose validation is slow and counted."""
+
+    def __init__(self, valid=True, delay=0.01):
+        self.valid = valid
+        self.delay = delay
+        self.validations = 0
+
+    async def generate(self, prompt, temperature=0.7, max_tokens=2000, **kwargs):
+        return ""
+
+    async def generate_with_streaming(self, prompt, temperature=0.7, max_tokens=2000, **kwargs):
+        yield ""
+
+    async def validate_connection(self):
+        self.validations += 1
+        await asyncio.sleep(self.delay)
+        return self.valid
+
+
+CONFIG = {"provider": "openai", "model": "gpt-4", "api_key": "sk-1", "temperature": 0.7}
+
+
+class TestConnectionKey:
+    """Test connection identity."""
+
+    def test_generation_params_ignored(self):
+        """Test that configs differing only in generation parameters share a key."""
+        assert connection_key(CONFIG) == connection_key({**CONFIG, "temperature": 0.1, "max_tokens": 10})
+
+    def test_credentials_distinguish(self):
+        """Test that different credentials give different keys without exposing them."""
+        other = connection_key({**CONFIG, "api_key": "sk-2"})
+
+        assert connection_key(CONFIG) != other
+        assert "sk-" not in other
+
+
+class TestValidationCache:
+    """Test cached, coalesced validation."""
+
+    @pytest.mark.asyncio
+    async def test_result_reused(self):
+        """Test that a connection is validated once within the TTL."""
+        registry = LLMRegistry()
+        client = FakeClient()
+
+        assert await registry.validate(CONFIG, client)
+        assert await registry.validate({**CONFIG, "temperature": 0.2}, client)
+        assert client.validations == 1
+
+    @pytest.mark.asyncio
+    async def test_concurrent_validations_coalesced(self):
+        """Test that concurrent validations of one connection share a call."""
+        registry = LLMRegistry()
+        client = FakeClient()
+
+        results = await asyncio.gather(*(registry.validate(CONFIG, client) for _ in range(10)))
+
+        assert all(results)
+        assert client.validations == 1
+
+    @pytest.mark.asyncio
+    async def test_failures_use_failure_ttl(self, monkeypatch):
+        """Test that failed validations follow the failure TTL."""
+        monkeypatch.setattr(settings, "llm_validation_failure_cache_seconds", 0)
+        registry = LLMRegistry()
+        client = FakeClient(valid=False)
+
+        assert not await registry.validate(CONFIG, client)
+        assert not await registry.validate(CONFIG, client)
+        assert client.validations == 2
+
+
+class ClosingClient(FakeClient):
+    """LLM client recording when it is closed."""
+
+    def __init__(self, model, **kwargs):
+        super().__init__()
+        self.model = model
+        self.closed = False
+
+    async def aclose(self):
+        self.closed = True
+
+
+def fake_registry(**kwargs):
+    """Registry creating ClosingClients for every provider."""
+    registry = LLMRegistry(**kwargs)
+    registry._providers = {"openai": lambda model, api_key, **params: ClosingClient(model)}
+    return registry
+
+
+class TestClientCache:
+    """Test caching of clients per connection."""
+
+    def test_keyed_by_credentials(self):
+        """Test that users with different keys or endpoints get different clients."""
+        registry = fake_registry()
+
+        first = registry.get_client("openai", "gpt-4", "sk-1")
+        assert registry.get_client("openai", "gpt-4", "sk-1", temperature=0.1) is first
+        assert registry.get_client("openai", "gpt-4", "sk-2") is not first
+        assert registry.get_client("openai", "gpt-4", "sk-1", base_url="http://proxy") is not first
+        assert registry.get_stats()["hits"] == 1
+        assert registry.get_stats()["misses"] == 3
+
+    @pytest.mark.asyncio
+    async def test_least_recently_used_evicted_and_closed(self):
+        """Test that the least recently used client is evicted and closed beyond max_clients."""
+        registry = fake_registry(max_clients=2)
+
+        first = registry.get_client("openai", "a", "sk")
+        second = registry.get_client("openai", "b", "sk")
+        registry.get_client("openai", "a", "sk")
+        registry.get_client("openai", "c", "sk")
+        await asyncio.sleep(0)
+
+        assert second.closed and not first.closed
+        assert registry.get_client("openai", "a", "sk") is first
+        assert registry.get_stats()["evictions"] == 1
+        assert registry.get_stats()["cached_clients"] == 2
+
+    @pytest.mark.asyncio
+    async def test_idle_clients_expire(self, monkeypatch):
+        """Test that clients unused for idle_seconds are replaced."""
+        clock = [100.0]
+        monkeypatch.setattr(time_module, "monotonic", lambda: clock[0])
+        registry = fake_registry(idle_seconds=60)
+
+        first = registry.get_client("openai", "a", "sk")
+        clock[0] += 61
+        second = registry.get_client("openai", "a", "sk")
+        await asyncio.sleep(0)
+
+        assert second is not first
+        assert first.closed
+        assert registry.get_stats()["expirations"] == 1
+
+        await registry.close()
+        assert second.closed
+
+
+class TestInitializeAgents:
+    """Test agent initialization round trips."""
+
+    @pytest.mark.asyncio
+    async def test_one_query_and_one_validation(self, tmp_path, monkeypatch):
+        """Test that four roles sharing a model cost one query and one validation."""
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'agents.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+        async with session_factory() as db:
+            user = User(email="u@example.com", username="u", hashed_password="x")
+            db.add(user)
+            await db.flush()
+            for role in (AgentRole.PRODUCT_MANAGER, AgentRole.ARCHITECT, AgentRole.ENGINEER, AgentRole.QA_ENGINEER):
+                db.add(AgentConfig(
+                    user_id=user.id,
+                    agent_role=role,
+                    llm_provider=LLMProvider.OPENAI,
+                    llm_model="gpt-4",
+                    temperature=0.5,
+                    max_tokens=1000,
+                    parameters='{"api_key": "sk-test"}',
+                    is_default=True,
+                ))
+            await db.commit()
+
+        client = FakeClient()
+        monkeypatch.setattr(agent_manager_module, "get_llm_client_from_config", lambda config, **kwargs: client)
+        monkeypatch.setattr(agent_manager_module, "validate_llm_connection", LLMRegistry().validate)
+
+        statements = []
+        event.listen(
+            engine.sync_engine, "before_cursor_execute",
+            lambda conn, cursor, statement, *args: statements.append(statement),
+        )
+
+        async with session_factory() as db:
+            manager = AgentManager(db, SimpleNamespace(id="p1"), user.id)
+            agents = await manager.initialize_agents()
+
+        assert sorted(agents) == sorted(r.value for r in (
+            AgentRole.PRODUCT_MANAGER, AgentRole.ARCHITECT, AgentRole.ENGINEER, AgentRole.QA_ENGINEER,
+        ))
+        assert len([s for s in statements if "agent_configs" in s]) == 1
+        assert client.validations == 1
+
+        await engine.dispose()
@@ -0,0 +1,160 @@
+"""
+Tests for near-duplicate prompt lookup and per-execution cache statistics.
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from app.metagpt_integration.llm_cache import CachedLLMClient, LLMResponseCache, SQLiteResponseCacheBackend
+from app.metagpt_integration.prompt_cache import (
+    MinHasher,
+    NearDuplicateIndex,
+    PromptCacheStats,
+    current_prompt_cache_stats,
+    record_provider_usage,
+    use_prompt_cache_stats,
+)
+from tests.metagpt_integration.test_llm_cache import CONNECTION, CountingClient
+
+
+CONTEXT = " ".join(f"word{i}" for i in range(200))
+
+
+def prompt(context=CONTEXT, instruction="Write only the file app/main.py."):
+    return f"Project requirements:\n\n{context}\n\n{instruction}"
+
+
+class TestMinHasher:
+    """Test similarity estimates."""
+
+    def test_similarity(self):
+        """Test that near-identical texts score high and unrelated texts low."""
+        hasher = MinHasher()
+        base = hasher.signature(CONTEXT)
+
+        assert MinHasher.similarity(base, hasher.signature(CONTEXT + " word200")) > 0.9
+        assert MinHasher.similarity(base, hasher.signature(" ".join(f"other{i}" for i in range(200)))) < 0.1
+
+
+class TestNearDuplicateIndex:
+    """Test near-duplicate lookup."""
+
+    def test_normalized_and_near_matches(self):
+        """Test that whitespace/case variants and small edits match, other scopes do not."""
+        index = NearDuplicateIndex(threshold=0.9)
+        index.add("k1", "scope", prompt())
+
+        assert index.find("scope", prompt().upper().replace(" ", "  ")) == ("k1", 1.0)
+        key, similarity = index.find("scope", prompt(CONTEXT + " word200"))
+        assert key == "k1" and 0.9 <= similarity < 1.0
+        assert index.find("other-scope", prompt()) is None
+
+    def test_instruction_must_match(self):
+        """Test that prompts sharing the context but not the instruction never match."""
+        index = NearDuplicateIndex(threshold=0.5)
+        index.add("k1", "scope", prompt())
+
+        assert index.find("scope", prompt(instruction="Write only the file app/db.py.")) is None
+
+    def test_bounded(self):
+        """Test that the least recently used entries are dropped beyond max_entries."""
+        index = NearDuplicateIndex(max_entries=2)
+        for i in range(3):
+            index.add(f"k{i}", "scope", prompt(instruction=f"Task {i}."))
+
+        assert len(index) == 2
+        assert index.find("scope", prompt(instruction="Task 0.")) is None
+
+
+class TestPromptCacheStats:
+    """Test per-execution statistics."""
+
+    @pytest.mark.asyncio
+    async def test_near_duplicate_hit_recorded(self, tmp_path):
+        """Test that a near-duplicate request is answered from the cache and counted."""
+        backend = SQLiteResponseCacheBackend(str(tmp_path / "llm_cache.db"))
+        cache = LLMResponseCache(backend, ttl=60, near_duplicates=NearDuplicateIndex(threshold=0.9))
+        inner = CountingClient()
+        client = CachedLLMClient(inner, CONNECTION, cache)
+        stats = PromptCacheStats()
+
+        async def run():
+            use_prompt_cache_stats(stats)
+            first = await client.generate(prompt(), temperature=0)
+            second = await client.generate(prompt(CONTEXT + " word200"), temperature=0)
+            third = await client.generate(prompt(instruction="Write only the file app/db.py."), temperature=0)
+            return first, second, third
+
+        first, second, third = await asyncio.create_task(run())
+        await backend.close()
+
+        assert second == first
+        assert third != first
+        assert inner.calls == 2
+        report = stats.to_dict()
+        assert report["lookups"] == 3
+        assert report["near_duplicate_hits"] == 1
+        assert report["hit_rate"] == pytest.approx(1 / 3)
+        assert report["saved_tokens"] > 0
+        # The statistics were installed in the task only
+        assert current_prompt_cache_stats() is None
+
+    @pytest.mark.asyncio
+    async def test_near_duplicates_stay_within_tenant(self, tmp_path):
+        """Test that other tenants or credentials never get a near-duplicate hit."""
+        backend = SQLiteResponseCacheBackend(str(tmp_path / "llm_cache.db"))
+        cache = LLMResponseCache(backend, ttl=60, near_duplicates=NearDuplicateIndex(threshold=0.9))
+        inner = CountingClient()
+        owner = CachedLLMClient(inner, CONNECTION, cache, tenant="user-a")
+        other_user = CachedLLMClient(inner, CONNECTION, cache, tenant="user-b")
+        other_key = CachedLLMClient(inner, {**CONNECTION, "api_key": "sk-other"}, cache, tenant="user-a")
+
+        first = await owner.generate(prompt(), temperature=0)
+        near = prompt(CONTEXT + " word200")
+
+        assert await other_user.generate(near, temperature=0) != first
+        assert await other_key.generate(prompt(CONTEXT + " word201"), temperature=0) != first
+        assert await owner.generate(prompt(CONTEXT + " word202"), temperature=0) == first
+        assert inner.calls == 3
+        await backend.close()
+
+    @pytest.mark.asyncio
+    async def test_signatures_computed_off_loop(self, tmp_path):
+        """Test that the response cache fingerprints prompts in a worker thread."""
+        backend = SQLiteResponseCacheBackend(str(tmp_path / "llm_cache.db"))
+        index = NearDuplicateIndex(threshold=0.9)
+        cache = LLMResponseCache(backend, ttl=60, near_duplicates=index)
+        client = CachedLLMClient(CountingClient(), CONNECTION, cache)
+        threads = []
+        fingerprint = index.fingerprint
+
+        def recording_fingerprint(scope, text):
+            threads.append(threading.current_thread())
+            return fingerprint(scope, text)
+
+        index.fingerprint = recording_fingerprint
+        await client.generate(prompt(), temperature=0)
+        await backend.close()
+
+        assert len(threads) == 2
+        assert threading.main_thread() not in threads
+
+    @pytest.mark.asyncio
+    async def test_provider_usage_recorded(self):
+        """Test that cached prompt tokens reported by the provider are counted."""
+        stats = PromptCacheStats()
+
+        async def run():
+            use_prompt_cache_stats(stats)
+            record_provider_usage({"prompt_tokens": 2000, "prompt_tokens_details": {"cached_tokens": 1536}})
+            record_provider_usage({"prompt_tokens": 500})
+
+        await asyncio.create_task(run())
+
+        report = stats.to_dict()
+        assert report["provider_requests"] == 2
+        assert report["provider_cached_tokens"] == 1536
+        assert report["saved_tokens"] == 1536
+        assert report["provider_cache_rate"] == pytest.approx(1536 / 2500)
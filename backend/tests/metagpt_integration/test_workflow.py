@@ -0,0 +1,550 @@
+"""
+Tests for the workflow graph and its scheduler.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.core.database import Base
+from app.metagpt_integration.agent_manager import AgentManager
+from app.metagpt_integration.codegen import FilePlanItem
+from app.metagpt_integration.workflow import (
+    DEFAULT_WORKFLOW,
+    StageNode,
+    StageStatus,
+    WorkflowError,
+    WorkflowGraph,
+    WorkflowScheduler,
+)
+from app.models.agent_config import AgentRole
+from app.models.execution import Execution, ExecutionStatus
+from app.models.project import Project
+from app.models.user import User
+from app.services.execution_log_service import ExecutionLogService, get_execution_log_service
+
+
+def node(name, inputs=(), template="{prompt}"):
+    """Build a stage run by the engineer role."""
+    return StageNode(name=name, role=AgentRole.ENGINEER, prompt_template=template, inputs=tuple(inputs))
+
+
+class ConcurrencyProbe:
+    """Stage runner that records concurrency and echoes its rendered prompt."""
+
+    def __init__(self, delay=0.02, fail=()):
+        self.delay = delay
+        self.fail = set(fail)
+        self.running = 0
+        self.max_running = 0
+        self.ran = []
+
+    async def __call__(self, node, prompt, inputs, publish):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await publish({"type": "stage_start", "stage": node.name})
+            await asyncio.sleep(self.delay)
+            self.ran.append(node.name)
+            if node.name in self.fail:
+                raise RuntimeError("boom")
+            return node.render(prompt, inputs)
+        finally:
+            self.running -= 1
+
+
+async def collect(scheduler, prompt="p"):
+    """Run a scheduler to completion and return its events."""
+    return [event async for event in scheduler.run(prompt)]
+
+
+class TestWorkflowGraph:
+    """Test graph validation and ordering."""
+
+    def test_order_follows_inputs(self):
+        """Test that every stage comes after its inputs."""
+        graph = WorkflowGraph([node("c", ["a", "b"]), node("b", ["a"]), node("a")])
+
+        assert [n.name for n in graph] == ["a", "b", "c"]
+
+    def test_cycle_rejected(self):
+        """Test that cyclic graphs are rejected."""
+        with pytest.raises(WorkflowError, match="cycle"):
+            WorkflowGraph([node("a", ["b"]), node("b", ["a"])])
+
+    def test_unknown_input_and_field_rejected(self):
+        """Test that inputs and template fields must name known stages."""
+        with pytest.raises(WorkflowError, match="unknown input"):
+            WorkflowGraph([node("a", ["missing"])])
+        with pytest.raises(WorkflowError, match="unknown field"):
+            WorkflowGraph([node("a"), node("b", template="{a}")])
+
+    def test_default_workflow_has_width(self):
+        """Test that code generation and testing do not depend on each other."""
+        testing = DEFAULT_WORKFLOW.nodes["testing"]
+
+        assert "code_generation" not in testing.inputs
+        assert testing.inputs == DEFAULT_WORKFLOW.nodes["code_generation"].inputs
+
+
+class TestWorkflowScheduler:
+    """Test concurrent stage scheduling."""
+
+    @pytest.mark.asyncio
+    async def test_independent_stages_run_concurrently(self):
+        """Test that a wide graph runs its branches at the same time."""
+        graph = WorkflowGraph([node("root"), node("x", ["root"]), node("y", ["root"]), node("z", ["root"])])
+        probe = ConcurrencyProbe()
+        scheduler = WorkflowScheduler(graph, probe)
+
+        events = await collect(scheduler)
+
+        assert probe.max_running == 3
+        assert probe.ran[0] == "root"
+        assert [e["stage"] for e in events if e["type"] == "stage_complete"][0] == "root"
+        assert all(r.status == StageStatus.COMPLETED for r in scheduler.results.values())
+
+    @pytest.mark.asyncio
+    async def test_max_parallel_bounds_stages(self):
+        """Test that the semaphore bounds concurrent stages."""
+        graph = WorkflowGraph([node(name) for name in "abcd"])
+        probe = ConcurrencyProbe()
+
+        await collect(WorkflowScheduler(graph, probe, max_parallel=2))
+
+        assert probe.max_running == 2
+
+    @pytest.mark.asyncio
+    async def test_upstream_outputs_rendered(self):
+        """Test that stages receive their upstream outputs."""
+        graph = WorkflowGraph([
+            node("spec", template="spec of {prompt}"),
+            node("code", ["spec"], template="code for {spec}"),
+        ])
+        scheduler = WorkflowScheduler(graph, ConcurrencyProbe(delay=0))
+
+        await collect(scheduler, prompt="an API")
+
+        assert scheduler.results["code"].output == "code for spec of an API"
+        assert scheduler.get_output()["stages"]["code"]["status"] == "completed"
+
+    @pytest.mark.asyncio
+    async def test_failure_skips_dependents_only(self):
+        """Test that a failed stage skips its dependents but not independent branches."""
+        graph = WorkflowGraph([
+            node("root"),
+            node("bad", ["root"]),
+            node("after_bad", ["bad"]),
+            node("last", ["after_bad"]),
+            node("good", ["root"]),
+        ])
+        scheduler = WorkflowScheduler(graph, ConcurrencyProbe(delay=0, fail={"bad"}))
+
+        events = await collect(scheduler)
+
+        statuses = {name: r.status for name, r in scheduler.results.items()}
+        assert statuses == {
+            "root": StageStatus.COMPLETED,
+            "bad": StageStatus.FAILED,
+            "after_bad": StageStatus.SKIPPED,
+            "last": StageStatus.SKIPPED,
+            "good": StageStatus.COMPLETED,
+        }
+        assert scheduler.failed_stages() == ["bad"]
+        assert len([e for e in events if e["type"] == "stage_complete"]) == 5
+
+
+class TestCheckpointRestore:
+    """Test restoring completed stages from a checkpoint."""
+
+    @pytest.mark.asyncio
+    async def test_completed_stages_not_rerun(self):
+        """Test that restored stages are reported as resumed and not run."""
+        graph = WorkflowGraph([node("a"), node("b", ["a"], template="b of {a}")])
+        first = WorkflowScheduler(graph, ConcurrencyProbe(delay=0, fail={"b"}))
+        await collect(first)
+
+        probe = ConcurrencyProbe(delay=0)
+        second = WorkflowScheduler(graph, probe)
+        assert second.restore(first.get_output(), "p") == ["a"]
+        events = await collect(second)
+
+        assert probe.ran == ["b"]
+        assert second.results["b"].output == "b of p"
+        assert [e["resumed"] for e in events if e["type"] == "stage_complete"] == [True, False]
+
+    @pytest.mark.asyncio
+    async def test_changed_stage_and_dependents_rerun(self):
+        """Test that editing a stage invalidates its checkpoint and its dependents'."""
+        graph = WorkflowGraph([node("a"), node("b", ["a"]), node("c", ["b"])])
+        first = WorkflowScheduler(graph, ConcurrencyProbe(delay=0))
+        await collect(first)
+
+        edited = WorkflowGraph([node("a"), node("b", ["a"], template="new {prompt}"), node("c", ["b"])])
+
+        assert WorkflowScheduler(edited, ConcurrencyProbe()).restore(first.get_output(), "p") == ["a"]
+        assert WorkflowScheduler(graph, ConcurrencyProbe()).restore(first.get_output(), "other") == []
+
+
+class FakeLLMClient:
+    """LLM client that answers after a delay and tracks overlap."""
+
+    def __init__(self, delay=0.02, fail_on=None):
+        self.delay = delay
+        self.fail_on = fail_on
+        self.prompts = []
+        self.running = 0
+        self.max_running = 0
+
+    async def generate(self, prompt, temperature=0.7, max_tokens=2000, **kwargs):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        self.prompts.append(prompt)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail_on and self.fail_on in prompt:
+                raise RuntimeError("LLM unavailable")
+            return f"answer {len(self.prompts)}"
+        finally:
+            self.running -= 1
+
+    async def generate_with_streaming(self, prompt, temperature=0.7, max_tokens=2000, **kwargs):
+        response = await self.generate(prompt, temperature, max_tokens)
+        for i in range(0, len(response), 7):
+            yield response[i:i + 7]
+
+
+class FakeFileHandler:
+    """File handler recording writes."""
+
+    def __init__(self):
+        self.files = {}
+
+    def file_exists(self, project_id, file_path):
+        return file_path in self.files
+
+    def write_file(self, project_id, file_path, content):
+        self.files[file_path] = content
+        return file_path
+
+
+@pytest.fixture
+async def workflow_db(tmp_path):
+    """Session factory with a user owning a project."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'workflow.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with session_factory() as db:
+        user = User(email="u@example.com", username="u", hashed_password="x")
+        db.add(user)
+        await db.flush()
+        project = Project(name="P", owner_id=user.id)
+        db.add(project)
+        await db.commit()
+
+    yield SimpleNamespace(engine=engine, factory=session_factory, user=user, project=project)
+    await engine.dispose()
+
+
+def make_manager(db, workflow_db, client, monkeypatch):
+    """Agent manager whose four agents all use the given client."""
+    agents = {
+        role.value: {"role": role.value, "name": role.value, "llm_client": client, "config": {}, "llm_config": {}}
+        for role in (AgentRole.PRODUCT_MANAGER, AgentRole.ARCHITECT, AgentRole.ENGINEER, AgentRole.QA_ENGINEER)
+    }
+    manager = AgentManager(db, workflow_db.project, workflow_db.user.id)
+
+    async def initialize_agents():
+        manager.agents = agents
+        return agents
+
+    monkeypatch.setattr(manager, "initialize_agents", initialize_agents)
+    manager.file_handler = FakeFileHandler()
+    return manager
+
+
+class TestRunWorkflow:
+    """Test the agent manager running the default workflow."""
+
+    @pytest.mark.asyncio
+    async def test_default_workflow(self, workflow_db, monkeypatch):
+        """Test that stages overlap, receive upstream outputs and persist their outputs."""
+        client = FakeLLMClient()
+
+        async with workflow_db.factory() as db:
+            manager = make_manager(db, workflow_db, client, monkeypatch)
+            events = [event async for event in manager.run_workflow("Build a REST API")]
+            execution = await db.get(Execution, manager.execution.id)
+
+        assert events[-1]["type"] == "execution_complete"
+        assert execution.status == ExecutionStatus.COMPLETED
+        assert set(execution.get_output()["stages"]) == set(DEFAULT_WORKFLOW.nodes)
+        # Code generation and testing ran at the same time
+        assert client.max_running == 2
+        # The design stage saw the requirements analysis
+        assert "answer 1" in client.prompts[1]
+
+    @pytest.mark.asyncio
+    async def test_writes_batched_per_stage(self, workflow_db, monkeypatch):
+        """Test that logs, progress and status are committed at stage boundaries only."""
+        monkeypatch.setattr(settings, "workflow_write_flush_interval", 0)
+        commits = []
+        event.listen(workflow_db.engine.sync_engine, "commit", lambda conn: commits.append(1))
+
+        async with workflow_db.factory() as db:
+            manager = make_manager(db, workflow_db, FakeLLMClient(delay=0), monkeypatch)
+            [event_ async for event_ in manager.run_workflow("Build a REST API")]
+            page = await get_execution_log_service(db).get_logs(manager.execution.id)
+
+        # Execution creation, one checkpoint per stage, and completion
+        assert len(commits) == len(DEFAULT_WORKFLOW) + 2
+        assert len(page.entries) == len(DEFAULT_WORKFLOW)
+
+    @pytest.mark.asyncio
+    async def test_failure_persisted_when_flush_fails(self, workflow_db, monkeypatch):
+        """Test that the execution is marked failed even if buffered writes cannot be flushed."""
+        async def append_many(self, *args, **kwargs):
+            raise RuntimeError("disk full")
+
+        monkeypatch.setattr(ExecutionLogService, "append_many", append_many)
+
+        async with workflow_db.factory() as db:
+            manager = make_manager(db, workflow_db, FakeLLMClient(delay=0, fail_on="Create comprehensive tests"), monkeypatch)
+            events = [event async for event in manager.run_workflow("Build a REST API")]
+            execution_id = manager.execution.id
+
+        async with workflow_db.factory() as db:
+            execution = await db.get(Execution, execution_id)
+
+        assert events[-1]["type"] == "error"
+        assert execution.status == ExecutionStatus.FAILED
+        assert execution.error_message
+        assert execution.completed_at is not None
+
+    @pytest.mark.asyncio
+    async def test_retry_skips_completed_stages(self, workflow_db, monkeypatch):
+        """Test that a retried execution only reruns the failed stage."""
+        failing = FakeLLMClient(delay=0, fail_on="Create comprehensive tests")
+
+        async with workflow_db.factory() as db:
+            manager = make_manager(db, workflow_db, failing, monkeypatch)
+            events = [event async for event in manager.run_workflow("Build a REST API")]
+            execution_id = manager.execution.id
+
+            assert events[-1]["type"] == "error"
+            execution = await db.get(Execution, execution_id)
+            assert execution.status == ExecutionStatus.FAILED
+            stages = execution.get_output()["stages"]
+            assert stages["code_generation"]["status"] == "completed"
+            assert stages["testing"]["status"] == "failed"
+
+        client = FakeLLMClient(delay=0)
+        async with workflow_db.factory() as db:
+            manager = make_manager(db, workflow_db, client, monkeypatch)
+            events = [event async for event in manager.run_workflow("Build a REST API", execution_id=execution_id)]
+            execution = await db.get(Execution, execution_id)
+
+        assert events[0]["resumed_stages"] == ["requirements_analysis", "system_design", "code_generation"]
+        assert events[-1]["type"] == "execution_complete"
+        assert execution.status == ExecutionStatus.COMPLETED
+        # Only the QA stage was paid for again, with the checkpointed design as input
+        assert len(client.prompts) == 1
+        assert "Create comprehensive tests" in client.prompts[0]
+        assert "answer 2" in client.prompts[0]
+
+    @pytest.mark.asyncio
+    async def test_checkpoint_not_reused_for_other_prompt(self, workflow_db, monkeypatch):
+        """Test that a checkpoint is only reused for the prompt it was made for."""
+        async with workflow_db.factory() as db:
+            manager = make_manager(db, workflow_db, FakeLLMClient(delay=0, fail_on="Create comprehensive tests"), monkeypatch)
+            [event async for event in manager.run_workflow("Build a REST API")]
+            execution_id = manager.execution.id
+
+        client = FakeLLMClient(delay=0)
+        async with workflow_db.factory() as db:
+            manager = make_manager(db, workflow_db, client, monkeypatch)
+            events = [event async for event in manager.run_workflow("Build a CLI", execution_id=execution_id)]
+
+        assert events[0]["resumed_stages"] == []
+        assert len(client.prompts) == 4
+
+
+class DesignClient(FakeLLMClient):
+    """LLM client whose system design lists files, and whose file answers are code blocks."""
+
+    async def generate(self, prompt, temperature=0.7, max_tokens=2000, **kwargs):
+        await super().generate(prompt)
+        if "Design the system architecture" in prompt:
+            return "Components...\n\nFile List:\n- app/main.py: entry point\n- app/db.py: models\n- app/api.py: routes\n"
+        if "Write only the file" in prompt:
+            path = prompt.split("Write only the file ")[1].split(" ")[0]
+            return f"```python\n# {path}\n```"
+        return "spec"
+
+
+class TestCodegenFanOut:
+    """Test per-file code generation."""
+
+    @pytest.mark.asyncio
+    async def test_files_generated_concurrently(self, workflow_db, monkeypatch):
+        """Test that each listed file is generated by its own concurrent call and written."""
+        client = DesignClient(delay=0.02)
+        file_handler = FakeFileHandler()
+
+        async with workflow_db.factory() as db:
+            manager = make_manager(db, workflow_db, client, monkeypatch)
+            manager.file_handler = file_handler
+            events = [event async for event in manager.run_workflow("Build a REST API")]
+            execution = await db.get(Execution, manager.execution.id)
+
+        assert events[-1]["type"] == "execution_complete"
+        assert file_handler.files == {
+            "app/main.py": "# app/main.py",
+            "app/db.py": "# app/db.py",
+            "app/api.py": "# app/api.py",
+        }
+        assert sorted(e["file"] for e in events if e.get("file")) == ["app/api.py", "app/db.py", "app/main.py"]
+        # Three file calls plus the QA stage, at the same time
+        assert client.max_running == 4
+        # Each file call sees the whole file list
+        file_prompts = [p for p in client.prompts if "Write only the file" in p]
+        assert len(file_prompts) == 3
+        assert all("- app/api.py: routes" in p for p in file_prompts)
+        assert "### app/db.py" in execution.get_output()["stages"]["code_generation"]["output"]
+        # ... and they share the prompt prefix up to the instruction
+        prefix = file_prompts[0].split("Generate production-ready code")[0]
+        assert all(p.startswith(prefix) for p in file_prompts)
+        assert execution.get_output()["cache"] == events[-1]["output"]["cache"]
+
+    @pytest.mark.asyncio
+    async def test_fan_out_bounded(self, workflow_db, monkeypatch):
+        """Test that workflow_codegen_max_parallel bounds the file calls."""
+        monkeypatch.setattr(settings, "workflow_codegen_max_parallel", 1)
+        monkeypatch.setattr(settings, "workflow_max_parallel_stages", 1)
+        client = DesignClient(delay=0.01)
+
+        async with workflow_db.factory() as db:
+            manager = make_manager(db, workflow_db, client, monkeypatch)
+            [event async for event in manager.run_workflow("Build a REST API")]
+
+        assert client.max_running == 1
+
+    @pytest.mark.asyncio
+    async def test_cancelled_file_fails_stage(self, workflow_db, monkeypatch):
+        """Test that a file call that was cancelled counts as a failed file."""
+        class CancellingClient(DesignClient):
+            async def generate(self, prompt, temperature=0.7, max_tokens=2000, **kwargs):
+                if "Write only the file app/db.py" in prompt:
+                    raise asyncio.CancelledError()
+                return await super().generate(prompt)
+
+        async with workflow_db.factory() as db:
+            manager = make_manager(db, workflow_db, CancellingClient(delay=0), monkeypatch)
+            events = [event async for event in manager.run_workflow("Build a REST API")]
+            execution = await db.get(Execution, manager.execution.id)
+
+        assert events[-1]["type"] == "error"
+        stage = execution.get_output()["stages"]["code_generation"]
+        assert stage["status"] == "failed"
+        assert "app/db.py" in stage["error"]
+        assert "app/db.py" not in manager.file_handler.files
+
+    @pytest.mark.asyncio
+    async def test_stage_cancellation_propagates(self, workflow_db, monkeypatch):
+        """Test that cancelling a fan-out stage cancels its file calls and is not reported as a failure."""
+        client = DesignClient(delay=10)
+        plan = [FilePlanItem("app/main.py", "entry point"), FilePlanItem("app/db.py", "models")]
+        agent = {"llm_client": client, "llm_config": {}}
+
+        async def publish(event):
+            pass
+
+        async with workflow_db.factory() as db:
+            manager = make_manager(db, workflow_db, client, monkeypatch)
+            stage = asyncio.create_task(manager._run_fan_out_stage(
+                DEFAULT_WORKFLOW.nodes["code_generation"], agent, "p",
+                {"requirements_analysis": "spec", "system_design": "design"}, plan, publish,
+            ))
+            await asyncio.sleep(0.01)
+            stage.cancel()
+
+            with pytest.raises(asyncio.CancelledError):
+                await stage
+
+        assert client.running == 0
+        assert manager.file_handler.files == {}
+
+
+class StreamingCodeClient(FakeLLMClient):
+    """LLM client streaming two files and recording what was written mid-stream."""
+
+    def __init__(self):
+        super().__init__(delay=0)
+        self.file_handler = None
+        self.written_mid_stream = None
+
+    async def generate_with_streaming(self, prompt, temperature=0.7, max_tokens=2000, **kwargs):
+        if "Generate production-ready code" not in prompt:
+            async for chunk in super().generate_with_streaming(prompt):
+                yield chunk
+            return
+
+        for chunk in ["Here:\n``", "`python app/ma", "in.py\nprint(1)\n", "```\n"]:
+            yield chunk
+        await asyncio.sleep(0)
+        self.written_mid_stream = dict(self.file_handler.files)
+        yield "```app/util.py\nx = 1\n```"
+
+
+class TestStreamedFiles:
+    """Test writing files while the engineer response streams."""
+
+    @pytest.mark.asyncio
+    async def test_files_written_as_blocks_close(self, workflow_db, monkeypatch):
+        """Test that a file is written as soon as its block closes, before the response ends."""
+        client = StreamingCodeClient()
+
+        async with workflow_db.factory() as db:
+            manager = make_manager(db, workflow_db, client, monkeypatch)
+            client.file_handler = manager.file_handler
+            events = [event_ async for event_ in manager.run_workflow("Build a REST API")]
+
+        assert events[-1]["type"] == "execution_complete"
+        assert client.written_mid_stream == {"app/main.py": "print(1)"}
+        assert client.file_handler.files == {"app/main.py": "print(1)", "app/util.py": "x = 1"}
+
+    @pytest.mark.asyncio
+    async def test_single_call_prompt_yields_files(self, workflow_db, monkeypatch):
+        """Test that the single-call code prompt asks for path fences and a typical answer writes every file."""
+        node = DEFAULT_WORKFLOW.nodes["code_generation"]
+        rendered = node.render("Build a REST API", {"requirements_analysis": "spec", "system_design": "design"})
+        assert "```python app/main.py" in rendered
+
+        response = (
+            "Here is the implementation.\n\n"
+            "```python app/main.py\nfrom fastapi import FastAPI\n\napp = FastAPI()\n```\n\n"
+            "And the dependencies:\n\n"
+            "```text requirements.txt\nfastapi\nuvicorn\n```\n"
+        )
+
+        class AnswerClient(FakeLLMClient):
+            async def generate_with_streaming(self, prompt, temperature=0.7, max_tokens=2000, **kwargs):
+                for i in range(0, len(response), 16):
+                    yield response[i:i + 16]
+
+        client = AnswerClient(delay=0)
+        async with workflow_db.factory() as db:
+            manager = make_manager(db, workflow_db, client, monkeypatch)
+            agent = {"llm_client": client, "llm_config": {}}
+            assert await manager._stream_files(agent, "engineer", {"prompt": rendered}) == response
+
+        assert manager.file_handler.files == {
+            "app/main.py": "from fastapi import FastAPI\n\napp = FastAPI()",
+            "requirements.txt": "fastapi\nuvicorn",
+        }
@@ -0,0 +1,146 @@
+"""
+Tests for the execution write-behind buffer.
+"""
+
+import asyncio
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.database import Base
+from app.metagpt_integration.write_buffer import ExecutionWriteBuffer
+from app.models.execution import Execution, ExecutionStatus
+from app.models.project import Project
+from app.models.user import User
+from app.services.execution_log_service import get_execution_log_service
+
+
+@pytest.fixture
+async def buffered(tmp_path):
+    """Session, execution and project, with a counter of committed transactions."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'buffer.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with session_factory() as db:
+        user = User(email="u@example.com", username="u", hashed_password="x")
+        db.add(user)
+        await db.flush()
+        project = Project(name="P", owner_id=user.id)
+        db.add(project)
+        await db.flush()
+        execution = Execution(id=str(uuid4()), project_id=project.id, user_id=user.id)
+        db.add(execution)
+        await db.commit()
+
+        commits = []
+        event.listen(engine.sync_engine, "commit", lambda conn: commits.append(1))
+
+        yield SimpleNamespace(db=db, execution=execution, project=project, commits=commits)
+
+    await engine.dispose()
+
+
+class TestExecutionWriteBuffer:
+    """Test batching and flushing of execution writes."""
+
+    @pytest.mark.asyncio
+    async def test_writes_batched_into_one_transaction(self, buffered):
+        """Test that logs, progress, status and output are written in one commit."""
+        buffer = ExecutionWriteBuffer(buffered.db, buffered.execution, buffered.project, flush_interval=0)
+
+        for i in range(20):
+            await buffer.add_log("engineer", f"line {i}")
+        buffer.set_progress(25.0)
+        buffer.set_progress(50.0)
+        buffer.set_status(ExecutionStatus.RUNNING)
+        buffer.set_output({"stages": {}})
+        assert buffered.commits == []
+
+        await buffer.flush()
+
+        assert len(buffered.commits) == 1
+        page = await get_execution_log_service(buffered.db).get_logs(buffered.execution.id, limit=100)
+        assert [entry.seq for entry in page.entries] == list(range(1, 21))
+        assert buffered.project.progress == 50.0
+        assert buffered.execution.status == ExecutionStatus.RUNNING
+        assert buffer.metrics["coalesced_writes"] == 1
+
+        await buffer.flush()
+        assert len(buffered.commits) == 1
+
+    @pytest.mark.asyncio
+    async def test_flushes_when_full(self, buffered):
+        """Test that reaching max_pending_logs flushes."""
+        buffer = ExecutionWriteBuffer(
+            buffered.db, buffered.execution, buffered.project, flush_interval=0, max_pending_logs=5,
+        )
+
+        for i in range(12):
+            await buffer.add_log("qa_engineer", f"line {i}")
+
+        assert len(buffered.commits) == 2
+        assert buffer.get_metrics()["pending_logs"] == 2
+
+    @pytest.mark.asyncio
+    async def test_timer_flushes(self, buffered):
+        """Test that pending writes are flushed on the timer."""
+        buffer = ExecutionWriteBuffer(buffered.db, buffered.execution, buffered.project, flush_interval=0.01)
+        buffer.start()
+
+        await buffer.add_log("architect", "design")
+        await asyncio.sleep(0.05)
+
+        assert len(buffered.commits) == 1
+        await buffer.close()
+        assert len(buffered.commits) == 1
+
+    @pytest.mark.asyncio
+    async def test_close_writes_failure_with_logs(self, buffered):
+        """Test that closing after a failure writes the logs and the failure together."""
+        buffer = ExecutionWriteBuffer(buffered.db, buffered.execution, buffered.project, flush_interval=60)
+        buffer.start()
+
+        await buffer.add_log("engineer", "Error: boom", level="error")
+        buffer.set_failed("boom")
+        await buffer.close()
+
+        assert len(buffered.commits) == 1
+        assert buffered.execution.status == ExecutionStatus.FAILED
+        assert buffered.execution.error_message == "boom"
+        page = await get_execution_log_service(buffered.db).get_logs(buffered.execution.id)
+        assert page.entries[0].level == "error"
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_retried(self, buffered, monkeypatch):
+        """Test that writes kept after a failed commit are all written by the next flush."""
+        buffer = ExecutionWriteBuffer(buffered.db, buffered.execution, buffered.project, flush_interval=0)
+        commit = buffered.db.commit
+        failures = [RuntimeError("database is locked")]
+
+        async def flaky_commit():
+            if failures:
+                raise failures.pop()
+            await commit()
+
+        monkeypatch.setattr(buffered.db, "commit", flaky_commit)
+
+        await buffer.add_log("engineer", "line 1")
+        buffer.set_progress(40.0)
+        buffer.set_status(ExecutionStatus.RUNNING)
+        with pytest.raises(RuntimeError):
+            await buffer.flush()
+
+        await buffer.add_log("engineer", "line 2")
+        await buffer.flush()
+
+        assert buffer.metrics["failed_flushes"] == 1
+        assert not buffer.pending
+        page = await get_execution_log_service(buffered.db).get_logs(buffered.execution.id)
+        assert [entry.message for entry in page.entries] == ["line 1", "line 2"]
+        assert buffered.execution.status == ExecutionStatus.RUNNING
+        assert buffered.project.progress == 40.0
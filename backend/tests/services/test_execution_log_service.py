@@ -0,0 +1,110 @@
+"""
+Tests for the execution log store.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.models.execution import Execution
+from app.services.execution_log_service import ExecutionLogService
+from app.websocket.message_handler import MessageHandler
+
+
+@pytest.fixture
+async def log_service(test_db: AsyncSession) -> ExecutionLogService:
+    """Execution log service with 10 entries for execution e1."""
+    service = ExecutionLogService(test_db)
+    await service.append_many("e1", [
+        {
+            "agent": "engineer" if i % 2 else "architect",
+            "level": "error" if i % 5 == 0 else "info",
+            "message": f"line {i}",
+        }
+        for i in range(1, 11)
+    ])
+    await service.append("e2", "engineer", "other execution")
+    return service
+
+
+class TestExecutionLogService:
+    """Test append and cursor reads."""
+
+    @pytest.mark.asyncio
+    async def test_sequence_numbers(self, log_service):
+        """Test that sequence numbers are per execution and consecutive."""
+        assert await log_service.last_seq("e1") == 10
+        assert await log_service.last_seq("e2") == 1
+        assert await log_service.last_seq("missing") == 0
+
+        entry = await log_service.append("e1", "qa", "more")
+        assert entry.seq == 11
+
+    @pytest.mark.asyncio
+    async def test_newest_page_and_backward_paging(self, log_service):
+        """Test reading the newest entries and paging back with the cursor."""
+        page = await log_service.get_logs("e1", limit=4)
+
+        assert [e.seq for e in page.entries] == [7, 8, 9, 10]
+        assert page.has_more
+        assert page.before == 7
+        assert page.after == 10
+
+        seqs = [e.seq for e in page.entries]
+        while page.before is not None:
+            page = await log_service.get_logs("e1", limit=4, before=page.before)
+            seqs = [e.seq for e in page.entries] + seqs
+
+        assert seqs == list(range(1, 11))
+
+    @pytest.mark.asyncio
+    async def test_tailing(self, log_service):
+        """Test tailing entries after a sequence number."""
+        page = await log_service.get_logs("e1", limit=3, after=5)
+        assert [e.seq for e in page.entries] == [6, 7, 8]
+        assert page.has_more
+
+        page = await log_service.get_logs("e1", limit=3, after=page.after)
+        assert [e.seq for e in page.entries] == [9, 10]
+        assert not page.has_more
+
+        page = await log_service.get_logs("e1", after=page.after)
+        assert page.entries == []
+        assert page.after == 10
+
+    @pytest.mark.asyncio
+    async def test_filters(self, log_service):
+        """Test agent and level filters."""
+        page = await log_service.get_logs("e1", agent="architect")
+        assert [e.seq for e in page.entries] == [2, 4, 6, 8, 10]
+
+        page = await log_service.get_logs("e1", level="error", agent="architect")
+        assert [e.message for e in page.entries] == ["line 10"]
+
+    @pytest.mark.asyncio
+    async def test_get_execution_logs_message(self, test_db, test_user):
+        """Test the GET_EXECUTION_LOGS WebSocket message reads from the store."""
+        execution = Execution(project_id="p1", user_id=test_user.id)
+        test_db.add(execution)
+        await test_db.commit()
+        await ExecutionLogService(test_db).append_many(
+            execution.id, [{"agent": "engineer", "message": f"line {i}"} for i in range(5)]
+        )
+
+        handler = MessageHandler(settings, session_factory=async_sessionmaker(test_db.bind, class_=AsyncSession))
+        user = SimpleNamespace(id=test_user.id)
+
+        response = await handler.handle(
+            "get_execution_logs", {"execution_id": execution.id, "limit": 2}, user
+        )
+
+        assert response.success, response.error
+        assert [log["seq"] for log in response.data["logs"]] == [4, 5]
+        assert response.data["cursor"] == {"before": 4, "after": 5}
+
+        response = await handler.handle(
+            "get_execution_logs", {"execution_id": execution.id, "after": 3}, user
+        )
+        assert [log["message"] for log in response.data["logs"]] == ["line 3", "line 4"]
@@ -0,0 +1,218 @@
+"""
+Tests for WebSocket handshake authentication.
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.config import Settings
+from app.core.database import Base
+from app.core.security import create_access_token
+from app.core.token_blacklist import TokenBlacklistService
+from app.models.project import Project
+from app.models.user import User
+from app.websocket.auth import WebSocketAuthenticator
+
+
+class FakePipeline:
+    """Pipeline stand-in that runs queued EXISTS commands in one execute."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.keys = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def exists(self, key):
+        self.keys.append(key)
+
+    async def execute(self):
+        self.redis.round_trips += 1
+        return [int(key in self.redis.keys) for key in self.keys]
+
+
+class FakeRedis:
+    """Redis stand-in that counts round trips."""
+
+    def __init__(self):
+        self.keys = set()
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def exists(self, key):
+        self.round_trips += 1
+        return int(key in self.keys)
+
+
+class CountingSessionFactory:
+    """Session factory wrapper that counts sessions opened."""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.opened = 0
+
+    def __call__(self):
+        self.opened += 1
+        return self.factory()
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    """File-backed sqlite session factory with all tables."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'auth.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.fixture
+async def owner(session_factory):
+    """A user owning one project."""
+    async with session_factory() as db:
+        user = User(email="owner@example.com", username="owner", hashed_password="x")
+        db.add(user)
+        await db.flush()
+        project = Project(name="P", owner_id=user.id)
+        db.add(project)
+        await db.commit()
+        return user, project
+
+
+@pytest.fixture
+def redis():
+    """Fake Redis client."""
+    return FakeRedis()
+
+
+@pytest.fixture
+def authenticator(session_factory, redis):
+    """Authenticator over the sqlite database and fake Redis."""
+    blacklist = TokenBlacklistService()
+    blacklist.redis_client = redis
+    return WebSocketAuthenticator(
+        Settings(websocket_auth_cache_seconds=60),
+        session_factory=CountingSessionFactory(session_factory),
+        blacklist=blacklist,
+    )
+
+
+class TestRevocationPipeline:
+    """Test the pipelined revocation check."""
+
+    @pytest.mark.asyncio
+    async def test_both_checks_in_one_round_trip(self, redis):
+        """Test that token and user revocation share one round trip."""
+        blacklist = TokenBlacklistService()
+        blacklist.redis_client = redis
+        redis.keys.add(f"{blacklist.prefix}user:u1")
+
+        assert await blacklist.check_revocation("tok", "u1") == (False, True)
+        assert redis.round_trips == 1
+
+    @pytest.mark.asyncio
+    async def test_fails_open_without_redis(self):
+        """Test that a missing Redis client reports nothing revoked."""
+        assert await TokenBlacklistService().check_revocation("tok", "u1") == (False, False)
+
+
+class TestWebSocketAuthenticator:
+    """Test handshake authentication and caching."""
+
+    @pytest.mark.asyncio
+    async def test_owner_accepted(self, authenticator, owner, redis):
+        """Test that the owner is accepted with one query and one Redis round trip."""
+        user, project = owner
+        token = create_access_token({"sub": user.id})
+
+        result = await authenticator.authenticate(token, project_id=project.id)
+
+        assert result.ok
+        assert result.user.id == user.id
+        assert authenticator.session_factory.opened == 1
+        assert redis.round_trips == 1
+
+    @pytest.mark.asyncio
+    async def test_non_owner_rejected(self, authenticator, owner, session_factory):
+        """Test that another user's project is reported as not found."""
+        _, project = owner
+        async with session_factory() as db:
+            other = User(email="other@example.com", username="other", hashed_password="x")
+            db.add(other)
+            await db.commit()
+
+        result = await authenticator.authenticate(
+            create_access_token({"sub": other.id}), project_id=project.id
+        )
+
+        assert not result.ok
+        assert result.error == "Project not found"
+
+    @pytest.mark.asyncio
+    async def test_invalid_and_revoked_tokens(self, authenticator, owner, redis):
+        """Test rejection of bad, unknown-user and revoked tokens."""
+        user, _ = owner
+        token = create_access_token({"sub": user.id})
+        redis.keys.add(f"token_blacklist:{token}")
+
+        assert (await authenticator.authenticate("garbage")).error == "Invalid token"
+        assert (await authenticator.authenticate(create_access_token({"sub": "nobody"}))).error == "Invalid token"
+        assert (await authenticator.authenticate(token)).error == "Token has been revoked"
+        assert authenticator.metrics["total_rejected"] == 3
+
+    @pytest.mark.asyncio
+    async def test_results_cached_per_token(self, authenticator, owner, redis):
+        """Test that repeated handshakes within the TTL skip DB and Redis."""
+        user, project = owner
+        token = create_access_token({"sub": user.id})
+
+        for _ in range(5):
+            assert (await authenticator.authenticate(token, project_id=project.id)).ok
+
+        assert authenticator.session_factory.opened == 1
+        assert redis.round_trips == 1
+        assert authenticator.metrics["cache_hits"] == 4
+
+        authenticator.invalidate(token)
+        assert (await authenticator.authenticate(token, project_id=project.id)).ok
+        assert authenticator.session_factory.opened == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrent_handshakes_share_lookup(self, authenticator, owner):
+        """Test that a reconnect storm for one token runs a single lookup."""
+        user, project = owner
+        token = create_access_token({"sub": user.id})
+
+        results = await asyncio.gather(
+            *(authenticator.authenticate(token, project_id=project.id) for _ in range(20))
+        )
+
+        assert all(result.ok for result in results)
+        assert authenticator.metrics["total_lookups"] == 1
+        assert authenticator.metrics["coalesced"] == 19
+
+    @pytest.mark.asyncio
+    async def test_cache_disabled(self, session_factory, owner, redis):
+        """Test that a zero TTL looks up every handshake."""
+        user, _ = owner
+        blacklist = TokenBlacklistService()
+        blacklist.redis_client = redis
+        authenticator = WebSocketAuthenticator(
+            Settings(websocket_auth_cache_seconds=0),
+            session_factory=session_factory,
+            blacklist=blacklist,
+        )
+        token = create_access_token({"sub": user.id})
+
+        await authenticator.authenticate(token)
+        await authenticator.authenticate(token)
+
+        assert authenticator.metrics["total_lookups"] == 2
@@ -0,0 +1,109 @@
+"""
+Tests for the queued broadcast dispatcher.
+"""
+
+import asyncio
+
+import pytest
+
+from app.websocket import broadcast as broadcast_module
+from app.websocket.broadcast import BroadcastEventType, BroadcastManager
+from app.websocket.cluster import ClusterRelay
+from app.websocket.connection_manager import ConnectionManager
+from tests.websocket.test_cluster import FakeRedis, make_node
+from tests.websocket.test_connection_manager import FakeWebSocket
+
+
+class FlakyRedis(FakeRedis):
+    """Shared fake Redis whose first pipelined publishes fail."""
+
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+
+    def pipeline(self, transaction=True):
+        pipe = super().pipeline(transaction)
+        execute = pipe.execute
+
+        async def flaky_execute():
+            if self.failures and any(name == "publish" for name, _ in pipe.commands):
+                self.failures -= 1
+                raise ConnectionError("Connection closed by server.")
+            return await execute()
+
+        pipe.execute = flaky_execute
+        return pipe
+
+
+@pytest.fixture
+def conn_manager(monkeypatch):
+    """Isolated connection manager used by the broadcast dispatcher."""
+    manager = ConnectionManager()
+    monkeypatch.setattr(broadcast_module, "get_connection_manager", lambda: manager)
+    return manager
+
+
+class TestBroadcastDispatcher:
+    """Test non-blocking broadcast delivery."""
+
+    @pytest.mark.asyncio
+    async def test_broadcast_returns_before_delivery(self, conn_manager):
+        """Test that broadcasting does not wait for the fan-out."""
+        ws = FakeWebSocket()
+        await conn_manager.connect("c1", ws, "u1", "p1")
+        manager = BroadcastManager(batch_window_ms=10)
+
+        queued = await manager.broadcast_log_entry("p1", "e1", "hello")
+
+        assert queued == 1
+        assert ws.sent == []
+        await manager.stop()
+        await conn_manager.registry.get("c1").send_queue.join()
+        assert [m["data"]["message"] for m in ws.sent] == ["hello"]
+        await conn_manager.disconnect_all()
+
+    @pytest.mark.asyncio
+    async def test_events_grouped_per_project(self, conn_manager, monkeypatch):
+        """Test that one dispatcher batch makes one delivery call per project."""
+        calls = []
+        original = conn_manager.send_many_to_project_local
+
+        def recording(project_id, messages, exclude_user_id=None):
+            calls.append((project_id, len(messages)))
+            return original(project_id, messages, exclude_user_id=exclude_user_id)
+
+        monkeypatch.setattr(conn_manager, "send_many_to_project_local", recording)
+        manager = BroadcastManager(batch_window_ms=50)
+
+        for i in range(3):
+            await manager.broadcast_execution_progress("p1", "e1", i * 10, "coding")
+        await manager.broadcast_execution_progress("p2", "e2", 50, "testing")
+        await manager.stop()
+
+        assert calls == [("p1", 3), ("p2", 1)]
+        assert manager.metrics["total_batches"] == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_relay_is_retried(self, conn_manager):
+        """Test that a failed relay to other nodes is retried without redelivering locally."""
+        server = FlakyRedis(failures=1)
+        conn_manager.cluster = ClusterRelay(conn_manager, node_id="a", redis_client=server)
+        await conn_manager.cluster.start()
+        remote = await make_node(server, "b")
+        local_ws, remote_ws = FakeWebSocket(), FakeWebSocket()
+        await conn_manager.connect("c1", local_ws, "u1", "p1")
+        remote_conn = await remote.connect("c2", remote_ws, "u2", "p1")
+        manager = BroadcastManager(batch_window_ms=0, retry_backoff_ms=10)
+
+        await manager.broadcast_agent_update("p1", BroadcastEventType.STATUS_UPDATE, {"status": "ok"})
+        await asyncio.sleep(0.1)
+        await conn_manager.registry.get("c1").send_queue.join()
+        await remote_conn.send_queue.join()
+
+        assert manager.metrics["retried_broadcasts"] == 1
+        assert len(local_ws.sent) == 1
+        assert len(remote_ws.sent) == 1
+        await manager.stop()
+        for node in (conn_manager, remote):
+            await node.cluster.stop()
+            await node.disconnect_all()
@@ -0,0 +1,198 @@
+"""
+Tests for cross-node WebSocket delivery through the cluster relay.
+"""
+
+import asyncio
+from collections import defaultdict
+
+import pytest
+
+from app.websocket.cluster import ClusterRelay
+from app.websocket.connection_manager import ConnectionManager
+from tests.websocket.test_connection_manager import FakeWebSocket
+
+
+class FakePubSub:
+    """In-memory stand-in for a redis.asyncio PubSub."""
+
+    def __init__(self, server: "FakeRedis"):
+        self.server = server
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.channels = set()
+
+    async def subscribe(self, *channels):
+        for channel in channels:
+            self.channels.add(channel)
+            self.server.subscribers[channel].add(self)
+
+    async def unsubscribe(self, *channels):
+        for channel in channels or list(self.channels):
+            self.server.subscribers[channel].discard(self)
+            self.channels.discard(channel)
+
+    async def listen(self):
+        while True:
+            message = await self.queue.get()
+            if isinstance(message, Exception):
+                raise message
+            yield message
+
+    async def close(self):
+        pass
+
+
+class FakePipeline:
+    """Buffers commands and runs them on execute()."""
+
+    def __init__(self, server: "FakeRedis"):
+        self.server = server
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args: self.commands.append((name, args))
+
+    async def execute(self):
+        return [await getattr(self.server, name)(*args) for name, args in self.commands]
+
+
+class FakeRedis:
+    """Just enough of redis.asyncio.Redis for the relay, shared by all nodes."""
+
+    def __init__(self):
+        self.sets = defaultdict(set)
+        self.subscribers = defaultdict(set)
+        self.published = []
+
+    async def ping(self):
+        return True
+
+    async def sadd(self, key, *members):
+        self.sets[key].update(members)
+
+    async def srem(self, key, *members):
+        self.sets[key].difference_update(members)
+
+    async def smembers(self, key):
+        return set(self.sets.get(key, ()))
+
+    async def publish(self, channel, message):
+        self.published.append(channel)
+        for sub in self.subscribers.get(channel, ()):
+            sub.queue.put_nowait({"type": "message", "channel": channel, "data": message})
+        return len(self.subscribers.get(channel, ()))
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def close(self):
+        pass
+
+
+async def make_node(server: FakeRedis, node_id: str, **kwargs) -> ConnectionManager:
+    manager = ConnectionManager()
+    manager.cluster = ClusterRelay(manager, node_id=node_id, redis_client=server, **kwargs)
+    await manager.cluster.start()
+    return manager
+
+
+class TestClusterRelay:
+    """Test presence tracking and targeted relaying between nodes."""
+
+    @pytest.mark.asyncio
+    async def test_user_message_reaches_other_node(self):
+        """Test that a user's tab on another node receives targeted sends."""
+        server = FakeRedis()
+        node_a, node_b = await make_node(server, "a"), await make_node(server, "b")
+        ws_a, ws_b = FakeWebSocket(), FakeWebSocket()
+        await node_a.connect("c1", ws_a, "u1", "p1")
+        conn_b = await node_b.connect("c2", ws_b, "u1", "p2")
+
+        assert server.sets["ws:presence:user:u1"] == {"a", "b"}
+
+        await node_a.send_to_user("u1", {"type": "hello"})
+        await asyncio.sleep(0.01)
+        await conn_b.send_queue.join()
+
+        assert ws_a.sent == [{"type": "hello"}]
+        assert ws_b.sent == [{"type": "hello"}]
+
+        for node in (node_a, node_b):
+            await node.cluster.stop()
+            await node.disconnect_all()
+
+    @pytest.mark.asyncio
+    async def test_project_send_only_targets_holding_nodes(self):
+        """Test that project sends are published only to nodes holding the project."""
+        server = FakeRedis()
+        node_a = await make_node(server, "a")
+        node_b = await make_node(server, "b")
+        node_c = await make_node(server, "c")
+        await node_b.connect("c1", FakeWebSocket(), "u1", "p1")
+        await node_c.connect("c2", FakeWebSocket(), "u2", "p2")
+
+        await node_a.send_to_project("p1", {"type": "update"})
+
+        assert server.published == ["ws:inbox:b"]
+        for node in (node_a, node_b, node_c):
+            await node.cluster.stop()
+            await node.disconnect_all()
+
+    @pytest.mark.asyncio
+    async def test_presence_withdrawn_and_stale_nodes_pruned(self):
+        """Test presence cleanup on last disconnect and after a node disappears."""
+        server = FakeRedis()
+        node_a = await make_node(server, "a")
+        await node_a.connect("c1", FakeWebSocket(), "u1", "p1")
+        await node_a.connect("c2", FakeWebSocket(), "u1", "p1")
+
+        await node_a.disconnect("c1")
+        assert server.sets["ws:presence:user:u1"] == {"a"}
+        await node_a.disconnect("c2")
+        assert server.sets["ws:presence:user:u1"] == set()
+        assert server.sets["ws:presence:project:p1"] == set()
+
+        # A node that died without withdrawing its presence
+        server.sets["ws:presence:user:u9"].add("dead")
+        assert await node_a.cluster.publish_to_user("u9", {"type": "x"}) == 0
+        assert server.sets["ws:presence:user:u9"] == set()
+        assert node_a.cluster.metrics["total_stale_nodes_pruned"] == 1
+        await node_a.cluster.stop()
+
+    @pytest.mark.asyncio
+    async def test_resubscribes_after_connection_loss(self):
+        """Test that a node whose subscription drops resubscribes and re-announces presence."""
+        server = FakeRedis()
+        node_a = await make_node(server, "a")
+        node_b = await make_node(server, "b", resubscribe_backoff_ms=10)
+        ws_b = FakeWebSocket()
+        conn_b = await node_b.connect("c1", ws_b, "u1")
+
+        # The subscription drops and other nodes prune b while its inbox is dead
+        lost = node_b.cluster._pubsub
+        await lost.unsubscribe()
+        lost.queue.put_nowait(ConnectionError("Connection closed by server."))
+        await asyncio.sleep(0)
+        assert await node_a.send_to_user("u1", {"type": "lost"}) == 0
+        assert server.sets["ws:presence:user:u1"] == set()
+
+        await asyncio.sleep(0.05)
+        assert node_b.cluster.metrics["total_resubscribes"] == 1
+        assert server.sets["ws:presence:user:u1"] == {"b"}
+
+        await node_a.send_to_user("u1", {"type": "hello"})
+        await asyncio.sleep(0.01)
+        await conn_b.send_queue.join()
+        assert ws_b.sent == [{"type": "hello"}]
+
+        for node in (node_a, node_b):
+            await node.cluster.stop()
+            await node.disconnect_all()
@@ -0,0 +1,367 @@
+"""
+Tests for the WebSocket connection manager.
+"""
+
+import asyncio
+import json
+import zlib
+
+import pytest
+
+from app.websocket.connection_manager import (
+    FRAME_DEFLATE_JSON,
+    ConnectionManager,
+    SendOverflowPolicy,
+)
+
+
+class FakeWebSocket:
+    """Minimal stand-in for a Starlette WebSocket."""
+
+    def __init__(self, send_delay: float = 0.0):
+        self.sent = []
+        self.closed = False
+        self.send_delay = send_delay
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, data):
+        await self.gate.wait()
+        if self.send_delay:
+            await asyncio.sleep(self.send_delay)
+        self.sent.append(data)
+
+    async def send_text(self, data):
+        await self.send_json(json.loads(data))
+
+    async def send_bytes(self, data):
+        await self.gate.wait()
+        self.sent.append(data)
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        self.closed = True
+
+
+class TestSendQueue:
+    """Test per-connection outbound queues."""
+
+    @pytest.mark.asyncio
+    async def test_messages_delivered_in_order(self):
+        """Test that queued messages are written in enqueue order."""
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        conn_info = await manager.connect("c1", ws, "u1", "p1")
+
+        for i in range(5):
+            assert await manager.send_to_connection("c1", {"n": i})
+        await conn_info.send_queue.join()
+
+        assert [m["n"] for m in ws.sent] == [0, 1, 2, 3, 4]
+        assert manager.metrics["total_messages_sent"] == 5
+        await manager.disconnect_all()
+
+    @pytest.mark.asyncio
+    async def test_send_does_not_block_on_slow_socket(self):
+        """Test that producers return immediately while the socket is stalled."""
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        ws.gate.clear()
+        await manager.connect("c1", ws, "u1", "p1")
+
+        sent = await asyncio.wait_for(manager.send_to_project("p1", {"n": 1}), timeout=0.1)
+
+        assert sent == 1
+        assert ws.sent == []
+        await manager.disconnect_all()
+
+    @pytest.mark.asyncio
+    async def test_drop_oldest_policy(self):
+        """Test that a full queue evicts the oldest message."""
+        manager = ConnectionManager(send_queue_size=2, overflow_policy=SendOverflowPolicy.DROP_OLDEST)
+        ws = FakeWebSocket()
+        ws.gate.clear()
+        conn_info = await manager.connect("c1", ws, "u1")
+        await manager.send_to_connection("c1", {"n": 0})
+        await asyncio.sleep(0)  # let the writer pick up the first message and stall
+
+        for i in range(1, 4):
+            await manager.send_to_connection("c1", {"n": i})
+        ws.gate.set()
+        await conn_info.send_queue.join()
+
+        assert [m["n"] for m in ws.sent] == [0, 2, 3]
+        assert conn_info.dropped_count == 1
+        await manager.disconnect_all()
+
+    @pytest.mark.asyncio
+    async def test_close_policy_disconnects_slow_consumer(self):
+        """Test that the close policy drops a client that cannot keep up."""
+        manager = ConnectionManager(send_queue_size=1, overflow_policy=SendOverflowPolicy.CLOSE)
+        ws = FakeWebSocket()
+        ws.gate.clear()
+        await manager.connect("c1", ws, "u1")
+        await manager.send_to_connection("c1", {"n": 0})
+        await asyncio.sleep(0)
+
+        await manager.send_to_connection("c1", {"n": 1})
+        assert await manager.send_to_connection("c1", {"n": 2}) is False
+        assert await manager.send_to_connection("c1", {"n": 3}) is False
+        await asyncio.sleep(0.01)
+
+        assert manager.get_connection_count() == 0
+        assert ws.closed
+        assert manager.metrics["total_slow_consumer_closes"] == 1
+
+
+class TestBatching:
+    """Test opt-in event batching."""
+
+    @pytest.mark.asyncio
+    async def test_events_grouped_into_one_frame(self):
+        """Test that events within the window go out as a single batch frame."""
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        conn_info = await manager.connect("c1", ws, "u1", batch_interval_ms=50, batch_max_size=10)
+
+        for i in range(5):
+            await manager.send_to_connection("c1", {"type": "event", "event": {"n": i, "priority": 5}})
+        await conn_info.send_queue.join()
+
+        assert len(ws.sent) == 1
+        assert ws.sent[0]["type"] == "batch"
+        assert [m["event"]["n"] for m in ws.sent[0]["messages"]] == [0, 1, 2, 3, 4]
+        await manager.disconnect_all()
+
+    @pytest.mark.asyncio
+    async def test_response_flushes_batch_in_order(self):
+        """Test that a non-event message ends the batch without waiting for the window."""
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        conn_info = await manager.connect("c1", ws, "u1", batch_interval_ms=1000)
+
+        await manager.send_to_connection("c1", {"type": "event", "event": {"n": 0}})
+        await manager.send_to_connection("c1", {"success": True, "message_type": "ping"})
+        await asyncio.wait_for(conn_info.send_queue.join(), timeout=0.5)
+
+        assert len(ws.sent) == 1
+        assert ws.sent[0]["messages"][-1]["message_type"] == "ping"
+        await manager.disconnect_all()
+
+    @pytest.mark.asyncio
+    async def test_batching_disabled_by_default(self):
+        """Test that connections without negotiation get one frame per message."""
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        conn_info = await manager.connect("c1", ws, "u1")
+
+        for i in range(3):
+            await manager.send_to_connection("c1", {"type": "event", "event": {"n": i}})
+        await conn_info.send_queue.join()
+
+        assert len(ws.sent) == 3
+        assert conn_info.get_batching_info() is None
+        await manager.disconnect_all()
+
+
+class TestCompression:
+    """Test negotiated frame compression."""
+
+    @pytest.mark.asyncio
+    async def test_large_frame_compressed(self):
+        """Test that frames above the threshold are sent as deflate binary frames."""
+        manager = ConnectionManager(compression_threshold=1024)
+        ws = FakeWebSocket()
+        conn_info = await manager.connect("c1", ws, "u1", compression="deflate")
+
+        payload = {"type": "file", "content": "print('hello')\n" * 500}
+        await manager.send_to_connection("c1", payload)
+        await manager.send_to_connection("c1", {"type": "pong"})
+        await conn_info.send_queue.join()
+
+        frame, small = ws.sent
+        assert frame[0] == FRAME_DEFLATE_JSON
+        assert json.loads(zlib.decompress(frame[1:])) == payload
+        assert small == {"type": "pong"}
+        assert manager.get_metrics()["compression_ratio"] > 1
+        await manager.disconnect_all()
+
+    @pytest.mark.asyncio
+    async def test_huge_frame_compressed_off_loop(self, monkeypatch):
+        """Test that frames above the offload threshold compress in a worker thread."""
+        offloaded = []
+        real_to_thread = asyncio.to_thread
+
+        async def tracking_to_thread(func, *args, **kwargs):
+            offloaded.append(func)
+            return await real_to_thread(func, *args, **kwargs)
+
+        monkeypatch.setattr(asyncio, "to_thread", tracking_to_thread)
+        manager = ConnectionManager(compression_threshold=1024, compression_offload_threshold=4096)
+        ws = FakeWebSocket()
+        conn_info = await manager.connect("c1", ws, "u1", compression="deflate")
+
+        await manager.send_to_connection("c1", {"content": "a" * 2000})
+        await manager.send_to_connection("c1", {"content": "b" * 8000})
+        await conn_info.send_queue.join()
+
+        small, large = ws.sent
+        assert json.loads(zlib.decompress(small[1:])) == {"content": "a" * 2000}
+        assert json.loads(zlib.decompress(large[1:])) == {"content": "b" * 8000}
+        assert offloaded == [zlib.compress]
+        assert manager.metrics["total_offloaded_compressions"] == 1
+        await manager.disconnect_all()
+
+    @pytest.mark.asyncio
+    async def test_compression_not_negotiated(self):
+        """Test that clients without compression always get JSON frames."""
+        manager = ConnectionManager(compression_threshold=16)
+        ws = FakeWebSocket()
+        conn_info = await manager.connect("c1", ws, "u1", compression="brotli")
+
+        await manager.send_to_connection("c1", {"content": "x" * 1000})
+        await conn_info.send_queue.join()
+
+        assert conn_info.compression is None
+        assert ws.sent == [{"content": "x" * 1000}]
+        assert manager.get_metrics()["compression_ratio"] is None
+        await manager.disconnect_all()
+
+
+class TestConnectionRegistry:
+    """Test the sharded connection registry."""
+
+    @pytest.mark.asyncio
+    async def test_removed_before_close(self):
+        """Test that a connection is unroutable while its close is still pending."""
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        close_gate = asyncio.Event()
+
+        async def slow_close(code: int = 1000, reason: str = ""):
+            await close_gate.wait()
+            ws.closed = True
+
+        ws.close = slow_close
+        await manager.connect("c1", ws, "u1", "p1")
+
+        disconnect = asyncio.create_task(manager.disconnect("c1"))
+        await asyncio.sleep(0)
+
+        assert manager.get_connection_count() == 0
+        assert manager.get_project_count() == 0
+        assert await manager.send_to_project("p1", {"n": 1}) == 0
+        assert await manager.disconnect("c1") is False
+
+        close_gate.set()
+        assert await disconnect is True
+        assert ws.closed and ws.sent == []
+
+    @pytest.mark.asyncio
+    async def test_duplicate_connection_id_rejected(self):
+        """Test that concurrent connects with the same id register only once."""
+        manager = ConnectionManager()
+
+        results = await asyncio.gather(
+            manager.connect("c1", FakeWebSocket(), "u1"),
+            manager.connect("c1", FakeWebSocket(), "u2"),
+            return_exceptions=True,
+        )
+
+        assert sum(isinstance(r, ValueError) for r in results) == 1
+        assert manager.get_connection_count() == 1
+        await manager.disconnect_all()
+
+    @pytest.mark.asyncio
+    async def test_fan_out_uses_indexed_connections(self, monkeypatch):
+        """Test that user and project fan-out enqueue from the indexes without per-id lookups."""
+        manager = ConnectionManager()
+        await manager.connect("c1", FakeWebSocket(), "u1", "p1")
+        await manager.connect("c2", FakeWebSocket(), "u1", "p1")
+        await manager.connect("c3", FakeWebSocket(), "u2", "p1")
+
+        def lookup(connection_id):
+            raise AssertionError("unexpected per-connection lookup")
+
+        monkeypatch.setattr(manager.registry, "get", lookup)
+
+        assert await manager.send_to_user("u1", {"n": 1}, exclude_connection_id="c2") == 1
+        assert await manager.send_to_project("p1", {"n": 2}, exclude_user_id="u2") == 2
+        assert await manager.send_many_to_project("p1", [{"n": 3}, {"n": 4}]) == 6
+        monkeypatch.undo()
+        await manager.disconnect_all()
+
+    @pytest.mark.asyncio
+    async def test_load_50k_connections(self):
+        """Test registering, targeting and tearing down 50k connections."""
+        manager = ConnectionManager(num_shards=64)
+        total = 50_000
+
+        for i in range(total):
+            await manager.connect(f"c{i}", FakeWebSocket(), f"u{i % 5000}", f"p{i % 100}")
+
+        assert manager.get_connection_count() == total
+        assert manager.get_user_count() == 5000
+        assert manager.get_project_connection_count("p7") == total // 100
+        assert max(len(shard) for shard in manager.registry.shards) < total // 32
+        assert manager.registry.get("c49999").user_id == "u4999"
+
+        assert await manager.send_to_project("p7", {"type": "ping"}) == total // 100
+        assert await manager.broadcast({"type": "ping"}) == total
+
+        assert await manager.disconnect_all() == total
+        assert manager.get_connection_count() == 0
+        assert manager.registry.by_user == {} and manager.registry.by_project == {}
+
+
+class TestIdleReaper:
+    """Test heap-driven idle connection expiry."""
+
+    @pytest.mark.asyncio
+    async def test_reaps_only_idle_connections(self):
+        """Test that touched connections survive and idle ones are closed."""
+        manager = ConnectionManager(idle_timeout=0.05)
+        idle_ws, active_ws = FakeWebSocket(), FakeWebSocket()
+        await manager.connect("idle", idle_ws, "u1")
+        await manager.connect("active", active_ws, "u2")
+
+        await asyncio.sleep(0.03)
+        manager.touch("active")
+        await asyncio.sleep(0.03)
+
+        assert await manager.reap_expired() == 1
+        assert idle_ws.closed and not active_ws.closed
+        assert manager.registry.get("active") is not None
+
+        await asyncio.sleep(0.06)
+        assert await manager.reap_expired() == 1
+        assert manager.get_connection_count() == 0
+        assert manager.metrics["total_idle_reaped"] == 2
+
+    @pytest.mark.asyncio
+    async def test_reap_skips_unexpired_entries(self):
+        """Test that a pass does not touch connections whose deadline is ahead."""
+        manager = ConnectionManager(idle_timeout=60)
+        for i in range(100):
+            await manager.connect(f"c{i}", FakeWebSocket(), "u1")
+        await manager.disconnect("c0")
+
+        assert await manager.reap_expired() == 0
+        assert len(manager._expiry_heap) == 100
+        await manager.disconnect_all()
+
+    @pytest.mark.asyncio
+    async def test_background_reaper(self):
+        """Test that the reaper task disconnects idle connections on its own."""
+        manager = ConnectionManager(idle_timeout=0.02, reaper_interval=0.01)
+        ws = FakeWebSocket()
+        await manager.connect("c1", ws, "u1")
+
+        manager.start_reaper()
+        await asyncio.sleep(0.1)
+        await manager.stop_reaper()
+
+        assert ws.closed
+        assert manager.get_connection_count() == 0
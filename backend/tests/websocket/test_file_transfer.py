@@ -0,0 +1,229 @@
+"""
+Tests for chunked and ranged file transfer.
+"""
+
+import asyncio
+import base64
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.metagpt_integration import file_handler as file_handler_module
+from app.metagpt_integration.file_handler import FileHandler
+from app.websocket import message_handler as message_handler_module
+from app.websocket.connection_manager import ConnectionManager
+from app.websocket.file_transfer import (
+    FRAME_FILE_CHUNK,
+    decode_file_chunk,
+    encode_file_chunk,
+    iter_file_chunks,
+    parse_range_header,
+    resolve_range,
+)
+from app.websocket.message_handler import MessageHandler, MessagePolicy, MessageType, RequestDispatcher
+from tests.websocket.test_connection_manager import FakeWebSocket
+from tests.websocket.test_message_handler import FakeSessionFactory
+
+
+CONTENT = bytes(range(256)) * 40  # 10240 bytes
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """Workspace with one binary file, served by an isolated file handler."""
+    handler = FileHandler(workspace_root=str(tmp_path))
+    (tmp_path / "p1").mkdir()
+    (tmp_path / "p1" / "blob.bin").write_bytes(CONTENT)
+    monkeypatch.setattr(file_handler_module, "get_file_handler", lambda *args: handler)
+    return tmp_path
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    """Message handler with small inline and chunk limits."""
+    class Projects:
+        async def get_project(self, project_id, user_id):
+            return object()
+
+    monkeypatch.setattr(message_handler_module, "get_project_service", lambda db: Projects())
+    custom = settings.model_copy(update={
+        "websocket_file_chunk_size": 4096,
+        "websocket_file_inline_max_bytes": 1024,
+    })
+    return MessageHandler(custom, session_factory=FakeSessionFactory())
+
+
+def reassemble(frames, start=0):
+    """Join chunk frames, checking offsets and the last flag."""
+    data = b""
+    for i, frame in enumerate(frames):
+        _, offset, chunk, last = decode_file_chunk(frame)
+        assert offset == start + len(data)
+        assert last == (i == len(frames) - 1)
+        data += chunk
+    return data
+
+
+class TestChunkFrames:
+    """Test the binary chunk format and range helpers."""
+
+    def test_roundtrip(self):
+        """Test encoding and decoding a chunk frame."""
+        frame = encode_file_chunk("0123456789abcdef", 65536, b"xyz", last=True)
+
+        assert frame[0] == FRAME_FILE_CHUNK
+        assert decode_file_chunk(frame) == ("0123456789abcdef", 65536, b"xyz", True)
+        with pytest.raises(ValueError):
+            decode_file_chunk(b"\x01abc")
+
+    def test_resolve_range(self):
+        """Test clamping of requested ranges."""
+        assert resolve_range(None, None, 100) == (0, 100)
+        assert resolve_range(90, 50, 100) == (90, 100)
+        with pytest.raises(ValueError):
+            resolve_range(101, None, 100)
+        with pytest.raises(ValueError):
+            resolve_range(-1, None, 100)
+
+    def test_parse_range_header(self):
+        """Test HTTP Range header parsing."""
+        assert parse_range_header("bytes=0-99", 1000) == (0, 100)
+        assert parse_range_header("bytes=900-", 1000) == (900, 1000)
+        assert parse_range_header("bytes=-100", 1000) == (900, 1000)
+        assert parse_range_header("bytes=990-2000", 1000) == (990, 1000)
+        for bad in ("bytes=1000-", "bytes=0-1,5-9", "items=0-1", "bytes=-", "bytes=a-b"):
+            with pytest.raises(ValueError):
+                parse_range_header(bad, 1000)
+
+    @pytest.mark.asyncio
+    async def test_iter_file_chunks(self, workspace):
+        """Test that a range is split into frames that reassemble exactly."""
+        path = str(workspace / "p1" / "blob.bin")
+
+        frames = [f async for f in iter_file_chunks(path, "00" * 8, 100, 9100, 4096)]
+        assert len(frames) == 3
+        assert reassemble(frames, start=100) == CONTENT[100:9100]
+
+        frames = [f async for f in iter_file_chunks(path, "00" * 8, 50, 50, 4096)]
+        assert [decode_file_chunk(f)[2:] for f in frames] == [(b"", True)]
+
+
+class TestGetFile:
+    """Test GET_FILE ranges and chunked responses."""
+
+    @pytest.mark.asyncio
+    async def test_range_inline(self, handler, workspace):
+        """Test a small range returned inline as base64."""
+        user = SimpleNamespace(id="u1")
+        response = await handler.handle(
+            "get_file", {"project_id": "p1", "file_path": "blob.bin", "offset": 10, "length": 20}, user
+        )
+
+        assert response.success, response.error
+        assert response.data["encoding"] == "range"
+        assert base64.b64decode(response.data["content"]) == CONTENT[10:30]
+        assert response.attachment is None
+
+    @pytest.mark.asyncio
+    async def test_large_file_streamed_over_connection(self, handler, workspace):
+        """Test that a large file is sent as a response followed by chunk frames."""
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        conn_info = await manager.connect("c1", ws, "u1", "p1")
+        dispatcher = RequestDispatcher(
+            handler,
+            SimpleNamespace(id="u1"),
+            lambda response: manager.send_to_connection("c1", response),
+            send_binary=lambda frame: manager.send_binary("c1", frame),
+        )
+
+        task = await dispatcher.submit(
+            {"type": "get_file", "id": 9, "payload": {"project_id": "p1", "file_path": "blob.bin"}}
+        )
+        await task
+        await conn_info.send_queue.join()
+
+        header, frames = ws.sent[0], ws.sent[1:]
+        assert header["request_id"] == 9
+        assert header["data"]["encoding"] == "chunked"
+        assert header["data"]["chunks"] == len(frames) == 3
+        assert all(decode_file_chunk(f)[0] == header["data"]["transfer_id"] for f in frames)
+        assert reassemble(frames) == CONTENT
+        assert conn_info.queued_binary == 0
+        await manager.disconnect_all()
+
+    @pytest.mark.asyncio
+    async def test_transfers_bounded_by_policy(self, handler, workspace):
+        """Test that chunk streaming honours the GET_FILE concurrency limit and timeout."""
+        limit = handler.policies[MessageType.GET_FILE].max_concurrency
+        sent, streaming = [], []
+        active = 0
+
+        async def send(response):
+            sent.append(response)
+
+        async def slow_send_binary(frame):
+            nonlocal active
+            active += 1
+            streaming.append(active)
+            await asyncio.sleep(0.02)
+            active -= 1
+
+        dispatcher = RequestDispatcher(handler, SimpleNamespace(id="u1"), send, send_binary=slow_send_binary)
+        payload = {"project_id": "p1", "file_path": "blob.bin", "chunked": True}
+        tasks = [await dispatcher.submit({"type": "get_file", "id": i, "payload": payload}) for i in range(limit + 2)]
+        await asyncio.gather(*tasks)
+
+        assert max(streaming) == limit
+        assert len(streaming) == 3 * (limit + 2)
+
+        # A transfer outliving the type's timeout is cut off and reported
+        handler.policies[MessageType.GET_FILE] = MessagePolicy(timeout=0.03, max_concurrency=limit)
+        sent.clear()
+        await (await dispatcher.submit({"type": "get_file", "id": "slow", "payload": payload}))
+
+        assert sent[0]["success"]
+        assert not sent[-1]["success"] and sent[-1]["error"] == "Transfer timed out"
+        assert sent[-1]["request_id"] == "slow"
+
+    @pytest.mark.asyncio
+    async def test_chunked_without_binary_channel(self, handler, workspace):
+        """Test that a chunked response fails cleanly when binary frames can't be sent."""
+        sent = []
+
+        async def send(response):
+            sent.append(response)
+
+        dispatcher = RequestDispatcher(handler, SimpleNamespace(id="u1"), send)
+        task = await dispatcher.submit(
+            {"type": "get_file", "payload": {"project_id": "p1", "file_path": "blob.bin", "chunked": True}}
+        )
+        await task
+
+        assert not sent[0]["success"]
+        assert "Binary" in sent[0]["error"]
+
+
+class TestBinaryQueue:
+    """Test binary frames in the send queue."""
+
+    @pytest.mark.asyncio
+    async def test_binary_frames_not_batched_or_dropped(self):
+        """Test that binary frames bypass batching and survive drop_oldest overflow."""
+        manager = ConnectionManager(send_queue_size=3)
+        ws = FakeWebSocket()
+        ws.gate.clear()
+        conn_info = await manager.connect("c1", ws, "u1", "p1", batch_interval_ms=50)
+
+        await manager.send_binary("c1", b"\x02frame")
+        for i in range(4):
+            manager._enqueue(conn_info, {"event_type": "log", "n": i})
+
+        ws.gate.set()
+        await conn_info.send_queue.join()
+
+        assert ws.sent[0] == b"\x02frame"
+        assert all(isinstance(frame, dict) for frame in ws.sent[1:])
+        assert conn_info.dropped_count == 2
+        await manager.disconnect_all()
@@ -0,0 +1,267 @@
+"""
+Tests for concurrent WebSocket request dispatch.
+"""
+
+import asyncio
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core.config import settings
+from app.core.database import Base
+from app.websocket.connection_manager import ConnectionManager
+from app.websocket.message_handler import (
+    MessageHandler,
+    MessagePolicy,
+    MessageResponse,
+    MessageType,
+    RequestDispatcher,
+)
+from tests.websocket.test_connection_manager import FakeWebSocket
+
+
+class FakeSession:
+    """Stand-in for AsyncSession that records whether it was closed."""
+
+    def __init__(self):
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.closed = True
+
+
+class FakeSessionFactory:
+    """Session factory that remembers the sessions it created."""
+
+    def __init__(self):
+        self.sessions = []
+
+    def __call__(self):
+        session = FakeSession()
+        self.sessions.append(session)
+        return session
+
+
+@pytest.fixture
+def handler():
+    """Message handler over fake per-message sessions."""
+    return MessageHandler(settings, session_factory=FakeSessionFactory())
+
+
+@pytest.fixture
+def user():
+    """Minimal user object."""
+    return SimpleNamespace(id="u1")
+
+
+def make_dispatcher(handler, user, max_in_flight=None):
+    """Build a dispatcher that collects sent responses."""
+    sent = []
+
+    async def send(response):
+        sent.append(response)
+
+    return RequestDispatcher(handler, user, send, max_in_flight=max_in_flight), sent
+
+
+def slow_handler(message_type, delay, started=None):
+    """Build a handler that sleeps before answering."""
+    async def handle(payload, user):
+        if started is not None:
+            started.append(payload)
+        await asyncio.sleep(delay)
+        return MessageResponse(success=True, message_type=message_type.value, data=payload)
+    return handle
+
+
+class TestRequestDispatcher:
+    """Test per-message task dispatch."""
+
+    @pytest.mark.asyncio
+    async def test_slow_request_does_not_block_ping(self, handler, user):
+        """Test that a ping submitted after a slow request is answered first."""
+        handler.handlers[MessageType.LIST_FILES] = slow_handler(MessageType.LIST_FILES, 0.2)
+        dispatcher, sent = make_dispatcher(handler, user)
+
+        slow = await dispatcher.submit({"type": "list_files", "id": 1})
+        ping = await dispatcher.submit({"type": "ping", "id": 2})
+        await ping
+
+        assert [r["request_id"] for r in sent] == [2]
+        assert sent[0]["data"] == {"pong": True}
+
+        await slow
+        assert [r["request_id"] for r in sent] == [2, 1]
+
+    @pytest.mark.asyncio
+    async def test_context_added_to_payload(self, handler, user):
+        """Test that endpoint context is merged into the payload."""
+        handler.handlers[MessageType.GET_PROJECT] = slow_handler(MessageType.GET_PROJECT, 0)
+        dispatcher, sent = make_dispatcher(handler, user)
+
+        task = await dispatcher.submit(
+            {"type": "get_project", "payload": {"x": 1}, "request_id": "abc"},
+            context={"project_id": "p1"},
+        )
+        await task
+
+        assert sent[0]["request_id"] == "abc"
+        assert sent[0]["data"] == {"x": 1, "project_id": "p1"}
+
+    @pytest.mark.asyncio
+    async def test_in_flight_limit(self, handler, user):
+        """Test that requests over the per-connection limit are rejected."""
+        handler.handlers[MessageType.PING] = slow_handler(MessageType.PING, 0.1)
+        dispatcher, sent = make_dispatcher(handler, user, max_in_flight=2)
+
+        first = await dispatcher.submit({"type": "ping", "id": 1})
+        second = await dispatcher.submit({"type": "ping", "id": 2})
+        rejected = await dispatcher.submit({"type": "ping", "id": 3})
+
+        assert rejected is None
+        assert sent[0]["request_id"] == 3
+        assert "in-flight" in sent[0]["error"]
+        assert dispatcher.metrics["total_rejected"] == 1
+
+        await asyncio.gather(first, second)
+        assert dispatcher.in_flight == 0
+        assert await dispatcher.submit({"type": "ping", "id": 4}) is not None
+
+    @pytest.mark.asyncio
+    async def test_missing_type_rejected(self, handler, user):
+        """Test that a message without a type gets an error with its id."""
+        dispatcher, sent = make_dispatcher(handler, user)
+
+        assert await dispatcher.submit({"id": 7}) is None
+        assert sent[0]["request_id"] == 7
+        assert sent[0]["error"] == "Missing message type"
+
+    @pytest.mark.asyncio
+    async def test_close_cancels_in_flight(self, handler, user):
+        """Test that closing the dispatcher cancels running requests."""
+        handler.handlers[MessageType.LIST_FILES] = slow_handler(MessageType.LIST_FILES, 10)
+        dispatcher, sent = make_dispatcher(handler, user)
+
+        task = await dispatcher.submit({"type": "list_files", "id": 1})
+        await asyncio.sleep(0)
+        await dispatcher.close()
+
+        assert task.cancelled()
+        assert dispatcher.in_flight == 0
+        assert sent == []
+
+
+class TestMessagePolicies:
+    """Test per-message-type timeouts and concurrency."""
+
+    @pytest.mark.asyncio
+    async def test_timeout_returns_error(self, handler, user):
+        """Test that a handler exceeding its type's timeout is cut off."""
+        handler.handlers[MessageType.GET_EXECUTION_LOGS] = slow_handler(MessageType.GET_EXECUTION_LOGS, 1)
+        handler.policies[MessageType.GET_EXECUTION_LOGS] = MessagePolicy(timeout=0.05)
+
+        response = await handler.handle("get_execution_logs", {}, user, request_id="r1")
+
+        assert not response.success
+        assert "timed out" in response.error
+        assert response.request_id == "r1"
+        assert handler.metrics["total_timeouts"] == 1
+        assert handler.session_factory.sessions[0].closed
+
+    @pytest.mark.asyncio
+    async def test_type_concurrency_limit(self, handler, user):
+        """Test that a type's max_concurrency bounds its parallel requests."""
+        active = 0
+        peak = 0
+
+        async def list_files(payload, user):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.02)
+            active -= 1
+            return MessageResponse(success=True, message_type="list_files")
+
+        handler.handlers[MessageType.LIST_FILES] = list_files
+        handler.policies[MessageType.LIST_FILES] = MessagePolicy(timeout=5, max_concurrency=2, uses_db=False)
+        handler._semaphores[MessageType.LIST_FILES] = asyncio.Semaphore(2)
+
+        await asyncio.gather(*(handler.handle("list_files", {}, user) for _ in range(6)))
+
+        assert peak == 2
+
+
+class TestPerMessageSessions:
+    """Test that sessions live only as long as a message."""
+
+    @pytest.mark.asyncio
+    async def test_session_per_message(self, handler, user):
+        """Test that each message gets its own session, closed afterwards."""
+        seen = []
+
+        async def get_project(payload, user):
+            seen.append(handler.db)
+            assert handler.project_service.db is handler.db
+            await asyncio.sleep(0.01)
+            return MessageResponse(success=True, message_type="get_project")
+
+        handler.handlers[MessageType.GET_PROJECT] = get_project
+
+        await asyncio.gather(*(handler.handle("get_project", {}, user) for _ in range(4)))
+
+        assert len(set(map(id, seen))) == 4
+        assert all(session.closed for session in handler.session_factory.sessions)
+        with pytest.raises(RuntimeError):
+            _ = handler.db
+
+    @pytest.mark.asyncio
+    async def test_sessionless_messages_open_no_session(self, handler, user):
+        """Test that ping and heartbeat never open a session."""
+        await handler.handle("ping", {}, user)
+        await handler.handle("heartbeat", {}, user)
+
+        assert handler.session_factory.sessions == []
+
+    @pytest.mark.asyncio
+    async def test_idle_sockets_hold_no_connections(self, tmp_path, user):
+        """Test that 1k sockets that have been used but are idle hold zero DB connections."""
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'ws.db'}",
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=5,
+            max_overflow=0,
+        )
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        pool = engine.sync_engine.pool
+        session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        manager = ConnectionManager()
+
+        dispatchers = []
+        tasks = []
+        for i in range(1000):
+            connection_id = f"c{i}"
+            await manager.connect(connection_id, FakeWebSocket(), "u1", "p1")
+            handler = MessageHandler(settings, session_factory=session_factory)
+            dispatcher, sent = make_dispatcher(handler, user)
+            dispatchers.append((dispatcher, sent))
+            tasks.append(await dispatcher.submit({
+                "type": "get_project",
+                "payload": {"project_id": str(uuid4())},
+                "id": i,
+            }))
+
+        await asyncio.gather(*tasks)
+
+        assert len(manager.registry) == 1000
+        assert all(sent[0]["error"] == "Project not found" for _, sent in dispatchers)
+        assert pool.checkedout() == 0
+
+        await manager.disconnect_all()
+        await engine.dispose()
@@ -0,0 +1,207 @@
+"""
+Tests for channel subscriptions over one WebSocket connection.
+"""
+
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.core.database import Base
+from app.metagpt_integration.streaming import EventType, StreamEvent, StreamingHandler
+from app.models.execution import Execution
+from app.models.project import Project
+from app.models.user import User
+from app.websocket.connection_manager import ConnectionManager
+from app.websocket.message_handler import MessageHandler, RequestDispatcher
+from app.websocket.subscriptions import ChannelFilter, ChannelSubscriptions
+from tests.websocket.test_connection_manager import FakeWebSocket
+
+
+def make_event(project_id=None, execution_id=None):
+    """Build a progress event for a project and/or execution."""
+    return StreamEvent(
+        event_type=EventType.EXECUTION_PROGRESS,
+        data={"message": "hi"},
+        timestamp=datetime.utcnow(),
+        source="test",
+        project_id=project_id,
+        execution_id=execution_id,
+    )
+
+
+async def drain(websocket):
+    """Let the connection's writer flush queued messages."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+    return websocket.sent
+
+
+@pytest.fixture
+async def connection():
+    """A registered connection with its manager, streaming handler and channels."""
+    manager = ConnectionManager()
+    streaming = StreamingHandler()
+    websocket = FakeWebSocket()
+    await manager.connect("c1", websocket, "u1")
+    channels = ChannelSubscriptions("c1", manager, streaming, max_channels=3)
+    yield SimpleNamespace(manager=manager, streaming=streaming, websocket=websocket, channels=channels)
+    await manager.disconnect_all()
+
+
+class TestChannelFilter:
+    """Test channel matching."""
+
+    def test_matches_any_channel(self):
+        """Test that an event matches if its project or its execution is subscribed."""
+        event_filter = ChannelFilter({"p1"}, {"e1"})
+
+        assert event_filter.matches(make_event(project_id="p1"))
+        assert event_filter.matches(make_event(project_id="p2", execution_id="e1"))
+        assert not event_filter.matches(make_event(project_id="p2", execution_id="e2"))
+        assert not event_filter.matches(make_event())
+
+
+class TestChannelSubscriptions:
+    """Test adding and removing channels on a connection."""
+
+    @pytest.mark.asyncio
+    async def test_no_subscriber_without_channels(self, connection):
+        """Test that a connection without channels costs no streaming subscriber."""
+        await connection.channels.close()
+
+        assert "c1" not in connection.streaming.subscribers
+
+    @pytest.mark.asyncio
+    async def test_add_and_remove_channels(self, connection):
+        """Test that one subscriber follows the channel set and events are forwarded."""
+        channels, streaming = connection.channels, connection.streaming
+
+        await channels.add(project_id="p1")
+        await channels.add(execution_id="e1")
+        subscriber = streaming.subscribers["c1"]
+        assert len(streaming.subscribers) == 1
+
+        assert await subscriber.send_event(make_event(project_id="p1"))
+        assert await subscriber.send_event(make_event(execution_id="e1"))
+        assert not await subscriber.send_event(make_event(project_id="p2"))
+        sent = await drain(connection.websocket)
+        assert [m["event"]["project_id"] for m in sent] == ["p1", None]
+
+        await channels.remove(project_id="p1")
+        assert not await streaming.subscribers["c1"].send_event(make_event(project_id="p1"))
+
+        await channels.remove(execution_id="e1")
+        assert "c1" not in streaming.subscribers
+        assert channels.list() == {"project_ids": [], "execution_ids": []}
+
+    @pytest.mark.asyncio
+    async def test_project_channel_joins_project(self, connection):
+        """Test that project channels make send_to_project reach the connection."""
+        manager = connection.manager
+
+        await connection.channels.add(project_id="p1")
+        assert manager.send_to_project_local("p1", {"type": "hello"}) == 1
+        assert manager.get_connection_info("c1")["project_ids"] == ["p1"]
+
+        await connection.channels.remove(project_id="p1")
+        assert manager.send_to_project_local("p1", {"type": "hello"}) == 0
+        assert manager.get_project_count() == 0
+
+    @pytest.mark.asyncio
+    async def test_channel_limit(self, connection):
+        """Test that subscriptions beyond max_channels are refused."""
+        channels = connection.channels
+        await channels.add(project_id="p1", execution_id="e1")
+        await channels.add(project_id="p1")  # already subscribed, no new channel
+        await channels.add(project_id="p2")
+
+        with pytest.raises(ValueError):
+            await channels.add(execution_id="e2")
+        assert len(channels) == 3
+
+
+class TestSubscribeMessages:
+    """Test SUBSCRIBE/UNSUBSCRIBE handling."""
+
+    @pytest.fixture
+    async def owned(self, tmp_path):
+        """Session factory with a user owning a project and an execution."""
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'subs.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+        async with session_factory() as db:
+            user = User(email="owner@example.com", username="owner", hashed_password="x")
+            db.add(user)
+            await db.flush()
+            project = Project(name="P", owner_id=user.id)
+            db.add(project)
+            await db.flush()
+            execution = Execution(id=str(uuid4()), project_id=project.id, user_id=user.id)
+            db.add(execution)
+            await db.commit()
+
+        yield SimpleNamespace(factory=session_factory, user=user, project=project, execution=execution)
+        await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_subscribe_checks_ownership(self, connection, owned):
+        """Test that only the user's own projects and executions can be subscribed."""
+        handler = MessageHandler(settings, session_factory=owned.factory)
+        channels = connection.channels
+
+        response = await handler.handle(
+            "subscribe",
+            {"project_id": owned.project.id, "execution_id": owned.execution.id},
+            owned.user,
+            channels=channels,
+        )
+        assert response.success
+        assert response.data["channels"] == {
+            "project_ids": [owned.project.id],
+            "execution_ids": [owned.execution.id],
+        }
+
+        stranger = SimpleNamespace(id=str(uuid4()))
+        response = await handler.handle("subscribe", {"project_id": owned.project.id}, stranger, channels=channels)
+        assert response.error == "Project not found"
+
+        response = await handler.handle("unsubscribe", {"project_id": owned.project.id}, owned.user, channels=channels)
+        assert response.data["channels"]["project_ids"] == []
+
+    @pytest.mark.asyncio
+    async def test_subscribe_without_channels(self, owned):
+        """Test that subscribing fails on a connection without channel support."""
+        handler = MessageHandler(settings, session_factory=owned.factory)
+
+        response = await handler.handle("subscribe", {"project_id": owned.project.id}, owned.user)
+
+        assert response.error == "Subscriptions are not supported on this connection"
+
+    @pytest.mark.asyncio
+    async def test_endpoint_context_not_merged(self, connection, owned):
+        """Test that a project socket's own project_id does not override the subscription."""
+        handler = MessageHandler(settings, session_factory=owned.factory)
+        sent = []
+
+        async def send(response):
+            sent.append(response)
+
+        dispatcher = RequestDispatcher(handler, owned.user, send, channels=connection.channels)
+        await connection.channels.add(project_id="home")
+
+        task = await dispatcher.submit(
+            {"type": "unsubscribe", "payload": {"execution_id": owned.execution.id}, "id": 1},
+            context={"project_id": "home"},
+        )
+        await task
+
+        assert sent[0]["success"]
+        assert sent[0]["data"]["project_id"] is None
+        assert connection.channels.list()["project_ids"] == ["home"]